@@ -3,10 +3,14 @@ API 模块
 统一管理应用的路由和接口定义
 """
 
+from .debug import router as debug_router
 from .example import router as example_router
 from .health import router as health_router
+from .metrics import router as metrics_router
 
 __all__ = [
     "health_router",
     "example_router",
+    "metrics_router",
+    "debug_router",
 ]
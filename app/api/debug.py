@@ -0,0 +1,205 @@
+"""
+调试 API
+提供运行时诊断接口,需配置 DEBUG_TOKEN 并通过 X-Debug-Token 请求头访问
+
+诊断数据均为当前 worker 进程内的数据
+"""
+
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from app.dependencies import verify_debug_token
+from app.orm.tools.SQLMonitor import sql_monitor
+from app.schemas import DataResponseModel
+from app.services.concurrency_limiter import llm_concurrency_limiter
+from app.services.llms_manage.client_registry import llm_client_registry
+from app.services.llms_manage.router import llm_router
+from app.services.now_find_agents.graph_registry import graph_registry
+from app.services.redis import AsyncRedisService, RedisService
+from app.services.redis_near_cache import redis_near_cache
+from app.services.redis_pubsub import redis_subscriber
+from app.services.workflow.job_queue import WorkflowJobQueue
+from app.support.loop_monitor import loop_monitor
+from app.support.memory_debug import memory_debugger
+from app.support.profiler import ProfilerBusyError, profiler
+from config.config import get_settings
+
+router = APIRouter(
+    prefix="/debug",
+    tags=["调试"],
+    dependencies=[Depends(verify_debug_token)],
+    include_in_schema=False,
+)
+
+
+@router.get("/sql", response_model=DataResponseModel[dict])
+async def sql_stats(
+    top: int = Query(50, ge=1, le=1000, description="返回的语句指纹数量"),
+    order_by: str = Query("total_ms", pattern="^(total_ms|count|avg_ms|max_ms|slow)$"),
+):
+    """
+    SQL 语句指纹统计
+
+    按语句指纹聚合的执行次数与耗时,以及疑似 N+1 查询记录
+    """
+    return DataResponseModel(data=sql_monitor.snapshot(top, order_by))
+
+
+@router.delete("/sql", response_model=DataResponseModel[dict])
+async def reset_sql_stats():
+    """清空 SQL 语句统计"""
+    sql_monitor.reset()
+    return DataResponseModel(data={}, message="SQL统计已清空")
+
+
+@router.get("/loop", response_model=DataResponseModel[dict])
+async def loop_stats(top: int = Query(20, ge=1, le=200, description="返回的阻塞调用点数量")):
+    """
+    事件循环延迟与阻塞调用点
+
+    需开启 LOOP_MONITOR_ENABLED,阻塞调用点按总阻塞时长排序并附带调用栈
+    """
+    return DataResponseModel(data=loop_monitor.snapshot(top))
+
+
+@router.delete("/loop", response_model=DataResponseModel[dict])
+async def reset_loop_stats():
+    """清空事件循环监控统计"""
+    loop_monitor.reset()
+    return DataResponseModel(data={}, message="事件循环统计已清空")
+
+
+@router.get("/redis", response_model=DataResponseModel[dict])
+async def redis_pool_stats():
+    """
+    Redis 连接池状态
+
+    async 为应用共享的异步客户端(app.redis),sync 为 RedisService 的同步连接池(未使用时为空),
+    pubsub 为订阅服务各处理函数的队列统计,near_cache 为本地近缓存的命中统计
+    """
+    return DataResponseModel(
+        data={
+            "async": AsyncRedisService.pool_stats() if AsyncRedisService.is_bound() else None,
+            "sync": RedisService.pool_stats() if RedisService._pool is not None else None,
+            "pubsub": redis_subscriber.stats(),
+            "near_cache": redis_near_cache.stats(),
+        }
+    )
+
+
+@router.get("/workflows", response_model=DataResponseModel[dict])
+async def workflow_queue_stats():
+    """
+    工作流任务队列状态
+
+    流长度、已投递未确认数、未投递数、最早未投递任务的等待时间与消费者数
+    """
+    return DataResponseModel(data=await WorkflowJobQueue.from_app().stats())
+
+
+@router.get("/graphs", response_model=DataResponseModel[dict])
+async def graph_stats():
+    """
+    编译图注册表状态
+
+    已注册的图、编译版本与编译次数,以及checkpointer的会话数、近似内存占用与淘汰统计
+    """
+    return DataResponseModel(data=graph_registry.stats())
+
+
+@router.get("/llm-clients", response_model=DataResponseModel[dict])
+async def llm_client_stats():
+    """
+    LLM 客户端注册表与路由状态
+
+    已加载的激活模型数、各 (provider, api_url, model_name) 客户端的创建时间与共享连接池,
+    以及各服务地址的耗时、错误率、摘除状态、已缓存的 Agent 模型和各提供商/模型的自适应并发上限
+    """
+    return DataResponseModel(data={
+        **llm_client_registry.stats(),
+        "routing": llm_router.stats(),
+        "concurrency": llm_concurrency_limiter.stats(),
+    })
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10, gt=0, description="采样时长(秒)"),
+    mode: str = Query("wall", pattern="^(wall|cpu)$", description="wall: 墙钟时间, cpu: 仅CPU时间"),
+    hz: int = Query(None, ge=1, le=1000, description="采样频率(次/秒),默认 PROFILER_SAMPLE_HZ"),
+):
+    """
+    采样分析当前 worker 进程
+
+    返回折叠栈文本,可直接用于 flamegraph.pl 或 speedscope;同一 worker 同时只允许一个分析任务
+    """
+    settings = get_settings()
+    if seconds > settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"采样时长不能超过 {settings.PROFILER_MAX_SECONDS} 秒",
+        )
+    if profiler.busy:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="已有分析任务在运行")
+    try:
+        result = await asyncio.to_thread(
+            profiler.profile, seconds, mode, hz or settings.PROFILER_SAMPLE_HZ
+        )
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return PlainTextResponse(result)
+
+
+@router.get("/memory", response_model=DataResponseModel[dict])
+async def memory_status():
+    """
+    内存诊断状态
+
+    tracemalloc 状态、已保存的快照以及进程内缓存/注册表的大小
+    """
+    return DataResponseModel(data=memory_debugger.status())
+
+
+@router.post("/memory/start", response_model=DataResponseModel[dict])
+async def start_memory_tracing(
+    nframes: int = Query(1, ge=1, le=50, description="每次分配记录的调用栈深度"),
+):
+    """开启 tracemalloc(会增加内存分配开销,排查结束后请关闭)"""
+    memory_debugger.start(nframes)
+    return DataResponseModel(data=memory_debugger.status(), message="tracemalloc 已开启")
+
+
+@router.post("/memory/stop", response_model=DataResponseModel[dict])
+async def stop_memory_tracing():
+    """关闭 tracemalloc 并清空快照"""
+    memory_debugger.stop()
+    return DataResponseModel(data={}, message="tracemalloc 已关闭")
+
+
+@router.post("/memory/snapshots", response_model=DataResponseModel[dict])
+async def take_memory_snapshot(name: str = Query(..., min_length=1, max_length=64)):
+    """保存命名快照"""
+    try:
+        snapshot = await asyncio.to_thread(memory_debugger.take_snapshot, name)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return DataResponseModel(data=snapshot, message="快照已保存")
+
+
+@router.get("/memory/diff", response_model=DataResponseModel[dict])
+async def diff_memory_snapshots(
+    base: str = Query(..., description="基准快照名称"),
+    target: str = Query(None, description="目标快照名称,为空时与当前时刻比较"),
+    top: int = Query(30, ge=1, le=500),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+):
+    """比较两个快照,按 文件:行号 返回内存增长最多的分配位置"""
+    if target is None and not memory_debugger.tracing:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="tracemalloc 未开启")
+    try:
+        result = await asyncio.to_thread(memory_debugger.diff, base, target, top, group_by)
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"快照不存在: {e}")
+    return DataResponseModel(data=result)
@@ -0,0 +1,22 @@
+"""
+监控指标 API
+以 Prometheus 文本格式暴露应用指标
+"""
+
+from fastapi import APIRouter, Response
+
+from app.support.metrics import render_latest, run_async_scrape_hooks
+
+router = APIRouter(tags=["监控指标"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus 指标抓取接口
+
+    多 worker 部署时汇总所有 worker 进程的指标
+    """
+    await run_async_scrape_hooks()
+    content, content_type = render_latest()
+    return Response(content=content, media_type=content_type)
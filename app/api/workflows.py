@@ -0,0 +1,108 @@
+"""
+工作流 API 路由
+提交 Agent 工作流任务到任务队列,由独立的 worker 进程执行
+"""
+
+import asyncio
+
+from fastapi import APIRouter, Header, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+
+from app.schemas.base import DataResponseModel
+from app.schemas.workflow import WorkflowRunRequest, WorkflowTaskResponse
+from app.services.workflow.job_queue import (EVENT_END, STATUS_FAILED,
+                                             STATUS_PENDING, STATUS_SUCCEEDED,
+                                             WorkflowJobQueue)
+
+router = APIRouter(prefix="/workflows", tags=["workflows"])
+
+# 事件流轮询间隔(秒): 不使用 XREAD BLOCK,避免长时间占用共享连接池的连接
+EVENTS_POLL_INTERVAL = 0.5
+# 没有新事件时发送注释行保持连接的间隔(秒)
+EVENTS_KEEPALIVE_INTERVAL = 15.0
+
+
+@router.post(
+    "/",
+    response_model=DataResponseModel[WorkflowTaskResponse],
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_workflow(request: WorkflowRunRequest) -> DataResponseModel[WorkflowTaskResponse]:
+    """
+    提交工作流任务,立即返回 task_id
+
+    相同 HR 的相同输入在排队或执行中时不会重复运行,返回进行中任务的 task_id(deduplicated=true)
+    """
+    queue = WorkflowJobQueue.from_app()
+    task_id, deduplicated = await queue.submit(request.user_input, request.hr_id)
+    if not deduplicated:
+        return DataResponseModel(
+            data=WorkflowTaskResponse(task_id=task_id, status=STATUS_PENDING),
+            message="任务已提交",
+        )
+    task = await queue.get_status(task_id) or {"status": STATUS_PENDING}
+    return DataResponseModel(
+        data=WorkflowTaskResponse(task_id=task_id, deduplicated=True, **task),
+        message="相同任务正在执行,已关联到进行中的任务",
+    )
+
+
+@router.get("/{task_id}", response_model=DataResponseModel[WorkflowTaskResponse])
+async def get_workflow_task(task_id: str) -> DataResponseModel[WorkflowTaskResponse]:
+    """查询工作流任务状态"""
+    task = await WorkflowJobQueue.from_app().get_status(task_id)
+    if task is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"任务 {task_id} 不存在"
+        )
+    return DataResponseModel(data=WorkflowTaskResponse(task_id=task_id, **task))
+
+
+@router.get("/{task_id}/events")
+async def stream_workflow_events(
+    task_id: str,
+    request: Request,
+    last_event_id: str | None = Header(None),
+) -> StreamingResponse:
+    """
+    以 Server-Sent Events 跟随任务事件
+
+    默认从第一个事件开始回放,断线重连时按 Last-Event-ID 续读;收到 end 事件后结束
+    """
+    queue = WorkflowJobQueue.from_app()
+    if await queue.get_status(task_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"任务 {task_id} 不存在"
+        )
+
+    async def event_source():
+        last_id = last_event_id or "0"
+        idle = 0.0
+        while not await request.is_disconnected():
+            events = await queue.read_events(task_id, last_id)
+            for event_id, fields in events:
+                last_id = event_id
+                yield f"id: {event_id}\nevent: {fields['type']}\ndata: {fields['data']}\n\n"
+                if fields["type"] == EVENT_END:
+                    return
+            if events:
+                idle = 0.0
+                continue
+
+            # 事件流已过期但任务已结束时不再等待
+            task = await queue.get_status(task_id)
+            if task is None or task["status"] in (STATUS_SUCCEEDED, STATUS_FAILED):
+                return
+            idle += EVENTS_POLL_INTERVAL
+            if idle >= EVENTS_KEEPALIVE_INTERVAL:
+                idle = 0.0
+                yield ": keepalive\n\n"
+            await asyncio.sleep(EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
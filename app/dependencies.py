@@ -3,8 +3,10 @@ FastAPI 依赖注入
 提供数据库会话等公共依赖
 """
 
-from typing import AsyncGenerator
+import secrets
+from typing import AsyncGenerator, Optional
 
+from fastapi import Header, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.providers.database import get_engine
@@ -20,6 +22,22 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
     _, async_session = get_engine()
     async with async_session() as session:
         try:
+            # 连接在首次执行 SQL 时才从连接池获取,checkout 耗时由 TracedSession 记录
             yield session
         finally:
             await session.close()
+
+
+async def verify_debug_token(x_debug_token: Optional[str] = Header(default=None)) -> None:
+    """
+    校验 /debug 调试接口的访问令牌
+
+    未配置 DEBUG_TOKEN 时调试接口整体不可用(返回 404)
+    """
+    from config.config import get_settings
+
+    debug_token = get_settings().DEBUG_TOKEN
+    if not debug_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_debug_token or not secrets.compare_digest(x_debug_token, debug_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无效的调试令牌")
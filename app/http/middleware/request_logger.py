@@ -1,56 +1,237 @@
+import random
+import re
 import time
 import uuid
-from collections.abc import Callable
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.orm.tools.SQLMonitor import sql_monitor
 from app.providers.logging_provider import logger
+from app.support.metrics import observe_http_request
+from app.support.request_context import request_id_var
+from app.support.structured_logging import log_sampler
+from app.support.tracing import (SPAN_KIND_SERVER, Span, Trace,
+                                 TraceFileExporter, end_trace,
+                                 parse_traceparent, span, start_trace)
 
+# 请求体中需要脱敏的字段
+_SENSITIVE_BODY_PATTERN = re.compile(
+    r'("(?:password|secret|token|key)"\s*:\s*)"[^"]*"', re.IGNORECASE
+)
+_BODY_METHODS = frozenset({"POST", "PUT", "PATCH"})
 
-class RequestLoggerMiddleware(BaseHTTPMiddleware):
+
+class RequestLoggerMiddleware:
     """
-    中间件:记录请求日志,包括请求路径、方法、处理时间、状态码等信息
+    纯 ASGI 请求日志中间件:记录请求方法、路径、状态码、处理耗时,
+    并在响应头中添加 X-Request-ID 与 X-Process-Time
+
+    不继承 BaseHTTPMiddleware,避免额外的 task 与响应流包装开销。
+    请求体记录默认关闭,开启后按比例采样,通过包装 receive 旁路复制
+    已被下游读取的数据块,不会提前缓冲整个请求体,且最多保留 body_max_bytes 字节。
+    请求日志按 log_sampler 的路由/方法/级别规则采样,错误与慢请求始终记录。
+    开启 tracing 时为每个请求建立 Trace,各埋点耗时汇总到 Server-Timing 响应头与日志字段。
+    开启 metrics 时按路由模板记录 Prometheus 请求数与耗时指标。
+    开启 sql_stats 时统计请求内的查询次数(日志字段 db_queries)并检查疑似 N+1 查询。
     """
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        request_id = str(uuid.uuid4())
-        start_time = time.time()
+    def __init__(
+        self,
+        app: ASGIApp,
+        log_body: bool = False,
+        body_sample_rate: float = 0.0,
+        body_max_bytes: int = 2048,
+        tracing: bool = True,
+        server_timing: bool = True,
+        max_spans: int = 500,
+        trace_exporter: TraceFileExporter | None = None,
+        metrics: bool = True,
+        sql_stats: bool = True,
+    ) -> None:
+        self.app = app
+        self.log_body = log_body
+        self.body_sample_rate = body_sample_rate
+        self.body_max_bytes = body_max_bytes
+        self.tracing = tracing
+        self.server_timing = server_timing
+        self.max_spans = max_spans
+        self.trace_exporter = trace_exporter
+        self.metrics = metrics
+        self.sql_stats = sql_stats
 
-        # 记录请求开始
-        logger.info(
-            f"Request started | ID: {request_id} | "
-            f"Method: {request.method} | Path: {request.url.path} | "
-            f"Client: {request.client.host if request.client else 'Unknown'}"
-        )
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        try:
-            # 处理请求
-            response = await call_next(request)
-
-            # 计算处理时间
-            process_time = time.time() - start_time
-
-            # 记录请求结束
-            logger.info(
-                f"Request completed | ID: {request_id} | "
-                f"Method: {request.method} | Path: {request.url.path} | "
-                f"Status: {response.status_code} | "
-                f"Duration: {process_time:.4f}s"
-            )
+        start_time = time.perf_counter()
+        # 优先沿用上游网关传入的 X-Request-ID
+        request_id = self._get_header(scope, b"x-request-id") or str(uuid.uuid4())
+        method = scope["method"]
+        status_code = 500
+
+        body_buffer: bytearray | None = None
+        if self._should_capture_body(method):
+            body_buffer = bytearray()
+            receive = self._tee_receive(receive, body_buffer)
 
-            # 添加自定义响应头,包含请求ID和处理时间
-            response.headers["X-Request-ID"] = request_id
-            response.headers["X-Process-Time"] = str(process_time)
+        trace: Trace | None = None
+        trace_token = None
+        if self.tracing:
+            trace_id = parse_traceparent(self._get_header(scope, b"traceparent"))
+            trace, trace_token = start_trace(trace_id, self.max_spans)
 
-            return response
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Request-ID", request_id)
+                headers.append(
+                    "X-Process-Time", f"{time.perf_counter() - start_time:.6f}"
+                )
+                if trace is not None and self.server_timing:
+                    server_timing = trace.server_timing()
+                    if server_timing:
+                        headers.append("Server-Timing", server_timing)
+            await send(message)
 
+        sql_token = sql_monitor.begin_request() if self.sql_stats else None
+        token = request_id_var.set(request_id)
+        try:
+            with span("http.server", SPAN_KIND_SERVER) as root_span:
+                await self.app(scope, receive, send_wrapper)
         except Exception as e:
-            # 记录异常
-            process_time = time.time() - start_time
-            logger.error(
-                f"Request failed | ID: {request_id} | "
-                f"Method: {request.method} | Path: {request.url.path} | "
-                f"Error: {e!s} | Duration: {process_time:.4f}s"
-            )
+            self._log_request(scope, request_id, status_code, start_time, body_buffer, trace, e)
             raise
+        else:
+            self._log_request(scope, request_id, status_code, start_time, body_buffer, trace)
+        finally:
+            route_path = getattr(scope.get("route"), "path", None)
+            if self.metrics:
+                observe_http_request(
+                    method, route_path, status_code, time.perf_counter() - start_time
+                )
+            if sql_token is not None:
+                sql_monitor.end_request(sql_token, f"{method} {route_path or scope['path']}")
+            if trace_token is not None:
+                self._finish_trace(scope, trace, root_span, status_code)
+                end_trace(trace_token)
+            request_id_var.reset(token)
+
+    def _log_request(
+        self,
+        scope: Scope,
+        request_id: str,
+        status_code: int,
+        start_time: float,
+        body_buffer: bytearray | None,
+        trace: Trace | None,
+        error: Exception | None = None,
+    ) -> None:
+        """按采样规则记录一条请求日志,字段同时绑定到 extra 供 JSON 日志使用"""
+        duration_ms = (time.perf_counter() - start_time) * 1000
+        method = scope["method"]
+        path = scope["path"]
+        # 路由匹配后 FastAPI 会把 APIRoute 写入 scope,优先使用路由模板进行采样匹配
+        route_path = getattr(scope.get("route"), "path", None)
+
+        if error is not None or status_code >= 500:
+            level = "ERROR"
+        elif status_code >= 400:
+            level = "WARNING"
+        else:
+            level = "INFO"
+
+        if not log_sampler.should_log(
+            method, route_path or path, level, duration_ms, cacheable=route_path is not None
+        ):
+            return
+
+        client = scope.get("client")
+        client_host = client[0] if client else "Unknown"
+        if error is not None:
+            message = (
+                f"Request failed | ID: {request_id} | {method} {path} | "
+                f"Error: {error!s} | Duration: {duration_ms / 1000:.4f}s"
+            )
+        else:
+            message = (
+                f"Request completed | ID: {request_id} | {method} {path} | "
+                f"Status: {status_code} | Duration: {duration_ms / 1000:.4f}s | "
+                f"Client: {client_host}"
+            )
+        if body_buffer is not None:
+            message += f" | Body: {self._format_body(body_buffer)}"
+
+        fields = {
+            "method": method,
+            "route": route_path,
+            "path": path,
+            "status": status_code,
+            "duration_ms": round(duration_ms, 3),
+            "client": client_host,
+        }
+        request_sql = sql_monitor.current_request()
+        if request_sql is not None:
+            fields["db_queries"] = request_sql.queries
+        if trace is not None:
+            fields["trace_id"] = trace.trace_id
+            fields["timings"] = trace.timings()
+        logger.bind(**fields).log(level, message)
+
+    def _finish_trace(
+        self, scope: Scope, trace: Trace, root_span: Span | None, status_code: int
+    ) -> None:
+        """补全根 span 信息并导出 Trace"""
+        if root_span is not None:
+            route_path = getattr(scope.get("route"), "path", None) or scope["path"]
+            root_span.name = f"{scope['method']} {route_path}"
+            root_span.attributes.update(
+                {
+                    "http.method": scope["method"],
+                    "http.route": route_path,
+                    "http.target": scope["path"],
+                    "http.status_code": status_code,
+                }
+            )
+        if self.trace_exporter is not None:
+            self.trace_exporter.export(trace)
+
+    @staticmethod
+    def _get_header(scope: Scope, name: bytes) -> str | None:
+        for key, value in scope["headers"]:
+            if key == name:
+                return value.decode("latin-1")
+        return None
+
+    def _should_capture_body(self, method: str) -> bool:
+        return (
+            self.log_body
+            and method in _BODY_METHODS
+            and random.random() < self.body_sample_rate
+        )
+
+    def _tee_receive(self, receive: Receive, buffer: bytearray) -> Receive:
+        """包装 receive,在下游读取请求体时旁路复制前 body_max_bytes 字节"""
+        max_bytes = self.body_max_bytes
+
+        async def tee() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                remaining = max_bytes - len(buffer)
+                if remaining > 0:
+                    buffer.extend(message.get("body", b"")[:remaining])
+            return message
+
+        return tee
+
+    def _format_body(self, buffer: bytearray) -> str:
+        if not buffer:
+            return "<empty>"
+        text = buffer.decode("utf-8", errors="replace")
+        text = _SENSITIVE_BODY_PATTERN.sub(r'\1"***"', text)
+        if len(buffer) >= self.body_max_bytes:
+            text += "...<truncated>"
+        return text
@@ -0,0 +1,46 @@
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String
+from sqlalchemy.dialects.mysql import LONGBLOB
+
+from .BaseModels import Base
+
+# MySQL 的 BLOB 最大 64KB,checkpoint 状态使用 LONGBLOB
+Payload = LargeBinary().with_variant(LONGBLOB(), "mysql")
+
+
+class Checkpoint(Base):
+    __tablename__ = "langgraph_checkpoint"
+
+    thread_id = Column(String(150), primary_key=True, comment="会话ID(task_id)")
+    checkpoint_ns = Column(String(255), primary_key=True, default="", comment="子图命名空间")
+    checkpoint_id = Column(String(64), primary_key=True, comment="checkpoint ID,按时间递增")
+    parent_checkpoint_id = Column(String(64), nullable=True, comment="父checkpoint ID")
+    type = Column(String(32), nullable=False, comment="checkpoint 序列化格式与压缩算法")
+    checkpoint = Column(Payload, nullable=False, comment="checkpoint(不含通道值)")
+    metadata_type = Column(String(32), nullable=False, comment="元数据序列化格式与压缩算法")
+    checkpoint_metadata = Column(Payload, nullable=False, comment="checkpoint 元数据")
+    created_at = Column(DateTime, index=True, nullable=False, comment="写入时间(UTC)")
+
+
+class CheckpointBlob(Base):
+    __tablename__ = "langgraph_checkpoint_blob"
+
+    thread_id = Column(String(150), primary_key=True, comment="会话ID(task_id)")
+    checkpoint_ns = Column(String(255), primary_key=True, default="", comment="子图命名空间")
+    channel = Column(String(150), primary_key=True, comment="通道名称")
+    version = Column(String(64), primary_key=True, comment="通道版本")
+    type = Column(String(32), nullable=False, comment="序列化格式与压缩算法,empty 为空通道")
+    blob = Column(Payload, nullable=True, comment="通道值")
+
+
+class CheckpointWrite(Base):
+    __tablename__ = "langgraph_checkpoint_write"
+
+    thread_id = Column(String(150), primary_key=True, comment="会话ID(task_id)")
+    checkpoint_ns = Column(String(255), primary_key=True, default="", comment="子图命名空间")
+    checkpoint_id = Column(String(64), primary_key=True, comment="所属checkpoint ID")
+    task_id = Column(String(64), primary_key=True, comment="写入的任务ID")
+    idx = Column(Integer, primary_key=True, autoincrement=False, comment="写入序号,特殊通道为负数")
+    channel = Column(String(150), nullable=False, comment="通道名称")
+    type = Column(String(32), nullable=False, comment="序列化格式与压缩算法")
+    blob = Column(Payload, nullable=False, comment="写入值")
+    task_path = Column(String(255), nullable=False, default="", comment="任务路径")
@@ -10,6 +10,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.models.Agent import Agent
+from app.models.LLM import LLM
 from app.orm.dao.BaseDao import BaseDao
 
 
@@ -25,6 +26,16 @@ class AgentDao(BaseDao[Agent]):
         result = await self.db.execute(stmt)
         return result.scalars().first()
     
+    async def find_model_name(self, name: str) -> Optional[str]:
+        """根据 Agent 名称查找其使用的 llm 模型名称"""
+        stmt = (
+            select(LLM.model_name)
+            .join(Agent, Agent.agent_model_id == LLM.id)
+            .filter(Agent.name == name)
+        )
+        result = await self.db.execute(stmt)
+        return result.scalars().first()
+    
     async def find_by_status(self, status: int) -> List[Agent]:
         """根据状态查找 Agent 列表"""
         stmt = select(Agent).filter(Agent.status == status)
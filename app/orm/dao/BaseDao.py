@@ -20,6 +20,7 @@ from sqlalchemy.future import select
 from app.pages.Order import Order
 from app.pages.PageHelper import PageHelper
 from app.pages.Paginate import Paginate
+from app.support.metrics import instrument_dao_class
 
 M = TypeVar("M", bound=BaseModel)
 
@@ -32,6 +33,13 @@ class BaseDao(Generic[M]):
     db: AsyncSession = None
     cls = None
 
+    def __init_subclass__(cls, **kwargs):
+        """
+        子类定义的 DAO 方法自动记录耗时指标
+        """
+        super().__init_subclass__(**kwargs)
+        instrument_dao_class(cls)
+
     def __init__(self, db: AsyncSession, cls=None):
         self.db = db
         if cls is not None:
@@ -269,3 +277,6 @@ class BaseDao(Generic[M]):
                 result, search.pager.page_num, search.pager.page_size, None
             )
         return paginate
+
+
+instrument_dao_class(BaseDao)
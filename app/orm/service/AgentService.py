@@ -11,6 +11,7 @@ from app.models.Agent import Agent
 from app.orm.dao.AgentDao import AgentDao
 from app.orm.service.BaseServiceImpl import BaseServiceImpl
 from app.schemas.agent import AgentCreate, AgentUpdate, AgentQuery
+from app.services.redis_cache import redis_cache_evict, redis_cached
 
 
 class AgentService(BaseServiceImpl[Agent]):
@@ -20,6 +21,7 @@ class AgentService(BaseServiceImpl[Agent]):
         self.agent_dao = AgentDao(db)
         super().__init__(db, Agent, self.agent_dao)
     
+    @redis_cache_evict(tags=["agent"])
     async def create_agent(self, agent_create: AgentCreate) -> Agent:
         """创建 Agent"""
         # 检查名称是否已存在
@@ -30,6 +32,7 @@ class AgentService(BaseServiceImpl[Agent]):
         agent = Agent(**agent_create.model_dump())
         return await self.agent_dao.save(agent)
     
+    @redis_cache_evict(tags=["agent"])
     async def update_agent(self, agent_id: int, agent_update: AgentUpdate) -> Optional[Agent]:
         """更新 Agent"""
         # 查找现有 Agent
@@ -62,6 +65,11 @@ class AgentService(BaseServiceImpl[Agent]):
         """根据名称获取 Agent"""
         return await self.agent_dao.find_by_name(name)
     
+    @redis_cached(ttl=300, tags=["agent", "llm"])
+    async def get_agent_model_name(self, name: str) -> Optional[str]:
+        """获取 Agent 使用的 llm 模型名称,Agent 或模型不存在时返回 None"""
+        return await self.agent_dao.find_model_name(name)
+    
     async def get_agents_by_status(self, status: int) -> List[Agent]:
         """根据状态获取 Agent 列表"""
         return await self.agent_dao.find_by_status(status)
@@ -92,6 +100,7 @@ class AgentService(BaseServiceImpl[Agent]):
         """多条件搜索 Agent"""
         return await self.agent_dao.search_agents(keyword, status, level, agent_model_id)
     
+    @redis_cache_evict(tags=["agent"])
     async def delete_agent(self, agent_id: int) -> bool:
         """删除 Agent"""
         agent = Agent(id=agent_id)
@@ -106,16 +115,15 @@ class AgentService(BaseServiceImpl[Agent]):
         """检查 Agent 是否存在"""
         return await self.agent_dao.exists_by_name(name)
     
+    @redis_cache_evict(tags=["agent"])
     async def batch_update_status(self, agent_ids: List[int], status: int) -> bool:
         """批量更新 Agent 状态"""
-        agents = []
-        for agent_id in agent_ids:
-            agent = Agent(id=agent_id)
-            existing_agent = await self.agent_dao.find_by_id(agent)
-            if existing_agent:
-                existing_agent.status = status
-                agents.append(existing_agent)
+        # 一次查询取出全部记录并在同一事务中提交,避免逐条查询与逐条提交
+        agents = await self.agent_dao.find_by_ids(agent_ids)
+        for existing_agent in agents:
+            existing_agent.status = status
         
         if agents:
-            return await self.agent_dao.update_all(agents)
+            await self.agent_dao.update_all_not_commit(agents)
+            await self.db.commit()
         return True
@@ -11,6 +11,7 @@ from app.models.LLM import LLM
 from app.orm.dao.LLMDao import LLMDao
 from app.orm.service.BaseServiceImpl import BaseServiceImpl
 from app.schemas.llm import LLMCreate, LLMUpdate
+from app.services.redis_cache import redis_cache_evict
 
 
 class LLMService(BaseServiceImpl[LLM]):
@@ -20,6 +21,7 @@ class LLMService(BaseServiceImpl[LLM]):
         self.llm_dao = LLMDao(db)
         super().__init__(db, LLM, self.llm_dao)
     
+    @redis_cache_evict(tags=["llm"])
     async def create_llm(self, llm_create: LLMCreate) -> LLM:
         """创建 LLM"""
         # 检查模型名称是否已存在
@@ -30,6 +32,7 @@ class LLMService(BaseServiceImpl[LLM]):
         llm = LLM(**llm_create.model_dump())
         return await self.llm_dao.save(llm)
     
+    @redis_cache_evict(tags=["llm"])
     async def update_llm(self, llm_id: int, llm_update: LLMUpdate) -> Optional[LLM]:
         """更新 LLM"""
         # 查找现有 LLM
@@ -75,7 +78,12 @@ class LLMService(BaseServiceImpl[LLM]):
         return await self.llm_dao.find_by_status(status)
     
     async def get_active_llms(self) -> List[LLM]:
-        """获取激活状态的 LLM 列表"""
+        """
+        获取激活状态的 LLM 列表
+
+        行中包含明文 api_key,不写入 Redis 缓存;模型客户端注册表在进程内缓存结果,
+        并按 llm 标签版本(写方法通过 redis_cache_evict 递增)重新加载
+        """
         return await self.llm_dao.find_active_models()
     
     async def get_basic_models(self) -> List[LLM]:
@@ -100,6 +108,7 @@ class LLMService(BaseServiceImpl[LLM]):
         """多条件搜索 LLM"""
         return await self.llm_dao.search_models(keyword, provider, model_type, status)
     
+    @redis_cache_evict(tags=["llm"])
     async def delete_llm(self, llm_id: int) -> bool:
         """删除 LLM"""
         llm = LLM(id=llm_id)
@@ -118,18 +127,17 @@ class LLMService(BaseServiceImpl[LLM]):
         """根据提供商和模型类型获取 LLM 列表"""
         return await self.llm_dao.find_by_provider_and_type(provider, model_type)
     
+    @redis_cache_evict(tags=["llm"])
     async def batch_update_status(self, llm_ids: List[int], status: int) -> bool:
         """批量更新 LLM 状态"""
-        llms = []
-        for llm_id in llm_ids:
-            llm = LLM(id=llm_id)
-            existing_llm = await self.llm_dao.find_by_id(llm)
-            if existing_llm:
-                existing_llm.status = status
-                llms.append(existing_llm)
+        # 一次查询取出全部记录并在同一事务中提交,避免逐条查询与逐条提交
+        llms = await self.llm_dao.find_by_ids(llm_ids)
+        for existing_llm in llms:
+            existing_llm.status = status
         
         if llms:
-            return await self.llm_dao.update_all(llms)
+            await self.llm_dao.update_all_not_commit(llms)
+            await self.db.commit()
         return True
     
     async def test_llm_connection(self, llm_id: int) -> bool:
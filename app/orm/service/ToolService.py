@@ -11,6 +11,8 @@ from app.models.Tool import Tool
 from app.orm.dao.ToolDao import ToolDao
 from app.orm.service.BaseServiceImpl import BaseServiceImpl
 from app.schemas.tool import ToolCreate, ToolUpdate
+from app.services.redis_cache import (orm_dump, orm_loader, redis_cache_evict,
+                                      redis_cached)
 
 
 class ToolService(BaseServiceImpl[Tool]):
@@ -20,6 +22,7 @@ class ToolService(BaseServiceImpl[Tool]):
         self.tool_dao = ToolDao(db)
         super().__init__(db, Tool, self.tool_dao)
     
+    @redis_cache_evict(tags=["tool"])
     async def create_tool(self, tool_create: ToolCreate) -> Tool:
         """创建 Tool"""
         # 检查名称是否已存在
@@ -34,6 +37,7 @@ class ToolService(BaseServiceImpl[Tool]):
         tool = Tool(**tool_create.model_dump())
         return await self.tool_dao.save(tool)
     
+    @redis_cache_evict(tags=["tool"])
     async def update_tool(self, tool_id: int, tool_update: ToolUpdate) -> Optional[Tool]:
         """更新 Tool"""
         # 查找现有 Tool
@@ -96,6 +100,7 @@ class ToolService(BaseServiceImpl[Tool]):
         """多条件搜索 Tool"""
         return await self.tool_dao.search_tools(keyword, status, is_direct_return)
     
+    @redis_cache_evict(tags=["tool"])
     async def delete_tool(self, tool_id: int) -> bool:
         """删除 Tool"""
         tool = Tool(id=tool_id)
@@ -114,6 +119,7 @@ class ToolService(BaseServiceImpl[Tool]):
         """检查 Tool 函数是否存在"""
         return await self.tool_dao.exists_by_function(tool_function)
     
+    @redis_cached(ttl=300, tags=["tool"], dump=orm_dump, load=orm_loader(Tool))
     async def get_tools_by_names(self, names: List[str]) -> List[Tool]:
         """根据名称列表获取 Tool 列表"""
         return await self.tool_dao.find_tools_by_names(names)
@@ -122,18 +128,17 @@ class ToolService(BaseServiceImpl[Tool]):
         """根据函数列表获取 Tool 列表"""
         return await self.tool_dao.find_tools_by_functions(functions)
     
+    @redis_cache_evict(tags=["tool"])
     async def batch_update_status(self, tool_ids: List[int], status: int) -> bool:
         """批量更新 Tool 状态"""
-        tools = []
-        for tool_id in tool_ids:
-            tool = Tool(id=tool_id)
-            existing_tool = await self.tool_dao.find_by_id(tool)
-            if existing_tool:
-                existing_tool.status = status
-                tools.append(existing_tool)
+        # 一次查询取出全部记录并在同一事务中提交,避免逐条查询与逐条提交
+        tools = await self.tool_dao.find_by_ids(tool_ids)
+        for existing_tool in tools:
+            existing_tool.status = status
         
         if tools:
-            return await self.tool_dao.update_all(tools)
+            await self.tool_dao.update_all_not_commit(tools)
+            await self.db.commit()
         return True
     
     async def validate_tool_config(self, tool_id: int) -> bool:
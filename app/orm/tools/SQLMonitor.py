@@ -0,0 +1,296 @@
+"""
+SQL 执行监控
+
+替代逐条编译并打印语句的 SQLAlchemyInterceptor,仅在 before/after_cursor_execute 中计时,
+开销为每条语句一次 perf_counter 与一次指纹查表:
+
+- 按语句指纹(去除参数与字面量、折叠 IN 列表后的 SQL)聚合次数、总耗时与最大耗时
+- 统计每个请求内的查询次数,同一指纹的 SELECT 在单个请求内执行次数达到阈值时记录疑似 N+1
+- 超过阈值的慢查询写入慢查询日志(extra.slow_sql=True),可选附带 EXPLAIN 结果
+
+统计数据为进程内数据,多 worker 部署时各 worker 独立统计。
+"""
+
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar, Token
+from functools import lru_cache
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.support.memory_debug import register_memory_probe
+
+# 超过该数量的新指纹统一归入 OTHER_FINGERPRINT,防止统计表无界增长
+OTHER_FINGERPRINT = "<other>"
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+|\?")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\b(IN )\(\?(?:, \?)*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\b(VALUES \(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+_COMMA = re.compile(r" ?, ?")
+_PAREN_SPACE = re.compile(r"(?<=\() | (?=\))")
+
+_EXPLAIN_PREFIX = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN ",
+    "mysql": "EXPLAIN ",
+}
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """生成语句指纹: 参数占位符与字面量统一替换为 ?,空白统一,IN 列表(任意长度)与多行 VALUES 折叠"""
+    text = _STRING_LITERAL.sub("?", statement)
+    text = _PLACEHOLDER.sub("?", text)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    text = _COMMA.sub(", ", text)
+    text = _PAREN_SPACE.sub("", text)
+    text = _IN_LIST.sub(r"\1(...)", text)
+    text = _VALUES_LIST.sub(r"\1, ...", text)
+    return text
+
+
+class StatementStats:
+    """单个语句指纹的聚合统计"""
+
+    __slots__ = ("count", "total_ms", "max_ms", "errors", "slow")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+        self.slow = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "errors": self.errors,
+            "slow": self.slow,
+        }
+
+
+class RequestSQLStats:
+    """单个请求内的 SQL 统计"""
+
+    __slots__ = ("queries", "total_ms", "fingerprints")
+
+    def __init__(self):
+        self.queries = 0
+        self.total_ms = 0.0
+        self.fingerprints: Counter[str] = Counter()
+
+
+_request_stats_var: ContextVar[RequestSQLStats | None] = ContextVar(
+    "request_sql_stats", default=None
+)
+
+
+class SQLMonitor:
+    """SQL 统计、N+1 检测与慢查询日志"""
+
+    def __init__(self):
+        self.enabled = True
+        self.slow_threshold_ms = 500.0
+        self.n_plus_one_threshold = 10
+        self.explain = False
+        self.explain_interval = 300.0
+        self.max_fingerprints = 1000
+        self._statements: dict[str, StatementStats] = {}
+        self._n_plus_one: Counter[tuple[str, str]] = Counter()
+        self._explained_at: dict[str, float] = {}
+
+    def configure(
+        self,
+        enabled: bool = True,
+        slow_threshold_ms: float = 500.0,
+        n_plus_one_threshold: int = 10,
+        explain: bool = False,
+        max_fingerprints: int = 1000,
+    ) -> None:
+        """更新监控配置
+
+        Args:
+            enabled: 是否统计
+            slow_threshold_ms: 慢查询阈值(毫秒)
+            n_plus_one_threshold: 单个请求内同一 SELECT 指纹执行次数达到该值时视为疑似 N+1
+            explain: 慢 SELECT 是否附带 EXPLAIN 结果(同一指纹每 explain_interval 秒最多一次)
+            max_fingerprints: 最多单独统计的指纹数量
+        """
+        self.enabled = enabled
+        self.slow_threshold_ms = slow_threshold_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.explain = explain
+        self.max_fingerprints = max_fingerprints
+
+    def configure_from_settings(self, settings) -> None:
+        """根据应用配置初始化"""
+        self.configure(
+            enabled=settings.SQL_STATS_ENABLED,
+            slow_threshold_ms=settings.SQL_SLOW_QUERY_MS,
+            n_plus_one_threshold=settings.SQL_N_PLUS_ONE_THRESHOLD,
+            explain=settings.SQL_SLOW_QUERY_EXPLAIN,
+        )
+
+    # ===============================================instrumentation====================================================
+
+    def instrument(self, engine: Engine) -> None:
+        """为同步引擎(异步引擎传入 engine.sync_engine)注册计时事件"""
+        if getattr(engine, "_sql_monitor_instrumented", False):
+            return
+        engine._sql_monitor_instrumented = True  # type: ignore[attr-defined]
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled:
+            conn.info.setdefault("_sql_monitor_starts", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("_sql_monitor_starts")
+        if not starts:
+            return
+        duration_ms = (time.perf_counter() - starts.pop()) * 1000
+        fp = self._record(statement, duration_ms)
+        if duration_ms >= self.slow_threshold_ms:
+            self._log_slow_query(conn, fp, statement, parameters, executemany, duration_ms)
+
+    def _handle_error(self, exception_context):
+        conn = exception_context.connection
+        starts = conn.info.get("_sql_monitor_starts") if conn is not None else None
+        if not starts or exception_context.statement is None:
+            return
+        duration_ms = (time.perf_counter() - starts.pop()) * 1000
+        self._record(exception_context.statement, duration_ms, error=True)
+
+    def _record(self, statement: str, duration_ms: float, error: bool = False) -> str:
+        fp = fingerprint(statement)
+        stats = self._statements.get(fp)
+        if stats is None:
+            if len(self._statements) >= self.max_fingerprints:
+                fp = OTHER_FINGERPRINT
+            stats = self._statements.setdefault(fp, StatementStats())
+        stats.count += 1
+        stats.total_ms += duration_ms
+        if duration_ms > stats.max_ms:
+            stats.max_ms = duration_ms
+        if error:
+            stats.errors += 1
+        if duration_ms >= self.slow_threshold_ms:
+            stats.slow += 1
+
+        request_stats = _request_stats_var.get()
+        if request_stats is not None:
+            request_stats.queries += 1
+            request_stats.total_ms += duration_ms
+            request_stats.fingerprints[fp] += 1
+        return fp
+
+    def _log_slow_query(self, conn, fp, statement, parameters, executemany, duration_ms) -> None:
+        message = f"慢查询 | {duration_ms:.1f}ms | {statement[:2000]}"
+        plan = None
+        if self.explain and not executemany and self._should_explain(fp):
+            plan = self._explain(conn, statement, parameters)
+            if plan:
+                message += f"\n执行计划:\n{plan}"
+        logger.bind(
+            slow_sql=True, fingerprint=fp, duration_ms=round(duration_ms, 3), explain=plan
+        ).warning(message)
+
+    def _should_explain(self, fp: str) -> bool:
+        now = time.monotonic()
+        if now - self._explained_at.get(fp, float("-inf")) < self.explain_interval:
+            return False
+        self._explained_at[fp] = now
+        return True
+
+    @staticmethod
+    def _explain(conn, statement: str, parameters) -> str | None:
+        """在同一连接上对慢 SELECT 执行 EXPLAIN,失败时返回 None"""
+        if not statement.lstrip()[:6].upper() == "SELECT":
+            return None
+        prefix = _EXPLAIN_PREFIX.get(conn.dialect.name)
+        if prefix is None:
+            return None
+        try:
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute(prefix + statement, parameters)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.debug(f"慢查询EXPLAIN失败: {e}")
+            return None
+        return "\n".join(" | ".join(str(col) for col in row) for row in rows)
+
+    # ===============================================request scope====================================================
+
+    def begin_request(self) -> Token:
+        """开始统计当前请求内的查询,返回用于 end_request 的 token"""
+        return _request_stats_var.set(RequestSQLStats())
+
+    def current_request(self) -> RequestSQLStats | None:
+        return _request_stats_var.get()
+
+    def end_request(self, token: Token, route: str) -> RequestSQLStats | None:
+        """结束请求统计,并检查疑似 N+1 查询"""
+        request_stats = _request_stats_var.get()
+        _request_stats_var.reset(token)
+        if request_stats is None or request_stats.queries < self.n_plus_one_threshold:
+            return request_stats
+
+        for fp, count in request_stats.fingerprints.items():
+            if count >= self.n_plus_one_threshold and fp.startswith("SELECT"):
+                self._n_plus_one[(route, fp)] += 1
+                logger.bind(n_plus_one=True, fingerprint=fp, query_count=count).warning(
+                    f"疑似 N+1 查询 | {route} | 同一语句执行 {count} 次 | {fp[:500]}"
+                )
+        return request_stats
+
+    # ===============================================report====================================================
+
+    def snapshot(self, top: int = 50, order_by: str = "total_ms") -> dict:
+        """获取按 order_by 排序的前 top 个语句指纹统计与 N+1 记录"""
+        statements = [
+            {"fingerprint": fp, **stats.as_dict()} for fp, stats in self._statements.items()
+        ]
+        statements.sort(key=lambda item: item.get(order_by, 0), reverse=True)
+        return {
+            "slow_threshold_ms": self.slow_threshold_ms,
+            "n_plus_one_threshold": self.n_plus_one_threshold,
+            "fingerprints": len(self._statements),
+            "statements": statements[:top],
+            "n_plus_one": [
+                {"route": route, "fingerprint": fp, "requests": count}
+                for (route, fp), count in self._n_plus_one.most_common(top)
+            ],
+        }
+
+    def reset(self) -> None:
+        """清空统计数据"""
+        self._statements = {}
+        self._n_plus_one = Counter()
+        self._explained_at = {}
+
+
+# 全局 SQL 监控实例
+sql_monitor = SQLMonitor()
+register_memory_probe(
+    "sql_monitor",
+    lambda: {
+        "fingerprints": len(sql_monitor._statements),
+        "fingerprint_cache": fingerprint.cache_info().currsize,
+        "n_plus_one": len(sql_monitor._n_plus_one),
+    },
+)
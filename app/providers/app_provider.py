@@ -1,21 +1,23 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
-from redis.asyncio import from_url
 
 from app.models.BaseModels import Base  # 创建表的关键
 # 导入所有模型类，确保它们被注册到 Base.metadata 中
 from app.models.Agent import Agent
 from app.models.LLM import LLM  
 from app.models.Tool import Tool
+from app.models.Checkpoint import Checkpoint, CheckpointBlob, CheckpointWrite
 from app.providers.database import (
     SCHEMA_NAME,
     check_database_health, 
     engine,
     get_database_pool_status
 )
+from app.support.tracing import TracedRedis, TraceFileExporter
 from config.config import DevelopmentSettings, ProductionSettings, get_settings
 
 settings = get_settings()
@@ -53,6 +55,8 @@ async def lifespan(app: FastAPI):
 
     # 初始化全局任务字典 - 用于存储异步任务实例
     app.task_dict = {}  # type: ignore
+    from app.support.memory_debug import register_memory_probe
+    register_memory_probe("app.task_dict", lambda: len(app.task_dict))  # type: ignore
 
     # 初始化Redis连接
     redis_url = (
@@ -61,11 +65,21 @@ async def lifespan(app: FastAPI):
     if settings.REDIS_PASSWORD:
         redis_url = f"redis://:{settings.REDIS_PASSWORD}@{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}"
 
-    app.redis = from_url(  # type: ignore
+    app.redis = TracedRedis.from_url(  # type: ignore
         redis_url,
         encoding="utf-8",
         decode_responses=True,  # 解码为字符串而非bytes
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
     )
+    from app.services.redis import AsyncRedisService
+    AsyncRedisService.bind(app.redis)  # type: ignore
+    from app.services.redis_pubsub import redis_subscriber
+    await redis_subscriber.start(app.redis)  # type: ignore
+    from app.services.redis_near_cache import redis_near_cache
+    await redis_near_cache.start(app.redis)  # type: ignore
 
     # 检查主数据库连接健康状态
     logger.info("正在检查数据库连接健康状态...")
@@ -91,6 +105,37 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"数据库表结构检查失败: {e}")
 
+    # 工作流checkpointer建表并启动过期会话清理
+    try:
+        from app.services.now_find_agents.graph_registry import graph_registry
+        await graph_registry.start()
+    except Exception as e:
+        logger.error(f"启动工作流checkpointer失败: {e}")
+
+    # 加载模型提供商映射,用于LLM调用指标
+    try:
+        from app.services.llms_manage.llm import refresh_model_providers
+        _, async_session = get_engine()
+        async with async_session() as session:
+            await refresh_model_providers(session)
+    except Exception as e:
+        logger.error(f"加载模型提供商信息失败: {e}")
+
+    # 后台预先创建模型客户端并建立到模型服务的长连接
+    from app.services.llms_manage.client_registry import llm_client_registry
+    llm_client_registry.start()
+
+    # 采样分析器绑定事件循环,用于标注采样时正在执行的Task
+    from app.support.profiler import profiler
+    profiler.bind_loop(asyncio.get_running_loop())
+
+    # 事件循环延迟监控与阻塞调用检测
+    if settings.LOOP_MONITOR_ENABLED:
+        from app.support.loop_monitor import loop_monitor
+        loop_monitor.interval = settings.LOOP_MONITOR_INTERVAL_MS / 1000
+        loop_monitor.block_threshold = settings.LOOP_BLOCK_THRESHOLD_MS / 1000
+        loop_monitor.start()
+
     # TODO: 在此处添加您的业务初始化逻辑
     # 例如: 初始化缓存、加载配置、启动后台任务等
     
@@ -102,6 +147,16 @@ async def lifespan(app: FastAPI):
     # ===== 应用关闭时的清理工作 =====
     logger.info("Application shutting down...")
 
+    from app.support.loop_monitor import loop_monitor
+    await loop_monitor.stop()
+
+    from app.services.now_find_agents.graph_registry import graph_registry
+    await graph_registry.stop()
+
+    # 关闭模型客户端共享的HTTP连接池
+    from app.services.llms_manage.client_registry import llm_client_registry
+    await llm_client_registry.aclose()
+
     # 清理数据库连接
     try:
         from app.providers.database import engine
@@ -113,11 +168,21 @@ async def lifespan(app: FastAPI):
 
     # 清理Redis连接
     try:
-        app.redis.close()  # type: ignore
+        from app.services.redis_pubsub import redis_subscriber
+        await redis_subscriber.stop()
+        from app.services.redis_near_cache import redis_near_cache
+        await redis_near_cache.stop()
+        await app.redis.aclose()  # type: ignore
+        from app.services.redis import RedisService
+        RedisService.close()
         logger.info("Redis连接已关闭")
     except Exception as e:
         logger.error(f"关闭Redis连接失败: {e}")
 
+    # 写完并关闭Trace导出文件
+    if getattr(app.state, "trace_exporter", None) is not None:
+        app.state.trace_exporter.close()
+
     # 清理Nacos配置
     try:
         from config.config import cleanup_nacos_config
@@ -126,8 +191,16 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"清理Nacos配置失败: {e}")
 
+    # 多worker模式下清理本进程的指标数据
+    from app.support.metrics import mark_process_dead
+    mark_process_dead()
+
     logger.info("Application stopped.")
 
+    # 最后写完后台日志队列中剩余的日志
+    from app.providers import logging_provider
+    logging_provider.shutdown()
+
 
 def add_global_middleware(app: FastAPI, app_settings):
     """注册全局中间件
@@ -138,9 +211,6 @@ def add_global_middleware(app: FastAPI, app_settings):
     # 导入请求日志中间件
     from app.http.middleware.request_logger import RequestLoggerMiddleware
     
-    # app_settings 参数预留给将来的中间件配置使用
-    _ = app_settings  # 避免 unused argument 警告
-
     # 注册CORS中间件 - 处理跨域请求
     app.add_middleware(
         CORSMiddleware,
@@ -150,8 +220,28 @@ def add_global_middleware(app: FastAPI, app_settings):
         allow_headers=["*"],  # 允许的请求头
     )
 
-    # 注册请求日志中间件 - 记录API请求日志
-    app.add_middleware(RequestLoggerMiddleware)
+    # 可选: 将请求级Trace以OTLP/JSON格式导出到本地文件
+    trace_exporter = None
+    if app_settings.TRACING_ENABLED and app_settings.TRACING_EXPORT_PATH:
+        trace_exporter = TraceFileExporter(
+            app_settings.TRACING_EXPORT_PATH,
+            service_name=app_settings.NAME,
+            sample_rate=app_settings.TRACING_EXPORT_SAMPLE_RATE,
+        )
+    app.state.trace_exporter = trace_exporter
+
+    # 注册请求日志中间件 - 记录API请求日志(纯ASGI实现,请求体记录需显式开启并采样)
+    app.add_middleware(
+        RequestLoggerMiddleware,
+        log_body=app_settings.REQUEST_LOG_BODY,
+        body_sample_rate=app_settings.REQUEST_LOG_BODY_SAMPLE_RATE,
+        body_max_bytes=app_settings.REQUEST_LOG_BODY_MAX_BYTES,
+        tracing=app_settings.TRACING_ENABLED,
+        server_timing=app_settings.TRACING_SERVER_TIMING,
+        max_spans=app_settings.TRACING_MAX_SPANS,
+        trace_exporter=trace_exporter,
+        metrics=app_settings.METRICS_ENABLED,
+    )
 
     # TODO: 在此处添加您的自定义中间件
     # 例如: 认证中间件、限流中间件、安全中间件等
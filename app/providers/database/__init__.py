@@ -3,6 +3,10 @@ from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.pool import Pool
 
+from app.orm.tools.SQLMonitor import sql_monitor
+from app.support.metrics import instrument_db_pool
+from app.support.tracing import TracedSession, instrument_sqlalchemy
+
 # 延迟获取配置，避免在模块导入时就初始化
 def get_settings():
     from config.config import get_settings as _get_settings
@@ -249,7 +253,15 @@ def get_engine():
         async_session = async_sessionmaker(
             bind=engine,
             expire_on_commit=False,  # session.commit 之后仍然可以查询该对象
+            sync_session_class=TracedSession,  # 首次获取连接时记录 checkout 耗时(仅在请求Trace中生效)
         )
+        # SQL执行耗时埋点(仅在请求Trace中生效)
+        instrument_sqlalchemy(engine.sync_engine)
+        # 连接池连接数指标
+        instrument_db_pool(engine.sync_engine)
+        # SQL指纹统计、N+1检测与慢查询日志
+        sql_monitor.configure_from_settings(get_settings())
+        sql_monitor.instrument(engine.sync_engine)
     
     return engine, async_session
 
@@ -77,4 +77,5 @@ def register(
                     "message": f"{exc.detail}. ({str(request.url).replace(get_router_root(request.url), '')})",
                 }
             ),
+            headers=getattr(exc, "headers", None),
         )
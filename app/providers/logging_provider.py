@@ -1,14 +1,28 @@
+import copy
 import logging
 import os
 
-from fastapi import FastAPI, Request
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows 没有 fcntl,回退为按进程号区分
+    fcntl = None
+
+from fastapi import FastAPI
 from loguru import logger
 
+from app.support.log_writer import (BackgroundLogWriter, close_all_writers,
+                                    get_writer_stats)
+from app.support.structured_logging import json_formatter, log_sampler
 from config.config import DevelopmentSettings, ProductionSettings
 
 # 添加全局标志防止重复配置
 _LOGGER_CONFIGURED = False
 
+# 本进程占用的 worker 编号及其锁文件,进程存活期间一直持有
+_WORKER_SLOT: tuple[int | str, object] | None = None
+
+_LOG_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <4}</level> | <cyan>using_function:{function}</cyan> | <cyan>{file}:{line}</cyan> | <level>{message}</level>"
+
 
 class InterceptHandler(logging.Handler):
     """拦截 fastapi 主程序的 log
@@ -35,18 +49,89 @@ class InterceptHandler(logging.Handler):
         )
 
 
+def _worker_slot(lock_dir: str, workers: int) -> int | str:
+    """
+    为当前进程分配稳定的 worker 编号
+
+    依次对 lock_dir 下的编号锁文件加非阻塞排他锁,第一个成功的编号归本进程所有,进程退出时自动释放。
+    重启的 worker 复用空出的编号,日志文件名保持不变,历史文件由 loguru 的 retention 清理。
+    主进程与新旧 worker 交替期间会多占用编号,最多尝试 workers * 2 个,仍无空闲或不支持文件锁时使用进程号
+    """
+    global _WORKER_SLOT
+    if _WORKER_SLOT is not None:
+        return _WORKER_SLOT[0]
+    if fcntl is not None:
+        for index in range(workers * 2):
+            lock_file = open(os.path.join(lock_dir, f".worker.{index}.lock"), "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+            _WORKER_SLOT = (index, lock_file)
+            return index
+    _WORKER_SLOT = (os.getpid(), None)
+    return _WORKER_SLOT[0]
+
+
+def _worker_log_path(path: str, settings: DevelopmentSettings | ProductionSettings) -> str:
+    """多 worker 部署时为每个进程使用独立的日志文件,避免多进程同时轮转同一文件"""
+    if settings.WORKERS > 1 and settings.LOG_PER_WORKER_FILE:
+        root, ext = os.path.splitext(path)
+        slot = _worker_slot(os.path.dirname(path) or ".", settings.WORKERS)
+        return f"{root}.{slot}{ext}"
+    return path
+
+
+def _add_sink(
+    sink,
+    name: str,
+    settings: DevelopmentSettings | ProductionSettings,
+    base_logger,
+    level: str,
+    colorize: bool = False,
+    filter=None,
+    **file_options,
+) -> None:
+    """添加日志处理程序
+
+    开启 LOG_ASYNC_ENABLED 时, loguru 只负责格式化并投递到 BackgroundLogWriter,
+    由后台线程批量写入一个仅包含目标 sink 的独立 loguru 实例。
+    """
+    log_format = json_formatter if settings.LOG_FORMAT_TYPE == "json" else _LOG_FORMAT
+    if not settings.LOG_ASYNC_ENABLED:
+        logger.add(
+            sink, level=level, format=log_format, colorize=colorize, filter=filter, **file_options
+        )
+        return
+
+    target = copy.deepcopy(base_logger)
+    target.add(sink, level=0, format="{message}", colorize=False, **file_options)
+    writer = BackgroundLogWriter(
+        name=name,
+        write=lambda text: target.opt(raw=True).log("INFO", text),
+        queue_size=settings.LOG_ASYNC_QUEUE_SIZE,
+        batch_size=settings.LOG_ASYNC_BATCH_SIZE,
+        flush_interval=settings.LOG_ASYNC_FLUSH_INTERVAL,
+        overflow_policy=settings.LOG_ASYNC_OVERFLOW_POLICY,
+    )
+    logger.add(writer, level=level, format=log_format, colorize=colorize, filter=filter)
+
+
 def register(app: FastAPI, settings: DevelopmentSettings | ProductionSettings) -> None:
     # 使用全局标志防止重复配置
     global _LOGGER_CONFIGURED
     if _LOGGER_CONFIGURED:
         return
 
-    # 只使用最简单的控制台日志,完全避免多进程问题
-    # 避免使用loguru的多进程处理器
+    # 避免使用loguru的多进程处理器(enqueue=True),
+    # 异步写入由 BackgroundLogWriter 在进程内完成
     import sys
 
     # 清除所有处理程序
     logger.remove()
+    # 不含任何处理程序的独立副本,用作后台写入线程的目标实例
+    base_logger = copy.deepcopy(logger)
 
     # 确保日志目录存在
     # 处理loguru的格式化字符串,将双大括号替换为单大括号
@@ -60,126 +145,66 @@ def register(app: FastAPI, settings: DevelopmentSettings | ProductionSettings) -
     os.makedirs(error_log_dir, exist_ok=True)
 
     # 添加控制台日志处理程序
-    logger.add(
-        sys.stderr,
-        level="INFO",
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <4}</level> | <cyan>using_function:{function}</cyan> | <cyan>{file}:{line}</cyan> | <level>{message}</level>",
-        colorize=True,
-    )
+    _add_sink(sys.stderr, "console", settings, base_logger, level="INFO", colorize=True)
 
     # 添加普通文件日志处理程序
-    logger.add(
-        settings.LOG_PATH,
+    _add_sink(
+        _worker_log_path(settings.LOG_PATH, settings),
+        "file",
+        settings,
+        base_logger,
         level=settings.LOG_LEVEL,
         rotation=settings.LOG_ROTATION,
         retention=settings.LOG_RETENTION,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <4}</level> | <cyan>using_function:{function}</cyan> | <cyan>{file}:{line}</cyan> | <level>{message}</level>",
         encoding="utf-8",
     )
 
     # 添加错误日志文件处理程序
-    logger.add(
-        settings.LOG_PATH_ERROR,
+    _add_sink(
+        _worker_log_path(settings.LOG_PATH_ERROR, settings),
+        "error_file",
+        settings,
+        base_logger,
         level=settings.LOG_LEVEL_ERROR,
         rotation=settings.LOG_ROTATION,
         retention=settings.LOG_RETENTION,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <4}</level> | <cyan>using_function:{function}</cyan> | <cyan>{file}:{line}</cyan> | <level>{message}</level>",
         encoding="utf-8",
     )
 
-    # 添加json格式日志文件(可选,用于ELK或其他日志分析系统)
-    # logger.add(
-    #     settings.LOG_PATH.replace(".log", ".json"),
-    #     level=settings.LOG_LEVEL,
-    #     rotation=settings.LOG_ROTATION,
-    #     retention=settings.LOG_RETENTION,
-    #     format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name} | {line} | {message}",
-    #     serialize=True,  # 启用JSON序列化
-    # )
+    # 添加慢查询日志文件处理程序(只接收 SQLMonitor 记录的慢查询)
+    if settings.SQL_SLOW_LOG_PATH:
+        slow_log_path = settings.SQL_SLOW_LOG_PATH.replace("{time:", "{")
+        os.makedirs(os.path.dirname(slow_log_path.replace("{YYYY-MM-DD}", "")), exist_ok=True)
+        _add_sink(
+            _worker_log_path(settings.SQL_SLOW_LOG_PATH, settings),
+            "slow_sql_file",
+            settings,
+            base_logger,
+            level="WARNING",
+            filter=lambda record: record["extra"].get("slow_sql", False),
+            rotation=settings.LOG_ROTATION,
+            retention=settings.LOG_RETENTION,
+            encoding="utf-8",
+        )
+
+    # LOG_FORMAT_TYPE=json 时以上处理程序均输出单行JSON(用于ELK或其他日志分析系统)
+    # 请求日志采样规则,运行时可由Nacos调整
+    log_sampler.configure_from_settings(settings)
 
     # 设置为全局日志处理程序
     app.state.logger = logger
 
-    # 添加日志中间件
-    @app.middleware("http")
-    async def log_requests(request: Request, call_next):
-        import json
-        import time
-        import uuid
-
-        request_id = str(uuid.uuid4())
-        start_time = time.time()
-
-        # 获取请求的详细信息
-        client_host = request.client.host if request.client else "unknown"
-        client_port = request.client.port if request.client else "unknown"
-        server_host = request.url.hostname or "unknown"
-        server_port = request.url.port or "unknown"
+    # 请求日志由 app_provider 注册的 RequestLoggerMiddleware 统一记录
 
-        # 获取查询参数
-        query_params = dict(request.query_params) if request.query_params else {}
-
-        # 获取路径参数
-        path_params = (
-            dict(request.path_params) if hasattr(request, "path_params") else {}
-        )
-
-        # 获取请求头(过滤敏感信息)
-        headers = dict(request.headers)
-        # 过滤敏感的请求头
-        sensitive_headers = ["authorization", "cookie", "x-api-key", "x-auth-token"]
-        filtered_headers = {
-            k: v if k.lower() not in sensitive_headers else "***"
-            for k, v in headers.items()
-        }
-
-        # 尝试获取请求体(仅对POST/PUT/PATCH请求)
-        request_body = None
-        if request.method in ["POST", "PUT", "PATCH"]:
-            try:
-                # 读取请求体
-                body = await request.body()
-                if body:
-                    # 尝试解析JSON
-                    try:
-                        request_body = json.loads(body.decode("utf-8"))
-                        # 过滤敏感字段
-                        if isinstance(request_body, dict):
-                            sensitive_fields = ["password", "secret", "token", "key"]
-                            for field in sensitive_fields:
-                                if field in request_body:
-                                    request_body[field] = "***"
-                    except (json.JSONDecodeError, UnicodeDecodeError):
-                        request_body = f"<binary data: {len(body)} bytes>"
-            except Exception as e:
-                request_body = f"<error reading body: {e!s}>"
-
-        # 记录详细的请求开始信息
-        logger.info(
-            f"🚀 请求开始 [{request.method}] {request.url.path} - ID: {request_id}\n"
-            f"   📍 客户端: {client_host}:{client_port} -> 服务端: {server_host}:{server_port}\n"
-            f"   🔗 完整URL: {request.url!s}\n"
-            f"   📋 查询参数: {query_params}\n"
-            f"   🛤️  路径参数: {path_params}\n"
-            f"   📤 请求头: {filtered_headers}\n"
-            f"   📦 请求体: {request_body}"
-        )
+    # 设置标志,表示日志已配置
+    _LOGGER_CONFIGURED = True
 
-        # 执行请求
-        response = await call_next(request)
 
-        # 计算处理时间
-        process_time = time.time() - start_time
+def get_log_writer_stats() -> list[dict]:
+    """获取后台日志写入器的队列深度与丢弃计数"""
+    return get_writer_stats()
 
-        # 记录请求结束和响应状态
-        logger.info(
-            f"✅ 请求完成 [{request.method}] {request.url.path} - ID: {request_id}\n"
-            f"   📊 状态码: {response.status_code}\n"
-            f"   ⏱️  处理耗时: {process_time:.4f}秒\n"
-            f"   📍 客户端: {client_host}:{client_port}"
-        )
 
-        return response
-
-    # 设置标志,表示日志已配置
-    _LOGGER_CONFIGURED = True
+def shutdown() -> None:
+    """应用关闭时写完队列中剩余的日志"""
+    close_all_writers()
@@ -0,0 +1,35 @@
+"""
+工作流任务相关 Schema 定义
+"""
+
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class WorkflowRunRequest(BaseModel):
+    """提交工作流任务模型"""
+
+    user_input: str = Field(..., min_length=1, max_length=10000, description="用户输入")
+    hr_id: int = Field(..., description="HR ID")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "user_input": "帮我找3年以上经验的Python后端工程师",
+                "hr_id": 1,
+            }
+        }
+
+
+class WorkflowTaskResponse(BaseModel):
+    """工作流任务状态响应模型"""
+
+    task_id: str = Field(..., description="任务ID")
+    status: str = Field(..., description="任务状态: PENDING/RUNNING/SUCCEEDED/FAILED")
+    deduplicated: bool = Field(False, description="是否为重复提交,复用了进行中的任务")
+    consumer: Optional[str] = Field(None, description="执行任务的worker")
+    enqueued_at: Optional[int] = Field(None, description="入队时间(毫秒时间戳)")
+    started_at: Optional[int] = Field(None, description="开始执行时间(毫秒时间戳)")
+    finished_at: Optional[int] = Field(None, description="结束时间(毫秒时间戳)")
+    error: Optional[str] = Field(None, description="失败原因")
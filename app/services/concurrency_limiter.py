@@ -0,0 +1,328 @@
+"""
+自适应并发限制
+
+按键(如 "provider:openai"、"model:gpt-4o")限制进程内同时进行的调用数,上限按 AIMD 自动调整:
+
+- 调用成功且耗时正常、且进行中的调用数接近上限时加性增长,每个成功调用增加 1/上限(约每轮调用 +1)
+- 调用返回 429/5xx 或超时(过载),或近期耗时EWMA超过长期耗时EWMA的 latency_tolerance 倍(耗时膨胀)时
+  乘以 backoff 下调;在上次下调之前开始的调用不再触发下调,避免同一批并发失败把上限连续压到最小
+- 其余错误(如参数错误、连接失败)不调整上限
+- 名额不足时按先到先得排队等待,超过 timeout 抛出 ConcurrencyLimitExceeded
+
+上限只在本进程内生效,多 worker 部署时总并发约为各进程上限之和。
+
+用法:
+    async with llm_concurrency_limiter.limit("model:gpt-4o", "provider:openai"):
+        response = await llm.ainvoke(messages)
+"""
+
+import asyncio
+import time
+import weakref
+from collections import deque
+from collections.abc import Callable
+from contextlib import asynccontextmanager
+
+from loguru import logger
+
+from app.support.memory_debug import register_memory_probe
+from app.support.metrics import (observe_concurrency,
+                                 observe_concurrency_decrease,
+                                 observe_concurrency_rejected,
+                                 observe_concurrency_wait,
+                                 register_scrape_hook)
+from config.config import get_settings
+
+# 调用结果
+OUTCOME_SUCCESS = "success"
+OUTCOME_OVERLOAD = "overload"
+OUTCOME_IGNORE = "ignore"
+
+# 长期耗时至少积累该数量的样本后才判断耗时膨胀
+MIN_LATENCY_SAMPLES = 20
+SHORT_EWMA_ALPHA = 0.3
+LONG_EWMA_ALPHA = 0.02
+
+_live_limiters: "weakref.WeakSet[AdaptiveConcurrencyLimiter]" = weakref.WeakSet()
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """在等待时间内未能获得并发名额"""
+
+    def __init__(self, key: str, limit: int, queued: int):
+        super().__init__(f"并发已满: {key}, 上限 {limit}, 排队 {queued}")
+        self.key = key
+        self.limit = limit
+        self.queued = queued
+
+
+def classify_error(exc: BaseException) -> str:
+    """按异常判断是否为服务端过载: 429/5xx 与超时为过载,其余错误不调整上限"""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return OUTCOME_OVERLOAD if status == 429 or status >= 500 else OUTCOME_IGNORE
+    if isinstance(exc, TimeoutError) or "Timeout" in type(exc).__name__:
+        return OUTCOME_OVERLOAD
+    return OUTCOME_IGNORE
+
+
+class _KeyState:
+    """单个键的并发上限、进行中的调用与等待队列"""
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.inflight = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.short_latency: float | None = None
+        self.long_latency: float | None = None
+        self.samples = 0
+        self.last_decrease = float("-inf")
+
+    @property
+    def capacity(self) -> int:
+        return int(self.limit)
+
+
+class AdaptiveConcurrencyLimiter:
+    """按键自适应调整上限的并发限制器"""
+
+    def __init__(
+        self,
+        name: str,
+        rules: dict[str, dict] | None = None,
+        initial: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff: float = 0.7,
+        latency_tolerance: float = 2.0,
+        classify: Callable[[BaseException], str] = classify_error,
+        enabled: bool = True,
+    ):
+        """
+        Args:
+            name: 限制器名称,用于指标
+            rules: 按键覆盖 initial/min/max,如 {"provider:openai": {"initial": 16, "max": 128}}
+            initial: 初始并发上限
+            min_limit: 下调的最小值
+            max_limit: 增长的最大值
+            backoff: 下调时上限乘以的系数
+            latency_tolerance: 近期耗时超过长期耗时的该倍数时下调
+            classify: 按调用抛出的异常返回 overload/ignore
+            enabled: 为 False 时不限制
+        """
+        self.name = name
+        self.rules = rules or {}
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.classify = classify
+        self.enabled = enabled
+        self._states: dict[str, _KeyState] = {}
+        _live_limiters.add(self)
+
+    def set_rules(self, rules: dict[str, dict]) -> None:
+        """更新按键配置的上限,已有键的当前上限收敛到新的范围内"""
+        self.rules = rules or {}
+        for key, state in self._states.items():
+            rule = self.rules.get(key, {})
+            state.min_limit = max(1, rule.get("min", self.min_limit))
+            state.max_limit = max(state.min_limit, rule.get("max", self.max_limit))
+            state.limit = min(max(state.limit, state.min_limit), state.max_limit)
+            self._wake(state)
+
+    def _state(self, key: str) -> _KeyState:
+        state = self._states.get(key)
+        if state is None:
+            rule = self.rules.get(key, {})
+            state = self._states[key] = _KeyState(
+                rule.get("initial", self.initial),
+                rule.get("min", self.min_limit),
+                rule.get("max", self.max_limit),
+            )
+        return state
+
+    # ===== 名额获取与释放 =====
+
+    async def acquire(self, key: str, timeout: float | None = None) -> None:
+        """
+        获取一个并发名额,名额不足时排队等待
+
+        Args:
+            key: 限制键
+            timeout: 最长等待时间(秒),None 为一直等待
+
+        Raises:
+            ConcurrencyLimitExceeded: 超过 timeout 仍未获得名额
+        """
+        state = self._state(key)
+        if state.inflight < state.capacity and not state.waiters:
+            state.inflight += 1
+            observe_concurrency_wait(self.name, key, 0.0)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        state.waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(timeout):
+                await waiter
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # 超时或取消的同时已分配到名额,转给下一个等待者
+                self._release_slot(state)
+            else:
+                waiter.cancel()
+                try:
+                    state.waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, TimeoutError):
+                observe_concurrency_rejected(self.name, key)
+                raise ConcurrencyLimitExceeded(key, state.capacity, len(state.waiters)) from None
+            raise
+        observe_concurrency_wait(self.name, key, time.monotonic() - started)
+
+    def release(self, key: str, started: float, latency: float, outcome: str) -> None:
+        """
+        归还名额并按调用结果调整上限
+
+        Args:
+            key: 限制键
+            started: 调用开始时间(time.monotonic())
+            latency: 调用耗时(秒)
+            outcome: success/overload/ignore
+        """
+        state = self._states[key]
+        inflight = state.inflight
+        if outcome == OUTCOME_SUCCESS:
+            self._on_success(key, state, started, latency, inflight)
+        elif outcome == OUTCOME_OVERLOAD:
+            self._decrease(key, state, started, "overload")
+        self._release_slot(state)
+
+    def _release_slot(self, state: _KeyState) -> None:
+        state.inflight -= 1
+        self._wake(state)
+
+    def _wake(self, state: _KeyState) -> None:
+        while state.waiters and state.inflight < state.capacity:
+            waiter = state.waiters.popleft()
+            if waiter.done():
+                continue
+            state.inflight += 1
+            waiter.set_result(None)
+
+    # ===== AIMD =====
+
+    def _on_success(self, key: str, state: _KeyState, started: float, latency: float, inflight: int) -> None:
+        state.samples += 1
+        if state.short_latency is None:
+            state.short_latency = state.long_latency = latency
+        else:
+            state.short_latency += SHORT_EWMA_ALPHA * (latency - state.short_latency)
+            state.long_latency += LONG_EWMA_ALPHA * (latency - state.long_latency)
+        if (
+            state.samples >= MIN_LATENCY_SAMPLES
+            and state.short_latency > state.long_latency * self.latency_tolerance
+        ):
+            self._decrease(key, state, started, "latency")
+            return
+        # 只有名额被实际用到时才增长,空闲时不会无依据地放大上限
+        if inflight * 2 >= state.capacity and state.limit < state.max_limit:
+            state.limit = min(state.limit + 1 / state.limit, state.max_limit)
+
+    def _decrease(self, key: str, state: _KeyState, started: float, reason: str) -> None:
+        if started < state.last_decrease:
+            return
+        previous = state.capacity
+        state.limit = max(state.limit * self.backoff, state.min_limit)
+        state.last_decrease = time.monotonic()
+        if reason == "latency":
+            # 以下调后的耗时作为新的比较基准,避免长期耗时追上前连续下调
+            state.short_latency = state.long_latency
+        observe_concurrency_decrease(self.name, key, reason)
+        logger.warning(
+            f"并发上限下调 | {self.name} | {key} | {previous} -> {state.capacity} | 原因 {reason}"
+        )
+
+    @asynccontextmanager
+    async def limit(self, *keys: str, timeout: float | None = None):
+        """
+        异步上下文管理器,进入时依次获取所有键的名额,退出时按是否抛出异常及异常类型调整上限
+
+        Args:
+            keys: 一个或多个限制键,如 ("model:gpt-4o", "provider:openai")
+            timeout: 每个键的最长等待时间(秒)
+        """
+        if not self.enabled:
+            yield
+            return
+        acquired = []
+        try:
+            for key in keys:
+                await self.acquire(key, timeout)
+                acquired.append(key)
+        except BaseException:
+            for key in acquired:
+                self._release_slot(self._states[key])
+            raise
+
+        started = time.monotonic()
+        outcome = OUTCOME_SUCCESS
+        try:
+            yield
+        except asyncio.CancelledError:
+            outcome = OUTCOME_IGNORE
+            raise
+        except Exception as e:
+            outcome = self.classify(e)
+            raise
+        finally:
+            latency = time.monotonic() - started
+            for key in acquired:
+                self.release(key, started, latency, outcome)
+
+    def stats(self) -> dict:
+        """各键的当前上限、进行中与排队的调用数及耗时"""
+        return {
+            key: {
+                "limit": state.capacity,
+                "inflight": state.inflight,
+                "queued": len(state.waiters),
+                "short_latency_ms": None if state.short_latency is None else round(state.short_latency * 1000, 1),
+                "long_latency_ms": None if state.long_latency is None else round(state.long_latency * 1000, 1),
+            }
+            for key, state in self._states.items()
+        }
+
+
+def _refresh_metrics() -> None:
+    for limiter in list(_live_limiters):
+        for key, state in limiter._states.items():
+            observe_concurrency(limiter.name, key, state.capacity, state.inflight, len(state.waiters))
+
+
+register_scrape_hook(_refresh_metrics)
+register_memory_probe(
+    "concurrency_limiter.keys", lambda: sum(len(limiter._states) for limiter in _live_limiters)
+)
+
+
+# 全局 LLM 并发限制器,llm_router.route() 选定服务地址后按模型与提供商获取名额
+_settings = get_settings()
+llm_concurrency_limiter = AdaptiveConcurrencyLimiter(
+    "llm",
+    rules=_settings.LLM_CONCURRENCY_LIMITS,
+    initial=_settings.LLM_CONCURRENCY_INITIAL,
+    min_limit=_settings.LLM_CONCURRENCY_MIN,
+    max_limit=_settings.LLM_CONCURRENCY_MAX,
+    backoff=_settings.LLM_CONCURRENCY_BACKOFF,
+    latency_tolerance=_settings.LLM_CONCURRENCY_LATENCY_TOLERANCE,
+    enabled=_settings.LLM_CONCURRENCY_ENABLED,
+)
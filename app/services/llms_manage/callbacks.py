@@ -0,0 +1,95 @@
+"""
+LangChain 模型调用回调
+
+LLMTracingCallback 在模型调用开始/结束时记录 llm span 与 Prometheus 指标,挂载到模型实例的
+callbacks 上即可对 invoke/ainvoke/stream 等全部调用生效;span 仅在请求 Trace 中记录。
+"""
+
+import time
+from typing import Any, NamedTuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.services.llms_manage.llm import get_model_provider
+from app.support.metrics import observe_llm_request
+from app.support.tracing import SPAN_KIND_CLIENT, Span, start_span
+
+
+class _LLMRun(NamedTuple):
+    model: str
+    provider: str
+    start: float
+    span: Span | None
+
+
+def _token_usage(response) -> tuple[int, int]:
+    """从模型响应中读取 (prompt_tokens, completion_tokens)"""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    # 流式调用等场景下 llm_output 为空,回退到消息上的 usage_metadata
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                prompt_tokens += metadata.get("input_tokens", 0)
+                completion_tokens += metadata.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+class LLMTracingCallback(BaseCallbackHandler):
+    """记录模型调用耗时与 token 消耗的回调"""
+
+    # 在事件循环中直接执行回调,保证可以读取调用方的 contextvars
+    run_inline = True
+
+    def __init__(self, provider: str | None = None):
+        """
+        Args:
+            provider: 模型提供商,为空时按模型名称从 llm 表的映射中查找
+        """
+        self.provider = provider
+        self._runs: dict[UUID, _LLMRun] = {}
+
+    def _start(self, run_id: UUID, metadata: dict[str, Any] | None, kwargs: dict) -> None:
+        metadata = metadata or {}
+        invocation_params = kwargs.get("invocation_params") or {}
+        model = metadata.get("ls_model_name") or invocation_params.get("model", "")
+        provider = self.provider or get_model_provider(model)
+        span_obj = start_span(
+            "llm", SPAN_KIND_CLIENT, **{"llm.model": model, "llm.provider": provider}
+        )
+        self._runs[run_id] = _LLMRun(model, provider, time.perf_counter(), span_obj)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, metadata, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, metadata, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        prompt_tokens, completion_tokens = _token_usage(response)
+        observe_llm_request(
+            run.model,
+            run.provider,
+            time.perf_counter() - run.start,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+        if run.span is not None:
+            if prompt_tokens or completion_tokens:
+                run.span.attributes["llm.total_tokens"] = prompt_tokens + completion_tokens
+            run.span.end()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        observe_llm_request(run.model, run.provider, time.perf_counter() - run.start, error=True)
+        if run.span is not None:
+            run.span.end(error)
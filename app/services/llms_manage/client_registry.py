@@ -0,0 +1,233 @@
+"""
+LLM 客户端注册表
+
+按 llm 表的激活模型创建并复用模型客户端,避免每次调用都新建客户端与连接池:
+
+- 每个 (provider, api_url, model_name) 一个 ChatOpenAI 实例,对应行的 updated_at 变化时重建
+- 同一 api_url 的客户端共用一个保持长连接的 httpx.AsyncClient,连接池大小与超时由 LLM_HTTP_* 配置,
+  TLS 握手与建连只在连接首次建立时发生;start() 在后台预先建立到各服务地址的连接
+- 激活模型缓存在进程内,llm 标签版本变化(LLMService 的写方法会失效该标签)后重新加载,
+  版本最多每 LLM_CLIENT_CHECK_INTERVAL 秒检查一次;读取不到版本时每 LLM_CLIENT_RELOAD_INTERVAL 秒重新加载
+- 连接池在进程退出时由 aclose() 关闭;不再使用的服务地址的连接池同样保留到退出,避免中断进行中的调用
+
+工作流节点通过 llm_router(app.services.llms_manage.router)按 Agent 配置与服务地址健康状况获取客户端。
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.models.LLM import LLM
+from app.orm.service.LLMService import LLMService
+from app.services.llms_manage.callbacks import LLMTracingCallback
+from app.services.llms_manage.llm import set_model_providers
+from app.services.redis_cache import tag_versions
+from app.support.memory_debug import register_memory_probe
+from app.support.metrics import observe_llm_client_build
+from config.config import get_settings
+
+# llm 表对应的缓存标签
+LLM_TAG = "llm"
+
+ClientKey = tuple[str, str, str]
+
+
+class _Client(NamedTuple):
+    llm: ChatOpenAI
+    updated_at: datetime | None
+    built_at: float
+
+
+def client_key(llm: LLM) -> ClientKey:
+    """客户端的缓存键 (provider, api_url, model_name)"""
+    return llm.provider, llm.api_url, llm.model_name
+
+
+class LLMClientRegistry:
+    """进程内的 LLM 客户端注册表"""
+
+    def __init__(self, check_interval: float | None = None, reload_interval: float | None = None):
+        """
+        Args:
+            check_interval: llm 标签版本检查间隔(秒),默认使用 LLM_CLIENT_CHECK_INTERVAL
+            reload_interval: 读取不到版本时重新加载的间隔(秒),默认使用 LLM_CLIENT_RELOAD_INTERVAL
+        """
+        settings = get_settings()
+        self.check_interval = (
+            settings.LLM_CLIENT_CHECK_INTERVAL if check_interval is None else check_interval
+        )
+        self.reload_interval = (
+            settings.LLM_CLIENT_RELOAD_INTERVAL if reload_interval is None else reload_interval
+        )
+        self._clients: dict[ClientKey, _Client] = {}
+        self._pools: dict[str, httpx.AsyncClient] = {}
+        self._llms: list[LLM] = []
+        self._version: tuple | None = None
+        self._version_checked_at = float("-inf")
+        self._loaded_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self._warmup: asyncio.Task | None = None
+        self.builds = 0
+
+    def _pool(self, api_url: str) -> httpx.AsyncClient:
+        """服务地址对应的共享连接池"""
+        pool = self._pools.get(api_url)
+        if pool is None or pool.is_closed:
+            settings = get_settings()
+            pool = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(
+                    settings.LLM_REQUEST_TIMEOUT, connect=settings.LLM_HTTP_CONNECT_TIMEOUT
+                ),
+            )
+            self._pools[api_url] = pool
+        return pool
+
+    def client(self, llm: LLM) -> ChatOpenAI:
+        """返回 llm 表中一行对应的客户端,首次使用或该行 updated_at 变化时创建"""
+        key = client_key(llm)
+        cached = self._clients.get(key)
+        if cached is not None and cached.updated_at == llm.updated_at:
+            return cached.llm
+
+        settings = get_settings()
+        client = ChatOpenAI(
+            api_key=llm.api_key,
+            base_url=llm.api_url,
+            model=llm.model_name,
+            timeout=settings.LLM_REQUEST_TIMEOUT,
+            max_retries=settings.LLM_MAX_RETRIES,
+            http_async_client=self._pool(llm.api_url),
+            callbacks=[LLMTracingCallback(llm.provider)],
+        )
+        self._clients[key] = _Client(client, llm.updated_at, time.time())
+        self.builds += 1
+        observe_llm_client_build(llm.provider, "new" if cached is None else "updated")
+        logger.info(
+            f"LLM客户端已{'创建' if cached is None else '重建'} | {llm.provider} | "
+            f"{llm.model_name} | {llm.api_url}"
+        )
+        return client
+
+    async def active_llms(self) -> list[LLM]:
+        """进程内缓存的激活模型,llm 标签版本变化后重新加载"""
+        if time.monotonic() - self._version_checked_at < self.check_interval:
+            return self._llms
+        async with self._lock:
+            # 等待锁期间其他调用方可能已检查
+            now = time.monotonic()
+            if now - self._version_checked_at < self.check_interval:
+                return self._llms
+            version = await self._config_version()
+            expired = not version and now - self._loaded_at >= self.reload_interval
+            if version != self._version or expired:
+                await self._reload()
+                self._version = version
+            self._version_checked_at = now
+        return self._llms
+
+    async def _config_version(self) -> tuple:
+        try:
+            return await tag_versions(LLM_TAG)
+        except (RedisError, OSError) as e:
+            logger.warning(f"读取LLM配置版本失败: {e}")
+            return ()
+
+    async def _reload(self) -> None:
+        from app.providers.database import get_engine
+
+        try:
+            _, async_session = get_engine()
+            async with async_session() as session:
+                llms = await LLMService(session).get_active_llms()
+        except Exception as e:
+            # 已加载过时沿用上次的结果,不影响调用
+            if not self._llms:
+                raise
+            logger.warning(f"重新加载LLM配置失败,沿用已加载的 {len(self._llms)} 个模型: {e}")
+            return
+
+        self._llms = list(llms)
+        self._loaded_at = time.monotonic()
+        set_model_providers(self._llms)
+        # 停用或修改了地址/名称的模型不再复用旧客户端
+        keys = {client_key(llm) for llm in self._llms}
+        for key in [key for key in self._clients if key not in keys]:
+            del self._clients[key]
+        logger.info(f"已加载 {len(self._llms)} 个激活的LLM模型")
+
+    async def warmup(self) -> None:
+        """为所有激活模型创建客户端,并预先建立到各服务地址的连接,失败只记录日志"""
+        for llm in await self.active_llms():
+            self.client(llm)
+        timeout = get_settings().LLM_HTTP_CONNECT_TIMEOUT
+
+        async def connect(api_url: str, pool: httpx.AsyncClient) -> None:
+            try:
+                # 任意响应都说明连接已建立,连接随后保留在连接池中
+                await pool.head(api_url, timeout=timeout)
+            except httpx.HTTPError as e:
+                logger.warning(f"预先连接模型服务失败 | {api_url} | {e!r}")
+
+        await asyncio.gather(*(connect(url, pool) for url, pool in list(self._pools.items())))
+
+    async def _run_warmup(self) -> None:
+        try:
+            await self.warmup()
+        except Exception as e:
+            logger.warning(f"LLM客户端预热失败: {e}")
+
+    def start(self) -> None:
+        """按 LLM_CLIENT_WARMUP 在后台预热客户端与连接,不阻塞启动"""
+        if get_settings().LLM_CLIENT_WARMUP and self._warmup is None:
+            self._warmup = asyncio.create_task(self._run_warmup(), name="llm-client-warmup")
+
+    async def aclose(self) -> None:
+        """关闭所有连接池,之后再次获取客户端时重新创建"""
+        if self._warmup is not None:
+            self._warmup.cancel()
+            await asyncio.gather(self._warmup, return_exceptions=True)
+            self._warmup = None
+        pools = list(self._pools.values())
+        self._pools.clear()
+        self._clients.clear()
+        await asyncio.gather(*(pool.aclose() for pool in pools), return_exceptions=True)
+        if pools:
+            logger.info(f"已关闭 {len(pools)} 个LLM连接池")
+
+    def stats(self) -> dict:
+        """已加载的模型、客户端与连接池"""
+        return {
+            "version": None if self._version is None else list(self._version),
+            "models": len(self._llms),
+            "builds": self.builds,
+            "pools": list(self._pools),
+            "clients": [
+                {
+                    "provider": provider,
+                    "api_url": api_url,
+                    "model": model_name,
+                    "updated_at": client.updated_at.isoformat() if client.updated_at else None,
+                    "built_at": client.built_at,
+                }
+                for (provider, api_url, model_name), client in self._clients.items()
+            ],
+        }
+
+
+# 全局注册表,由 llm_router 按选中的 llm 表行获取模型客户端
+llm_client_registry = LLMClientRegistry()
+register_memory_probe(
+    "llm_client_registry",
+    lambda: {"clients": len(llm_client_registry._clients), "pools": len(llm_client_registry._pools)},
+)
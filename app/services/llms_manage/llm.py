@@ -0,0 +1,71 @@
+"""
+LLM 模型管理
+
+维护 llm 表中 模型名称 -> 提供商 的进程内映射,供指标、回调与限流按提供商区分模型调用。
+应用启动时由 lifespan 调用 refresh_model_providers 加载,LLM 客户端注册表重新加载 llm 表时同步更新。
+"""
+
+from collections.abc import Iterable
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.LLM import LLM
+from app.orm.dao.LLMDao import LLMDao
+from app.services.concurrency_limiter import llm_concurrency_limiter
+from app.services.rate_limiter import llm_rate_limiter
+from config.config import get_settings
+
+UNKNOWN_PROVIDER = "unknown"
+
+_model_providers: dict[str, str] = {}
+
+
+async def refresh_model_providers(db: AsyncSession) -> dict[str, str]:
+    """从 llm 表加载激活模型的提供商映射"""
+    set_model_providers(await LLMDao(db).find_active_models())
+    logger.info(f"已加载 {len(_model_providers)} 个模型的提供商信息")
+    return _model_providers
+
+
+def set_model_providers(llms: Iterable[LLM]) -> None:
+    """按已加载的激活模型替换提供商映射"""
+    global _model_providers
+    _model_providers = {llm.model_name: llm.provider for llm in llms}
+
+
+def get_model_provider(model_name: str) -> str:
+    """获取模型的提供商,未在 llm 表中登记时返回 unknown"""
+    return _model_providers.get(model_name, UNKNOWN_PROVIDER)
+
+
+def llm_rate_limit(model_name: str):
+    """
+    LLM 调用限流上下文,依次获取提供商与模型的令牌(LLM_RATE_LIMITS 中未配置的键不限流)
+
+    用法:
+        async with llm_rate_limit("gpt-4o"):
+            response = await llm.ainvoke(messages)
+    """
+    return llm_rate_limiter.limit(
+        f"provider:{get_model_provider(model_name)}",
+        f"model:{model_name}",
+        timeout=get_settings().LLM_RATE_LIMIT_TIMEOUT,
+    )
+
+
+def llm_concurrency_limit(provider: str, model_name: str):
+    """
+    LLM 调用并发名额上下文,依次获取模型与提供商的名额,上限按调用结果自适应调整
+
+    模型先于提供商获取,排队等待某个模型的调用不会占用提供商的名额。
+
+    用法:
+        async with llm_concurrency_limit("openai", "gpt-4o"):
+            response = await llm.ainvoke(messages)
+    """
+    return llm_concurrency_limiter.limit(
+        f"model:{model_name}",
+        f"provider:{provider}",
+        timeout=get_settings().LLM_CONCURRENCY_QUEUE_TIMEOUT,
+    )
@@ -0,0 +1,267 @@
+"""
+LLM 路由
+
+按 agent 表与 llm 表选择模型调用的服务地址:
+
+- resolve_agent_model(name) 通过 Agent.agent_model_id 查得模型名称(AgentService.get_agent_model_name,
+  Redis 缓存且进程内缓存,agent/llm 标签版本变化后失效),Agent 不存在时使用 LLM_DEFAULT_MODEL
+- llm 表中同一 model_name 可以有多行激活的服务地址,route(model_name) 在其中按 P2C(随机取两个,
+  选择得分低的一个)选择,得分 = 耗时EWMA × (进行中的调用数 + 1) / (1 - 错误率EWMA)
+- 连续失败 LLM_EJECT_CONSECUTIVE_ERRORS 次,或调用数达到 LLM_EJECT_MIN_REQUESTS 后错误率达到
+  LLM_EJECT_ERROR_RATE 时摘除该地址,摘除时长从 LLM_EJECT_BASE_SECONDS 起连续摘除时倍增;
+  到期后重新接入并进入观察期,观察期内再次失败立即摘除,成功后恢复正常
+- 所有地址都被摘除时选择最早到期的地址,不因摘除而拒绝调用
+- 请求参数错误(400/422)由调用方导致,调用被取消时无法判断地址状况,两者都不计入该地址的统计
+- 选定地址后按模型与提供商获取自适应并发名额(llm_concurrency_limit),排队耗时不计入该地址的耗时
+
+用法:
+    model_name = await llm_router.resolve_agent_model("supervisor")
+    async with llm_rate_limit(model_name), llm_router.route(model_name) as llm:
+        response = await llm.ainvoke(messages)
+"""
+
+import random
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+import openai
+from langchain_openai import ChatOpenAI
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.models.LLM import LLM
+from app.orm.service.AgentService import AgentService
+from app.services.llms_manage.client_registry import (LLMClientRegistry,
+                                                      llm_client_registry)
+from app.services.llms_manage.llm import llm_concurrency_limit
+from app.services.redis_cache import tag_versions
+from app.support.memory_debug import register_memory_probe
+from app.support.metrics import observe_llm_endpoint_ejection
+from config.config import get_settings
+
+# Agent 的模型依赖 agent 表与 llm 表,对应 AgentService/LLMService 写方法失效的缓存标签
+AGENT_MODEL_TAGS = ("agent", "llm")
+
+# 调用方导致的错误,不代表服务地址不健康
+CLIENT_ERRORS = (openai.BadRequestError, openai.UnprocessableEntityError)
+
+
+@dataclass
+class EndpointHealth:
+    """单个服务地址(llm 表的一行)的调用统计"""
+
+    latency: float | None = None
+    error_rate: float = 0.0
+    requests: int = 0
+    inflight: int = 0
+    consecutive_errors: int = 0
+    ejections: int = 0
+    ejected_until: float = 0.0
+    probation: bool = False
+
+    def score(self, default_latency: float) -> float:
+        latency = default_latency if self.latency is None else self.latency
+        return latency * (self.inflight + 1) / max(1.0 - self.error_rate, 0.05)
+
+
+class LLMRouter:
+    """按 Agent 配置与服务地址健康状况选择模型客户端"""
+
+    def __init__(self, registry: LLMClientRegistry | None = None, check_interval: float | None = None):
+        """
+        Args:
+            registry: 模型客户端注册表,默认使用全局的 llm_client_registry
+            check_interval: agent/llm 标签版本检查间隔(秒),默认使用 LLM_CLIENT_CHECK_INTERVAL
+        """
+        settings = get_settings()
+        self.registry = registry if registry is not None else llm_client_registry
+        self.check_interval = (
+            settings.LLM_CLIENT_CHECK_INTERVAL if check_interval is None else check_interval
+        )
+        self._health: dict[int, EndpointHealth] = {}
+        self._endpoints: dict[int, LLM] = {}
+        self._agent_models: dict[str, str | None] = {}
+        self._version: tuple | None = None
+        self._version_checked_at = float("-inf")
+        self._agent_models_loaded_at = float("-inf")
+
+    # ===== Agent 模型 =====
+
+    async def resolve_agent_model(self, agent_name: str) -> str:
+        """Agent 使用的模型名称,Agent 不存在或未关联到 llm 表时使用 LLM_DEFAULT_MODEL"""
+        await self._check_version()
+        if agent_name not in self._agent_models:
+            from app.providers.database import get_engine
+
+            _, async_session = get_engine()
+            async with async_session() as session:
+                self._agent_models[agent_name] = await AgentService(session).get_agent_model_name(agent_name)
+        model_name = self._agent_models[agent_name]
+        if model_name is None:
+            return get_settings().LLM_DEFAULT_MODEL
+        return model_name
+
+    async def _check_version(self) -> None:
+        now = time.monotonic()
+        if now - self._version_checked_at < self.check_interval:
+            return
+        self._version_checked_at = now
+        try:
+            version = await tag_versions(*AGENT_MODEL_TAGS)
+        except (RedisError, OSError) as e:
+            logger.warning(f"读取Agent模型配置版本失败: {e}")
+            version = ()
+        # 读取不到版本时按 LLM_CLIENT_RELOAD_INTERVAL 定期重新查询
+        expired = not version and now - self._agent_models_loaded_at >= get_settings().LLM_CLIENT_RELOAD_INTERVAL
+        if version != self._version or expired:
+            self._agent_models.clear()
+            self._version = version
+            self._agent_models_loaded_at = now
+
+    # ===== 服务地址选择 =====
+
+    async def endpoints(self, model_name: str) -> list[LLM]:
+        """llm 表中提供该模型的激活服务地址"""
+        llms = await self.registry.active_llms()
+        if len(self._endpoints) > len(llms):
+            # 停用的地址不再保留统计
+            active = {llm.id for llm in llms}
+            for llm_id in [llm_id for llm_id in self._endpoints if llm_id not in active]:
+                if self._health[llm_id].inflight == 0:
+                    del self._endpoints[llm_id], self._health[llm_id]
+        return [llm for llm in llms if llm.model_name == model_name]
+
+    def _pick(self, endpoints: list[LLM]) -> LLM:
+        now = time.monotonic()
+        for llm in endpoints:
+            self._endpoints[llm.id] = llm
+        healths = {llm.id: self._health.setdefault(llm.id, EndpointHealth()) for llm in endpoints}
+        available = [llm for llm in endpoints if healths[llm.id].ejected_until <= now]
+        if not available:
+            # 全部被摘除时选择最早到期的地址
+            return min(endpoints, key=lambda llm: healths[llm.id].ejected_until)
+        if len(available) == 1:
+            return available[0]
+        # 尚无耗时数据的地址按已知耗时的最小值计算,保证新地址能分到调用
+        known = [healths[llm.id].latency for llm in available if healths[llm.id].latency is not None]
+        default_latency = min(known) if known else 1.0
+        first, second = random.sample(available, 2)
+        if healths[first.id].score(default_latency) <= healths[second.id].score(default_latency):
+            return first
+        return second
+
+    def _readmit(self, llm: LLM, health: EndpointHealth) -> None:
+        if health.ejected_until and health.ejected_until <= time.monotonic():
+            health.ejected_until = 0.0
+            health.probation = True
+            logger.info(f"模型服务地址重新接入 | {llm.model_name} | {llm.provider} | {llm.api_url}")
+
+    def _record(self, llm: LLM, health: EndpointHealth, duration: float, error: bool) -> None:
+        settings = get_settings()
+        alpha = settings.LLM_ROUTER_EWMA_ALPHA
+        health.requests += 1
+        health.error_rate = (1 - alpha) * health.error_rate + alpha * (1.0 if error else 0.0)
+        if not error:
+            health.latency = duration if health.latency is None else (1 - alpha) * health.latency + alpha * duration
+            health.consecutive_errors = 0
+            if health.probation:
+                health.probation = False
+                health.ejections = 0
+            return
+
+        health.consecutive_errors += 1
+        if (
+            health.probation
+            or health.consecutive_errors >= settings.LLM_EJECT_CONSECUTIVE_ERRORS
+            or (
+                health.requests >= settings.LLM_EJECT_MIN_REQUESTS
+                and health.error_rate >= settings.LLM_EJECT_ERROR_RATE
+            )
+        ):
+            self._eject(llm, health)
+
+    def _eject(self, llm: LLM, health: EndpointHealth) -> None:
+        if health.ejected_until > time.monotonic():
+            # 同一批并发调用的失败只摘除一次
+            return
+        settings = get_settings()
+        seconds = min(
+            settings.LLM_EJECT_BASE_SECONDS * 2 ** health.ejections, settings.LLM_EJECT_MAX_SECONDS
+        )
+        health.ejections += 1
+        health.ejected_until = time.monotonic() + seconds
+        # 重新接入后从头统计错误率
+        health.error_rate = 0.0
+        health.requests = 0
+        health.consecutive_errors = 0
+        health.probation = False
+        observe_llm_endpoint_ejection(llm.model_name, llm.provider, llm.api_url)
+        logger.warning(
+            f"模型服务地址已摘除 {seconds:g}s | {llm.model_name} | {llm.provider} | {llm.api_url} | "
+            f"第 {health.ejections} 次"
+        )
+
+    @asynccontextmanager
+    async def route(self, model_name: str) -> AsyncIterator[ChatOpenAI]:
+        """
+        选择提供该模型的服务地址,获取该模型与提供商的并发名额后返回其客户端,
+        并按调用结果更新该地址的耗时与错误率
+
+        Raises:
+            LookupError: llm 表中没有该名称的激活模型
+            ConcurrencyLimitExceeded: 超过 LLM_CONCURRENCY_QUEUE_TIMEOUT 仍未获得并发名额
+        """
+        endpoints = await self.endpoints(model_name)
+        if not endpoints:
+            raise LookupError(f"llm 表中没有激活的模型: {model_name}")
+        llm = self._pick(endpoints)
+        health = self._health[llm.id]
+        self._readmit(llm, health)
+        client = self.registry.client(llm)
+
+        async with llm_concurrency_limit(llm.provider, llm.model_name):
+            health.inflight += 1
+            started = time.perf_counter()
+            # 只有成功与服务地址自身的失败计入统计,取消(CancelledError)与参数错误保持 None 不计入
+            error: bool | None = None
+            try:
+                yield client
+                error = False
+            except CLIENT_ERRORS:
+                raise
+            except Exception:
+                error = True
+                raise
+            finally:
+                health.inflight -= 1
+                if error is not None:
+                    self._record(llm, health, time.perf_counter() - started, error)
+
+    def stats(self) -> dict:
+        """各服务地址的耗时、错误率与摘除状态,以及已缓存的 Agent 模型"""
+        now = time.monotonic()
+        endpoints = {}
+        for llm_id, llm in self._endpoints.items():
+            health = self._health[llm_id]
+            endpoints[llm_id] = {
+                "model": llm.model_name,
+                "provider": llm.provider,
+                "api_url": llm.api_url,
+                "latency_ms": None if health.latency is None else round(health.latency * 1000, 1),
+                "error_rate": round(health.error_rate, 4),
+                "inflight": health.inflight,
+                "ejections": health.ejections,
+                "ejected_for": round(max(health.ejected_until - now, 0.0), 1),
+                "probation": health.probation,
+            }
+        return {"agent_models": dict(self._agent_models), "endpoints": endpoints}
+
+
+# 全局路由,工作流节点通过 llm_router.route() 获取模型客户端
+llm_router = LLMRouter()
+register_memory_probe(
+    "llm_router",
+    lambda: {"endpoints": len(llm_router._health), "agent_models": len(llm_router._agent_models)},
+)
@@ -0,0 +1,400 @@
+"""
+有界的进程内 checkpointer
+
+InMemorySaver 不会删除任何会话,长时间运行的进程内存持续增长。BoundedMemorySaver 在其基础上:
+
+- 按会话(thread_id)统计近似内存占用: 序列化后的 checkpoint、元数据、通道值与写入的字节数,
+  加上每个条目的固定开销
+- 会话数超过 max_threads 或总字节数超过 max_bytes 时,按最近访问时间淘汰最久未使用的会话(LRU);
+  超过 ttl 秒未访问的会话在写入时与后台任务中淘汰
+- 配置 spill 时,被淘汰会话每个命名空间的最新 checkpoint 及其未完成写入转存到 spill
+  (通常是本地 SQLite 文件上的 SQLCheckpointSaver),之后读取该会话时从 spill 恢复并把全部通道值放回内存,
+  中断等待人工输入的会话被淘汰后仍可继续运行;spill 只保存最新 checkpoint,不保存历史
+- stats() 返回会话数、字节数、淘汰次数与占用最多的会话
+
+转存通过异步接口完成,只使用同步接口时被淘汰的会话在下一次异步调用时转存。
+"""
+
+import asyncio
+import heapq
+import time
+import weakref
+from collections import Counter, OrderedDict
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (BaseCheckpointSaver, ChannelVersions,
+                                       Checkpoint, CheckpointMetadata,
+                                       CheckpointTuple, SerializerProtocol)
+from langgraph.checkpoint.memory import InMemorySaver
+from loguru import logger
+
+from app.support.memory_debug import register_memory_probe
+from app.support.metrics import (observe_checkpoint_memory,
+                                 observe_checkpoint_memory_eviction,
+                                 register_scrape_hook)
+from config.config import get_settings
+
+# 每个存储条目(字典项、元组、键)除序列化字节外的近似开销
+ENTRY_OVERHEAD = 200
+
+EVICT_TTL = "ttl"
+EVICT_THREADS = "max_threads"
+EVICT_BYTES = "max_bytes"
+
+_live_bounded_savers: "weakref.WeakSet[BoundedMemorySaver]" = weakref.WeakSet()
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """按会话数、字节数与空闲时间淘汰会话的 InMemorySaver"""
+
+    def __init__(
+        self,
+        *,
+        max_threads: int | None = None,
+        max_bytes: int | None = None,
+        ttl: float | None = None,
+        spill: BaseCheckpointSaver | None = None,
+        serde: SerializerProtocol | None = None,
+    ):
+        """
+        Args:
+            max_threads: 最多保存的会话数,0 为不限制,默认使用 CHECKPOINT_MEMORY_MAX_THREADS
+            max_bytes: 所有会话的近似总字节数上限,0 为不限制,默认使用 CHECKPOINT_MEMORY_MAX_BYTES
+            ttl: 会话超过该时长(秒)未访问时淘汰,0 为不限制,默认使用 CHECKPOINT_MEMORY_TTL
+            spill: 被淘汰会话的转存目标,为空时直接丢弃
+            serde: 序列化器,默认 JsonPlusSerializer
+        """
+        super().__init__(serde=serde)
+        settings = get_settings()
+        self.max_threads = settings.CHECKPOINT_MEMORY_MAX_THREADS if max_threads is None else max_threads
+        self.max_bytes = settings.CHECKPOINT_MEMORY_MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl = settings.CHECKPOINT_MEMORY_TTL if ttl is None else ttl
+        self.spill = spill
+        # thread_id -> 最近访问时间,按访问先后排列
+        self._access: OrderedDict[str, float] = OrderedDict()
+        self._thread_bytes: dict[str, int] = {}
+        self.total_bytes = 0
+        self.evictions: Counter[str] = Counter()
+        self.spilled = 0
+        self.spill_hits = 0
+        self._spill_queue: list[CheckpointTuple] = []
+        self._pruner: asyncio.Task | None = None
+        _live_bounded_savers.add(self)
+
+    # ===============================================accounting====================================================
+
+    def _touch(self, thread_id: str) -> None:
+        self._access[thread_id] = time.monotonic()
+        self._access.move_to_end(thread_id)
+
+    def _account(self, thread_id: str, delta: int) -> None:
+        self._thread_bytes[thread_id] = self._thread_bytes.get(thread_id, 0) + delta
+        self.total_bytes += delta
+
+    def _forget(self, thread_id: str) -> None:
+        self.total_bytes -= self._thread_bytes.pop(thread_id, 0)
+        self._access.pop(thread_id, None)
+
+    def _writes_size(self, key: tuple[str, str, str]) -> int:
+        stored = self.writes.get(key)
+        if not stored:
+            return 0
+        return sum(len(value[2][1]) + ENTRY_OVERHEAD for value in stored.values())
+
+    # ===============================================saver====================================================
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        # storage 为 defaultdict,不存在的会话不能直接访问,否则会留下空条目
+        if thread_id not in self.storage:
+            return None
+        self._touch(thread_id)
+        return super().get_tuple(config)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        if config:
+            thread_id = config["configurable"]["thread_id"]
+            if thread_id not in self.storage:
+                return iter(())
+            self._touch(thread_id)
+        return super().list(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        saved, metadata_b, _ = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+        size = len(saved[1]) + len(metadata_b[1]) + ENTRY_OVERHEAD
+        for channel, version in new_versions.items():
+            size += len(self.blobs[(thread_id, checkpoint_ns, channel, version)][1]) + ENTRY_OVERHEAD
+        self._account(thread_id, size)
+        self._touch(thread_id)
+        self._evict(current=thread_id)
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        key = (thread_id, configurable.get("checkpoint_ns", ""), configurable["checkpoint_id"])
+        # 特殊通道的写入会覆盖已有条目,按前后差值计入
+        before = self._writes_size(key)
+        super().put_writes(config, writes, task_id, task_path)
+        self._account(thread_id, self._writes_size(key) - before)
+        self._touch(thread_id)
+        self._evict(current=thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        self._forget(thread_id)
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        await self._flush_spill()
+        checkpoint_tuple = self.get_tuple(config)
+        if checkpoint_tuple is None and self.spill is not None:
+            checkpoint_tuple = await self.spill.aget_tuple(config)
+            if checkpoint_tuple is not None:
+                self.spill_hits += 1
+                checkpoint_tuple = self._restore(checkpoint_tuple)
+        return checkpoint_tuple
+
+    def _restore(self, checkpoint_tuple: CheckpointTuple) -> CheckpointTuple:
+        """
+        把 spill 中的 checkpoint 连同全部通道值与未完成的写入放回内存
+
+        之后的 put 只写入本步变化的通道,未放回的通道会从会话状态中丢失
+        """
+        configurable = checkpoint_tuple.config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        parent_config: RunnableConfig = {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}}
+        if checkpoint_tuple.parent_config:
+            parent_config["configurable"]["checkpoint_id"] = checkpoint_tuple.parent_config["configurable"]["checkpoint_id"]
+        checkpoint = checkpoint_tuple.checkpoint
+        config = self.put(parent_config, checkpoint, checkpoint_tuple.metadata, checkpoint["channel_versions"])
+        writes_by_task: dict[str, list[tuple[str, Any]]] = {}
+        for task_id, channel, value in checkpoint_tuple.pending_writes or ():
+            writes_by_task.setdefault(task_id, []).append((channel, value))
+        for task_id, writes in writes_by_task.items():
+            self.put_writes(config, writes, task_id)
+        return self.get_tuple(config) or checkpoint_tuple
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        await self._flush_spill()
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            if limit is not None:
+                limit -= 1
+            yield item
+        if self.spill is None or (limit is not None and limit <= 0):
+            return
+        # 内存中的会话以内存为准,spill 中只可能还有它被淘汰前的旧 checkpoint
+        async for item in self.spill.alist(config, filter=filter, before=before):
+            if item.config["configurable"]["thread_id"] in self.storage:
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    return
+                limit -= 1
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = self.put(config, checkpoint, metadata, new_versions)
+        await self._flush_spill()
+        return next_config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.put_writes(config, writes, task_id, task_path)
+        await self._flush_spill()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
+        if self.spill is not None:
+            await self.spill.adelete_thread(thread_id)
+
+    # ===============================================eviction====================================================
+
+    def _evict(self, current: str | None = None) -> None:
+        """淘汰过期会话,再按 LRU 淘汰到会话数与字节数都不超过上限,不淘汰正在写入的会话"""
+        if self.ttl:
+            deadline = time.monotonic() - self.ttl
+            while self._access:
+                thread_id, accessed_at = next(iter(self._access.items()))
+                if accessed_at > deadline or thread_id == current:
+                    break
+                self._evict_thread(thread_id, EVICT_TTL)
+        while self._access:
+            if self.max_threads and len(self._access) > self.max_threads:
+                reason = EVICT_THREADS
+            elif self.max_bytes and self.total_bytes > self.max_bytes:
+                reason = EVICT_BYTES
+            else:
+                break
+            thread_id = next(iter(self._access))
+            if thread_id == current:
+                # 只剩当前会话,单个会话超过字节上限时保留
+                break
+            self._evict_thread(thread_id, reason)
+
+    def _evict_thread(self, thread_id: str, reason: str) -> None:
+        if self.spill is not None:
+            for checkpoint_ns in list(self.storage.get(thread_id, ())):
+                checkpoint_tuple = super().get_tuple(
+                    {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}}
+                )
+                if checkpoint_tuple is not None:
+                    self._spill_queue.append(checkpoint_tuple)
+        self.delete_thread(thread_id)
+        self.evictions[reason] += 1
+        observe_checkpoint_memory_eviction(reason)
+
+    async def _flush_spill(self) -> None:
+        if not self._spill_queue:
+            return
+        pending, self._spill_queue = self._spill_queue, []
+        for checkpoint_tuple in pending:
+            try:
+                await self._spill_one(checkpoint_tuple)
+                self.spilled += 1
+            except Exception as e:
+                logger.warning(
+                    f"转存会话 {checkpoint_tuple.config['configurable']['thread_id']} 的checkpoint失败: {e}"
+                )
+
+    async def _spill_one(self, checkpoint_tuple: CheckpointTuple) -> None:
+        configurable = checkpoint_tuple.config["configurable"]
+        parent_config = checkpoint_tuple.parent_config or {
+            "configurable": {
+                "thread_id": configurable["thread_id"],
+                "checkpoint_ns": configurable["checkpoint_ns"],
+            }
+        }
+        checkpoint = checkpoint_tuple.checkpoint
+        config = await self.spill.aput(
+            parent_config, checkpoint, checkpoint_tuple.metadata, checkpoint["channel_versions"]
+        )
+        # 未完成的写入按任务分组,保持原有顺序
+        writes_by_task: dict[str, list[tuple[str, Any]]] = {}
+        for task_id, channel, value in checkpoint_tuple.pending_writes or ():
+            writes_by_task.setdefault(task_id, []).append((channel, value))
+        for task_id, writes in writes_by_task.items():
+            await self.spill.aput_writes(config, writes, task_id)
+
+    async def expire(self) -> None:
+        """淘汰过期与超出上限的会话并完成转存"""
+        self._evict()
+        await self._flush_spill()
+
+    # ===============================================lifecycle====================================================
+
+    async def setup(self) -> None:
+        setup = getattr(self.spill, "setup", None)
+        if setup is not None:
+            await setup()
+
+    async def start(self) -> None:
+        """spill 建表并启动后台淘汰"""
+        await self.setup()
+        self.start_pruner()
+
+    async def stop(self) -> None:
+        await self.stop_pruner()
+
+    def start_pruner(self, interval: float | None = None) -> None:
+        """启动后台任务,定期淘汰空闲会话并清理 spill 中的过期会话"""
+        if self._pruner is not None and not self._pruner.done():
+            return
+        interval = get_settings().CHECKPOINT_PRUNE_INTERVAL if interval is None else interval
+        self._pruner = asyncio.create_task(self._prune_loop(interval), name="bounded-checkpoint-pruner")
+
+    async def stop_pruner(self) -> None:
+        if self._pruner is not None:
+            self._pruner.cancel()
+            try:
+                await self._pruner
+            except asyncio.CancelledError:
+                pass
+            self._pruner = None
+        await self._flush_spill()
+
+    async def _prune_loop(self, interval: float) -> None:
+        prune_expired = getattr(self.spill, "prune_expired", None)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.expire()
+                if prune_expired is not None:
+                    await prune_expired()
+            except Exception as e:
+                logger.warning(f"淘汰空闲会话失败: {e}")
+
+    def stats(self, top: int = 10) -> dict:
+        """会话数、近似字节数、淘汰与转存次数,以及占用字节最多的 top 个会话"""
+        return {
+            "threads": len(self._access),
+            "bytes": self.total_bytes,
+            "max_threads": self.max_threads,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "evictions": dict(self.evictions),
+            "spill": type(self.spill).__name__ if self.spill is not None else None,
+            "spilled": self.spilled,
+            "spill_hits": self.spill_hits,
+            "spill_pending": len(self._spill_queue),
+            "top_threads": heapq.nlargest(top, self._thread_bytes.items(), key=lambda item: item[1]),
+        }
+
+
+def _refresh_metrics() -> None:
+    savers = list(_live_bounded_savers)
+    observe_checkpoint_memory(
+        sum(len(saver._access) for saver in savers), sum(saver.total_bytes for saver in savers)
+    )
+
+
+register_scrape_hook(_refresh_metrics)
+register_memory_probe(
+    "checkpointer.bounded",
+    lambda: {
+        "threads": sum(len(saver._access) for saver in _live_bounded_savers),
+        "bytes": sum(saver.total_bytes for saver in _live_bounded_savers),
+    },
+)
@@ -1,15 +1,43 @@
+import weakref
+
 from langgraph.graph import StateGraph, START, END
 
-# TODO: 开发使用内存，上生产需更换为 PostgresStore
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import InMemorySaver
 
+from app.services.now_find_agents.bounded_checkpointer import BoundedMemorySaver
 from app.services.now_find_agents.state_types import State
 from app.services.now_find_agents.graph_nodes.supervisor_node import supervisor
+from app.support.memory_debug import register_memory_probe
+
+# 所有存活的 InMemorySaver,用于内存诊断
+_live_savers: "weakref.WeakSet[InMemorySaver]" = weakref.WeakSet()
+
+
+def _in_memory_saver_stats() -> dict:
+    savers = list(_live_savers)
+    return {
+        "savers": len(savers),
+        "threads": sum(len(saver.storage) for saver in savers),
+        "writes": sum(len(saver.writes) for saver in savers),
+        "blobs": sum(len(saver.blobs) for saver in savers),
+    }
+
+
+register_memory_probe("checkpointer.in_memory", _in_memory_saver_stats)
 
 
 class GraphBuilder:
-    def __init__(self):
-        self.store = InMemorySaver()
+    def __init__(self, checkpointer: BaseCheckpointSaver | None = None):
+        """
+        Args:
+            checkpointer: 图的checkpointer,为空时新建独立的 BoundedMemorySaver
+                          (应用内通过 graph_registry 获取共享checkpointer的图)
+        """
+        if checkpointer is None:
+            checkpointer = BoundedMemorySaver()
+            _live_savers.add(checkpointer)
+        self.store = checkpointer
 
     async def build_graph_async(self):
         agent_builder = StateGraph(State)
@@ -2,13 +2,17 @@ import json
 from typing import Literal
 
 from langchain_core.messages import AIMessage
-from langchain_openai import ChatOpenAI
 from langgraph.types import Command
 from loguru import logger
 
 
+from app.services.llms_manage.llm import llm_rate_limit
+from app.services.llms_manage.router import llm_router
 from app.services.now_find_agents.state_types import State
 
+# agent 表中监督者的名称,其 agent_model_id 决定使用的模型
+AGENT_NAME = "supervisor"
+
 
 async def supervisor(state: State) -> Command[Literal["__end__"]]:
     """
@@ -16,10 +20,11 @@ async def supervisor(state: State) -> Command[Literal["__end__"]]:
     监督者,监督所有任务需要用到的agent
     """
     try:
-        llm = ChatOpenAI(api_key="sk-ct5qFCReZ4vsHYst5c7841D09dD84eCeA23bBfBeE5787413", base_url="https://one-api.nowcoder.com",model="gpt-4o")
+        model_name = await llm_router.resolve_agent_model(AGENT_NAME)
         messages = state["messages"]
         # whether to enable deep thinking mode
-        response = await llm.ainvoke(messages)
+        async with llm_rate_limit(model_name), llm_router.route(model_name) as llm:
+            response = await llm.ainvoke(messages)
         return Command(goto="__end__",update={"messages": [response]})
     except Exception as e:
         logger.error(f"Error in supervisor_node: {e}")
@@ -0,0 +1,203 @@
+"""
+编译图注册表
+
+每个图定义在进程内只编译一次,所有运行共用编译好的图与同一个checkpointer:
+
+- register(name, factory) 注册图定义,factory(checkpointer) 返回编译好的图(可以是协程函数)
+- get(name) 返回缓存的编译图;Agent/Tool/LLM 配置变更(对应服务的写方法会递增 redis_cached 的
+  agent/tool/llm 标签版本)后,下次 get 时重新编译,配置版本最多每 GRAPH_VERSION_CHECK_INTERVAL 秒检查一次
+- 编译好的图可被多个运行并发使用,各运行以 thread_id(task_id)区分checkpoint
+- checkpointer 按 CHECKPOINTER_BACKEND 创建,默认持久化到数据库(SQLCheckpointSaver,CHECKPOINT_DURABILITY
+  不为 sync 时外层包装 WriteBehindSaver),memory 为有界的进程内 BoundedMemorySaver;
+  进程启动时调用 start() 建表并启动后台任务,运行结束时 flush(thread_id) 写入写后缓冲
+"""
+
+import asyncio
+import inspect
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, NamedTuple
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from loguru import logger
+from redis.exceptions import RedisError
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.services.now_find_agents.bounded_checkpointer import BoundedMemorySaver
+from app.services.now_find_agents.graph_builder import GraphBuilder, _live_savers
+from app.services.now_find_agents.sql_checkpointer import SQLCheckpointSaver
+from app.services.now_find_agents.write_behind_checkpointer import (
+    DURABILITY_SYNC, WriteBehindSaver)
+from app.services.redis_cache import tag_versions
+from app.support.memory_debug import register_memory_probe
+from config.config import get_settings
+
+DEFAULT_GRAPH = "now_find"
+
+# 图依赖的配置,对应 AgentService/ToolService/LLMService 写方法失效的缓存标签
+CONFIG_TAGS = ("agent", "tool", "llm")
+
+GraphFactory = Callable[[BaseCheckpointSaver], Any | Awaitable[Any]]
+
+
+def create_checkpointer(backend: str | None = None) -> BaseCheckpointSaver:
+    """
+    按配置创建checkpointer
+
+    Args:
+        backend: sql / memory,默认使用 CHECKPOINTER_BACKEND
+    """
+    settings = get_settings()
+    backend = backend or settings.CHECKPOINTER_BACKEND
+    if backend == "sql":
+        if settings.CHECKPOINT_DURABILITY == DURABILITY_SYNC:
+            return SQLCheckpointSaver()
+        return WriteBehindSaver(SQLCheckpointSaver())
+    if backend == "memory":
+        spill = None
+        if settings.CHECKPOINT_MEMORY_SPILL_PATH:
+            # 转存的会话只需要最新 checkpoint
+            spill = SQLCheckpointSaver(
+                create_async_engine(f"sqlite+aiosqlite:///{settings.CHECKPOINT_MEMORY_SPILL_PATH}"),
+                keep_last=1,
+            )
+        saver = BoundedMemorySaver(spill=spill)
+        _live_savers.add(saver)
+        return saver
+    raise ValueError(f"不支持的checkpointer: {backend}")
+
+
+class _CompiledGraph(NamedTuple):
+    graph: Any
+    version: tuple
+    compiled_at: float
+    compile_seconds: float
+
+
+class GraphRegistry:
+    """进程内的编译图注册表"""
+
+    def __init__(
+        self,
+        checkpointer: BaseCheckpointSaver | None = None,
+        version_tags: tuple[str, ...] = CONFIG_TAGS,
+        check_interval: float | None = None,
+    ):
+        """
+        Args:
+            checkpointer: 所有图共用的checkpointer,默认按 CHECKPOINTER_BACKEND 创建
+            version_tags: 决定图版本的缓存标签
+            check_interval: 配置版本检查间隔(秒),默认使用 GRAPH_VERSION_CHECK_INTERVAL
+        """
+        self.checkpointer = checkpointer if checkpointer is not None else create_checkpointer()
+        self.version_tags = version_tags
+        self.check_interval = (
+            get_settings().GRAPH_VERSION_CHECK_INTERVAL if check_interval is None else check_interval
+        )
+        self._factories: dict[str, GraphFactory] = {}
+        self._graphs: dict[str, _CompiledGraph] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._version: tuple = ()
+        self._version_checked_at = float("-inf")
+        self.compiles = 0
+
+    async def start(self) -> None:
+        """启动checkpointer(建表、后台清理与写后缓冲落库),没有 start 方法的checkpointer(如 InMemorySaver)跳过"""
+        start = getattr(self.checkpointer, "start", None)
+        if start is not None:
+            await start()
+
+    async def stop(self) -> None:
+        """停止checkpointer,写后缓冲中未落库的checkpoint在此写入"""
+        stop = getattr(self.checkpointer, "stop", None)
+        if stop is not None:
+            await stop()
+
+    async def flush(self, thread_id: str | None = None) -> None:
+        """写入会话(为空时全部)在写后缓冲中的checkpoint,其他checkpointer不需要"""
+        aflush = getattr(self.checkpointer, "aflush", None)
+        if aflush is not None:
+            await aflush(thread_id)
+
+    def register(self, name: str, factory: GraphFactory) -> None:
+        """注册图定义,重复注册时覆盖并在下次获取时重新编译"""
+        self._factories[name] = factory
+        self._graphs.pop(name, None)
+
+    def invalidate(self, name: str | None = None) -> None:
+        """丢弃编译结果,name 为空时丢弃全部"""
+        if name is None:
+            self._graphs.clear()
+        else:
+            self._graphs.pop(name, None)
+
+    async def get(self, name: str = DEFAULT_GRAPH) -> Any:
+        """
+        获取编译好的图,首次获取或配置版本变化时编译
+
+        Args:
+            name: 图名称
+
+        Returns:
+            CompiledStateGraph: 编译好的图
+        """
+        if name not in self._factories:
+            raise KeyError(f"未注册的图: {name}")
+        version = await self._config_version()
+        compiled = self._graphs.get(name)
+        if compiled is not None and compiled.version == version:
+            return compiled.graph
+
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            # 等待锁期间其他调用方可能已编译
+            compiled = self._graphs.get(name)
+            if compiled is not None and compiled.version == version:
+                return compiled.graph
+            started = time.perf_counter()
+            graph = self._factories[name](self.checkpointer)
+            if inspect.isawaitable(graph):
+                graph = await graph
+            elapsed = time.perf_counter() - started
+            self._graphs[name] = _CompiledGraph(graph, version, time.time(), elapsed)
+            self.compiles += 1
+            logger.info(f"图 {name} 已编译 | 配置版本 {version} | 耗时 {elapsed * 1000:.1f}ms")
+            return graph
+
+    async def _config_version(self) -> tuple:
+        now = time.monotonic()
+        if now - self._version_checked_at < self.check_interval:
+            return self._version
+        try:
+            self._version = await tag_versions(*self.version_tags)
+        except (RedisError, OSError) as e:
+            # 读取失败时沿用上次的版本,不影响运行
+            logger.warning(f"读取图配置版本失败: {e}")
+        self._version_checked_at = now
+        return self._version
+
+    def stats(self) -> dict:
+        """注册的图、编译版本与编译次数,未编译的图为 None"""
+        graphs = {}
+        for name in self._factories:
+            compiled = self._graphs.get(name)
+            graphs[name] = None if compiled is None else {
+                "version": list(compiled.version),
+                "compiled_at": compiled.compiled_at,
+                "compile_ms": round(compiled.compile_seconds * 1000, 2),
+            }
+        stats = getattr(self.checkpointer, "stats", None)
+        return {
+            "checkpointer": type(self.checkpointer).__name__,
+            "checkpointer_stats": stats() if stats is not None else None,
+            "version": list(self._version),
+            "compiles": self.compiles,
+            "graphs": graphs,
+        }
+
+
+# 全局注册表,工作流通过 graph_registry.get() 获取编译好的图
+graph_registry = GraphRegistry()
+graph_registry.register(DEFAULT_GRAPH, lambda checkpointer: GraphBuilder(checkpointer).build_graph_async())
+register_memory_probe("graph_registry.graphs", lambda: len(graph_registry._graphs))
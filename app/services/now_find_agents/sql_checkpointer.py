@@ -0,0 +1,600 @@
+"""
+数据库持久化的 LangGraph checkpointer
+
+基于应用已有的 SQLAlchemy 异步引擎,支持 SQLite/PostgreSQL/MySQL:
+
+- 三张表: checkpoint(不含通道值)、通道值 blob(按通道版本去重,未变化的通道不重复写入)、任务写入
+- 一次 aput 在同一事务内批量写入(executemany)本步变化的通道值与 checkpoint,冲突时按方言忽略或覆盖;
+  aput_batch 可在一个事务内写入多个会话的 checkpoint 与任务写入(供 WriteBehindSaver 批量落库)
+- 状态由 serde 序列化,超过 CHECKPOINT_COMPRESS_MIN_BYTES 时压缩(zstd,未安装时 zlib),压缩算法记录在 type 列
+- 每个会话(thread_id + 命名空间)只保留最近 CHECKPOINT_KEEP_LAST 个 checkpoint,
+  写入新 checkpoint 时同一事务内删除更早的 checkpoint、写入与不再被引用的通道值
+- 后台清理任务每 CHECKPOINT_PRUNE_INTERVAL 秒删除超过 CHECKPOINT_TTL 未更新的会话
+- 进程内不保存任何会话状态,worker 内存不随运行过的会话数增长
+
+只实现异步接口(图通过 astream/ainvoke 运行);保留最近 N 个 checkpoint 后,
+更早的历史(get_state_history、回到旧 checkpoint 重新运行)不再可用。
+"""
+
+import asyncio
+import random
+import zlib
+from collections.abc import AsyncIterator, Iterable, Sequence
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (WRITES_IDX_MAP, BaseCheckpointSaver,
+                                       ChannelVersions, Checkpoint,
+                                       CheckpointMetadata, CheckpointTuple,
+                                       SerializerProtocol,
+                                       get_checkpoint_id,
+                                       get_checkpoint_metadata,
+                                       writes_sort_key)
+from loguru import logger
+from sqlalchemy import bindparam, delete, func, select, tuple_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.models.BaseModels import Base
+from app.models.Checkpoint import Checkpoint as CheckpointRow
+from app.models.Checkpoint import CheckpointBlob, CheckpointWrite
+from app.support.metrics import observe_checkpoints_pruned
+from config.config import get_settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHECKPOINTS = CheckpointRow.__table__
+BLOBS = CheckpointBlob.__table__
+WRITES = CheckpointWrite.__table__
+
+# 空通道(本步被清空)的 blob 类型
+EMPTY_TYPE = "empty"
+
+COMPRESSION = "zstd" if zstandard is not None else "zlib"
+
+# 每轮 TTL 清理删除的会话数
+PRUNE_BATCH_SIZE = 500
+
+
+def _compress(data: bytes) -> bytes:
+    if COMPRESSION == "zstd":
+        return zstandard.compress(data, 3)
+    return zlib.compress(data, 6)
+
+
+def _decompress(compression: str, data: bytes) -> bytes:
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("解压 zstd 压缩的 checkpoint 需要安装 zstandard")
+        return zstandard.decompress(data)
+    if compression == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"未知的 checkpoint 压缩算法: {compression}")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class SQLCheckpointSaver(BaseCheckpointSaver[str]):
+    """基于 SQLAlchemy 异步引擎的 checkpointer"""
+
+    def __init__(
+        self,
+        engine: AsyncEngine | None = None,
+        *,
+        keep_last: int | None = None,
+        ttl: int | None = None,
+        prune_interval: float | None = None,
+        compress_min_bytes: int | None = None,
+        serde: SerializerProtocol | None = None,
+    ):
+        """
+        Args:
+            engine: 异步引擎,默认使用应用的数据库引擎(首次访问时创建)
+            keep_last: 每个会话保留的 checkpoint 数,0 为不限制,默认使用 CHECKPOINT_KEEP_LAST
+            ttl: 会话超过该时长(秒)未更新时由后台任务删除,0 为不清理,默认使用 CHECKPOINT_TTL
+            prune_interval: 后台清理间隔(秒),默认使用 CHECKPOINT_PRUNE_INTERVAL
+            compress_min_bytes: 序列化结果达到该大小(字节)时压缩,默认使用 CHECKPOINT_COMPRESS_MIN_BYTES
+            serde: 序列化器,默认 JsonPlusSerializer
+        """
+        super().__init__(serde=serde)
+        settings = get_settings()
+        self._engine = engine
+        self.keep_last = settings.CHECKPOINT_KEEP_LAST if keep_last is None else keep_last
+        self.ttl = settings.CHECKPOINT_TTL if ttl is None else ttl
+        self.prune_interval = (
+            settings.CHECKPOINT_PRUNE_INTERVAL if prune_interval is None else prune_interval
+        )
+        self.compress_min_bytes = (
+            settings.CHECKPOINT_COMPRESS_MIN_BYTES if compress_min_bytes is None else compress_min_bytes
+        )
+        self._is_setup = False
+        self._setup_lock = asyncio.Lock()
+        self._pruner: asyncio.Task | None = None
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            from app.providers.database import get_engine
+
+            self._engine, _ = get_engine()
+        return self._engine
+
+    async def setup(self) -> None:
+        """创建 checkpoint 相关的表(已存在时跳过),worker 进程首次写入前自动调用"""
+        if self._is_setup:
+            return
+        async with self._setup_lock:
+            if self._is_setup:
+                return
+            async with self.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all, tables=[CHECKPOINTS, BLOBS, WRITES])
+            self._is_setup = True
+
+    # ===============================================serde====================================================
+
+    def _dump(self, value: Any) -> tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        if self.compress_min_bytes and len(data) >= self.compress_min_bytes:
+            compressed = _compress(data)
+            if len(compressed) < len(data):
+                return f"{type_}+{COMPRESSION}", compressed
+        return type_, data
+
+    def _load(self, type_: str, data: bytes) -> Any:
+        type_, _, compression = type_.partition("+")
+        if compression:
+            data = _decompress(compression, data)
+        return self.serde.loads_typed((type_, data))
+
+    # ===============================================statements====================================================
+
+    def _insert(self, table, update: Sequence[str] = ()):
+        """按方言构造插入语句: 主键冲突时覆盖 update 中的列,update 为空时忽略"""
+        dialect = self.engine.dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            stmt = (sqlite if dialect == "sqlite" else postgresql).insert(table)
+            keys = [column.name for column in table.primary_key]
+            if update:
+                return stmt.on_conflict_do_update(
+                    index_elements=keys, set_={name: stmt.excluded[name] for name in update}
+                )
+            return stmt.on_conflict_do_nothing(index_elements=keys)
+        if dialect in ("mysql", "mariadb"):
+            stmt = mysql.insert(table)
+            if update:
+                return stmt.on_duplicate_key_update({name: stmt.inserted[name] for name in update})
+            return stmt.prefix_with("IGNORE")
+        raise NotImplementedError(f"SQLCheckpointSaver 不支持 {dialect} 数据库")
+
+    @staticmethod
+    def _where_ns(table, thread_id: str, checkpoint_ns: str):
+        return (table.c.thread_id == thread_id, table.c.checkpoint_ns == checkpoint_ns)
+
+    # ===============================================read====================================================
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        await self.setup()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = select(CHECKPOINTS).where(*self._where_ns(CHECKPOINTS, thread_id, checkpoint_ns))
+        if checkpoint_id := get_checkpoint_id(config):
+            query = query.where(CHECKPOINTS.c.checkpoint_id == checkpoint_id)
+        else:
+            query = query.order_by(CHECKPOINTS.c.checkpoint_id.desc()).limit(1)
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(query)).first()
+            if row is None:
+                return None
+            return await self._load_tuple(conn, row)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        await self.setup()
+        query = select(CHECKPOINTS).order_by(CHECKPOINTS.c.checkpoint_id.desc())
+        if config:
+            configurable = config["configurable"]
+            query = query.where(CHECKPOINTS.c.thread_id == configurable["thread_id"])
+            if configurable.get("checkpoint_ns") is not None:
+                query = query.where(CHECKPOINTS.c.checkpoint_ns == configurable["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                query = query.where(CHECKPOINTS.c.checkpoint_id == checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query = query.where(CHECKPOINTS.c.checkpoint_id < before_id)
+        # 元数据序列化存储,按元数据过滤时在读取后过滤,不能在 SQL 中限制条数
+        if limit is not None and not filter:
+            query = query.limit(limit)
+
+        # 先读完再返回,调用方提前结束迭代时不会占用连接
+        results: list[CheckpointTuple] = []
+        async with self.engine.connect() as conn:
+            for row in (await conn.execute(query)).all():
+                if limit is not None and len(results) >= limit:
+                    break
+                if filter:
+                    metadata = self._load(row.metadata_type, row.checkpoint_metadata)
+                    if not all(metadata.get(key) == value for key, value in filter.items()):
+                        continue
+                results.append(await self._load_tuple(conn, row))
+        for item in results:
+            yield item
+
+    async def _load_tuple(self, conn: AsyncConnection, row) -> CheckpointTuple:
+        checkpoint: Checkpoint = self._load(row.type, row.checkpoint)
+        versions = checkpoint["channel_versions"]
+        channel_values: dict[str, Any] = {}
+        if versions:
+            blobs = await conn.execute(
+                select(BLOBS.c.channel, BLOBS.c.type, BLOBS.c.blob).where(
+                    *self._where_ns(BLOBS, row.thread_id, row.checkpoint_ns),
+                    tuple_(BLOBS.c.channel, BLOBS.c.version).in_(
+                        [(channel, str(version)) for channel, version in versions.items()]
+                    ),
+                )
+            )
+            for channel, type_, blob in blobs:
+                if type_ != EMPTY_TYPE:
+                    channel_values[channel] = self._load(type_, blob)
+
+        writes = (
+            await conn.execute(
+                select(WRITES.c.task_id, WRITES.c.idx, WRITES.c.channel, WRITES.c.type,
+                       WRITES.c.blob, WRITES.c.task_path).where(
+                    *self._where_ns(WRITES, row.thread_id, row.checkpoint_ns),
+                    WRITES.c.checkpoint_id == row.checkpoint_id,
+                )
+            )
+        ).all()
+        writes.sort(key=lambda w: writes_sort_key(w.task_path, w.task_id, w.idx))
+
+        configurable = {
+            "thread_id": row.thread_id,
+            "checkpoint_ns": row.checkpoint_ns,
+        }
+        return CheckpointTuple(
+            config={"configurable": {**configurable, "checkpoint_id": row.checkpoint_id}},
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self._load(row.metadata_type, row.checkpoint_metadata),
+            parent_config=(
+                {"configurable": {**configurable, "checkpoint_id": row.parent_checkpoint_id}}
+                if row.parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[(w.task_id, w.channel, self._load(w.type, w.blob)) for w in writes],
+        )
+
+    # ===============================================write====================================================
+
+    def _checkpoint_rows(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> tuple[dict, list[dict]]:
+        """序列化为 (checkpoint 行, 通道值行)"""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        values: dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+
+        # 只写入本步变化的通道,未变化的通道沿用已写入的版本
+        blobs = []
+        for channel, version in new_versions.items():
+            type_, blob = self._dump(values[channel]) if channel in values else (EMPTY_TYPE, None)
+            blobs.append({
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "channel": channel,
+                "version": str(version),
+                "type": type_,
+                "blob": blob,
+            })
+        type_, data = self._dump(c)
+        metadata_type, metadata_data = self._dump(get_checkpoint_metadata(config, metadata))
+        row = {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "type": type_,
+            "checkpoint": data,
+            "metadata_type": metadata_type,
+            "checkpoint_metadata": metadata_data,
+            "created_at": _utcnow(),
+        }
+        return row, blobs
+
+    def _write_rows(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> list[dict]:
+        configurable = config["configurable"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self._dump(value)
+            rows.append({
+                "thread_id": configurable["thread_id"],
+                "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+                "checkpoint_id": configurable["checkpoint_id"],
+                "task_id": task_id,
+                "idx": WRITES_IDX_MAP.get(channel, idx),
+                "channel": channel,
+                "type": type_,
+                "blob": blob,
+                "task_path": task_path,
+            })
+        return rows
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        await self.aput_batch([(config, checkpoint, metadata, new_versions)])
+        return {
+            "configurable": {
+                "thread_id": config["configurable"]["thread_id"],
+                "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        if writes:
+            await self.aput_batch(writes=[(config, writes, task_id, task_path)])
+
+    async def aput_batch(
+        self,
+        checkpoints: Sequence[tuple[RunnableConfig, Checkpoint, CheckpointMetadata, ChannelVersions]] = (),
+        writes: Sequence[tuple[RunnableConfig, Sequence[tuple[str, Any]], str, str]] = (),
+    ) -> None:
+        """
+        在一个事务内写入多个 checkpoint 与任务写入,供写后缓冲批量落库
+
+        Args:
+            checkpoints: aput 的参数 (config, checkpoint, metadata, new_versions) 列表
+            writes: aput_writes 的参数 (config, writes, task_id, task_path) 列表
+        """
+        if not checkpoints and not writes:
+            return
+        await self.setup()
+        rows, blobs = [], []
+        for args in checkpoints:
+            row, checkpoint_blobs = self._checkpoint_rows(*args)
+            rows.append(row)
+            blobs.extend(checkpoint_blobs)
+        # 特殊通道(错误、中断等)的写入以最新一次为准,普通写入重复时保留第一次
+        keep_first, overwrite = [], []
+        for config, task_writes, task_id, task_path in writes:
+            if not task_writes:
+                continue
+            target = overwrite if all(channel in WRITES_IDX_MAP for channel, _ in task_writes) else keep_first
+            target.extend(self._write_rows(config, task_writes, task_id, task_path))
+
+        pruned = 0
+        async with self.engine.begin() as conn:
+            if blobs:
+                await conn.execute(self._insert(BLOBS), blobs)
+            if rows:
+                await conn.execute(
+                    self._insert(CHECKPOINTS, update=(
+                        "parent_checkpoint_id", "type", "checkpoint",
+                        "metadata_type", "checkpoint_metadata", "created_at",
+                    )),
+                    rows,
+                )
+            if keep_first:
+                await conn.execute(self._insert(WRITES), keep_first)
+            if overwrite:
+                await conn.execute(
+                    self._insert(WRITES, update=("channel", "type", "blob", "task_path")), overwrite
+                )
+            retained = dict.fromkeys((r["thread_id"], r["checkpoint_ns"]) for r in rows)
+            for thread_id, checkpoint_ns in retained:
+                pruned += await self._retain(conn, thread_id, checkpoint_ns, self.keep_last)
+            # 图执行时任务写入与下一个 checkpoint 并发写入,写入可能在其 checkpoint 被清理后才提交
+            for thread_id, checkpoint_ns in dict.fromkeys(
+                (r["thread_id"], r["checkpoint_ns"]) for r in keep_first + overwrite
+            ):
+                if (thread_id, checkpoint_ns) not in retained:
+                    await self._drop_stale_writes(conn, thread_id, checkpoint_ns, self.keep_last)
+        if pruned:
+            observe_checkpoints_pruned("retention", pruned)
+
+    def get_next_version(self, current: str | None, channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        # 版本号补零到固定长度,按字符串比较即按版本先后排序(清理通道值时依赖该顺序)
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ===============================================prune====================================================
+
+    async def _oldest_kept(self, conn: AsyncConnection, thread_id: str, checkpoint_ns: str, keep: int, *columns):
+        """最近 keep 个 checkpoint 中最早的一个,不足 keep 个时返回 None"""
+        return (
+            await conn.execute(
+                select(CHECKPOINTS.c.checkpoint_id, *columns)
+                .where(*self._where_ns(CHECKPOINTS, thread_id, checkpoint_ns))
+                .order_by(CHECKPOINTS.c.checkpoint_id.desc())
+                .offset(keep - 1)
+                .limit(1)
+            )
+        ).first()
+
+    async def _drop_stale_writes(self, conn: AsyncConnection, thread_id: str, checkpoint_ns: str, keep: int) -> None:
+        """删除早于保留范围的任务写入(所属 checkpoint 已被清理)"""
+        if keep <= 0:
+            return
+        oldest = await self._oldest_kept(conn, thread_id, checkpoint_ns, keep)
+        if oldest is not None:
+            await conn.execute(
+                delete(WRITES).where(
+                    *self._where_ns(WRITES, thread_id, checkpoint_ns),
+                    WRITES.c.checkpoint_id < oldest.checkpoint_id,
+                )
+            )
+
+    async def _retain(self, conn: AsyncConnection, thread_id: str, checkpoint_ns: str, keep: int) -> int:
+        """
+        只保留最近 keep 个 checkpoint,返回删除的 checkpoint 数
+
+        通道版本单调递增,保留的 checkpoint 引用的版本不早于其中最早一个引用的版本,
+        比它更早的通道值不再被引用,可以一并删除
+        """
+        if keep <= 0:
+            return 0
+        oldest = await self._oldest_kept(
+            conn, thread_id, checkpoint_ns, keep, CHECKPOINTS.c.type, CHECKPOINTS.c.checkpoint
+        )
+        if oldest is None:
+            return 0
+        deleted = (
+            await conn.execute(
+                delete(CHECKPOINTS).where(
+                    *self._where_ns(CHECKPOINTS, thread_id, checkpoint_ns),
+                    CHECKPOINTS.c.checkpoint_id < oldest.checkpoint_id,
+                )
+            )
+        ).rowcount
+        if not deleted:
+            return 0
+        await conn.execute(
+            delete(WRITES).where(
+                *self._where_ns(WRITES, thread_id, checkpoint_ns),
+                WRITES.c.checkpoint_id < oldest.checkpoint_id,
+            )
+        )
+        versions = self._load(oldest.type, oldest.checkpoint)["channel_versions"]
+        if versions:
+            await conn.execute(
+                delete(BLOBS).where(
+                    *self._where_ns(BLOBS, thread_id, checkpoint_ns),
+                    BLOBS.c.channel == bindparam("b_channel"),
+                    BLOBS.c.version < bindparam("b_version"),
+                ),
+                [{"b_channel": channel, "b_version": str(version)} for channel, version in versions.items()],
+            )
+        return deleted
+
+    async def _delete_threads(self, conn: AsyncConnection, thread_ids: Iterable[str]) -> None:
+        thread_ids = list(thread_ids)
+        for table in (WRITES, BLOBS, CHECKPOINTS):
+            await conn.execute(delete(table).where(table.c.thread_id.in_(thread_ids)))
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self.setup()
+        async with self.engine.begin() as conn:
+            await self._delete_threads(conn, [thread_id])
+
+    async def aprune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        await self.setup()
+        async with self.engine.begin() as conn:
+            if strategy == "delete":
+                await self._delete_threads(conn, thread_ids)
+                return
+            if strategy != "keep_latest":
+                raise ValueError(f"不支持的清理策略: {strategy}")
+            namespaces = await conn.execute(
+                select(CHECKPOINTS.c.thread_id, CHECKPOINTS.c.checkpoint_ns)
+                .where(CHECKPOINTS.c.thread_id.in_(list(thread_ids)))
+                .distinct()
+            )
+            for thread_id, checkpoint_ns in namespaces.all():
+                await self._retain(conn, thread_id, checkpoint_ns, 1)
+
+    async def prune_expired(self, ttl: int | None = None) -> int:
+        """
+        删除超过 ttl 秒未写入新 checkpoint 的会话
+
+        Args:
+            ttl: 过期时长(秒),默认使用 self.ttl
+
+        Returns:
+            int: 删除的会话数
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return 0
+        await self.setup()
+        cutoff = _utcnow() - timedelta(seconds=ttl)
+        removed = 0
+        while True:
+            async with self.engine.begin() as conn:
+                thread_ids = (
+                    await conn.execute(
+                        select(CHECKPOINTS.c.thread_id)
+                        .group_by(CHECKPOINTS.c.thread_id)
+                        .having(func.max(CHECKPOINTS.c.created_at) < cutoff)
+                        .limit(PRUNE_BATCH_SIZE)
+                    )
+                ).scalars().all()
+                if thread_ids:
+                    await self._delete_threads(conn, thread_ids)
+            removed += len(thread_ids)
+            if len(thread_ids) < PRUNE_BATCH_SIZE:
+                break
+        if removed:
+            observe_checkpoints_pruned("ttl", removed)
+        return removed
+
+    async def start(self) -> None:
+        """建表并启动后台清理"""
+        await self.setup()
+        self.start_pruner()
+
+    async def stop(self) -> None:
+        await self.stop_pruner()
+
+    def start_pruner(self) -> None:
+        """启动后台过期会话清理任务,ttl 为 0 或已启动时不操作"""
+        if self.ttl <= 0 or (self._pruner is not None and not self._pruner.done()):
+            return
+        self._pruner = asyncio.create_task(self._prune_loop(), name="checkpoint-pruner")
+
+    async def stop_pruner(self) -> None:
+        if self._pruner is None:
+            return
+        self._pruner.cancel()
+        try:
+            await self._pruner
+        except asyncio.CancelledError:
+            pass
+        self._pruner = None
+
+    async def _prune_loop(self) -> None:
+        while True:
+            # 多个进程同时运行清理任务,间隔加入抖动避免同时执行
+            await asyncio.sleep(self.prune_interval * random.uniform(0.8, 1.2))
+            try:
+                removed = await self.prune_expired()
+                if removed:
+                    logger.info(f"已删除 {removed} 个过期会话的checkpoint")
+            except Exception as e:
+                logger.warning(f"清理过期checkpoint失败: {e}")
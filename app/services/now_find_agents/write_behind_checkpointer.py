@@ -0,0 +1,338 @@
+"""
+写后缓冲的 checkpointer 包装
+
+每个 super-step 都同步写库会把数据库延迟放进工作流的关键路径。WriteBehindSaver 包装任意异步
+checkpointer(通常是 SQLCheckpointSaver),按 durability 决定 checkpoint 何时落库:
+
+- sync: 直接调用被包装的 checkpointer,每步写入后才继续运行
+- async: aput/aput_writes 写入内存后立即返回,后台任务每 flush_interval 秒(或积压达到 batch_size 时)
+  批量落库;被包装的 checkpointer 提供 aput_batch 时一批在一个事务内写入
+- exit: 不在后台落库,由调用方在运行结束时 aflush(thread_id) 写入(graph_registry.flush),
+  运行中途进程崩溃时本次运行的进度丢失,任务重新投递后从头运行
+
+同一会话(thread_id + 命名空间)尚未落库的连续 checkpoint 合并为最新一个: 本步未变化但被合并掉的
+checkpoint 改过的通道一并写入,恢复运行只需要最新 checkpoint 及其未完成写入,被合并的中间 checkpoint
+与其写入不落库(与 SQLCheckpointSaver 只保留最近 N 个 checkpoint 一样不保留完整历史)。
+
+读取会话前先写入该会话缓冲中的 checkpoint,读到的始终是最新状态;停止时(stop)写入全部缓冲。
+积压的会话数超过 max_pending 时 aput 等待落库,数据库不可用时内存不会无限增长。
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (BaseCheckpointSaver, ChannelVersions,
+                                       Checkpoint, CheckpointMetadata,
+                                       CheckpointTuple, copy_checkpoint)
+from loguru import logger
+
+from config.config import get_settings
+
+DURABILITY_SYNC = "sync"
+DURABILITY_ASYNC = "async"
+DURABILITY_EXIT = "exit"
+DURABILITY_MODES = (DURABILITY_SYNC, DURABILITY_ASYNC, DURABILITY_EXIT)
+
+# 落库失败后重试的最长间隔(秒)
+MAX_RETRY_INTERVAL = 30.0
+
+
+class _Pending:
+    """一个会话命名空间尚未落库的 checkpoint(可能为空)及其任务写入"""
+
+    __slots__ = ("config", "checkpoint", "metadata", "new_versions", "writes")
+
+    def __init__(
+        self,
+        config: RunnableConfig | None = None,
+        checkpoint: Checkpoint | None = None,
+        metadata: CheckpointMetadata | None = None,
+        new_versions: ChannelVersions | None = None,
+    ):
+        self.config = config
+        self.checkpoint = checkpoint
+        self.metadata = metadata
+        self.new_versions = new_versions or {}
+        # (config, writes, task_id, task_path)
+        self.writes: list[tuple[RunnableConfig, Sequence[tuple[str, Any]], str, str]] = []
+
+
+def _merge(older: _Pending, newer: _Pending) -> _Pending:
+    """
+    合并同一会话命名空间先后两次未落库的数据
+
+    newer 带 checkpoint 时取代 older: older 中变化的通道按 newer 中的版本一并写入,
+    older 的任务写入属于被取代的 checkpoint,不再需要;newer 只有任务写入时追加到 older
+    """
+    if newer.checkpoint is None:
+        older.writes.extend(newer.writes)
+        return older
+    channel_versions = newer.checkpoint["channel_versions"]
+    for channel in older.new_versions:
+        if channel not in newer.new_versions and channel in channel_versions:
+            newer.new_versions[channel] = channel_versions[channel]
+    return newer
+
+
+class WriteBehindSaver(BaseCheckpointSaver):
+    """先写内存、后台批量落库的 checkpointer 包装"""
+
+    def __init__(
+        self,
+        saver: BaseCheckpointSaver,
+        *,
+        durability: str | None = None,
+        flush_interval: float | None = None,
+        batch_size: int | None = None,
+        max_pending: int | None = None,
+    ):
+        """
+        Args:
+            saver: 被包装的异步checkpointer
+            durability: sync / async / exit,默认使用 CHECKPOINT_DURABILITY
+            flush_interval: async 模式下后台落库间隔(秒),默认使用 CHECKPOINT_FLUSH_INTERVAL
+            batch_size: 每批落库的会话数,默认使用 CHECKPOINT_FLUSH_BATCH_SIZE
+            max_pending: 积压会话数上限,超过时 aput 等待落库,默认使用 CHECKPOINT_MAX_PENDING
+        """
+        super().__init__(serde=saver.serde)
+        settings = get_settings()
+        self.saver = saver
+        self.durability = durability or settings.CHECKPOINT_DURABILITY
+        if self.durability not in DURABILITY_MODES:
+            raise ValueError(f"不支持的checkpoint持久化模式: {self.durability}")
+        self.flush_interval = settings.CHECKPOINT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.batch_size = settings.CHECKPOINT_FLUSH_BATCH_SIZE if batch_size is None else batch_size
+        self.max_pending = settings.CHECKPOINT_MAX_PENDING if max_pending is None else max_pending
+        # (thread_id, checkpoint_ns) -> 未落库的数据,按写入先后排列
+        self._pending: OrderedDict[tuple[str, str], _Pending] = OrderedDict()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self.puts = 0
+        self.coalesced = 0
+        self.flushed = 0
+        self.flush_batches = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+
+    def _key(self, config: RunnableConfig) -> tuple[str, str]:
+        configurable = config["configurable"]
+        return configurable["thread_id"], configurable.get("checkpoint_ns", "")
+
+    def _add(self, key: tuple[str, str], pending: _Pending) -> None:
+        # 合并后保持该会话在缓冲中的位置,最早未落库的会话先写入
+        existing = self._pending.get(key)
+        if existing is not None:
+            if pending.checkpoint is not None and existing.checkpoint is not None:
+                self.coalesced += 1
+            pending = _merge(existing, pending)
+        self._pending[key] = pending
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _backpressure(self) -> None:
+        if self.max_pending and len(self._pending) > self.max_pending:
+            await self.aflush()
+
+    # ===============================================write====================================================
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        if self.durability == DURABILITY_SYNC:
+            return await self.saver.aput(config, checkpoint, metadata, new_versions)
+        self.puts += 1
+        # 运行继续推进时 checkpoint 中的字典会被替换,这里保存一份浅拷贝
+        self._add(
+            self._key(config),
+            _Pending(config, copy_checkpoint(checkpoint), dict(metadata), dict(new_versions)),
+        )
+        await self._backpressure()
+        return {
+            "configurable": {
+                "thread_id": config["configurable"]["thread_id"],
+                "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        if self.durability == DURABILITY_SYNC:
+            return await self.saver.aput_writes(config, writes, task_id, task_path)
+        pending = _Pending()
+        pending.writes.append((config, list(writes), task_id, task_path))
+        self._add(self._key(config), pending)
+        await self._backpressure()
+
+    def get_next_version(self, current: str | None, channel: None) -> str:
+        return self.saver.get_next_version(current, channel)
+
+    # ===============================================read====================================================
+
+    def _has_pending(self, thread_id: str | None) -> bool:
+        if thread_id is None:
+            return bool(self._pending)
+        return any(key[0] == thread_id for key in self._pending)
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        if self._has_pending(thread_id):
+            await self.aflush(thread_id)
+        return await self.saver.aget_tuple(config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"] if config else None
+        if self._has_pending(thread_id):
+            await self.aflush(thread_id)
+        async for item in self.saver.alist(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        async with self._flush_lock:
+            for key in [key for key in self._pending if key[0] == thread_id]:
+                del self._pending[key]
+            await self.saver.adelete_thread(thread_id)
+
+    async def aprune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        for thread_id in thread_ids:
+            if self._has_pending(thread_id):
+                await self.aflush(thread_id)
+        await self.saver.aprune(thread_ids, strategy=strategy)
+
+    # ===============================================flush====================================================
+
+    async def aflush(self, thread_id: str | None = None) -> int:
+        """
+        把缓冲中的数据写入被包装的checkpointer
+
+        Args:
+            thread_id: 只写入该会话,为空时写入全部
+
+        Returns:
+            int: 写入的会话命名空间数
+
+        Raises:
+            写入失败时抛出被包装checkpointer的异常,未写入的数据放回缓冲
+        """
+        written = 0
+        async with self._flush_lock:
+            while True:
+                keys = [key for key in self._pending if thread_id is None or key[0] == thread_id]
+                if not keys:
+                    return written
+                batch = [(key, self._pending.pop(key)) for key in keys[: self.batch_size]]
+                started = time.perf_counter()
+                try:
+                    await self._write(batch)
+                except BaseException:
+                    self._requeue(batch)
+                    self.flush_errors += 1
+                    raise
+                self.last_flush_ms = (time.perf_counter() - started) * 1000
+                self.flush_batches += 1
+                self.flushed += len(batch)
+                written += len(batch)
+
+    async def _write(self, batch: list[tuple[tuple[str, str], _Pending]]) -> None:
+        checkpoints = [
+            (p.config, p.checkpoint, p.metadata, p.new_versions) for _, p in batch if p.checkpoint is not None
+        ]
+        writes = [w for _, p in batch for w in p.writes]
+        aput_batch = getattr(self.saver, "aput_batch", None)
+        if aput_batch is not None:
+            await aput_batch(checkpoints, writes)
+            return
+        for args in checkpoints:
+            await self.saver.aput(*args)
+        for args in writes:
+            await self.saver.aput_writes(*args)
+
+    def _requeue(self, batch: list[tuple[tuple[str, str], _Pending]]) -> None:
+        """落库失败的数据放回缓冲最前面,期间新写入的数据合并在其后"""
+        for key, pending in reversed(batch):
+            newer = self._pending.pop(key, None)
+            self._pending[key] = pending if newer is None else _merge(pending, newer)
+            self._pending.move_to_end(key, last=False)
+
+    # ===============================================lifecycle====================================================
+
+    async def start(self) -> None:
+        """启动被包装的checkpointer,async 模式下启动后台落库任务"""
+        start = getattr(self.saver, "start", None)
+        if start is not None:
+            await start()
+        if self.durability == DURABILITY_ASYNC and (self._flusher is None or self._flusher.done()):
+            self._flusher = asyncio.create_task(self._flush_loop(), name="checkpoint-write-behind")
+
+    async def stop(self) -> None:
+        """停止后台任务并写入全部缓冲"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        try:
+            flushed = await self.aflush()
+            if flushed:
+                logger.info(f"停止前写入 {flushed} 个会话的checkpoint")
+        except Exception as e:
+            logger.error(f"停止前写入checkpoint失败,{len(self._pending)} 个会话的最新进度丢失: {e}")
+        stop = getattr(self.saver, "stop", None)
+        if stop is not None:
+            await stop()
+
+    async def _flush_loop(self) -> None:
+        retry_interval = self.flush_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), retry_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.aflush()
+                retry_interval = self.flush_interval
+            except Exception as e:
+                retry_interval = min(max(retry_interval * 2, 0.1), MAX_RETRY_INTERVAL)
+                logger.warning(
+                    f"checkpoint落库失败,{len(self._pending)} 个会话等待重试({retry_interval:.1f}s后): {e}"
+                )
+
+    def stats(self) -> dict:
+        """缓冲中的会话数与落库统计,被包装的checkpointer有统计时一并返回"""
+        saver_stats = getattr(self.saver, "stats", None)
+        return {
+            "durability": self.durability,
+            "saver": type(self.saver).__name__,
+            "pending": len(self._pending),
+            "puts": self.puts,
+            "coalesced": self.coalesced,
+            "flushed": self.flushed,
+            "flush_batches": self.flush_batches,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "saver_stats": saver_stats() if saver_stats is not None else None,
+        }
@@ -0,0 +1,371 @@
+"""
+Redis 分布式限流
+
+令牌桶与滑动窗口均以 Lua 脚本在 Redis 中原子执行,时间取自 Redis TIME,各 worker 的本地时钟偏差不影响结果:
+
+- TokenBucketLimiter: 令牌桶,允许不超过 capacity 的突发;prefetch > 1 时一次从 Redis 预取多个令牌,
+  在本地 prefetch_ttl 秒内消耗,减少每次调用的 Redis 往返(未用完的令牌过期后作废,限流只会更保守)
+- SlidingWindowLimiter: 滑动窗口,任意 window 秒内最多 limit 次
+
+键按业务自定义,如 "provider:openai"、"model:gpt-4o"、"hr:123"。限流器按 rules 为不同的键配置速率,
+没有匹配规则且未配置默认速率的键不限流。Redis 不可用时默认放行(fail_open),避免限流本身导致服务不可用。
+
+用法:
+    async with llm_rate_limiter.limit("model:gpt-4o"):
+        response = await llm.ainvoke(messages)
+
+    @router.post("/run", dependencies=[Depends(rate_limit(api_rate_limiter, key_func=by_client_ip))])
+"""
+
+import asyncio
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from contextlib import asynccontextmanager
+from typing import Any
+
+from fastapi import HTTPException, Request, status
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.services.redis import AsyncRedisService
+from app.support.metrics import observe_rate_limit
+from config.config import get_settings
+
+KEY_PREFIX = "ratelimit"
+
+# 返回 {本次获得的令牌数, 令牌不足时需要等待的毫秒数}
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local min_tokens = tonumber(ARGV[3])
+local max_tokens = tonumber(ARGV[4])
+if redis.replicate_commands then pcall(redis.replicate_commands) end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+elseif now > ts then
+    tokens = math.min(capacity, tokens + (now - ts) * rate / 1000)
+end
+
+local granted = 0
+local wait_ms = 0
+if tokens >= min_tokens then
+    granted = math.min(math.floor(tokens), max_tokens)
+    tokens = tokens - granted
+else
+    wait_ms = math.ceil((min_tokens - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return {granted, wait_ms}
+"""
+
+# 返回 {本次获得的次数, 超限时需要等待的毫秒数}
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local n = tonumber(ARGV[3])
+local nonce = ARGV[4]
+if redis.replicate_commands then pcall(redis.replicate_commands) end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count + n <= limit then
+    for i = 1, n do
+        redis.call('ZADD', KEYS[1], now, nonce .. ':' .. i)
+    end
+    redis.call('PEXPIRE', KEYS[1], window)
+    return {n, 0}
+end
+
+-- 需要等到第 (count + n - limit) 早的记录移出窗口
+local index = count + n - limit - 1
+local entry = redis.call('ZRANGE', KEYS[1], index, index, 'WITHSCORES')
+local wait_ms = window
+if entry[2] then
+    wait_ms = tonumber(entry[2]) + window - now
+end
+return {0, math.max(wait_ms, 1)}
+"""
+
+
+class RateLimitExceeded(Exception):
+    """在等待时间内未能获得令牌"""
+
+    def __init__(self, key: str, retry_after: float):
+        super().__init__(f"触发限流: {key}, {retry_after:.2f}秒后重试")
+        self.key = key
+        self.retry_after = retry_after
+
+
+class _BaseLimiter(ABC):
+    """限流器公共逻辑: 规则匹配、等待重试、上下文管理器"""
+
+    script_source = ""
+
+    def __init__(self, name: str, rules: dict[str, dict] | None = None, fail_open: bool = True):
+        self.name = name
+        self.rules = rules or {}
+        self.fail_open = fail_open
+        self._script = None
+        self._script_client = None
+
+    def set_rules(self, rules: dict[str, dict]) -> None:
+        """更新按键配置的限流规则(可由 Nacos 配置变更时调用)"""
+        self.rules = rules or {}
+
+    @abstractmethod
+    def _rule(self, key: str) -> dict | None:
+        """键对应的限流规则,不限流时返回 None"""
+
+    @abstractmethod
+    async def _call(self, key: str, rule: dict, tokens: int) -> tuple[int, float]:
+        """执行限流脚本,返回 (获得的令牌数,0 为未获得; 未获得时需要等待的秒数)"""
+
+    def _redis_key(self, key: str) -> str:
+        return f"{KEY_PREFIX}:{self.name}:{key}"
+
+    def _get_script(self):
+        # 绑定的客户端变化时(如测试或重启)重新注册脚本,EVALSHA 未命中时 redis-py 自动 SCRIPT LOAD
+        client = AsyncRedisService._get_connection()
+        if self._script is None or self._script_client is not client:
+            self._script = client.register_script(self.script_source)
+            self._script_client = client
+        return self._script
+
+    async def try_acquire(self, key: str, tokens: int = 1) -> tuple[bool, float]:
+        """
+        尝试获取令牌,不等待
+
+        Args:
+            key: 限流键
+            tokens: 需要的令牌数
+
+        Returns:
+            Tuple[bool, float]: 是否获得令牌,以及未获得时建议等待的秒数
+        """
+        rule = self._rule(key)
+        if rule is None:
+            return True, 0.0
+        try:
+            granted, wait = await self._call(key, rule, tokens)
+        except (RedisError, OSError, RuntimeError) as e:
+            observe_rate_limit(self.name, "error")
+            if self.fail_open:
+                logger.warning(f"限流器 {self.name} 不可用,放行请求: {e}")
+                return True, 0.0
+            raise
+        observe_rate_limit(self.name, "allowed" if granted else "throttled")
+        return bool(granted), wait
+
+    async def acquire(self, key: str, tokens: int = 1, timeout: float | None = None) -> None:
+        """
+        获取令牌,不足时按 Redis 返回的等待时间休眠后重试
+
+        Args:
+            key: 限流键
+            tokens: 需要的令牌数
+            timeout: 最长等待时间(秒),None 为一直等待,0 为不等待
+
+        Raises:
+            RateLimitExceeded: 超过 timeout 仍未获得令牌
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            ok, wait = await self.try_acquire(key, tokens)
+            if ok:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise RateLimitExceeded(key, wait)
+            await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def limit(self, *keys: str, tokens: int = 1, timeout: float | None = None):
+        """
+        异步上下文管理器,进入时依次获取所有键的令牌
+
+        Args:
+            keys: 一个或多个限流键,如 ("provider:openai", "model:gpt-4o")
+            tokens: 每个键需要的令牌数
+            timeout: 每个键的最长等待时间(秒)
+        """
+        for key in keys:
+            await self.acquire(key, tokens, timeout)
+        yield
+
+
+class TokenBucketLimiter(_BaseLimiter):
+    """
+    令牌桶限流器
+
+    rules 格式: {"model:gpt-4o": {"rate": 5, "capacity": 10}},rate 为每秒补充的令牌数,
+    capacity 为桶容量(允许的突发量,默认等于 rate)
+    """
+
+    script_source = TOKEN_BUCKET_SCRIPT
+
+    def __init__(
+        self,
+        name: str,
+        rate: float | None = None,
+        capacity: float | None = None,
+        rules: dict[str, dict] | None = None,
+        prefetch: int = 1,
+        prefetch_ttl: float = 1.0,
+        fail_open: bool = True,
+    ):
+        """
+        Args:
+            name: 限流器名称,用于 Redis 键前缀与指标标签
+            rate: 默认每秒补充的令牌数,None 表示没有规则的键不限流
+            capacity: 默认桶容量
+            rules: 按键配置的速率与容量
+            prefetch: 每次从 Redis 预取的令牌数,1 表示不预取
+            prefetch_ttl: 预取令牌在本地的有效期(秒)
+            fail_open: Redis 不可用时是否放行
+        """
+        super().__init__(name, rules, fail_open)
+        self.rate = rate
+        self.capacity = capacity
+        self.prefetch = max(prefetch, 1)
+        self.prefetch_ttl = prefetch_ttl
+        # key -> [剩余令牌数, 过期时间]
+        self._local: dict[str, list[float]] = {}
+
+    def _rule(self, key: str) -> dict | None:
+        rule = self.rules.get(key)
+        if rule is None:
+            if self.rate is None:
+                return None
+            rule = {"rate": self.rate, "capacity": self.capacity}
+        rate = float(rule["rate"])
+        return {"rate": rate, "capacity": float(rule.get("capacity") or rate)}
+
+    def _take_local(self, key: str, tokens: int) -> bool:
+        local = self._local.get(key)
+        if local is None:
+            return False
+        if local[1] < time.monotonic():
+            del self._local[key]
+            return False
+        if local[0] < tokens:
+            return False
+        local[0] -= tokens
+        return True
+
+    async def _call(self, key: str, rule: dict, tokens: int) -> tuple[int, float]:
+        if tokens > rule["capacity"]:
+            raise ValueError(f"请求的令牌数 {tokens} 超过桶容量 {rule['capacity']}")
+        if self.prefetch > 1 and self._take_local(key, tokens):
+            return tokens, 0.0
+
+        max_tokens = max(tokens, min(self.prefetch, int(rule["capacity"])))
+        granted, wait_ms = await self._get_script()(
+            keys=[self._redis_key(key)],
+            args=[rule["rate"], rule["capacity"], tokens, max_tokens],
+        )
+        granted = int(granted)
+        if granted > tokens:
+            self._local[key] = [granted - tokens, time.monotonic() + self.prefetch_ttl]
+        return granted, int(wait_ms) / 1000
+
+
+class SlidingWindowLimiter(_BaseLimiter):
+    """
+    滑动窗口限流器
+
+    rules 格式: {"hr:123": {"limit": 100, "window": 60}},任意 window 秒内最多 limit 次
+    """
+
+    script_source = SLIDING_WINDOW_SCRIPT
+
+    def __init__(
+        self,
+        name: str,
+        limit: int | None = None,
+        window: float = 60.0,
+        rules: dict[str, dict] | None = None,
+        fail_open: bool = True,
+    ):
+        """
+        Args:
+            name: 限流器名称,用于 Redis 键前缀与指标标签
+            limit: 默认窗口内允许的次数,None 表示没有规则的键不限流
+            window: 默认窗口长度(秒)
+            rules: 按键配置的次数与窗口
+            fail_open: Redis 不可用时是否放行
+        """
+        super().__init__(name, rules, fail_open)
+        self.limit_count = limit
+        self.window = window
+
+    def _rule(self, key: str) -> dict | None:
+        rule = self.rules.get(key)
+        if rule is None:
+            if self.limit_count is None:
+                return None
+            rule = {"limit": self.limit_count, "window": self.window}
+        return {"limit": int(rule["limit"]), "window": float(rule.get("window") or self.window)}
+
+    async def _call(self, key: str, rule: dict, tokens: int) -> tuple[int, float]:
+        if tokens > rule["limit"]:
+            raise ValueError(f"请求次数 {tokens} 超过窗口上限 {rule['limit']}")
+        granted, wait_ms = await self._get_script()(
+            keys=[self._redis_key(key)],
+            args=[rule["limit"], int(rule["window"] * 1000), tokens, uuid.uuid4().hex],
+        )
+        return int(granted), int(wait_ms) / 1000
+
+
+# ===============================================fastapi====================================================
+
+
+def by_client_ip(request: Request) -> str:
+    """按客户端IP限流"""
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def rate_limit(
+    limiter: _BaseLimiter,
+    key_func: Callable[[Request], str] = by_client_ip,
+    tokens: int = 1,
+) -> Callable[[Request], Any]:
+    """
+    创建 FastAPI 限流依赖,超限时返回 429 并带 Retry-After 响应头
+
+    Args:
+        limiter: 限流器
+        key_func: 从请求中提取限流键,如按 hr_id: lambda r: f"hr:{r.query_params['hr_id']}"
+        tokens: 每个请求消耗的令牌数
+    """
+
+    async def dependency(request: Request) -> None:
+        key = key_func(request)
+        ok, wait = await limiter.try_acquire(key, tokens)
+        if not ok:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="请求过于频繁,请稍后重试",
+                headers={"Retry-After": str(max(1, round(wait)))},
+            )
+
+    return dependency
+
+
+# 全局 LLM 调用限流器,按 LLM_RATE_LIMITS 为提供商/模型配置速率,未配置的键不限流
+_settings = get_settings()
+llm_rate_limiter = TokenBucketLimiter(
+    "llm",
+    rules=_settings.LLM_RATE_LIMITS,
+    prefetch=_settings.LLM_RATE_LIMIT_PREFETCH,
+    fail_open=_settings.RATE_LIMIT_FAIL_OPEN,
+)
@@ -1,37 +1,149 @@
+import threading
+from collections.abc import Awaitable, Callable, Iterator, Sequence
 from typing import Any
 
-from redis import StrictRedis
+from redis import ConnectionPool, StrictRedis
+from redis.asyncio import Redis
+from redis.client import NEVER_DECODE, Pipeline
 
+from app.support.codec import decode, get_codec
+from app.support.metrics import observe_redis_pool, register_scrape_hook
+from app.support.tracing import TracedStrictRedis
 from config.config import get_settings
 
 settings = get_settings()
 
+# 批量操作每个管道批次/UNLINK 的键数量,避免单次请求或响应过大
+BATCH_SIZE = 500
+
+# 对象值为编码后的二进制,读取时跳过客户端的 decode_responses
+_RAW_RESPONSE = {NEVER_DECODE: []}
+
+
+def _chunks(items: Sequence, size: int) -> Iterator[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _expire_for(key: str, expire_seconds: int | dict[str, int] | None) -> int:
+    """批量写入时计算单个键的过期时间"""
+    if isinstance(expire_seconds, dict):
+        expire_seconds = expire_seconds.get(key)
+    return expire_seconds if expire_seconds is not None else settings.REDIS_EXPIRE
+
+
+def _pool_stats(pool) -> dict[str, int | None]:
+    """读取连接池的连接数统计(同步/异步连接池结构一致)"""
+    available = len(getattr(pool, "_available_connections", ()))
+    in_use = len(getattr(pool, "_in_use_connections", ()))
+    return {
+        "max_connections": pool.max_connections,
+        "created": available + in_use,
+        "in_use": in_use,
+        "available": available,
+    }
+
 
 class RedisService:
     """
     同步 Redis 数据库操作服务类
 
-    当需要在同步环境中与Redis交互时,使用本类替代异步Redis客户端
+    当需要在同步环境中与Redis交互时,使用本类替代异步Redis客户端。
+    所有调用共享同一个按配置创建的 ConnectionPool,连接在调用之间复用;
+    redis-py 的连接池在 fork 后会自动重建,多 worker 部署时各进程互不影响。
+    *_value 方法读写原始字符串,*_object 方法通过 app.support.codec 编解码任意对象。
+
+    注意: 同步调用会阻塞事件循环,在异步代码中请使用 AsyncRedisService
     """
 
-    @staticmethod
-    def _get_connection() -> StrictRedis:
+    _pool: ConnectionPool | None = None
+    _client: StrictRedis | None = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _get_pool(cls) -> ConnectionPool:
+        """
+        获取共享连接池(首次调用时按配置创建)
+
+        Returns:
+            ConnectionPool: Redis连接池
+        """
+        if cls._pool is None:
+            with cls._lock:
+                if cls._pool is None:
+                    cls._pool = ConnectionPool(
+                        host=settings.REDIS_HOST,
+                        port=settings.REDIS_PORT,
+                        db=settings.REDIS_DB,
+                        password=settings.REDIS_PASSWORD or None,
+                        decode_responses=True,
+                        max_connections=settings.REDIS_MAX_CONNECTIONS,
+                        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+                        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+                    )
+        return cls._pool
+
+    @classmethod
+    def _get_connection(cls) -> StrictRedis:
+        """
+        获取Redis数据库客户端
+
+        Returns:
+            StrictRedis: 绑定共享连接池的Redis客户端
+        """
+        if cls._client is None:
+            cls._client = TracedStrictRedis(connection_pool=cls._get_pool())
+        return cls._client
+
+    @classmethod
+    def pipeline(cls, transaction: bool = False) -> Pipeline:
+        """
+        创建管道,多条命令在 execute() 时一次往返发送
+
+        用法:
+            with RedisService.pipeline() as pipe:
+                pipe.set("a", 1).expire("a", 60).hget("h", "k")
+                results = pipe.execute()
+
+        Args:
+            transaction: 是否以 MULTI/EXEC 事务方式执行
+
+        Returns:
+            Pipeline: Redis管道
+        """
+        return cls._get_connection().pipeline(transaction=transaction)
+
+    @classmethod
+    def transaction(cls, func: Callable[[Pipeline], Any], *watches: str, **kwargs) -> Any:
         """
-        获取Redis数据库连接
+        以 WATCH/MULTI/EXEC 乐观锁方式执行事务,被监视的键在执行期间被修改时自动重试
+
+        Args:
+            func: 接收管道的函数,在 pipe.multi() 之前可读取被监视的键
+            watches: 需要监视的键
+            kwargs: 透传给 redis-py transaction,如 value_from_callable、watch_delay
 
         Returns:
-            StrictRedis: Redis客户端连接
+            Any: 默认为 EXEC 的结果列表
+        """
+        return cls._get_connection().transaction(func, *watches, **kwargs)
+
+    @classmethod
+    def pool_stats(cls) -> dict[str, int | None]:
         """
-        host = settings.REDIS_HOST
-        port = settings.REDIS_PORT
-        db = settings.REDIS_DB
-        password = settings.REDIS_PASSWORD
+        获取连接池统计
 
-        if password:
-            return StrictRedis(
-                host=host, port=port, db=db, password=password, decode_responses=True
-            )
-        return StrictRedis(host=host, port=port, db=db, decode_responses=True)
+        Returns:
+            Dict[str, int]: 最大连接数、已创建、使用中与空闲的连接数
+        """
+        return _pool_stats(cls._get_pool())
+
+    @classmethod
+    def close(cls) -> None:
+        """断开连接池中的所有连接"""
+        if cls._pool is not None:
+            cls._pool.disconnect()
 
     @classmethod
     def set_value(cls, key: str, value: Any, expire_seconds: int | None = None) -> None:
@@ -87,7 +199,7 @@ class RedisService:
             mapping: 包含键值对的字典
         """
         redis_client = cls._get_connection()
-        redis_client.hmset(hash_name, mapping)
+        redis_client.hset(hash_name, mapping=mapping)
 
     @classmethod
     def hash_get(cls, hash_name: str, key: str) -> str | None:
@@ -157,3 +269,495 @@ class RedisService:
         )
         redis_client = cls._get_connection()
         redis_client.expire(key, expiration)
+
+    # ===============================================batch====================================================
+
+    @classmethod
+    def get_values(cls, keys: Sequence[str]) -> list[str | None]:
+        """
+        批量读取键值,超过 BATCH_SIZE 的键分块通过同一管道发送 MGET
+
+        Args:
+            keys: 键名列表
+
+        Returns:
+            List[Optional[str]]: 与 keys 顺序一致的值,不存在的键为None
+        """
+        if not keys:
+            return []
+        with cls.pipeline() as pipe:
+            for chunk in _chunks(keys, BATCH_SIZE):
+                pipe.mget(chunk)
+            return [value for values in pipe.execute() for value in values]
+
+    @classmethod
+    def set_values(
+        cls, mapping: dict[str, Any], expire_seconds: int | dict[str, int] | None = None
+    ) -> None:
+        """
+        批量写入键值对,通过管道分块发送 SET,每个键可使用不同的过期时间
+
+        Args:
+            mapping: 键值对
+            expire_seconds: 统一的过期时间(秒),或 键名->过期时间 的字典(未列出的键使用默认配置)
+        """
+        if not mapping:
+            return
+        with cls.pipeline() as pipe:
+            for chunk in _chunks(list(mapping.items()), BATCH_SIZE):
+                for key, value in chunk:
+                    pipe.set(key, value, ex=_expire_for(key, expire_seconds))
+                pipe.execute()
+
+    @classmethod
+    def hash_get_all_many(cls, hash_names: Sequence[str]) -> list[dict[str, str]]:
+        """
+        批量获取多个哈希表的所有字段和值
+
+        Args:
+            hash_names: 哈希表名列表
+
+        Returns:
+            List[Dict[str, str]]: 与 hash_names 顺序一致的结果,不存在的哈希表为空字典
+        """
+        results = []
+        with cls.pipeline() as pipe:
+            for chunk in _chunks(hash_names, BATCH_SIZE):
+                for hash_name in chunk:
+                    pipe.hgetall(hash_name)
+                results.extend(pipe.execute())
+        return results
+
+    @classmethod
+    def delete_pattern(cls, pattern: str, batch_size: int = BATCH_SIZE) -> int:
+        """
+        按模式批量删除键,使用 SCAN 增量遍历并分块 UNLINK,不会像 KEYS 一样阻塞Redis
+
+        Args:
+            pattern: 键名匹配模式,如 "agent:cache:*"
+            batch_size: 每次 SCAN 的 COUNT 提示及每次 UNLINK 的键数量
+
+        Returns:
+            int: 删除的键数量
+        """
+        redis_client = cls._get_connection()
+        deleted = 0
+        batch = []
+        for key in redis_client.scan_iter(match=pattern, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                deleted += redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += redis_client.unlink(*batch)
+        return deleted
+
+    # ===============================================object====================================================
+
+    @classmethod
+    def set_object(cls, key: str, obj: Any, expire_seconds: int | None = None) -> None:
+        """
+        编码后写入对象,编码格式与压缩由 REDIS_CODEC_* 配置决定,读取使用 get_object
+
+        Args:
+            key: 键名
+            obj: 可序列化的对象
+            expire_seconds: 过期时间(秒),默认使用配置文件中的设置
+        """
+        expiration = (
+            expire_seconds if expire_seconds is not None else settings.REDIS_EXPIRE
+        )
+        cls._get_connection().set(key, get_codec().encode(obj), ex=expiration)
+
+    @classmethod
+    def get_object(cls, key: str) -> Any:
+        """
+        读取并解码对象,兼容旧版直接写入的 JSON 字符串
+
+        Args:
+            key: 键名
+
+        Returns:
+            Any: 解码后的对象,如果不存在则为None
+        """
+        return decode(cls._get_connection().execute_command("GET", key, **_RAW_RESPONSE))
+
+    @classmethod
+    def set_objects(
+        cls, mapping: dict[str, Any], expire_seconds: int | dict[str, int] | None = None
+    ) -> None:
+        """
+        批量编码并写入对象,参数同 set_values
+
+        Args:
+            mapping: 键->对象
+            expire_seconds: 统一的过期时间(秒),或 键名->过期时间 的字典(未列出的键使用默认配置)
+        """
+        codec = get_codec()
+        cls.set_values({key: codec.encode(obj) for key, obj in mapping.items()}, expire_seconds)
+
+    @classmethod
+    def get_objects(cls, keys: Sequence[str]) -> list[Any]:
+        """
+        批量读取并解码对象
+
+        Args:
+            keys: 键名列表
+
+        Returns:
+            List[Any]: 与 keys 顺序一致的对象,不存在的键为None
+        """
+        if not keys:
+            return []
+        with cls.pipeline() as pipe:
+            for chunk in _chunks(keys, BATCH_SIZE):
+                pipe.execute_command("MGET", *chunk, **_RAW_RESPONSE)
+            return [decode(value) for values in pipe.execute() for value in values]
+
+
+class AsyncRedisService:
+    """
+    异步 Redis 数据库操作服务类
+
+    与 RedisService 接口一致的异步版本,复用应用启动时创建的 app.redis 客户端及其连接池,
+    由 lifespan 调用 bind() 绑定
+    """
+
+    _client: Redis | None = None
+
+    @classmethod
+    def bind(cls, client: Redis) -> None:
+        """
+        绑定异步Redis客户端
+
+        Args:
+            client: 应用共享的异步Redis客户端(app.redis)
+        """
+        cls._client = client
+
+    @classmethod
+    def is_bound(cls) -> bool:
+        return cls._client is not None
+
+    @classmethod
+    def _get_connection(cls) -> Redis:
+        """
+        获取已绑定的异步Redis客户端
+
+        Returns:
+            Redis: 异步Redis客户端
+        """
+        if cls._client is None:
+            raise RuntimeError("AsyncRedisService 未绑定Redis客户端,请在应用启动后使用")
+        return cls._client
+
+    @classmethod
+    def pipeline(cls, transaction: bool = False):
+        """
+        创建异步管道,多条命令在 await pipe.execute() 时一次往返发送
+
+        用法:
+            async with AsyncRedisService.pipeline() as pipe:
+                pipe.set("a", 1).expire("a", 60)
+                results = await pipe.execute()
+
+        Args:
+            transaction: 是否以 MULTI/EXEC 事务方式执行
+        """
+        return cls._get_connection().pipeline(transaction=transaction)
+
+    @classmethod
+    async def transaction(
+        cls, func: Callable[[Any], Awaitable[Any]], *watches: str, **kwargs
+    ) -> Any:
+        """
+        以 WATCH/MULTI/EXEC 乐观锁方式执行事务,被监视的键在执行期间被修改时自动重试
+
+        Args:
+            func: 接收管道的协程函数,在 pipe.multi() 之前可读取被监视的键
+            watches: 需要监视的键
+            kwargs: 透传给 redis-py transaction,如 value_from_callable、watch_delay
+        """
+        return await cls._get_connection().transaction(func, *watches, **kwargs)
+
+    @classmethod
+    def pool_stats(cls) -> dict[str, int | None]:
+        """
+        获取连接池统计
+
+        Returns:
+            Dict[str, int]: 最大连接数、已创建、使用中与空闲的连接数
+        """
+        return _pool_stats(cls._get_connection().connection_pool)
+
+    @classmethod
+    async def set_value(cls, key: str, value: Any, expire_seconds: int | None = None) -> None:
+        """
+        写入键值对
+
+        Args:
+            key: 键名
+            value: 键值
+            expire_seconds: 过期时间(秒),默认使用配置文件中的设置
+        """
+        expiration = (
+            expire_seconds if expire_seconds is not None else settings.REDIS_EXPIRE
+        )
+        await cls._get_connection().set(key, value, ex=expiration)
+
+    @classmethod
+    async def get_value(cls, key: str) -> str | None:
+        """
+        读取键值
+
+        Args:
+            key: 键名
+
+        Returns:
+            Optional[str]: 键值,如果不存在则为None
+        """
+        return await cls._get_connection().get(key)
+
+    @classmethod
+    async def hash_set(cls, hash_name: str, key: str, value: Any) -> None:
+        """
+        设置哈希表中的字段值
+
+        Args:
+            hash_name: 哈希表名
+            key: 字段名
+            value: 字段值
+        """
+        await cls._get_connection().hset(hash_name, key, value)
+
+    @classmethod
+    async def hash_multi_set(cls, hash_name: str, mapping: dict[str, Any]) -> None:
+        """
+        批量设置哈希表字段
+
+        Args:
+            hash_name: 哈希表名
+            mapping: 包含键值对的字典
+        """
+        await cls._get_connection().hset(hash_name, mapping=mapping)
+
+    @classmethod
+    async def hash_get(cls, hash_name: str, key: str) -> str | None:
+        """
+        获取哈希表中指定字段的值
+
+        Args:
+            hash_name: 哈希表名
+            key: 字段名
+
+        Returns:
+            Optional[str]: 字段值,如果不存在则为None
+        """
+        return await cls._get_connection().hget(hash_name, key)
+
+    @classmethod
+    async def hash_get_all(cls, hash_name: str) -> dict[str, str]:
+        """
+        获取哈希表中所有字段和值
+
+        Args:
+            hash_name: 哈希表名
+
+        Returns:
+            Dict[str, str]: 哈希表中所有字段和值的字典
+        """
+        return await cls._get_connection().hgetall(hash_name)
+
+    @classmethod
+    async def delete(cls, *keys: str) -> None:
+        """
+        删除一个或多个键
+
+        Args:
+            keys: 要删除的键列表
+        """
+        await cls._get_connection().delete(*keys)
+
+    @classmethod
+    async def hash_delete(cls, hash_name: str, key: str) -> None:
+        """
+        从哈希表中删除指定字段
+
+        Args:
+            hash_name: 哈希表名
+            key: 要删除的字段名
+        """
+        await cls._get_connection().hdel(hash_name, key)
+
+    @classmethod
+    async def set_expire(cls, key: str, expire_seconds: int | None = None) -> None:
+        """
+        设置键的过期时间
+
+        Args:
+            key: 键名
+            expire_seconds: 过期时间(秒),如果未提供则使用默认配置
+        """
+        expiration = (
+            expire_seconds if expire_seconds is not None else settings.REDIS_EXPIRE
+        )
+        await cls._get_connection().expire(key, expiration)
+
+    # ===============================================batch====================================================
+
+    @classmethod
+    async def get_values(cls, keys: Sequence[str]) -> list[str | None]:
+        """
+        批量读取键值,超过 BATCH_SIZE 的键分块通过同一管道发送 MGET
+
+        Args:
+            keys: 键名列表
+
+        Returns:
+            List[Optional[str]]: 与 keys 顺序一致的值,不存在的键为None
+        """
+        if not keys:
+            return []
+        async with cls.pipeline() as pipe:
+            for chunk in _chunks(keys, BATCH_SIZE):
+                pipe.mget(chunk)
+            return [value for values in await pipe.execute() for value in values]
+
+    @classmethod
+    async def set_values(
+        cls, mapping: dict[str, Any], expire_seconds: int | dict[str, int] | None = None
+    ) -> None:
+        """
+        批量写入键值对,通过管道分块发送 SET,每个键可使用不同的过期时间
+
+        Args:
+            mapping: 键值对
+            expire_seconds: 统一的过期时间(秒),或 键名->过期时间 的字典(未列出的键使用默认配置)
+        """
+        if not mapping:
+            return
+        async with cls.pipeline() as pipe:
+            for chunk in _chunks(list(mapping.items()), BATCH_SIZE):
+                for key, value in chunk:
+                    pipe.set(key, value, ex=_expire_for(key, expire_seconds))
+                await pipe.execute()
+
+    @classmethod
+    async def hash_get_all_many(cls, hash_names: Sequence[str]) -> list[dict[str, str]]:
+        """
+        批量获取多个哈希表的所有字段和值
+
+        Args:
+            hash_names: 哈希表名列表
+
+        Returns:
+            List[Dict[str, str]]: 与 hash_names 顺序一致的结果,不存在的哈希表为空字典
+        """
+        results = []
+        async with cls.pipeline() as pipe:
+            for chunk in _chunks(hash_names, BATCH_SIZE):
+                for hash_name in chunk:
+                    pipe.hgetall(hash_name)
+                results.extend(await pipe.execute())
+        return results
+
+    @classmethod
+    async def delete_pattern(cls, pattern: str, batch_size: int = BATCH_SIZE) -> int:
+        """
+        按模式批量删除键,使用 SCAN 增量遍历并分块 UNLINK,不会像 KEYS 一样阻塞Redis
+
+        Args:
+            pattern: 键名匹配模式,如 "agent:cache:*"
+            batch_size: 每次 SCAN 的 COUNT 提示及每次 UNLINK 的键数量
+
+        Returns:
+            int: 删除的键数量
+        """
+        redis_client = cls._get_connection()
+        deleted = 0
+        batch = []
+        async for key in redis_client.scan_iter(match=pattern, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                deleted += await redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += await redis_client.unlink(*batch)
+        return deleted
+
+    # ===============================================object====================================================
+
+    @classmethod
+    async def set_object(cls, key: str, obj: Any, expire_seconds: int | None = None) -> None:
+        """
+        编码后写入对象,编码格式与压缩由 REDIS_CODEC_* 配置决定,读取使用 get_object
+
+        Args:
+            key: 键名
+            obj: 可序列化的对象
+            expire_seconds: 过期时间(秒),默认使用配置文件中的设置
+        """
+        expiration = (
+            expire_seconds if expire_seconds is not None else settings.REDIS_EXPIRE
+        )
+        await cls._get_connection().set(key, get_codec().encode(obj), ex=expiration)
+
+    @classmethod
+    async def get_object(cls, key: str) -> Any:
+        """
+        读取并解码对象,兼容旧版直接写入的 JSON 字符串
+
+        Args:
+            key: 键名
+
+        Returns:
+            Any: 解码后的对象,如果不存在则为None
+        """
+        return decode(
+            await cls._get_connection().execute_command("GET", key, **_RAW_RESPONSE)
+        )
+
+    @classmethod
+    async def set_objects(
+        cls, mapping: dict[str, Any], expire_seconds: int | dict[str, int] | None = None
+    ) -> None:
+        """
+        批量编码并写入对象,参数同 set_values
+
+        Args:
+            mapping: 键->对象
+            expire_seconds: 统一的过期时间(秒),或 键名->过期时间 的字典(未列出的键使用默认配置)
+        """
+        codec = get_codec()
+        await cls.set_values(
+            {key: codec.encode(obj) for key, obj in mapping.items()}, expire_seconds
+        )
+
+    @classmethod
+    async def get_objects(cls, keys: Sequence[str]) -> list[Any]:
+        """
+        批量读取并解码对象
+
+        Args:
+            keys: 键名列表
+
+        Returns:
+            List[Any]: 与 keys 顺序一致的对象,不存在的键为None
+        """
+        if not keys:
+            return []
+        async with cls.pipeline() as pipe:
+            for chunk in _chunks(keys, BATCH_SIZE):
+                pipe.execute_command("MGET", *chunk, **_RAW_RESPONSE)
+            return [decode(value) for values in await pipe.execute() for value in values]
+
+
+def _refresh_pool_metrics() -> None:
+    # 只刷新已创建的连接池,抓取指标不应触发连接池创建
+    if RedisService._pool is not None:
+        observe_redis_pool("sync", RedisService.pool_stats())
+    if AsyncRedisService.is_bound():
+        observe_redis_pool("async", AsyncRedisService.pool_stats())
+
+
+register_scrape_hook(_refresh_pool_metrics)
@@ -0,0 +1,441 @@
+"""
+Redis 缓存装饰器
+
+为异步服务方法提供共享缓存,热点键过期时不会让所有 worker 同时回源数据库:
+
+- 缓存键由命名空间(默认为 模块.类.方法)与参数哈希组成,self/cls 与 exclude 中的参数(如 db)不参与
+- 缓存值以 app.support.codec 编码,连同本次计算耗时与逻辑过期时间一起存储
+- 概率提前重算(XFetch): 读取时以 now - delta * beta * ln(rand) >= expiry 判断是否提前重算,
+  计算越慢、越接近过期越可能触发,提前重算的调用方先拿到锁才重算,其余调用方继续使用旧值
+- 缓存缺失时只有拿到锁的调用方回源,其余调用方等待新值写入,等待超时后才自行回源
+- 标签失效: 写入时把键加入标签集合,invalidate_tags 删除标签下所有键并递增标签版本,
+  版本变化期间完成的回源结果不再写入,避免失效前开始的计算把旧值写回
+- Redis 不可用或未绑定(如命令行脚本)时直接调用原方法
+- 缓存值以明文存入 Redis,不要缓存包含密钥等敏感列的结果(如 llm 表的 api_key)
+
+用法:
+    @redis_cached(ttl=300, tags=["tool"], dump=orm_dump, load=orm_loader(Tool))
+    async def get_tools_by_names(self, names: List[str]) -> List[Tool]: ...
+
+    @redis_cache_evict(tags=["llm"])
+    async def update_llm(self, llm_id: int, llm_update: LLMUpdate) -> Optional[LLM]: ...
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import math
+import random
+import time
+import uuid
+from collections.abc import Callable, Iterable, Sequence
+from datetime import date, datetime
+from typing import Any
+
+from loguru import logger
+from redis.client import NEVER_DECODE
+from redis.exceptions import RedisError
+from sqlalchemy import inspect as sa_inspect
+
+from app.services.redis import AsyncRedisService
+from app.support.codec import Codec, CodecError, decode, get_codec
+from config.config import get_settings
+
+KEY_PREFIX = "cache"
+
+_RAW_RESPONSE = {NEVER_DECODE: []}
+
+# 版本未变化时写入缓存并加入标签集合,返回 1;任一标签版本变化时不写入,返回 0
+# KEYS: 缓存键, 标签集合键..., 标签版本键...  ARGV: 值, ttl, 标签集合ttl, 标签数, 读取时的版本...
+WRITE_SCRIPT = """
+local n = tonumber(ARGV[4])
+for i = 1, n do
+    local version = redis.call('GET', KEYS[1 + n + i]) or '0'
+    if version ~= ARGV[4 + i] then
+        return 0
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+for i = 1, n do
+    redis.call('SADD', KEYS[1 + i], KEYS[1])
+    redis.call('EXPIRE', KEYS[1 + i], ARGV[3])
+end
+return 1
+"""
+
+# 回源锁未拿到且不等待(或等待超时)时的返回标记
+_NOT_COMPUTED = object()
+
+# 递增标签版本,并在同一脚本中取出并删除标签集合,返回集合中的缓存键;
+# 之后开始的写入在版本检查时失败,不会向已删除的集合加入键
+# KEYS: 标签集合键..., 标签版本键...  ARGV: 标签版本ttl
+INVALIDATE_SCRIPT = """
+local n = #KEYS / 2
+local members = {}
+for i = 1, n do
+    redis.call('INCR', KEYS[n + i])
+    redis.call('EXPIRE', KEYS[n + i], ARGV[1])
+    for _, key in ipairs(redis.call('SMEMBERS', KEYS[i])) do
+        table.insert(members, key)
+    end
+    redis.call('DEL', KEYS[i])
+end
+return members
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _tag_key(tag: str) -> str:
+    return f"{KEY_PREFIX}:tag:{tag}"
+
+
+def _tag_version_key(tag: str) -> str:
+    return f"{KEY_PREFIX}:tagv:{tag}"
+
+
+def _client():
+    return AsyncRedisService._get_connection() if AsyncRedisService.is_bound() else None
+
+
+# ===============================================orm====================================================
+
+
+def orm_dump(value: Any) -> Any:
+    """把 ORM 实例(或实例列表)转为只含列值的字典,供缓存编码"""
+    if value is None:
+        return None
+    if isinstance(value, list | tuple):
+        return [orm_dump(item) for item in value]
+    return {attr.key: getattr(value, attr.key) for attr in sa_inspect(value).mapper.column_attrs}
+
+
+def orm_loader(model_cls: type) -> Callable[[Any], Any]:
+    """
+    返回把 orm_dump 结果还原为 model_cls 实例的函数
+
+    还原的实例未关联会话,只能用于读取;日期时间列从 ISO 字符串还原
+    """
+    temporal = {}
+    for attr in sa_inspect(model_cls).column_attrs:
+        try:
+            python_type = attr.columns[0].type.python_type
+        except NotImplementedError:
+            continue
+        if python_type in (datetime, date):
+            temporal[attr.key] = python_type
+
+    def load(value: Any) -> Any:
+        if value is None:
+            return None
+        if isinstance(value, list):
+            return [load(item) for item in value]
+        for key, python_type in temporal.items():
+            if isinstance(value.get(key), str):
+                value[key] = python_type.fromisoformat(value[key])
+        return model_cls(**value)
+
+    return load
+
+
+# ===============================================cache====================================================
+
+
+class _CachedFunction:
+    """redis_cached 包装后的方法,另提供 cache_key / invalidate"""
+
+    def __init__(
+        self,
+        func: Callable,
+        ttl: int,
+        namespace: str | None,
+        key_func: Callable[..., str] | None,
+        tags: Sequence[str] | Callable[..., Iterable[str]],
+        exclude: Sequence[str],
+        codec: Codec | None,
+        dump: Callable[[Any], Any] | None,
+        load: Callable[[Any], Any] | None,
+        beta: float,
+        lock_timeout: float,
+    ):
+        settings = get_settings()
+        if ttl > settings.REDIS_CACHE_TAG_TTL:
+            raise ValueError(f"缓存时间 {ttl}s 不能超过标签集合保留时间 {settings.REDIS_CACHE_TAG_TTL}s")
+        self.func = func
+        self.ttl = ttl
+        self.namespace = namespace or f"{func.__module__}.{func.__qualname__}"
+        self.key_func = key_func
+        self.tags = tags
+        self.exclude = {"self", "cls", *exclude}
+        self.codec = codec
+        self.dump = dump
+        self.load = load
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+        self.tag_ttl = settings.REDIS_CACHE_TAG_TTL
+        self.signature = inspect.signature(func)
+        functools.update_wrapper(self, func)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return functools.partial(self, instance)
+
+    # ===============================================keys====================================================
+
+    def _arguments(self, args: tuple, kwargs: dict) -> dict[str, Any]:
+        bound = self.signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return {k: v for k, v in bound.arguments.items() if k not in self.exclude}
+
+    def cache_key(self, *args, **kwargs) -> str:
+        """计算调用对应的缓存键(参数与被装饰方法一致)"""
+        if self.key_func is not None:
+            return f"{KEY_PREFIX}:{self.namespace}:{self.key_func(*args, **kwargs)}"
+        arguments = self._arguments(args, kwargs)
+        if not arguments:
+            return f"{KEY_PREFIX}:{self.namespace}"
+        digest = hashlib.sha1(_encode_arguments(arguments))
+        return f"{KEY_PREFIX}:{self.namespace}:{digest.hexdigest()[:20]}"
+
+    def _tags_for(self, args: tuple, kwargs: dict) -> list[str]:
+        tags = self.tags(*args, **kwargs) if callable(self.tags) else self.tags
+        return list(dict.fromkeys(tags))
+
+    async def invalidate(self, *args, **kwargs) -> None:
+        """删除某次调用对应的缓存"""
+        client = _client()
+        if client is not None:
+            await client.unlink(self.cache_key(*args, **kwargs))
+
+    # ===============================================read====================================================
+
+    async def __call__(self, *args, **kwargs) -> Any:
+        client = _client()
+        if client is None:
+            return await self.func(*args, **kwargs)
+        key = self.cache_key(*args, **kwargs)
+        try:
+            cached = await self._read(client, key)
+        except (RedisError, OSError, CodecError) as e:
+            logger.warning(f"读取缓存 {key} 失败,直接调用: {e}")
+            return await self.func(*args, **kwargs)
+
+        if cached is not None:
+            value, delta, expiry = cached
+            # XFetch: ln(rand) 为负,越接近过期、计算越慢越可能提前重算
+            if time.time() - delta * self.beta * math.log(random.random() or 1e-12) < expiry:
+                return value
+            recomputed = await self._recompute(client, key, args, kwargs, wait=False)
+            return value if recomputed is _NOT_COMPUTED else recomputed
+
+        recomputed = await self._recompute(client, key, args, kwargs, wait=True)
+        if recomputed is _NOT_COMPUTED:
+            return await self.func(*args, **kwargs)
+        return recomputed
+
+    async def _read(self, client, key: str) -> tuple[Any, float, float] | None:
+        raw = await client.execute_command("GET", key, **_RAW_RESPONSE)
+        if raw is None:
+            return None
+        envelope = decode(raw)
+        value = envelope["v"]
+        if self.load is not None:
+            value = self.load(value)
+        return value, envelope["d"], envelope["e"]
+
+    # ===============================================recompute====================================================
+
+    async def _recompute(self, client, key: str, args: tuple, kwargs: dict, wait: bool) -> Any:
+        """
+        拿到锁后回源并写入;wait 为 True 时未拿到锁则等待其他调用方写入的新值
+
+        Returns:
+            Any: 新值;未拿到锁且(不等待或等待超时)时返回 _NOT_COMPUTED
+        """
+        lock_key = f"{key}:lock"
+        lock_value = uuid.uuid4().hex
+        try:
+            locked = await client.set(
+                lock_key, lock_value, nx=True, px=int(self.lock_timeout * 1000)
+            )
+        except (RedisError, OSError) as e:
+            logger.warning(f"获取缓存锁 {lock_key} 失败: {e}")
+            return _NOT_COMPUTED
+
+        if not locked:
+            return await self._wait_for_value(client, key) if wait else _NOT_COMPUTED
+
+        try:
+            tags = self._tags_for(args, kwargs)
+            versions = await client.mget([_tag_version_key(tag) for tag in tags]) if tags else []
+            started = time.time()
+            value = await self.func(*args, **kwargs)
+            delta = time.time() - started
+            await self._write(client, key, value, delta, tags, versions)
+            return value
+        finally:
+            try:
+                await client.eval(RELEASE_SCRIPT, 1, lock_key, lock_value)
+            except (RedisError, OSError) as e:
+                logger.debug(f"释放缓存锁 {lock_key} 失败: {e}")
+
+    async def _wait_for_value(self, client, key: str) -> Any:
+        deadline = time.monotonic() + self.lock_timeout
+        interval = 0.02
+        while time.monotonic() < deadline:
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, 0.2)
+            try:
+                cached = await self._read(client, key)
+            except (RedisError, OSError, CodecError):
+                return _NOT_COMPUTED
+            if cached is not None:
+                return cached[0]
+        logger.warning(f"等待缓存 {key} 超时,直接调用")
+        return _NOT_COMPUTED
+
+    async def _write(
+        self, client, key: str, value: Any, delta: float, tags: list[str], versions: list
+    ) -> None:
+        envelope = {
+            "v": self.dump(value) if self.dump is not None else value,
+            "d": round(delta, 4),
+            "e": time.time() + self.ttl,
+        }
+        try:
+            data = (self.codec or get_codec()).encode(envelope)
+            written = await client.eval(
+                WRITE_SCRIPT,
+                1 + 2 * len(tags),
+                key,
+                *[_tag_key(tag) for tag in tags],
+                *[_tag_version_key(tag) for tag in tags],
+                data,
+                # 逻辑过期后保留一小段时间,XFetch 提前重算期间其余调用方仍可读取旧值
+                self.ttl + max(1, int(delta * 10)),
+                self.tag_ttl,
+                len(tags),
+                *[version or "0" for version in versions],
+            )
+        except (RedisError, OSError, CodecError, TypeError) as e:
+            logger.warning(f"写入缓存 {key} 失败: {e}")
+            return
+        if not written:
+            logger.debug(f"缓存 {key} 计算期间标签已失效,不写入")
+
+
+def _encode_arguments(arguments: dict[str, Any]) -> bytes:
+    """参数按 JSON 编码参与哈希,无法 JSON 序列化的参数使用 repr"""
+    try:
+        return Codec().encode(arguments)
+    except (CodecError, TypeError):
+        return repr(sorted(arguments.items())).encode()
+
+
+def redis_cached(
+    ttl: int,
+    namespace: str | None = None,
+    key: Callable[..., str] | None = None,
+    tags: Sequence[str] | Callable[..., Iterable[str]] = (),
+    exclude: Sequence[str] = (),
+    codec: Codec | None = None,
+    dump: Callable[[Any], Any] | None = None,
+    load: Callable[[Any], Any] | None = None,
+    beta: float = 1.0,
+    lock_timeout: float = 5.0,
+) -> Callable[[Callable], _CachedFunction]:
+    """
+    缓存异步函数/方法的返回值
+
+    Args:
+        ttl: 缓存时间(秒)
+        namespace: 缓存键命名空间,默认为 模块.类.方法
+        key: 自定义键函数,参数与被装饰方法一致,返回命名空间之后的部分
+        tags: 标签列表,或按调用参数返回标签的函数,用于 invalidate_tags
+        exclude: 不参与缓存键的参数名(如 db 会话)
+        codec: 编解码器,默认使用 REDIS_CODEC_* 配置
+        dump: 写入前把返回值转为可编码的结构(如 orm_dump)
+        load: 读取后还原返回值(如 orm_loader(Tool))
+        beta: XFetch 系数,大于 1 更早重算,0 关闭提前重算
+        lock_timeout: 回源锁的租约时间(秒),也是其他调用方等待新值的最长时间
+    """
+
+    def decorator(func: Callable) -> _CachedFunction:
+        if not inspect.iscoroutinefunction(func):
+            raise TypeError(f"redis_cached 只能装饰协程函数: {func.__qualname__}")
+        return _CachedFunction(
+            func, ttl, namespace, key, tags, exclude, codec, dump, load, beta, lock_timeout
+        )
+
+    return decorator
+
+
+# ===============================================invalidation====================================================
+
+
+async def invalidate_tags(*tags: str) -> int:
+    """
+    删除标签下的所有缓存并递增标签版本
+
+    Returns:
+        int: 删除的键数量
+    """
+    client = _client()
+    if client is None or not tags:
+        return 0
+    members = await client.eval(
+        INVALIDATE_SCRIPT,
+        len(tags) * 2,
+        *[_tag_key(tag) for tag in tags],
+        *[_tag_version_key(tag) for tag in tags],
+        get_settings().REDIS_CACHE_TAG_TTL,
+    )
+    keys = set(members)
+    if not keys:
+        return 0
+    return await client.unlink(*keys)
+
+
+async def tag_versions(*tags: str) -> tuple[int, ...]:
+    """
+    读取标签版本,每次 invalidate_tags 后递增,可作为依赖这些数据的派生对象(如编译好的图)的版本号
+
+    Returns:
+        Tuple[int, ...]: 与 tags 顺序一致的版本,Redis 未绑定时为空元组
+    """
+    client = _client()
+    if client is None or not tags:
+        return ()
+    versions = await client.mget([_tag_version_key(tag) for tag in tags])
+    return tuple(int(version or 0) for version in versions)
+
+
+def redis_cache_evict(tags: Sequence[str] | Callable[..., Iterable[str]]) -> Callable:
+    """
+    方法成功返回后失效标签下的缓存,失效失败只记录日志
+
+    Args:
+        tags: 标签列表,或按调用参数返回标签的函数
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            result = await func(*args, **kwargs)
+            evicted = tags(*args, **kwargs) if callable(tags) else tags
+            try:
+                await invalidate_tags(*evicted)
+            except (RedisError, OSError) as e:
+                logger.warning(f"失效缓存标签 {list(evicted)} 失败: {e}")
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,248 @@
+"""
+Redis 分布式租约锁
+
+- 加锁以 Lua 脚本原子执行: 锁不存在时 INCR 递增的栅栏令牌(fencing token),再以 SET PX 写入
+  "{令牌}:{持有者}",令牌随每次成功加锁单调递增
+- 持有期间由看门狗协程每 ttl/3 续期一次,续期与释放都校验锁值,不会误续、误删他人的锁;
+  续期失败(锁已过期被他人获得)时标记 lost
+- watch(cancel_on_lost=True) 在锁丢失时取消持有者的任务,并在退出 watch 时抛出 LockLostError,
+  租约过期后的旧持有者不会与新持有者同时运行;下游也可以用 is_current(token) 校验令牌
+- 锁可以跨进程移交: 一个进程加锁后把令牌交给另一个进程,后者用 adopt() 接手并续期
+
+用法:
+    lock = LeaseLock("workflow:1001:abc", ttl_ms=30000, owner=task_id)
+    if await lock.acquire():
+        async with lock.watch(cancel_on_lost=True):
+            ...
+"""
+
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from typing import NamedTuple
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.services.redis import AsyncRedisService
+
+KEY_PREFIX = "lock"
+
+# 返回栅栏令牌,锁已被持有时返回 nil
+ACQUIRE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return false
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], token .. ':' .. ARGV[1], 'PX', ARGV[2])
+return token
+"""
+
+# 锁值一致时续期,返回 1/0
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# 锁值一致时删除,返回 1/0
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LockLostError(Exception):
+    """持有期间锁已过期或被他人获得"""
+
+    def __init__(self, name: str):
+        super().__init__(f"锁 {name} 已丢失")
+        self.name = name
+
+
+class LockHolder(NamedTuple):
+    """当前锁持有者"""
+
+    token: int
+    owner: str
+
+
+class LeaseLock:
+    """带栅栏令牌与看门狗续期的租约锁,客户端需开启 decode_responses"""
+
+    def __init__(
+        self,
+        name: str,
+        ttl_ms: int = 30000,
+        owner: str | None = None,
+        client: Redis | None = None,
+    ):
+        """
+        Args:
+            name: 锁名称,实际键为 lock:{name}
+            ttl_ms: 租约时长(毫秒),看门狗每 ttl_ms/3 续期一次
+            owner: 持有者标识,其他进程可通过 holder() 读取,默认随机生成
+            client: 异步Redis客户端,默认使用应用共享的客户端
+        """
+        self.name = name
+        self.key = f"{KEY_PREFIX}:{name}"
+        self.fence_key = f"{self.key}:fence"
+        self.ttl_ms = ttl_ms
+        self.owner = owner or uuid.uuid4().hex
+        self.token: int | None = None
+        self.lost = False
+        self._client = client
+        self._watchdog: asyncio.Task | None = None
+        self._cancelled_on_lost = False
+
+    @property
+    def client(self) -> Redis:
+        return self._client or AsyncRedisService._get_connection()
+
+    @property
+    def value(self) -> str:
+        return f"{self.token}:{self.owner}"
+
+    # ===============================================lease====================================================
+
+    async def acquire(self, ttl_ms: int | None = None) -> int | None:
+        """
+        尝试加锁,不等待
+
+        Args:
+            ttl_ms: 本次租约时长(毫秒),默认使用 self.ttl_ms
+
+        Returns:
+            Optional[int]: 栅栏令牌,锁已被持有时为None
+        """
+        token = await self.client.eval(
+            ACQUIRE_SCRIPT, 2, self.key, self.fence_key, self.owner, ttl_ms or self.ttl_ms
+        )
+        if token is None:
+            return None
+        self.token = int(token)
+        self.lost = False
+        return self.token
+
+    async def adopt(self, token: int) -> bool:
+        """
+        接手其他进程以相同 owner 获得的锁并立即续期
+
+        Args:
+            token: 加锁时返回的栅栏令牌
+
+        Returns:
+            bool: 锁仍由该令牌持有时为True
+        """
+        self.token = token
+        self.lost = False
+        return await self.renew()
+
+    async def renew(self, ttl_ms: int | None = None) -> bool:
+        """续期,锁已不属于自己时返回False并标记 lost"""
+        if self.token is None:
+            return False
+        renewed = await self.client.eval(
+            RENEW_SCRIPT, 1, self.key, self.value, ttl_ms or self.ttl_ms
+        )
+        if not renewed:
+            self.lost = True
+        return bool(renewed)
+
+    async def release(self) -> bool:
+        """释放锁,锁已不属于自己时返回False"""
+        self._stop_watchdog()
+        if self.token is None:
+            return False
+        released = await self.client.eval(RELEASE_SCRIPT, 1, self.key, self.value)
+        self.token = None
+        return bool(released)
+
+    def detach(self) -> None:
+        """停止续期并放弃本地持有,不删除锁,用于锁已由其他进程以相同令牌接手的情况"""
+        self._stop_watchdog()
+        self.token = None
+
+    async def holder(self) -> LockHolder | None:
+        """读取当前持有者,锁未被持有时返回 None"""
+        value = await self.client.get(self.key)
+        if value is None:
+            return None
+        token, _, owner = value.partition(":")
+        return LockHolder(int(token), owner)
+
+    async def is_current(self, token: int | None = None) -> bool:
+        """令牌是否仍是当前持有者的令牌(默认检查自己的令牌)"""
+        holder = await self.holder()
+        token = self.token if token is None else token
+        return holder is not None and holder.token == token
+
+    # ===============================================watchdog====================================================
+
+    @asynccontextmanager
+    async def watch(self, cancel_on_lost: bool = False):
+        """
+        持有期间运行看门狗续期,退出时释放锁
+
+        Args:
+            cancel_on_lost: 锁丢失时取消进入 watch 的任务,并以 LockLostError 代替 CancelledError 抛出
+
+        Raises:
+            LockLostError: cancel_on_lost 为 True 且持有期间锁已丢失
+        """
+        if self.token is None:
+            raise RuntimeError(f"锁 {self.name} 未持有,不能续期")
+        holder_task = asyncio.current_task() if cancel_on_lost else None
+        self._cancelled_on_lost = False
+        self._watchdog = asyncio.create_task(
+            self._renew_loop(holder_task), name=f"lock-watchdog:{self.name}"
+        )
+        try:
+            yield self
+        except asyncio.CancelledError:
+            # 只有看门狗的取消请求时转为 LockLostError,同时被外部取消时仍按取消处理
+            if self._cancelled_on_lost and holder_task.uncancel() == 0:
+                raise LockLostError(self.name) from None
+            raise
+        finally:
+            self._stop_watchdog()
+            try:
+                await self.release()
+            except RedisError as e:
+                # 释放失败时锁在租约到期后自动失效
+                logger.warning(f"释放锁 {self.name} 失败: {e}")
+
+    def _stop_watchdog(self) -> None:
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            self._watchdog = None
+
+    async def _renew_loop(self, holder_task: asyncio.Task | None) -> None:
+        interval = self.ttl_ms / 3000
+        loop = asyncio.get_running_loop()
+        renewed_at = loop.time()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.renew():
+                    logger.error(f"锁 {self.name} 已被他人持有,停止续期")
+                    self._on_lost(holder_task)
+                    return
+                renewed_at = loop.time()
+            except (RedisError, OSError) as e:
+                # 租约到期前继续重试
+                if loop.time() - renewed_at >= self.ttl_ms / 1000:
+                    logger.error(f"锁 {self.name} 续期失败且租约已到期: {e}")
+                    self._on_lost(holder_task)
+                    return
+                logger.warning(f"锁 {self.name} 续期失败,稍后重试: {e}")
+
+    def _on_lost(self, holder_task: asyncio.Task | None) -> None:
+        self.lost = True
+        if holder_task is not None and not holder_task.done():
+            self._cancelled_on_lost = True
+            holder_task.cancel()
@@ -0,0 +1,369 @@
+"""
+Redis 本地近缓存
+
+特性开关、HR 配置、岗位目录快照等键几乎每个请求都会读取但很少修改,
+通过 RESP3 客户端追踪(CLIENT TRACKING ... BCAST PREFIX)在进程内缓存这些键:
+
+- 专用的 RESP3 连接以广播模式订阅 REDIS_NEAR_CACHE_PREFIXES 前缀下所有键的失效通知,
+  任何客户端修改、删除或使键过期时 Redis 推送 invalidate,本地立即删除对应条目
+- 读取经 app.redis 执行,只缓存匹配前缀的键(包括不存在的键);其余键直接透传
+- 每个条目另有兜底过期时间 REDIS_NEAR_CACHE_TTL,失效通知丢失时最多读到该时长的旧值
+- 追踪连接未建立或断开期间不读写本地缓存,重连成功后清空全部条目
+- 追踪连接空闲时定期发送 PING 探测,服务端不支持 RESP3(Redis 6 以下)时自动停用
+- REDIS_NEAR_CACHE_PREFIXES 默认为空,此时不建立追踪连接,读取全部透传;
+  有读取方通过 redis_near_cache 读取热点键后再按其前缀开启
+
+由 lifespan 调用 start()/stop(),用法:
+
+    flags = await redis_near_cache.get_object("feature_flag:hr:1001")
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.client import NEVER_DECODE
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import ResponseError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from app.support.codec import decode
+from app.support.memory_debug import register_memory_probe
+from app.support.metrics import (observe_near_cache, observe_near_cache_invalidation,
+                                 observe_near_cache_size, register_scrape_hook)
+from config.config import get_settings
+
+_RAW_RESPONSE = {NEVER_DECODE: []}
+
+_MISSING = object()
+
+
+class _Entry:
+    """缓存条目: 原始值、过期时间与惰性解码的对象"""
+
+    __slots__ = ("raw", "expires_at", "obj")
+
+    def __init__(self, raw: bytes | None, expires_at: float):
+        self.raw = raw
+        self.expires_at = expires_at
+        self.obj = _MISSING
+
+
+class RedisNearCache:
+    """基于 RESP3 客户端追踪的本地近缓存"""
+
+    def __init__(
+        self,
+        prefixes: list[str] | None = None,
+        ttl: float | None = None,
+        max_entries: int | None = None,
+        ping_interval: float = 10.0,
+        max_backoff: float = 30.0,
+    ):
+        """
+        Args:
+            prefixes: 缓存的键前缀,默认使用 REDIS_NEAR_CACHE_PREFIXES
+            ttl: 条目兜底过期时间(秒),默认使用 REDIS_NEAR_CACHE_TTL
+            max_entries: 最大条目数,默认使用 REDIS_NEAR_CACHE_MAX_ENTRIES
+            ping_interval: 追踪连接空闲多久(秒)后发送 PING 探测
+            max_backoff: 追踪连接重连的最大退避时间(秒)
+        """
+        settings = get_settings()
+        self.prefixes = tuple(settings.REDIS_NEAR_CACHE_PREFIXES if prefixes is None else prefixes)
+        self.ttl = settings.REDIS_NEAR_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or settings.REDIS_NEAR_CACHE_MAX_ENTRIES
+        self.ping_interval = ping_interval
+        self.max_backoff = max_backoff
+
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        # 读取进行中的键及其读取数,读取期间收到失效通知的键不写入缓存
+        self._inflight: dict[str, int] = {}
+        self._dirty: set[str] = set()
+        # 清空全部条目时递增,之前发起的读取结果不再写入
+        self._generation = 0
+
+        self._client: Redis | None = None
+        self._tracker: asyncio.Task | None = None
+        self._tracking = False
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.invalidations = 0
+        self.reconnects = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.prefixes)
+
+    @property
+    def tracking(self) -> bool:
+        """追踪连接是否已建立,未建立时读取直接透传到 Redis"""
+        return self._tracking
+
+    def cacheable(self, key: str) -> bool:
+        return key.startswith(self.prefixes)
+
+    # ===============================================read====================================================
+
+    async def get(self, key: str) -> str | None:
+        """
+        读取字符串值
+
+        Args:
+            key: 键名
+
+        Returns:
+            Optional[str]: 值,如果不存在则为None
+        """
+        raw = (await self._get_entries([key]))[0].raw
+        return raw.decode() if raw is not None else None
+
+    async def get_many(self, keys: list[str]) -> list[str | None]:
+        """
+        批量读取字符串值,未命中的键通过一次 MGET 读取
+
+        Args:
+            keys: 键名列表
+
+        Returns:
+            List[Optional[str]]: 与 keys 顺序一致的值列表,不存在的键为None
+        """
+        return [
+            entry.raw.decode() if entry.raw is not None else None
+            for entry in await self._get_entries(keys)
+        ]
+
+    async def get_object(self, key: str) -> Any:
+        """
+        读取并解码对象(app.support.codec 格式)
+
+        命中时返回缓存中已解码的同一实例,调用方不要修改返回的对象
+
+        Args:
+            key: 键名
+
+        Returns:
+            Any: 解码后的对象,如果不存在则为None
+        """
+        return self._decoded((await self._get_entries([key]))[0])
+
+    async def get_objects(self, keys: list[str]) -> list[Any]:
+        """批量读取并解码对象,参数同 get_many"""
+        return [self._decoded(entry) for entry in await self._get_entries(keys)]
+
+    @staticmethod
+    def _decoded(entry: _Entry) -> Any:
+        if entry.obj is _MISSING:
+            entry.obj = decode(entry.raw)
+        return entry.obj
+
+    async def _get_entries(self, keys: list[str]) -> list[_Entry]:
+        if self._client is None:
+            raise RuntimeError("Redis近缓存未启动,请在应用启动后使用")
+
+        results: dict[str, _Entry] = {}
+        misses: list[str] = []
+        now = time.monotonic()
+        for key in dict.fromkeys(keys):
+            if not (self._tracking and self.cacheable(key)):
+                misses.append(key)
+                continue
+            entry = self._entries.get(key)
+            if entry is None:
+                misses.append(key)
+            elif entry.expires_at <= now:
+                self._entries.pop(key, None)
+                observe_near_cache_invalidation("ttl")
+                misses.append(key)
+            else:
+                self._entries.move_to_end(key)
+                results[key] = entry
+
+        if results:
+            self.hits += len(results)
+            observe_near_cache("hit", len(results))
+        if misses:
+            results.update(await self._fetch(misses))
+        return [results[key] for key in keys]
+
+    async def _fetch(self, keys: list[str]) -> dict[str, _Entry]:
+        cached = [key for key in keys if self._tracking and self.cacheable(key)]
+        if len(cached) < len(keys):
+            self.bypassed += len(keys) - len(cached)
+            observe_near_cache("bypass", len(keys) - len(cached))
+        if cached:
+            self.misses += len(cached)
+            observe_near_cache("miss", len(cached))
+
+        generation = self._generation
+        for key in cached:
+            self._inflight[key] = self._inflight.get(key, 0) + 1
+        try:
+            if len(keys) == 1:
+                values = [await self._client.execute_command("GET", keys[0], **_RAW_RESPONSE)]
+            else:
+                values = await self._client.execute_command("MGET", *keys, **_RAW_RESPONSE)
+            expires_at = time.monotonic() + self.ttl
+            results = {key: _Entry(value, expires_at) for key, value in zip(keys, values)}
+            if generation == self._generation and self._tracking:
+                for key in cached:
+                    if key not in self._dirty:
+                        self._store(key, results[key])
+            return results
+        finally:
+            for key in cached:
+                count = self._inflight.pop(key) - 1
+                if count:
+                    self._inflight[key] = count
+                else:
+                    self._dirty.discard(key)
+
+    def _store(self, key: str, entry: _Entry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            observe_near_cache_invalidation("evicted")
+
+    # ===============================================invalidation====================================================
+
+    def invalidate(self, *keys: str) -> None:
+        """删除本地条目(写入方无需调用,Redis 会推送失效通知,仅用于测试或手动排障)"""
+        for key in keys:
+            self._drop(key)
+
+    def clear(self, reason: str = "flush") -> None:
+        """清空本地条目"""
+        if self._entries:
+            observe_near_cache_invalidation(reason, len(self._entries))
+        self._entries.clear()
+        self._generation += 1
+
+    def _drop(self, key: str) -> None:
+        if key in self._inflight:
+            self._dirty.add(key)
+        if self._entries.pop(key, None) is not None:
+            observe_near_cache_invalidation("key")
+
+    async def _on_invalidate(self, message: list) -> bool:
+        """处理 invalidate 推送: ["invalidate", [key, ...]],键列表为 null 时表示 FLUSHDB/FLUSHALL"""
+        self.invalidations += 1
+        keys = message[1]
+        if keys is None:
+            self.clear()
+        else:
+            for key in keys:
+                self._drop(key.decode() if isinstance(key, bytes) else key)
+        return True
+
+    # ===============================================lifecycle====================================================
+
+    async def start(self, client: Redis) -> None:
+        """
+        启动近缓存
+
+        Args:
+            client: 应用共享的异步Redis客户端,用于读取;追踪连接复用其连接参数
+        """
+        self._client = client
+        if not self.enabled or self._tracker is not None:
+            return
+        self._tracker = asyncio.create_task(self._track_loop(), name="redis-near-cache")
+        logger.info(f"Redis近缓存已启动 | 前缀 {list(self.prefixes)} | 兜底过期 {self.ttl}s")
+
+    async def stop(self) -> None:
+        """停止追踪并清空本地条目"""
+        if self._tracker is not None:
+            self._tracker.cancel()
+            await asyncio.gather(self._tracker, return_exceptions=True)
+            self._tracker = None
+            logger.info("Redis近缓存已停止")
+        self._set_tracking(False)
+        self._client = None
+
+    def _set_tracking(self, tracking: bool) -> None:
+        # 状态切换前后都可能漏收失效通知,统一清空
+        self.clear("disconnect")
+        self._tracking = tracking
+
+    def _create_connection(self):
+        pool = self._client.connection_pool
+        connection_kwargs = {
+            **pool.connection_kwargs,
+            "protocol": 3,
+            "decode_responses": False,
+            # 追踪连接长时间空闲等待推送,由 PING 探测连接状态
+            "socket_timeout": None,
+            "health_check_interval": 0,
+        }
+        return pool.connection_class(**connection_kwargs)
+
+    async def _track_loop(self) -> None:
+        backoff = 0.5
+        prefix_args = [arg for prefix in self.prefixes for arg in ("PREFIX", prefix)]
+        while True:
+            connection = self._create_connection()
+            try:
+                await connection.connect()
+                connection._parser.set_invalidation_push_handler(self._on_invalidate)
+                await connection.send_command("CLIENT", "TRACKING", "ON", "BCAST", *prefix_args)
+                await connection.read_response()
+                self._set_tracking(True)
+                backoff = 0.5
+                await self._read_pushes(connection)
+            except ResponseError as e:
+                logger.warning(f"Redis不支持RESP3客户端追踪,近缓存停用: {e}")
+                return
+            except (RedisConnectionError, RedisTimeoutError, OSError) as e:
+                self.reconnects += 1
+                logger.warning(f"Redis近缓存追踪连接断开,{backoff:.1f}秒后重连: {e}")
+                self._set_tracking(False)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                self._tracking = False
+                await asyncio.shield(connection.disconnect())
+
+    async def _read_pushes(self, connection) -> None:
+        awaiting_pong = False
+        while True:
+            response = await connection.read_response(
+                timeout=self.ping_interval, push_request=True
+            )
+            if response is None:
+                if awaiting_pong:
+                    raise RedisTimeoutError(f"PING 超过 {self.ping_interval}s 未响应")
+                await connection.send_command("PING")
+                awaiting_pong = True
+            elif response is not True:
+                # PONG
+                awaiting_pong = False
+
+    # ===============================================report====================================================
+
+    def stats(self) -> dict:
+        """近缓存状态与命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "tracking": self._tracking,
+            "prefixes": list(self.prefixes),
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+            "reconnects": self.reconnects,
+        }
+
+
+# 全局近缓存,由 app_provider 在应用启动时绑定到 app.redis
+redis_near_cache = RedisNearCache()
+register_scrape_hook(lambda: observe_near_cache_size(len(redis_near_cache._entries)))
+register_memory_probe("redis_near_cache.entries", lambda: len(redis_near_cache._entries))
@@ -0,0 +1,367 @@
+"""
+Redis 发布/订阅消费
+
+基于 redis.asyncio 的订阅服务,替代 RedisUtil.listen_for_messages 的轮询:
+
+- 按频道(subscribe)或模式(psubscribe)注册处理函数,同一频道可注册多个处理函数
+- 读取协程阻塞等待消息,收到后放入各处理函数独立的有界队列,由各自的 worker 协程消费;
+  队列满时 overflow="block" 暂停读取(背压,消息在 Redis 输出缓冲中积压),
+  overflow="drop" 丢弃新消息并计数
+- 连接断开或读取出错后按指数退避重连,并重新订阅所有已注册的频道与模式
+- 读取使用有限的等待时间,连接空闲超过 REDIS_PUBSUB_PING_INTERVAL 时发送 PING,
+  再经过同样时间仍未收到任何数据视为连接已失效(半开连接)并重连
+- 由 lifespan 调用 start()/stop(),stop() 会在超时前尽量处理完队列中的消息
+
+订阅连接使用独立的连接池(不解码响应、不设读超时),不占用 app.redis 的连接。
+消息默认按 app.support.codec 解码,与 RedisUtil.publish_message 的编码一致。
+"""
+
+import asyncio
+import inspect
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from loguru import logger
+from redis.asyncio import ConnectionPool, Redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from app.support.codec import decode
+from app.support.memory_debug import register_memory_probe
+from config.config import get_settings
+
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP = "drop"
+
+# 单次等待消息的最长时间(秒),到期后检查是否需要发送 PING
+READ_TIMEOUT = 1.0
+
+# 处理函数: handler(channel, data),可以是普通函数或协程函数
+MessageHandler = Callable[[str, Any], Awaitable[None] | None]
+
+
+class _Subscription:
+    """单个处理函数的队列、消费协程与统计"""
+
+    def __init__(
+        self,
+        target: str,
+        handler: MessageHandler,
+        queue_size: int,
+        overflow: str,
+        decoder: Callable[[bytes], Any] | None,
+    ):
+        self.target = target
+        self.handler = handler
+        self.name = getattr(handler, "__qualname__", repr(handler))
+        self.queue: asyncio.Queue[tuple[str, bytes]] = asyncio.Queue(maxsize=queue_size)
+        self.overflow = overflow
+        self.decoder = decoder
+        self.worker: asyncio.Task | None = None
+        self.received = 0
+        self.dropped = 0
+        self.failed = 0
+
+    async def offer(self, channel: str, data: bytes) -> None:
+        self.received += 1
+        if self.overflow == OVERFLOW_BLOCK:
+            await self.queue.put((channel, data))
+            return
+        try:
+            self.queue.put_nowait((channel, data))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(
+                    f"订阅处理队列已满,丢弃消息 | {self.target} -> {self.name} | 累计丢弃 {self.dropped}"
+                )
+
+    async def consume(self) -> None:
+        while True:
+            channel, data = await self.queue.get()
+            try:
+                payload = self.decoder(data) if self.decoder is not None else data
+                result = self.handler(channel, payload)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                self.failed += 1
+                logger.exception(f"订阅消息处理失败 | {self.target} -> {self.name}")
+            finally:
+                self.queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "target": self.target,
+            "handler": self.name,
+            "overflow": self.overflow,
+            "queued": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "received": self.received,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+class RedisSubscriber:
+    """Redis 订阅服务"""
+
+    def __init__(self, max_backoff: float = 30.0, ping_interval: float | None = None):
+        """
+        Args:
+            max_backoff: 重连退避的最长间隔(秒)
+            ping_interval: 连接空闲多久(秒)后发送 PING,默认使用 REDIS_PUBSUB_PING_INTERVAL
+        """
+        self.max_backoff = max_backoff
+        self.ping_interval = (
+            get_settings().REDIS_PUBSUB_PING_INTERVAL if ping_interval is None else ping_interval
+        )
+        self._channels: dict[str, list[_Subscription]] = {}
+        self._patterns: dict[str, list[_Subscription]] = {}
+        self._client: Redis | None = None
+        self._pubsub = None
+        self._reader: asyncio.Task | None = None
+        self._has_targets = asyncio.Event()
+        self.reconnects = 0
+
+    @property
+    def running(self) -> bool:
+        return self._reader is not None and not self._reader.done()
+
+    # ===============================================registration====================================================
+
+    def subscribe(
+        self,
+        channel: str,
+        handler: MessageHandler,
+        queue_size: int | None = None,
+        overflow: str = OVERFLOW_BLOCK,
+        decoder: Callable[[bytes], Any] | None = decode,
+    ) -> None:
+        """
+        注册频道处理函数,服务运行中注册时立即订阅
+
+        Args:
+            channel: 频道名称
+            handler: handler(channel, data),可以是普通函数或协程函数
+            queue_size: 处理队列容量,默认使用 REDIS_PUBSUB_QUEUE_SIZE
+            overflow: 队列满时的策略,block(背压) / drop(丢弃新消息)
+            decoder: 消息解码函数,为 None 时传入原始 bytes
+        """
+        self._register(self._channels, channel, handler, queue_size, overflow, decoder)
+
+    def psubscribe(
+        self,
+        pattern: str,
+        handler: MessageHandler,
+        queue_size: int | None = None,
+        overflow: str = OVERFLOW_BLOCK,
+        decoder: Callable[[bytes], Any] | None = decode,
+    ) -> None:
+        """注册模式处理函数(如 "agent:*:events"),参数同 subscribe"""
+        self._register(self._patterns, pattern, handler, queue_size, overflow, decoder)
+
+    def on(self, target: str, pattern: bool = False, **kwargs) -> Callable:
+        """
+        装饰器形式注册处理函数
+
+        用法:
+            @redis_subscriber.on("agent:events")
+            async def handle_agent_event(channel, data): ...
+        """
+
+        def decorator(handler: MessageHandler) -> MessageHandler:
+            register = self.psubscribe if pattern else self.subscribe
+            register(target, handler, **kwargs)
+            return handler
+
+        return decorator
+
+    def _register(self, registry, target, handler, queue_size, overflow, decoder) -> None:
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP):
+            raise ValueError(f"不支持的队列溢出策略: {overflow}")
+        subscription = _Subscription(
+            target,
+            handler,
+            queue_size or get_settings().REDIS_PUBSUB_QUEUE_SIZE,
+            overflow,
+            decoder,
+        )
+        is_new = target not in registry
+        registry.setdefault(target, []).append(subscription)
+        self._has_targets.set()
+
+        if self.running:
+            subscription.worker = asyncio.create_task(
+                subscription.consume(), name=f"redis-sub:{target}"
+            )
+            if is_new and self._pubsub is not None:
+                # 读取协程重连时会重新订阅全部目标,这里失败只需记录
+                method = self._pubsub.psubscribe if registry is self._patterns else self._pubsub.subscribe
+                task = asyncio.create_task(method(target))
+                task.add_done_callback(self._log_subscribe_error)
+
+    @staticmethod
+    def _log_subscribe_error(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"订阅失败,将在重连时重试: {task.exception()}")
+
+    # ===============================================lifecycle====================================================
+
+    async def start(self, client: Redis) -> None:
+        """
+        启动订阅服务
+
+        Args:
+            client: 应用共享的异步Redis客户端,仅复用其连接参数
+        """
+        if self.running:
+            return
+        pool = client.connection_pool
+        connection_kwargs = {
+            **pool.connection_kwargs,
+            "decode_responses": False,
+            # 订阅连接长时间空闲等待消息,不设读超时,由读取协程定期 PING 探测连接状态
+            "socket_timeout": None,
+        }
+        self._client = Redis(
+            connection_pool=ConnectionPool(
+                connection_class=pool.connection_class, **connection_kwargs
+            )
+        )
+        for subscription in self._subscriptions():
+            subscription.worker = asyncio.create_task(
+                subscription.consume(), name=f"redis-sub:{subscription.target}"
+            )
+        self._reader = asyncio.create_task(self._read_loop(), name="redis-subscriber")
+        logger.info(
+            f"Redis订阅服务已启动 | 频道 {len(self._channels)} 个 | 模式 {len(self._patterns)} 个"
+        )
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """
+        停止订阅服务: 先停止读取,再在 timeout 秒内处理完队列中的消息
+
+        Args:
+            timeout: 等待队列处理完成的最长时间(秒)
+        """
+        if self._reader is None:
+            return
+        self._reader.cancel()
+        await asyncio.gather(self._reader, return_exceptions=True)
+        self._reader = None
+
+        subscriptions = self._subscriptions()
+        pending = [s.queue.join() for s in subscriptions if s.queue.qsize()]
+        if pending:
+            try:
+                await asyncio.wait_for(asyncio.gather(*pending), timeout)
+            except asyncio.TimeoutError:
+                left = sum(s.queue.qsize() for s in subscriptions)
+                logger.warning(f"Redis订阅服务停止超时,丢弃 {left} 条未处理消息")
+
+        workers = [s.worker for s in subscriptions if s.worker is not None]
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        for subscription in subscriptions:
+            subscription.worker = None
+
+        if self._client is not None:
+            await self._client.aclose()
+            await self._client.connection_pool.disconnect()
+            self._client = None
+        logger.info("Redis订阅服务已停止")
+
+    # ===============================================reader====================================================
+
+    async def _read_loop(self) -> None:
+        backoff = 0.5
+        while True:
+            await self._has_targets.wait()
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                if self._channels:
+                    await pubsub.subscribe(*self._channels)
+                if self._patterns:
+                    await pubsub.psubscribe(*self._patterns)
+                self._pubsub = pubsub
+                backoff = 0.5
+                await self._receive(pubsub)
+            except Exception as e:
+                self.reconnects += 1
+                if isinstance(e, (RedisConnectionError, RedisTimeoutError, OSError)):
+                    logger.warning(f"Redis订阅连接断开,{backoff:.1f}秒后重连: {e}")
+                else:
+                    logger.exception(f"Redis订阅读取失败,{backoff:.1f}秒后重连")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                self._pubsub = None
+                await asyncio.shield(self._close_pubsub(pubsub))
+
+    async def _receive(self, pubsub) -> None:
+        """读取并分发消息,连接空闲时 PING,PING 后仍无数据时抛出 RedisTimeoutError"""
+        loop = asyncio.get_running_loop()
+        last_seen = last_ping = loop.time()
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=READ_TIMEOUT)
+            now = loop.time()
+            if message is not None:
+                # PONG 也会作为消息返回,由 _dispatch 忽略
+                last_seen = now
+                await self._dispatch(message)
+                continue
+            if not self.ping_interval or now - last_seen < self.ping_interval:
+                continue
+            if last_ping > last_seen:
+                if now - last_ping >= self.ping_interval:
+                    raise RedisTimeoutError(f"订阅连接 {now - last_seen:.0f} 秒未收到数据,PING 无响应")
+                continue
+            await pubsub.ping()
+            last_ping = now
+
+    @staticmethod
+    async def _close_pubsub(pubsub) -> None:
+        try:
+            await pubsub.aclose()
+        except Exception as e:
+            logger.debug(f"关闭订阅连接失败: {e}")
+
+    async def _dispatch(self, message: dict) -> None:
+        if message["type"] == "pmessage":
+            subscriptions = self._patterns.get(message["pattern"].decode(), ())
+        elif message["type"] == "message":
+            subscriptions = self._channels.get(message["channel"].decode(), ())
+        else:
+            return
+        channel = message["channel"].decode()
+        for subscription in subscriptions:
+            await subscription.offer(channel, message["data"])
+
+    # ===============================================report====================================================
+
+    def _subscriptions(self) -> list[_Subscription]:
+        return [
+            subscription
+            for registry in (self._channels, self._patterns)
+            for subscriptions in registry.values()
+            for subscription in subscriptions
+        ]
+
+    def stats(self) -> dict:
+        """订阅状态与各处理函数的队列统计"""
+        return {
+            "running": self.running,
+            "connected": self._pubsub is not None,
+            "reconnects": self.reconnects,
+            "subscriptions": [s.stats() for s in self._subscriptions()],
+        }
+
+
+# 全局订阅服务,由 app_provider 在应用启动时启动
+redis_subscriber = RedisSubscriber()
+register_memory_probe(
+    "redis_subscriber.queued",
+    lambda: sum(s.queue.qsize() for s in redis_subscriber._subscriptions()),
+)
@@ -0,0 +1,364 @@
+"""
+工作流任务队列
+
+基于 Redis Streams 消费者组,把耗时的 Agent 工作流从 API 进程移到独立的 worker 进程中执行:
+
+- API 调用 enqueue 写入任务(XADD)并立即返回 task_id,任务状态保存在 workflow:task:{task_id} 哈希中
+- worker(app/services/workflow/worker.py)以消费者组方式读取任务,多个节点上的 worker 使用同一消费者组,
+  Redis 保证每条任务只投递给组内一个消费者,横向扩容只需增加 worker 进程
+- 任务结束后 XACK;worker 崩溃时未确认的任务在空闲超过 WORKFLOW_CLAIM_IDLE_MS 后由其他 worker
+  通过 XAUTOCLAIM 接管,投递次数超过 WORKFLOW_MAX_DELIVERIES 的任务转入死信流
+- submit 按 hr_id + 用户输入加租约锁去重: 相同任务排队或执行期间重复提交时返回进行中任务的 task_id,
+  调用方通过 workflow:task:{task_id}:events 事件流跟随该任务,不会重复消耗 LLM token
+"""
+
+import hashlib
+import time
+from typing import Any, NamedTuple
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from app.services.redis import AsyncRedisService
+from app.services.redis_lock import LeaseLock
+from app.support.metrics import observe_workflow_queue, register_async_scrape_hook
+from app.utils.common.id_util import IdUtil
+from config.config import get_settings
+
+STATUS_PENDING = "PENDING"
+STATUS_RUNNING = "RUNNING"
+STATUS_SUCCEEDED = "SUCCEEDED"
+STATUS_FAILED = "FAILED"
+
+TASK_KEY_PREFIX = "workflow:task"
+DEDUP_LOCK_PREFIX = "workflow:dedup"
+
+# 事件流中表示任务结束的事件类型
+EVENT_END = "end"
+
+# 只重置仍归属该消费者的任务的空闲时间,返回这些任务的ID;已被其他 worker 接管的任务不会被抢回
+TOUCH_SCRIPT = """
+local touched = {}
+for i = 3, #ARGV do
+    local pending = redis.call('XPENDING', KEYS[1], ARGV[1], ARGV[i], ARGV[i], 1, ARGV[2])
+    if #pending > 0 then
+        redis.call('XCLAIM', KEYS[1], ARGV[1], ARGV[2], 0, ARGV[i], 'JUSTID')
+        table.insert(touched, ARGV[i])
+    end
+end
+return touched
+"""
+
+
+class WorkflowJob(NamedTuple):
+    """从队列中读取的任务"""
+
+    message_id: str
+    task_id: str
+    user_input: str
+    hr_id: int
+    enqueued_at: int
+    # 去重锁名称与栅栏令牌,未加锁时为空
+    lock_name: str = ""
+    fence: int = 0
+
+    @classmethod
+    def from_entry(cls, message_id: str, fields: dict[str, str]) -> "WorkflowJob":
+        return cls(
+            message_id=message_id,
+            task_id=fields["task_id"],
+            user_input=fields["user_input"],
+            hr_id=int(fields["hr_id"]),
+            enqueued_at=int(fields.get("enqueued_at", 0)),
+            lock_name=fields.get("lock_name", ""),
+            fence=int(fields.get("fence", 0)),
+        )
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class WorkflowJobQueue:
+    """Redis Streams 任务队列,客户端需开启 decode_responses"""
+
+    def __init__(self, client: Redis, stream: str | None = None, group: str | None = None):
+        settings = get_settings()
+        self.client = client
+        self.stream = stream or settings.WORKFLOW_STREAM_KEY
+        self.group = group or settings.WORKFLOW_CONSUMER_GROUP
+        self.dead_letter_stream = f"{self.stream}:dead"
+        self.maxlen = settings.WORKFLOW_STREAM_MAXLEN
+        self.status_ttl = settings.WORKFLOW_STATUS_TTL
+        self.dedup_ttl_ms = settings.WORKFLOW_DEDUP_PENDING_TTL_MS
+        self.events_maxlen = settings.WORKFLOW_EVENTS_MAXLEN
+        self.events_ttl = settings.WORKFLOW_EVENTS_TTL
+        # XAUTOCLAIM 每次最多扫描 count×10 条待确认任务,从上次返回的游标继续,遍历完一轮后回到 0-0
+        self._reclaim_cursor = "0-0"
+
+    @classmethod
+    def from_app(cls) -> "WorkflowJobQueue":
+        """使用应用共享的异步Redis客户端(API 进程中使用)"""
+        return cls(AsyncRedisService._get_connection())
+
+    @staticmethod
+    def status_key(task_id: str) -> str:
+        return f"{TASK_KEY_PREFIX}:{task_id}"
+
+    @staticmethod
+    def events_key(task_id: str) -> str:
+        return f"{TASK_KEY_PREFIX}:{task_id}:events"
+
+    @staticmethod
+    def dedup_lock_name(user_input: str, hr_id: int) -> str:
+        """相同 HR 的相同输入(忽略首尾及连续空白)视为同一任务"""
+        normalized = " ".join(user_input.split())
+        digest = hashlib.sha256(normalized.encode()).hexdigest()[:32]
+        return f"{DEDUP_LOCK_PREFIX}:{hr_id}:{digest}"
+
+    # ===============================================producer====================================================
+
+    async def submit(self, user_input: str, hr_id: int) -> tuple[str, bool]:
+        """
+        去重提交任务: 相同任务排队或执行中时不再入队,返回进行中任务的ID
+
+        Args:
+            user_input: 用户输入
+            hr_id: HR ID
+
+        Returns:
+            Tuple[str, bool]: 任务ID, 是否复用了进行中的任务
+        """
+        task_id = IdUtil.generate_uuid_32()
+        lock = LeaseLock(
+            self.dedup_lock_name(user_input, hr_id),
+            ttl_ms=self.dedup_ttl_ms,
+            owner=task_id,
+            client=self.client,
+        )
+        # 持有者恰好在两次读取之间释放锁时重试
+        for _ in range(3):
+            fence = await lock.acquire()
+            if fence is not None:
+                try:
+                    await self.enqueue(
+                        user_input, hr_id, task_id=task_id, lock_name=lock.name, fence=fence
+                    )
+                except Exception:
+                    await lock.release()
+                    raise
+                return task_id, False
+            holder = await lock.holder()
+            if holder is not None:
+                return holder.owner, True
+        return await self.enqueue(user_input, hr_id, task_id=task_id), False
+
+    async def enqueue(
+        self,
+        user_input: str,
+        hr_id: int,
+        task_id: str | None = None,
+        lock_name: str = "",
+        fence: int = 0,
+    ) -> str:
+        """
+        写入任务(不去重)
+
+        Args:
+            user_input: 用户输入
+            hr_id: HR ID
+            task_id: 任务ID,为空时新建
+            lock_name: 去重锁名称,worker 执行时接手该锁并续期
+            fence: 去重锁的栅栏令牌
+
+        Returns:
+            str: 任务ID
+        """
+        task_id = task_id or IdUtil.generate_uuid_32()
+        enqueued_at = _now_ms()
+        job = {
+            "task_id": task_id,
+            "user_input": user_input,
+            "hr_id": hr_id,
+            "enqueued_at": enqueued_at,
+        }
+        if lock_name:
+            job.update(lock_name=lock_name, fence=fence)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(
+                self.status_key(task_id),
+                mapping={"status": STATUS_PENDING, "hr_id": hr_id, "enqueued_at": enqueued_at},
+            )
+            pipe.expire(self.status_key(task_id), self.status_ttl)
+            pipe.xadd(self.stream, job, maxlen=self.maxlen, approximate=True)
+            await pipe.execute()
+        return task_id
+
+    async def get_status(self, task_id: str) -> dict[str, str] | None:
+        """获取任务状态,任务不存在或已过期时返回 None"""
+        status = await self.client.hgetall(self.status_key(task_id))
+        return status or None
+
+    async def set_status(self, task_id: str, status: str, **fields: Any) -> None:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.status_key(task_id), mapping={"status": status, **fields})
+            pipe.expire(self.status_key(task_id), self.status_ttl)
+            await pipe.execute()
+
+    # ===============================================events====================================================
+
+    async def publish_event(self, task_id: str, event_type: str, data: str) -> str:
+        """写入任务事件,返回事件ID"""
+        key = self.events_key(task_id)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.xadd(
+                key, {"type": event_type, "data": data},
+                maxlen=self.events_maxlen, approximate=True,
+            )
+            pipe.expire(key, self.events_ttl)
+            event_id, _ = await pipe.execute()
+        return event_id
+
+    async def read_events(
+        self, task_id: str, last_id: str = "0", count: int = 100
+    ) -> list[tuple[str, dict[str, str]]]:
+        """
+        读取 last_id 之后的任务事件(不阻塞),last_id 为 "0" 时从头读取
+
+        Returns:
+            List[Tuple[str, Dict]]: (事件ID, {"type", "data"}) 列表
+        """
+        response = await self.client.xread({self.events_key(task_id): last_id}, count=count)
+        return [entry for _, entries in response or () for entry in entries]
+
+    # ===============================================consumer====================================================
+
+    async def ensure_group(self) -> None:
+        """创建消费者组(流不存在时一并创建),已存在时忽略"""
+        try:
+            await self.client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read(self, consumer: str, count: int, block_ms: int) -> list[WorkflowJob]:
+        """读取新任务,最多阻塞 block_ms 毫秒"""
+        response = await self.client.xreadgroup(
+            self.group, consumer, {self.stream: ">"}, count=count, block=block_ms
+        )
+        return [
+            WorkflowJob.from_entry(message_id, fields)
+            for _, entries in response or ()
+            for message_id, fields in entries
+        ]
+
+    async def ack(self, message_id: str) -> None:
+        await self.client.xack(self.stream, self.group, message_id)
+
+    async def touch(self, consumer: str, message_ids: list[str]) -> set[str]:
+        """
+        重置执行中任务的空闲时间,避免长时间运行的任务被其他 worker 接管
+
+        Returns:
+            Set[str]: 仍归属该消费者的任务ID,不在其中的任务已被其他 worker 接管
+        """
+        if not message_ids:
+            return set()
+        touched = await self.client.eval(
+            TOUCH_SCRIPT, 1, self.stream, self.group, consumer, *message_ids
+        )
+        return set(touched)
+
+    async def reclaim(self, consumer: str, min_idle_ms: int, count: int) -> list[tuple[WorkflowJob, int]]:
+        """
+        接管空闲超过 min_idle_ms 的未确认任务
+
+        Returns:
+            List[Tuple[WorkflowJob, int]]: 接管的任务及其累计投递次数
+        """
+        response = await self.client.xautoclaim(
+            self.stream, self.group, consumer, min_idle_ms, start_id=self._reclaim_cursor, count=count
+        )
+        self._reclaim_cursor = response[0] or "0-0"
+        entries = response[1]
+        # 已被裁剪出流的任务无法再执行,直接确认(Redis 7+ 返回第三项)
+        for message_id in response[2] if len(response) > 2 else ():
+            await self.ack(message_id)
+        entries = [(message_id, fields) for message_id, fields in entries if fields]
+        if not entries:
+            return []
+
+        pending = await self.client.xpending_range(
+            self.stream, self.group, min=entries[0][0], max=entries[-1][0],
+            count=len(entries) * 2, consumername=consumer,
+        )
+        deliveries = {item["message_id"]: item["times_delivered"] for item in pending}
+        return [
+            (WorkflowJob.from_entry(message_id, fields), deliveries.get(message_id, 1))
+            for message_id, fields in entries
+        ]
+
+    async def dead_letter(self, job: WorkflowJob, reason: str) -> None:
+        """转入死信流、确认原任务并释放其去重锁"""
+        await self.client.xadd(
+            self.dead_letter_stream,
+            {**job._asdict(), "reason": reason, "dead_at": _now_ms()},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+        await self.ack(job.message_id)
+        await self.release_dedup_lock(job)
+
+    async def release_dedup_lock(self, job: WorkflowJob) -> bool:
+        """释放任务提交时获得的去重锁,之后相同的提交会新建任务;锁已不属于该任务时返回False"""
+        if not job.lock_name:
+            return False
+        lock = LeaseLock(job.lock_name, owner=job.task_id, client=self.client)
+        lock.token = job.fence
+        return await lock.release()
+
+    # ===============================================report====================================================
+
+    async def stats(self) -> dict[str, Any]:
+        """
+        队列统计
+
+        Returns:
+            Dict: length 流长度, pending 已投递未确认数, lag 未投递数(Redis 7+),
+                  oldest_age_seconds 最早未投递任务的等待时间, consumers 消费者数
+        """
+        result: dict[str, Any] = {
+            "stream": self.stream,
+            "group": self.group,
+            "length": await self.client.xlen(self.stream),
+            "pending": 0,
+            "lag": None,
+            "oldest_age_seconds": 0.0,
+            "consumers": 0,
+        }
+        try:
+            groups = await self.client.xinfo_groups(self.stream)
+        except ResponseError:
+            return result
+        group = next((g for g in groups if g["name"] == self.group), None)
+        if group is None:
+            return result
+        result["pending"] = group["pending"]
+        result["consumers"] = group["consumers"]
+        result["lag"] = group.get("lag")
+
+        oldest = await self.client.xrange(
+            self.stream, min=f"({group['last-delivered-id']}", count=1
+        )
+        if oldest:
+            oldest_ms = int(oldest[0][0].split("-")[0])
+            result["oldest_age_seconds"] = max(0.0, (_now_ms() - oldest_ms) / 1000)
+        return result
+
+
+async def _refresh_queue_metrics() -> None:
+    if AsyncRedisService.is_bound():
+        observe_workflow_queue(await WorkflowJobQueue.from_app().stats())
+
+
+register_async_scrape_hook(_refresh_queue_metrics)
@@ -1,9 +1,12 @@
 import argparse
 import asyncio
+import inspect
+from collections.abc import Awaitable, Callable
+from typing import Any
 
 from loguru import logger
 
-from app.services.now_find_agents.graph_builder import GraphBuilder
+from app.services.now_find_agents.graph_registry import graph_registry
 from app.services.workflow.base import create_workflow_config
 from app.utils.common.id_util import IdUtil
 
@@ -11,15 +14,29 @@ from app.utils.common.id_util import IdUtil
 async def run_agent_workflow(
     user_input: str,
     hr_id: int,
-):
+    task_id: str | None = None,
+    on_event: Callable[[Any], Awaitable[None] | None] | None = None,
+) -> str:
+    """
+    运行Agent工作流
+
+    Args:
+        user_input: 用户输入
+        hr_id: HR ID
+        task_id: 任务ID,为空时新建(任务队列中由 enqueue 预先生成)
+        on_event: 工作流事件回调,可以是普通函数或协程函数
+
+    Returns:
+        str: 任务ID
+    """
     if not user_input:
         raise ValueError("Input could not be empty")
 
-    # 确保图已初始化
-    graph = await GraphBuilder().build_graph_async()
+    # 获取进程内共享的编译图,配置未变化时不重新编译
+    graph = await graph_registry.get()
 
     # 为会话创建唯一ID (用于checkpointer)
-    task_id = IdUtil.generate_uuid_32()
+    task_id = task_id or IdUtil.generate_uuid_32()
     logger.info(f"创建新会话,task_id: {task_id}")
 
     # 初始化创建任务表数据
@@ -47,9 +64,24 @@ async def run_agent_workflow(
     config = create_workflow_config(task_id = task_id,)
 
     # 运行工作流
-    stream_generator = graph.astream(data, config=config,stream_mode = ["values","updates","messages"])
-    async for event in stream_generator:
-        print(f"event: {event}\n")
+    try:
+        stream_generator = graph.astream(data, config=config,stream_mode = ["values","updates","messages"])
+        async for event in stream_generator:
+            if on_event is not None:
+                result = on_event(event)
+                if inspect.isawaitable(result):
+                    await result
+    except BaseException:
+        # 失败时也写入已完成步骤的进度,写入异常不覆盖原异常
+        try:
+            await graph_registry.flush(task_id)
+        except Exception as e:
+            logger.warning(f"会话 {task_id} 的checkpoint落库失败: {e}")
+        raise
+    # 写后缓冲中的checkpoint在运行结束时落库,任务确认前会话进度已持久化
+    await graph_registry.flush(task_id)
+    return task_id
+
 
 if __name__ == "__main__":
     # 创建命令行参数解析器
@@ -70,4 +102,6 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     # 运行工作流
-    asyncio.run(run_agent_workflow(args.input, args.hr_id))
+    asyncio.run(
+        run_agent_workflow(args.input, args.hr_id, on_event=lambda event: print(f"event: {event}\n"))
+    )
@@ -0,0 +1,323 @@
+"""
+工作流 worker
+
+从 Redis Streams 任务队列读取任务并运行 Agent 工作流,与 API 进程分开部署:
+
+    python -m app.services.workflow.worker --concurrency 4
+
+- 同一进程内最多同时运行 concurrency 个任务,只在有空闲槽位时读取新任务
+- 定期重置执行中任务的空闲时间,并通过 XAUTOCLAIM 接管其他 worker 崩溃后遗留的任务;
+  本进程停顿期间已被其他 worker 接管的任务停止本地执行
+- 任务带去重锁时接手该锁并由看门狗续期,结束后释放;续期失败、锁已被其他任务获得时取消执行并标记失败;
+  工作流事件写入任务事件流,供重复提交的调用方跟随
+- 收到 SIGTERM/SIGINT 后停止读取,等待执行中的任务结束;超时未结束的任务保持未确认,由其他 worker 接管
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import time
+from contextlib import nullcontext
+from typing import Any
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.services.llms_manage.client_registry import llm_client_registry
+from app.services.now_find_agents.graph_registry import graph_registry
+from app.services.redis import AsyncRedisService
+from app.services.redis_lock import LeaseLock, LockLostError
+from app.services.workflow.job_queue import (EVENT_END, STATUS_FAILED,
+                                             STATUS_RUNNING, STATUS_SUCCEEDED,
+                                             WorkflowJob, WorkflowJobQueue)
+from app.services.workflow.start_workflow import run_agent_workflow
+from config.config import get_settings
+
+
+class WorkflowWorker:
+    """工作流任务消费者"""
+
+    def __init__(
+        self,
+        queue: WorkflowJobQueue,
+        consumer: str | None = None,
+        concurrency: int = 4,
+        job_timeout: float | None = None,
+        claim_idle_ms: int = 60000,
+        max_deliveries: int = 3,
+        block_ms: int = 2000,
+    ):
+        """
+        Args:
+            queue: 任务队列
+            consumer: 消费者名称,需在消费者组内唯一,默认 主机名-进程号
+            concurrency: 同时运行的任务数
+            job_timeout: 单个任务的超时时间(秒),None 为不限制
+            claim_idle_ms: 未确认任务空闲超过该时间(毫秒)后可被接管
+            max_deliveries: 任务最多投递次数,超过后转入死信流
+            block_ms: 读取新任务时的最长阻塞时间(毫秒)
+        """
+        self.queue = queue
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = concurrency
+        self.job_timeout = job_timeout
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+        self.block_ms = block_ms
+        self._in_flight: dict[asyncio.Task, WorkflowJob] = {}
+        # 执行中任务接手的去重锁,按消息ID索引
+        self._locks: dict[str, LeaseLock] = {}
+        self._stopping = asyncio.Event()
+
+    @property
+    def free_slots(self) -> int:
+        return self.concurrency - len(self._in_flight)
+
+    def stop(self) -> None:
+        """停止读取新任务"""
+        if not self._stopping.is_set():
+            logger.info(f"worker {self.consumer} 正在停止,等待 {len(self._in_flight)} 个任务结束")
+            self._stopping.set()
+
+    async def run(self, shutdown_timeout: float = 30.0) -> None:
+        """运行直到 stop() 被调用,然后在 shutdown_timeout 秒内等待执行中的任务结束"""
+        await self.queue.ensure_group()
+        logger.info(
+            f"worker {self.consumer} 已启动 | stream={self.queue.stream} group={self.queue.group} "
+            f"concurrency={self.concurrency}"
+        )
+        maintenance = asyncio.create_task(self._maintenance_loop(), name="workflow-maintenance")
+        try:
+            await self._read_loop()
+        finally:
+            maintenance.cancel()
+            await asyncio.gather(maintenance, return_exceptions=True)
+            if self._in_flight:
+                done, pending = await asyncio.wait(self._in_flight, timeout=shutdown_timeout)
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    logger.warning(f"{len(pending)} 个任务未在停止超时前结束,将由其他 worker 接管")
+                    await asyncio.gather(*pending, return_exceptions=True)
+            logger.info(f"worker {self.consumer} 已停止")
+
+    async def _read_loop(self) -> None:
+        while not self._stopping.is_set():
+            if self.free_slots <= 0:
+                # 定时醒来以便及时响应 stop()
+                await asyncio.wait(self._in_flight, timeout=1.0, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            try:
+                jobs = await self.queue.read(self.consumer, self.free_slots, self.block_ms)
+            except (RedisError, OSError) as e:
+                logger.warning(f"读取任务失败,1秒后重试: {e}")
+                await asyncio.sleep(1)
+                if "NOGROUP" in str(e):
+                    await self.queue.ensure_group()
+                continue
+            for job in jobs:
+                self._start(job)
+
+    async def _maintenance_loop(self) -> None:
+        interval = max(self.claim_idle_ms / 3000, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._touch()
+                if self.free_slots > 0 and not self._stopping.is_set():
+                    await self._reclaim()
+            except Exception as e:
+                logger.warning(f"任务队列维护失败: {e}")
+
+    async def _touch(self) -> None:
+        in_flight = dict(self._in_flight)
+        owned = await self.queue.touch(self.consumer, [job.message_id for job in in_flight.values()])
+        for task, job in in_flight.items():
+            if job.message_id not in owned and not task.done():
+                # 本进程停顿期间任务已被其他 worker 接管,停止本地执行,避免同一任务运行两份
+                logger.warning(f"任务 {job.task_id} 已被其他 worker 接管,停止本地执行")
+                # 接管方以相同令牌持有去重锁,退出时不能释放
+                lock = self._locks.pop(job.message_id, None)
+                if lock is not None:
+                    lock.detach()
+                task.cancel()
+
+    async def _reclaim(self) -> None:
+        claimed = await self.queue.reclaim(self.consumer, self.claim_idle_ms, self.free_slots)
+        for job, deliveries in claimed:
+            if deliveries > self.max_deliveries:
+                logger.error(f"任务 {job.task_id} 已投递 {deliveries} 次,转入死信流")
+                await self.queue.dead_letter(job, f"超过最大投递次数 {self.max_deliveries}")
+                await self.queue.set_status(
+                    job.task_id, STATUS_FAILED, error="超过最大投递次数", finished_at=_now_ms()
+                )
+                continue
+            logger.warning(f"接管任务 {job.task_id} (第 {deliveries} 次投递)")
+            self._start(job)
+
+    def _start(self, job: WorkflowJob) -> None:
+        task = asyncio.create_task(self._run_job(job), name=f"workflow:{job.task_id}")
+        self._in_flight[task] = job
+        task.add_done_callback(self._on_job_done)
+
+    def _on_job_done(self, task: asyncio.Task) -> None:
+        job = self._in_flight.pop(task)
+        self._locks.pop(job.message_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            # 结束状态写入或确认失败,任务保持未确认,由其他 worker 接管
+            logger.opt(exception=task.exception()).error(f"任务 {job.task_id} 结束处理失败,等待其他 worker 接管")
+
+    async def _adopt_lock(self, job: WorkflowJob) -> LeaseLock | None:
+        """接手提交时获得的去重锁,锁已在排队期间过期时不加锁执行"""
+        if not job.lock_name:
+            return None
+        lock = LeaseLock(
+            job.lock_name,
+            ttl_ms=get_settings().WORKFLOW_LOCK_TTL_MS,
+            owner=job.task_id,
+            client=self.queue.client,
+        )
+        if await lock.adopt(job.fence):
+            return lock
+        logger.warning(f"任务 {job.task_id} 的去重锁已过期,本次执行不去重")
+        return None
+
+    async def _run_job(self, job: WorkflowJob) -> None:
+        started = time.monotonic()
+
+        async def publish(event: Any) -> None:
+            serialized = _serialize_event(event)
+            if serialized is not None:
+                await self.queue.publish_event(job.task_id, *serialized)
+
+        try:
+            await self.queue.set_status(
+                job.task_id, STATUS_RUNNING, consumer=self.consumer, started_at=_now_ms()
+            )
+            lock = await self._adopt_lock(job)
+        except (RedisError, OSError) as e:
+            # 未开始执行,任务保持未确认,空闲超时后由其他 worker 接管
+            logger.error(f"任务 {job.task_id} 开始执行失败,等待其他 worker 接管: {e}")
+            return
+
+        if lock is not None:
+            self._locks[job.message_id] = lock
+        try:
+            # 租约丢失(去重锁已被其他任务获得)时停止执行,不与新持有者同时运行
+            async with lock.watch(cancel_on_lost=True) if lock is not None else nullcontext():
+                await asyncio.wait_for(
+                    run_agent_workflow(
+                        job.user_input, job.hr_id, task_id=job.task_id, on_event=publish
+                    ),
+                    self.job_timeout,
+                )
+        except asyncio.CancelledError:
+            # 停止超时或已被其他 worker 接管时被取消: 不确认,由其他 worker 接管
+            raise
+        except Exception as e:
+            if isinstance(e, LockLostError):
+                logger.error(f"任务 {job.task_id} 的去重锁已丢失,停止执行")
+            else:
+                logger.exception(f"任务 {job.task_id} 执行失败")
+            error = repr(e)[:1000]
+            # 先写结束事件再更新状态,跟随者看到终态时事件流已完整
+            await self.queue.publish_event(
+                job.task_id, EVENT_END, json.dumps({"status": STATUS_FAILED, "error": error})
+            )
+            await self.queue.set_status(
+                job.task_id, STATUS_FAILED, error=error, finished_at=_now_ms()
+            )
+        else:
+            await self.queue.publish_event(
+                job.task_id, EVENT_END, json.dumps({"status": STATUS_SUCCEEDED})
+            )
+            await self.queue.set_status(job.task_id, STATUS_SUCCEEDED, finished_at=_now_ms())
+            logger.info(f"任务 {job.task_id} 完成,耗时 {time.monotonic() - started:.1f}s")
+        await self.queue.ack(job.message_id)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _serialize_event(event: Any) -> tuple[str, str] | None:
+    """
+    把 graph.astream 多模式事件 (mode, chunk) 转为 (事件类型, JSON)
+
+    values 为每步的完整状态,数据量大且可由 updates 推得,不写入事件流;
+    messages 只保留消息片段内容与所属节点
+    """
+    if not isinstance(event, tuple) or len(event) != 2:
+        return "event", json.dumps(event, ensure_ascii=False, default=str)
+    mode, chunk = event
+    if mode == "values":
+        return None
+    if mode == "messages":
+        message, metadata = chunk
+        chunk = {
+            "node": metadata.get("langgraph_node"),
+            "content": getattr(message, "content", str(message)),
+        }
+    return mode, json.dumps(chunk, ensure_ascii=False, default=str)
+
+
+def create_redis_client() -> Redis:
+    """worker 独立的Redis客户端,不设读超时,阻塞读取的时长由 XREADGROUP BLOCK 控制"""
+    settings = get_settings()
+    return Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        password=settings.REDIS_PASSWORD or None,
+        decode_responses=True,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        socket_timeout=None,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+    )
+
+
+async def main(concurrency: int, consumer: str | None) -> None:
+    settings = get_settings()
+    client = create_redis_client()
+    # 工作流中的限流器等组件通过 AsyncRedisService 访问Redis
+    AsyncRedisService.bind(client)
+
+    worker = WorkflowWorker(
+        WorkflowJobQueue(client),
+        consumer=consumer,
+        concurrency=concurrency,
+        job_timeout=settings.WORKFLOW_JOB_TIMEOUT or None,
+        claim_idle_ms=settings.WORKFLOW_CLAIM_IDLE_MS,
+        max_deliveries=settings.WORKFLOW_MAX_DELIVERIES,
+    )
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    # 工作流checkpointer建表并启动过期会话清理
+    await graph_registry.start()
+    llm_client_registry.start()
+    try:
+        await worker.run(shutdown_timeout=settings.WORKFLOW_SHUTDOWN_TIMEOUT)
+    finally:
+        await graph_registry.stop()
+        await llm_client_registry.aclose()
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="运行工作流 worker")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=get_settings().WORKFLOW_WORKER_CONCURRENCY,
+        help="同时运行的任务数",
+    )
+    parser.add_argument("--consumer", type=str, default=None, help="消费者名称,默认 主机名-进程号")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.concurrency, args.consumer))
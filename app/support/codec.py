@@ -0,0 +1,253 @@
+"""
+Redis 值编解码
+
+编码结果为 [头字节] + 负载:
+- 头字节取值 0xF8-0xFF(UTF-8 中不会出现的字节),第 2 位为序列化格式,低 2 位为压缩算法
+- 未压缩的 JSON 不加头字节,与旧版 json.dumps 写入的值一致,灰度期间新旧实例可以互相读取
+- 解码时没有头字节的值按 JSON 解析,兼容旧数据;解码不依赖当前配置,可以读取任意格式写入的值
+
+序列化: json(优先使用 orjson,未安装时回退标准库,输出格式兼容) / msgpack
+压缩: none / zstd / lz4,只压缩超过 compress_min_bytes 的负载,且仅在压缩后更小时使用
+
+开启 msgpack 或压缩前,需先确保所有读取方都已升级到支持头字节的版本。
+"""
+
+import json
+import threading
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from functools import lru_cache
+from typing import Any
+from uuid import UUID
+
+from loguru import logger
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 为 fastapi ORJSONResponse 的依赖
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+SERIALIZER_JSON = "json"
+SERIALIZER_MSGPACK = "msgpack"
+
+COMPRESSION_NONE = "none"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSION_LZ4 = "lz4"
+
+_HEADER_BASE = 0xF8
+_SERIALIZER_IDS = {SERIALIZER_JSON: 0, SERIALIZER_MSGPACK: 1}
+_COMPRESSION_IDS = {COMPRESSION_NONE: 0, COMPRESSION_ZSTD: 1, COMPRESSION_LZ4: 2}
+_SERIALIZER_NAMES = {v: k for k, v in _SERIALIZER_IDS.items()}
+_COMPRESSION_NAMES = {v: k for k, v in _COMPRESSION_IDS.items()}
+
+
+class CodecError(ValueError):
+    """值无法编码或解码(格式未知或所需的库未安装)"""
+
+
+def _default(obj: Any) -> Any:
+    """orjson/msgpack/json 无法直接序列化的类型"""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (Decimal, UUID)):
+        return str(obj)
+    raise TypeError(f"无法序列化 {type(obj).__name__} 类型的值")
+
+
+# ===============================================serializers====================================================
+
+
+def _json_dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _json_loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _msgpack_dumps(obj: Any) -> bytes:
+    return msgpack.packb(obj, default=_default, use_bin_type=True)
+
+
+def _msgpack_loads(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+# ===============================================compressors====================================================
+
+# zstandard 的压缩/解压上下文不能跨线程共享,按线程缓存
+_zstd_local = threading.local()
+
+
+def _zstd_compress(data: bytes, level: int) -> bytes:
+    compressors = getattr(_zstd_local, "compressors", None)
+    if compressors is None:
+        compressors = _zstd_local.compressors = {}
+    compressor = compressors.get(level)
+    if compressor is None:
+        compressor = compressors[level] = zstandard.ZstdCompressor(level=level)
+    return compressor.compress(data)
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    decompressor = getattr(_zstd_local, "decompressor", None)
+    if decompressor is None:
+        decompressor = _zstd_local.decompressor = zstandard.ZstdDecompressor()
+    # 压缩时写入了内容长度,无需预估输出大小
+    return decompressor.decompress(data)
+
+
+def _available(serializer: str, compression: str) -> str | None:
+    """返回不可用的依赖名称,全部可用时返回 None"""
+    if serializer == SERIALIZER_MSGPACK and msgpack is None:
+        return "msgpack"
+    if compression == COMPRESSION_ZSTD and zstandard is None:
+        return "zstandard"
+    if compression == COMPRESSION_LZ4 and lz4_frame is None:
+        return "lz4"
+    return None
+
+
+# ===============================================codec====================================================
+
+
+class Codec:
+    """按配置的序列化格式与压缩算法编码,解码支持所有格式"""
+
+    def __init__(
+        self,
+        serializer: str = SERIALIZER_JSON,
+        compression: str = COMPRESSION_NONE,
+        compress_min_bytes: int = 1024,
+        compress_level: int = 3,
+    ):
+        """
+        Args:
+            serializer: json / msgpack
+            compression: none / zstd / lz4
+            compress_min_bytes: 负载达到该大小(字节)时才压缩
+            compress_level: zstd 压缩级别
+
+        Raises:
+            CodecError: 格式不支持或所需的库未安装
+        """
+        if serializer not in _SERIALIZER_IDS:
+            raise CodecError(f"不支持的序列化格式: {serializer}")
+        if compression not in _COMPRESSION_IDS:
+            raise CodecError(f"不支持的压缩算法: {compression}")
+        missing = _available(serializer, compression)
+        if missing:
+            raise CodecError(f"{serializer}/{compression} 需要安装 {missing}")
+        self.serializer = serializer
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self.compress_level = compress_level
+        self._dumps = _msgpack_dumps if serializer == SERIALIZER_MSGPACK else _json_dumps
+        self._serializer_id = _SERIALIZER_IDS[serializer]
+
+    def __repr__(self) -> str:
+        return (
+            f"Codec(serializer={self.serializer!r}, compression={self.compression!r}, "
+            f"compress_min_bytes={self.compress_min_bytes})"
+        )
+
+    def encode(self, obj: Any) -> bytes:
+        """编码为带头字节的 bytes(未压缩的 JSON 不带头字节)"""
+        payload = self._dumps(obj)
+        compression_id = 0
+        if self.compression != COMPRESSION_NONE and len(payload) >= self.compress_min_bytes:
+            compressed = self._compress(payload)
+            if len(compressed) < len(payload):
+                payload = compressed
+                compression_id = _COMPRESSION_IDS[self.compression]
+
+        if self._serializer_id == 0 and compression_id == 0:
+            return payload
+        return bytes((_HEADER_BASE | self._serializer_id << 2 | compression_id,)) + payload
+
+    def decode(self, data: bytes | str | None) -> Any:
+        return decode(data)
+
+    def _compress(self, payload: bytes) -> bytes:
+        if self.compression == COMPRESSION_ZSTD:
+            return _zstd_compress(payload, self.compress_level)
+        return lz4_frame.compress(payload)
+
+
+def decode(data: bytes | str | None) -> Any:
+    """
+    解码任意格式编码的值
+
+    Args:
+        data: Redis 返回的原始值,None 或空值返回 None;str 与无头字节的 bytes 按 JSON 解析
+
+    Raises:
+        CodecError: 头字节未知或所需的库未安装
+    """
+    if not data:
+        return None
+    if isinstance(data, str) or data[0] < _HEADER_BASE:
+        return _json_loads(data)
+
+    header = data[0] - _HEADER_BASE
+    serializer = _SERIALIZER_NAMES.get(header >> 2)
+    compression = _COMPRESSION_NAMES.get(header & 0b11)
+    if serializer is None or compression is None:
+        raise CodecError(f"未知的编码头字节: {data[0]:#x}")
+    missing = _available(serializer, compression)
+    if missing:
+        raise CodecError(f"解码 {serializer}/{compression} 格式的值需要安装 {missing}")
+
+    payload = memoryview(data)[1:]
+    if compression == COMPRESSION_ZSTD:
+        payload = _zstd_decompress(payload)
+    elif compression == COMPRESSION_LZ4:
+        payload = lz4_frame.decompress(payload)
+    else:
+        payload = bytes(payload)
+    if serializer == SERIALIZER_MSGPACK:
+        return _msgpack_loads(payload)
+    return _json_loads(payload)
+
+
+@lru_cache
+def get_codec() -> Codec:
+    """按应用配置创建默认编解码器,配置的格式不可用时回退为 JSON 不压缩"""
+    from config.config import get_settings
+
+    settings = get_settings()
+    try:
+        return Codec(
+            serializer=settings.REDIS_CODEC_SERIALIZER,
+            compression=settings.REDIS_CODEC_COMPRESSION,
+            compress_min_bytes=settings.REDIS_CODEC_COMPRESS_MIN_BYTES,
+        )
+    except CodecError as e:
+        logger.warning(f"Redis 编解码配置不可用,回退为 json/none: {e}")
+        return Codec()
@@ -0,0 +1,213 @@
+"""
+后台批量日志写入器
+
+loguru 的文件 sink 在调用 logger.info() 的线程中同步写盘,在事件循环线程上
+磁盘延迟会直接体现为请求延迟。BackgroundLogWriter 作为 loguru 的可调用 sink,
+只负责把格式化后的日志放入有界队列,由专用线程批量取出后一次性写入目标 sink。
+
+- 队列满时按 overflow_policy 处理: "drop" 丢弃并计数, "block" 阻塞等待(超时后丢弃)
+- 提供 queue_depth / dropped / written / batches 等统计
+- 通过 os.register_at_fork 在 fork 出的子进程中重建队列与线程,
+  uvicorn 多 worker 场景下每个进程拥有独立的写入线程
+"""
+
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+import weakref
+from collections.abc import Callable
+
+from app.support.memory_debug import register_memory_probe
+
+OVERFLOW_DROP = "drop"
+OVERFLOW_BLOCK = "block"
+
+_STOP = object()
+
+# 所有存活的写入器,用于 fork 后重建与进程退出时刷新
+_writers: "weakref.WeakSet[BackgroundLogWriter]" = weakref.WeakSet()
+
+
+class BackgroundLogWriter:
+    """有界队列 + 专用线程的批量日志写入器"""
+
+    def __init__(
+        self,
+        name: str,
+        write: Callable[[str], None],
+        flush: Callable[[], None] | None = None,
+        queue_size: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        overflow_policy: str = OVERFLOW_DROP,
+        block_timeout: float = 1.0,
+    ):
+        """
+        Args:
+            name: 写入器名称,用于统计与线程命名
+            write: 实际写入函数,接收一个批次拼接后的文本
+            flush: 每个批次写入后调用的刷新函数
+            queue_size: 队列容量
+            batch_size: 单个批次最多合并的日志条数
+            flush_interval: 队列为空时线程的最长等待时间(秒)
+            overflow_policy: 队列满时的处理策略, drop 或 block
+            block_timeout: block 策略下最长等待时间(秒),超时后丢弃
+        """
+        if overflow_policy not in (OVERFLOW_DROP, OVERFLOW_BLOCK):
+            raise ValueError(f"不支持的队列溢出策略: {overflow_policy}")
+
+        self.name = name
+        self._write = write
+        self._flush = flush
+        self._queue_size = queue_size
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._overflow_policy = overflow_policy
+        self._block_timeout = block_timeout
+
+        self._dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self._reported_dropped = 0
+
+        self._start()
+        _writers.add(self)
+
+    def _start(self) -> None:
+        self._queue: queue.Queue = queue.Queue(maxsize=self._queue_size)
+        self._thread = threading.Thread(
+            target=self._run, name=f"log-writer-{self.name}", daemon=True
+        )
+        self._closed = False
+        self._thread.start()
+
+    def __call__(self, message: str) -> None:
+        """loguru sink 入口,只做入队,不做任何 IO"""
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            if self._overflow_policy == OVERFLOW_BLOCK:
+                try:
+                    self._queue.put(message, timeout=self._block_timeout)
+                    return
+                except queue.Full:
+                    pass
+            # 任意线程都可能调用 sink,计数在队列的锁内递增
+            with self._queue.mutex:
+                self._dropped += 1
+
+    @property
+    def dropped(self) -> int:
+        """队列满时丢弃的日志条数"""
+        return self._dropped
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                self._report_dropped()
+                continue
+
+            batch = []
+            stop = item is _STOP
+            if not stop:
+                batch.append(item)
+            while len(batch) < self._batch_size and not stop:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                self._write_batch(batch)
+            self._report_dropped()
+            if stop:
+                return
+
+    def _write_batch(self, batch: list[str]) -> None:
+        try:
+            self._write("".join(batch))
+            if self._flush is not None:
+                self._flush()
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            # 写入失败时不能再走 logger,否则会重新进入本队列
+            self.errors += 1
+            sys.stderr.write(f"[log-writer-{self.name}] 日志写入失败: {e}\n")
+
+    def _report_dropped(self) -> None:
+        if self.dropped != self._reported_dropped:
+            sys.stderr.write(
+                f"[log-writer-{self.name}] 日志队列已满,累计丢弃 {self.dropped} 条\n"
+            )
+            self._reported_dropped = self.dropped
+
+    def stats(self) -> dict:
+        """获取写入器统计信息"""
+        return {
+            "name": self.name,
+            "queue_depth": self._queue.qsize(),
+            "queue_size": self._queue_size,
+            "dropped": self.dropped,
+            "written": self.written,
+            "batches": self.batches,
+            "errors": self.errors,
+            "overflow_policy": self._overflow_policy,
+        }
+
+    def close(self, timeout: float = 5.0) -> None:
+        """停止写入线程,并写完队列中剩余的日志"""
+        if self._closed:
+            return
+        self._closed = True
+        deadline = time.monotonic() + timeout
+        while self._thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=0.1)
+                break
+            except queue.Full:
+                if time.monotonic() >= deadline:
+                    return
+        self._thread.join(max(deadline - time.monotonic(), 0))
+
+    def _reinit_after_fork(self) -> None:
+        # fork 后父进程的写入线程不存在于子进程中,丢弃继承的队列并重新启动
+        self._dropped = self.written = self.batches = self.errors = 0
+        self._reported_dropped = 0
+        self._start()
+
+
+def get_writer_stats() -> list[dict]:
+    """获取当前进程所有写入器的统计信息"""
+    return [writer.stats() for writer in list(_writers)]
+
+
+def close_all_writers(timeout: float = 5.0) -> None:
+    """关闭当前进程所有写入器(进程退出或应用关闭时调用)"""
+    for writer in list(_writers):
+        writer.close(timeout)
+
+
+def _after_fork_in_child() -> None:
+    for writer in list(_writers):
+        if not writer._closed:
+            writer._reinit_after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(close_all_writers)
+register_memory_probe(
+    "log_writer.queues", lambda: {writer.name: writer._queue.qsize() for writer in list(_writers)}
+)
@@ -0,0 +1,253 @@
+"""
+事件循环延迟监控与阻塞调用检测
+
+- 心跳协程每 interval 秒 sleep 一次,实际唤醒时间与预期之差即为事件循环调度延迟
+- 守护线程检查心跳,事件循环线程超过 block_threshold 未响应时,通过 sys._current_frames()
+  抓取事件循环线程当前的调用栈,按项目内最近的调用点 (文件:行号 函数) 聚合
+
+同步 Redis、requests、文件 IO、Nacos 客户端等阻塞调用都会以调用点的形式出现在统计中。
+统计数据为进程内数据,通过 /debug/loop 查看。
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from loguru import logger
+
+from app.support.memory_debug import register_memory_probe
+from app.support.metrics import observe_loop_block, observe_loop_lag
+
+# 项目根目录,用于从调用栈中定位项目内的调用点
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_SITE_MARKERS = ("site-packages", "dist-packages", f"{os.sep}lib{os.sep}python")
+
+
+def _is_project_frame(filename: str) -> bool:
+    return (
+        filename.startswith(_PROJECT_ROOT)
+        and not any(marker in filename for marker in _SITE_MARKERS)
+        and filename != __file__
+    )
+
+
+class BlockingEvent:
+    """按调用点聚合的阻塞事件"""
+
+    __slots__ = ("call_site", "blocking_frame", "stack", "count", "total_ms", "max_ms", "last_seen")
+
+    def __init__(self, call_site: str, blocking_frame: str, stack: list[str]):
+        self.call_site = call_site
+        self.blocking_frame = blocking_frame
+        self.stack = stack
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_seen = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "call_site": self.call_site,
+            "blocking_frame": self.blocking_frame,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 1),
+            "max_ms": round(self.max_ms, 1),
+            "last_seen": self.last_seen,
+            "stack": self.stack,
+        }
+
+
+class LoopMonitor:
+    """事件循环延迟监控器"""
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        block_threshold: float = 0.1,
+        max_events: int = 200,
+        stack_depth: int = 30,
+    ):
+        """
+        Args:
+            interval: 心跳间隔(秒)
+            block_threshold: 事件循环线程超过该时长(秒)未响应视为阻塞并抓取调用栈
+            max_events: 最多保留的调用点数量
+            stack_depth: 记录的调用栈深度
+        """
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.max_events = max_events
+        self.stack_depth = stack_depth
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._heartbeat_task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+        self._last_beat = 0.0
+        self._beat_seq = 0
+        # 当前阻塞片段: (心跳序号, 聚合事件, 已计入的阻塞时长ms)
+        self._episode: tuple[int, BlockingEvent, float] | None = None
+        self._lags: deque[float] = deque(maxlen=3000)
+        self._max_lag_ms = 0.0
+        self._events: dict[str, BlockingEvent] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._heartbeat_task is not None and not self._heartbeat_task.done()
+
+    def start(self) -> None:
+        """在事件循环中启动心跳协程与守护线程"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat_task = self._loop.create_task(self._heartbeat(), name="loop-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+        logger.info(
+            f"事件循环监控已启动: interval={self.interval * 1000:.0f}ms, "
+            f"block_threshold={self.block_threshold * 1000:.0f}ms"
+        )
+
+    async def stop(self) -> None:
+        """停止监控"""
+        self._stopped.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1.0)
+            self._watchdog = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag_ms = max(now - expected, 0.0) * 1000
+            self._lags.append(lag_ms)
+            if lag_ms > self._max_lag_ms:
+                self._max_lag_ms = lag_ms
+            observe_loop_lag(lag_ms / 1000)
+            if self._episode is not None and self._episode[0] == self._beat_seq:
+                self._finish_episode(lag_ms)
+            self._last_beat = now
+            self._beat_seq += 1
+
+    def _finish_episode(self, lag_ms: float) -> None:
+        # 阻塞结束后以心跳实测延迟修正守护线程最后一次检查之后的阻塞时长
+        with self._lock:
+            if self._episode is None:
+                return
+            _, event, counted_ms = self._episode
+            if lag_ms > counted_ms:
+                event.total_ms += lag_ms - counted_ms
+                event.max_ms = max(event.max_ms, lag_ms)
+            self._episode = None
+
+    def _watch(self) -> None:
+        check_interval = max(min(self.block_threshold / 2, self.interval), 0.01)
+        while not self._stopped.wait(check_interval):
+            blocked = time.monotonic() - self._last_beat - self.interval
+            if blocked >= self.block_threshold:
+                self._on_blocked(blocked * 1000)
+
+    def _on_blocked(self, blocked_ms: float) -> None:
+        seq = self._beat_seq
+        with self._lock:
+            # 同一阻塞片段只抓取一次调用栈,后续检查只更新阻塞时长
+            if self._episode is not None and self._episode[0] == seq:
+                _, event, counted_ms = self._episode
+                event.total_ms += blocked_ms - counted_ms
+                event.max_ms = max(event.max_ms, blocked_ms)
+                self._episode = (seq, event, blocked_ms)
+                return
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                return
+            event = self._aggregate(frame)
+            event.count += 1
+            event.total_ms += blocked_ms
+            event.max_ms = max(event.max_ms, blocked_ms)
+            event.last_seen = time.time()
+            self._episode = (seq, event, blocked_ms)
+
+        observe_loop_block()
+        logger.warning(
+            f"事件循环阻塞 | 已阻塞 {blocked_ms:.0f}ms | 调用点: {event.call_site} | "
+            f"阻塞位置: {event.blocking_frame}"
+        )
+
+    def _aggregate(self, frame) -> BlockingEvent:
+        summary = traceback.extract_stack(frame, limit=self.stack_depth)
+        innermost = summary[-1]
+        blocking_frame = f"{innermost.filename}:{innermost.lineno} in {innermost.name}"
+        call_site = blocking_frame
+        for item in reversed(summary):
+            if _is_project_frame(item.filename):
+                call_site = (
+                    f"{os.path.relpath(item.filename, _PROJECT_ROOT)}:{item.lineno} in {item.name}"
+                )
+                break
+
+        event = self._events.get(call_site)
+        if event is None:
+            if len(self._events) >= self.max_events:
+                # 淘汰最久未出现的调用点
+                oldest = min(self._events.values(), key=lambda e: e.last_seen)
+                del self._events[oldest.call_site]
+            stack = [f"{item.filename}:{item.lineno} in {item.name}" for item in summary]
+            event = self._events[call_site] = BlockingEvent(call_site, blocking_frame, stack)
+        return event
+
+    def snapshot(self, top: int = 20) -> dict:
+        """获取延迟分位数与按总阻塞时长排序的调用点"""
+        lags = sorted(self._lags)
+
+        def percentile(p: float) -> float:
+            if not lags:
+                return 0.0
+            return round(lags[min(int(len(lags) * p), len(lags) - 1)], 2)
+
+        with self._lock:
+            events = sorted(self._events.values(), key=lambda e: e.total_ms, reverse=True)
+            events = [event.as_dict() for event in events[:top]]
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "block_threshold_ms": self.block_threshold * 1000,
+            "lag_ms": {
+                "samples": len(lags),
+                "p50": percentile(0.5),
+                "p99": percentile(0.99),
+                "max": round(self._max_lag_ms, 2),
+            },
+            "blocking_events": events,
+        }
+
+    def reset(self) -> None:
+        """清空统计数据"""
+        with self._lock:
+            self._events = {}
+            self._episode = None
+        self._lags.clear()
+        self._max_lag_ms = 0.0
+
+
+# 全局事件循环监控实例,由 app_provider 在应用启动时按配置启动
+loop_monitor = LoopMonitor()
+register_memory_probe("loop_monitor.events", lambda: len(loop_monitor._events))
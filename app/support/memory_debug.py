@@ -0,0 +1,177 @@
+"""
+内存诊断
+
+- 按需开启 tracemalloc,保存命名快照,并按 文件:行号 比较两个快照之间的内存分配差异
+- 各模块通过 register_memory_probe 注册进程内缓存/注册表的大小探针(如 app.task_dict、
+  InMemorySaver 中的线程数、SQL 指纹缓存等),与快照一同返回,便于快速定位持续增长的对象
+
+tracemalloc 会显著增加内存分配开销,只应在排查问题期间开启。数据均为当前进程内的数据。
+"""
+
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any, NamedTuple
+
+from loguru import logger
+
+# 快照中排除 tracemalloc 与导入机制自身的分配
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_probes: dict[str, Callable[[], Any]] = {}
+
+
+def register_memory_probe(name: str, probe: Callable[[], Any]) -> None:
+    """注册内存探针,probe 返回数量或包含数量的字典,同名探针会被覆盖"""
+    _probes[name] = probe
+
+
+def collect_probes() -> dict[str, Any]:
+    """执行所有探针,单个探针失败不影响其余结果"""
+    result = {}
+    for name, probe in list(_probes.items()):
+        try:
+            result[name] = probe()
+        except Exception as e:
+            result[name] = {"error": str(e)}
+    return result
+
+
+class _Snapshot(NamedTuple):
+    """命名快照,总大小与块数在保存时统计一次"""
+
+    taken_at: float
+    snapshot: tracemalloc.Snapshot
+    size: int
+    count: int
+
+
+class MemoryDebugger:
+    """tracemalloc 快照管理"""
+
+    def __init__(self, max_snapshots: int = 10):
+        self.max_snapshots = max_snapshots
+        self._snapshots: OrderedDict[str, _Snapshot] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, nframes: int = 1) -> None:
+        """开启 tracemalloc,nframes 为每次分配记录的调用栈深度"""
+        if tracemalloc.is_tracing():
+            return
+        tracemalloc.start(nframes)
+        logger.warning(f"tracemalloc 已开启, nframes={nframes}")
+
+    def stop(self) -> None:
+        """关闭 tracemalloc 并清空快照"""
+        with self._lock:
+            self._snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.warning("tracemalloc 已关闭")
+
+    def take_snapshot(self, name: str) -> dict:
+        """保存命名快照,超过 max_snapshots 时淘汰最早的快照
+
+        Raises:
+            RuntimeError: tracemalloc 未开启
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc 未开启")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        stats = snapshot.statistics("filename")
+        entry = _Snapshot(
+            time.time(), snapshot, sum(stat.size for stat in stats), sum(stat.count for stat in stats)
+        )
+        with self._lock:
+            self._snapshots.pop(name, None)
+            self._snapshots[name] = entry
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return self._describe(name, entry)
+
+    def diff(
+        self,
+        base: str,
+        target: str | None = None,
+        top: int = 30,
+        group_by: str = "lineno",
+    ) -> dict:
+        """比较两个快照,返回按内存增长排序的前 top 项
+
+        Args:
+            base: 基准快照名称
+            target: 目标快照名称,为空时使用当前时刻的临时快照
+            group_by: lineno(文件:行号) / filename / traceback
+
+        Raises:
+            KeyError: 快照不存在
+        """
+        with self._lock:
+            base_snapshot = self._snapshots[base].snapshot
+            target_snapshot = self._snapshots[target].snapshot if target else None
+        if target_snapshot is None:
+            target_snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+        stats = target_snapshot.compare_to(base_snapshot, group_by)
+        return {
+            "base": base,
+            "target": target or "<now>",
+            "group_by": group_by,
+            "size_diff": sum(stat.size_diff for stat in stats),
+            "count_diff": sum(stat.count_diff for stat in stats),
+            "top": [
+                {
+                    "location": self._format_traceback(stat.traceback, group_by),
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size": stat.size,
+                    "count": stat.count,
+                }
+                for stat in stats[:top]
+            ],
+        }
+
+    def status(self) -> dict:
+        """tracemalloc 状态、快照列表与内存探针结果"""
+        result: dict[str, Any] = {"tracing": tracemalloc.is_tracing()}
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            result.update(
+                {
+                    "traced_current": current,
+                    "traced_peak": peak,
+                    "tracemalloc_overhead": tracemalloc.get_tracemalloc_memory(),
+                    "nframes": tracemalloc.get_traceback_limit(),
+                }
+            )
+        with self._lock:
+            result["snapshots"] = [self._describe(name, entry) for name, entry in self._snapshots.items()]
+        result["probes"] = collect_probes()
+        return result
+
+    @staticmethod
+    def _describe(name: str, entry: _Snapshot) -> dict:
+        return {"name": name, "taken_at": entry.taken_at, "size": entry.size, "count": entry.count}
+
+    @staticmethod
+    def _format_traceback(traceback: tracemalloc.Traceback, group_by: str) -> str | list[str]:
+        if group_by == "filename":
+            return traceback[0].filename
+        if group_by == "traceback":
+            return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+        return f"{traceback[0].filename}:{traceback[0].lineno}"
+
+
+# 全局内存诊断实例
+memory_debugger = MemoryDebugger()
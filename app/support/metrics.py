@@ -0,0 +1,412 @@
+"""
+Prometheus 指标
+
+- HTTP: 按路由模板统计请求数与耗时 (RequestLoggerMiddleware)
+- 数据库: 连接池连接数 (instrument_db_pool) 与 DAO 方法耗时 (instrument_dao_class)
+- Redis: 命令耗时 (TracedRedis / TracedStrictRedis) 与连接池连接数 (RedisService / AsyncRedisService)
+- LLM: 调用耗时、次数与 token 数,按模型与提供商区分 (LLMTracingCallback)
+- 事件循环: 调度延迟与阻塞次数 (LoopMonitor)
+- 限流: 各限流器放行/限流/出错次数 (TokenBucketLimiter / SlidingWindowLimiter)
+- 任务队列: 工作流任务流长度、未确认数、未投递数与最早任务等待时间 (WorkflowJobQueue)
+
+多 worker 部署时,需在 worker 启动前设置 PROMETHEUS_MULTIPROC_DIR,各进程把指标写入该目录下的
+mmap 文件,/metrics 通过 MultiProcessCollector 汇总所有进程;main.py 以多 worker 启动时会调用
+prepare_multiprocess_dir 自动完成。未安装 prometheus_client 时所有指标为空操作。
+"""
+
+import asyncio
+import functools
+import glob
+import inspect
+import os
+import time
+from collections.abc import Awaitable, Callable
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry,
+                                   Counter, Gauge, Histogram, generate_latest,
+                                   multiprocess)
+except ImportError:
+    logger.warning("prometheus_client 未安装, /metrics 指标不可用")
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+    Counter = Gauge = Histogram = None
+
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# 未匹配到路由的请求统一使用该标签,避免原始路径造成标签基数膨胀
+UNMATCHED_ROUTE = "<unmatched>"
+
+_DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+_REDIS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+_LLM_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+_QUEUE_WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class _NoopMetric:
+    """prometheus_client 不可用时的占位指标"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, *args, **kwargs):
+        pass
+
+    inc = dec = set = observe
+
+
+def _metric(metric_cls, *args, **kwargs):
+    if metric_cls is None:
+        return _NoopMetric()
+    return metric_cls(*args, **kwargs)
+
+
+ENABLED = Counter is not None
+
+HTTP_REQUESTS = _metric(
+    Counter, "http_requests_total", "HTTP 请求数", ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = _metric(
+    Histogram, "http_request_duration_seconds", "HTTP 请求耗时", ["method", "route"]
+)
+
+DB_POOL_SIZE = _metric(
+    Gauge, "db_pool_size", "数据库连接池配置大小", ["limit"], multiprocess_mode="livesum"
+)
+DB_POOL_CONNECTIONS = _metric(
+    Gauge, "db_pool_connections", "数据库连接池连接数", ["state"], multiprocess_mode="livesum"
+)
+DAO_METHOD_DURATION = _metric(
+    Histogram, "dao_method_duration_seconds", "DAO 方法耗时", ["dao", "method"],
+    buckets=_DB_BUCKETS,
+)
+
+REDIS_POOL_CONNECTIONS = _metric(
+    Gauge, "redis_pool_connections", "Redis 连接池连接数", ["client", "state"],
+    multiprocess_mode="livesum",
+)
+REDIS_COMMAND_DURATION = _metric(
+    Histogram, "redis_command_duration_seconds", "Redis 命令耗时", ["client", "command"],
+    buckets=_REDIS_BUCKETS,
+)
+REDIS_NEAR_CACHE_REQUESTS = _metric(
+    Counter, "redis_near_cache_requests_total", "Redis 本地近缓存读取次数", ["result"]
+)
+REDIS_NEAR_CACHE_INVALIDATIONS = _metric(
+    Counter, "redis_near_cache_invalidations_total", "Redis 本地近缓存失效次数", ["reason"]
+)
+REDIS_NEAR_CACHE_ENTRIES = _metric(
+    Gauge, "redis_near_cache_entries", "Redis 本地近缓存条目数", multiprocess_mode="livesum"
+)
+
+LLM_REQUESTS = _metric(
+    Counter, "llm_requests_total", "LLM 调用次数", ["model", "provider", "status"]
+)
+LLM_REQUEST_DURATION = _metric(
+    Histogram, "llm_request_duration_seconds", "LLM 调用耗时", ["model", "provider"],
+    buckets=_LLM_BUCKETS,
+)
+LLM_TOKENS = _metric(
+    Counter, "llm_tokens_total", "LLM token 消耗", ["model", "provider", "type"]
+)
+LLM_CLIENT_BUILDS = _metric(
+    Counter, "llm_client_builds_total", "LLM 客户端创建次数", ["provider", "reason"]
+)
+LLM_ENDPOINT_EJECTIONS = _metric(
+    Counter, "llm_endpoint_ejections_total", "模型服务地址被摘除的次数", ["model", "provider", "api_url"]
+)
+
+WORKFLOW_QUEUE_LENGTH = _metric(
+    Gauge, "workflow_queue_length", "工作流任务流长度", multiprocess_mode="livemostrecent"
+)
+WORKFLOW_QUEUE_PENDING = _metric(
+    Gauge, "workflow_queue_pending", "已投递未确认的工作流任务数", multiprocess_mode="livemostrecent"
+)
+WORKFLOW_QUEUE_LAG = _metric(
+    Gauge, "workflow_queue_lag", "尚未投递的工作流任务数", multiprocess_mode="livemostrecent"
+)
+WORKFLOW_QUEUE_OLDEST_AGE = _metric(
+    Gauge, "workflow_queue_oldest_age_seconds", "最早未投递任务的等待时间",
+    multiprocess_mode="livemostrecent",
+)
+
+CHECKPOINTS_PRUNED = _metric(
+    Counter, "checkpoints_pruned_total", "清理的工作流checkpoint数(retention 为 checkpoint 数,ttl 为会话数)",
+    ["reason"],
+)
+
+CHECKPOINT_MEMORY_THREADS = _metric(
+    Gauge, "checkpoint_memory_threads", "进程内checkpointer保存的会话数", multiprocess_mode="livesum"
+)
+CHECKPOINT_MEMORY_BYTES = _metric(
+    Gauge, "checkpoint_memory_bytes", "进程内checkpointer的近似字节数", multiprocess_mode="livesum"
+)
+CHECKPOINT_MEMORY_EVICTIONS = _metric(
+    Counter, "checkpoint_memory_evictions_total", "进程内checkpointer淘汰的会话数", ["reason"]
+)
+
+RATE_LIMIT_REQUESTS = _metric(
+    Counter, "rate_limit_requests_total", "限流器请求数", ["limiter", "result"]
+)
+CONCURRENCY_LIMIT = _metric(
+    Gauge, "concurrency_limit", "自适应并发上限", ["limiter", "key"], multiprocess_mode="livesum"
+)
+CONCURRENCY_INFLIGHT = _metric(
+    Gauge, "concurrency_inflight", "进行中的调用数", ["limiter", "key"], multiprocess_mode="livesum"
+)
+CONCURRENCY_QUEUED = _metric(
+    Gauge, "concurrency_queued", "等待并发名额的调用数", ["limiter", "key"], multiprocess_mode="livesum"
+)
+CONCURRENCY_QUEUE_WAIT = _metric(
+    Histogram, "concurrency_queue_wait_seconds", "等待并发名额的耗时", ["limiter", "key"],
+    buckets=_QUEUE_WAIT_BUCKETS,
+)
+CONCURRENCY_DECREASES = _metric(
+    Counter, "concurrency_limit_decreases_total", "并发上限下调次数", ["limiter", "key", "reason"]
+)
+CONCURRENCY_REJECTED = _metric(
+    Counter, "concurrency_rejected_total", "等待超时未获得并发名额的调用数", ["limiter", "key"]
+)
+
+EVENT_LOOP_LAG = _metric(
+    Histogram, "event_loop_lag_seconds", "事件循环调度延迟", buckets=_LOOP_LAG_BUCKETS
+)
+EVENT_LOOP_BLOCKS = _metric(Counter, "event_loop_blocks_total", "事件循环阻塞次数")
+
+
+# ===============================================recorders====================================================
+
+
+def observe_http_request(method: str, route: str | None, status: int, duration: float) -> None:
+    route = route or UNMATCHED_ROUTE
+    HTTP_REQUESTS.labels(method, route, str(status)).inc()
+    HTTP_REQUEST_DURATION.labels(method, route).observe(duration)
+
+
+def observe_redis_command(client: str, command, duration: float) -> None:
+    if isinstance(command, bytes):
+        command = command.decode("latin-1")
+    REDIS_COMMAND_DURATION.labels(client, str(command).upper()).observe(duration)
+
+
+def observe_near_cache(result: str, count: int = 1) -> None:
+    REDIS_NEAR_CACHE_REQUESTS.labels(result).inc(count)
+
+
+def observe_near_cache_invalidation(reason: str, count: int = 1) -> None:
+    REDIS_NEAR_CACHE_INVALIDATIONS.labels(reason).inc(count)
+
+
+def observe_near_cache_size(entries: int) -> None:
+    REDIS_NEAR_CACHE_ENTRIES.set(entries)
+
+
+def observe_llm_request(
+    model: str,
+    provider: str,
+    duration: float,
+    error: bool = False,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+) -> None:
+    LLM_REQUESTS.labels(model, provider, "error" if error else "success").inc()
+    LLM_REQUEST_DURATION.labels(model, provider).observe(duration)
+    if prompt_tokens:
+        LLM_TOKENS.labels(model, provider, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(model, provider, "completion").inc(completion_tokens)
+
+
+def observe_workflow_queue(stats: dict) -> None:
+    WORKFLOW_QUEUE_LENGTH.set(stats["length"])
+    WORKFLOW_QUEUE_PENDING.set(stats["pending"])
+    if stats["lag"] is not None:
+        WORKFLOW_QUEUE_LAG.set(stats["lag"])
+    WORKFLOW_QUEUE_OLDEST_AGE.set(stats["oldest_age_seconds"])
+
+
+def observe_checkpoints_pruned(reason: str, count: int) -> None:
+    CHECKPOINTS_PRUNED.labels(reason).inc(count)
+
+
+def observe_checkpoint_memory(threads: int, size: int) -> None:
+    CHECKPOINT_MEMORY_THREADS.set(threads)
+    CHECKPOINT_MEMORY_BYTES.set(size)
+
+
+def observe_checkpoint_memory_eviction(reason: str) -> None:
+    CHECKPOINT_MEMORY_EVICTIONS.labels(reason).inc()
+
+
+def observe_llm_client_build(provider: str, reason: str) -> None:
+    LLM_CLIENT_BUILDS.labels(provider, reason).inc()
+
+
+def observe_llm_endpoint_ejection(model: str, provider: str, api_url: str) -> None:
+    LLM_ENDPOINT_EJECTIONS.labels(model, provider, api_url).inc()
+
+
+def observe_rate_limit(limiter: str, result: str) -> None:
+    RATE_LIMIT_REQUESTS.labels(limiter, result).inc()
+
+
+def observe_concurrency(limiter: str, key: str, limit: int, inflight: int, queued: int) -> None:
+    CONCURRENCY_LIMIT.labels(limiter, key).set(limit)
+    CONCURRENCY_INFLIGHT.labels(limiter, key).set(inflight)
+    CONCURRENCY_QUEUED.labels(limiter, key).set(queued)
+
+
+def observe_concurrency_wait(limiter: str, key: str, wait: float) -> None:
+    CONCURRENCY_QUEUE_WAIT.labels(limiter, key).observe(wait)
+
+
+def observe_concurrency_decrease(limiter: str, key: str, reason: str) -> None:
+    CONCURRENCY_DECREASES.labels(limiter, key, reason).inc()
+
+
+def observe_concurrency_rejected(limiter: str, key: str) -> None:
+    CONCURRENCY_REJECTED.labels(limiter, key).inc()
+
+
+def observe_loop_lag(lag: float) -> None:
+    EVENT_LOOP_LAG.observe(lag)
+
+
+def observe_loop_block() -> None:
+    EVENT_LOOP_BLOCKS.inc()
+
+
+def observe_redis_pool(client: str, stats: dict) -> None:
+    for state in ("in_use", "available"):
+        REDIS_POOL_CONNECTIONS.labels(client, state).set(stats[state])
+
+
+# 抓取前执行的回调,用于刷新无法通过事件维护的状态类指标(如 Redis 连接池、任务队列长度)
+_scrape_hooks: list[Callable[[], None]] = []
+_async_scrape_hooks: list[Callable[[], Awaitable[None]]] = []
+
+
+def register_scrape_hook(hook: Callable[[], None]) -> None:
+    """注册抓取前回调,回调异常只记录日志不影响指标输出"""
+    _scrape_hooks.append(hook)
+
+
+def register_async_scrape_hook(hook: Callable[[], Awaitable[None]]) -> None:
+    """注册需要访问 Redis 等外部服务的异步抓取前回调,由 /metrics 在生成指标前等待执行"""
+    _async_scrape_hooks.append(hook)
+
+
+def _run_scrape_hooks() -> None:
+    for hook in _scrape_hooks:
+        try:
+            hook()
+        except Exception as e:
+            logger.debug(f"指标抓取回调执行失败: {e}")
+
+
+async def run_async_scrape_hooks(timeout: float = 2.0) -> None:
+    """执行异步抓取前回调,单个回调超时或失败只记录日志"""
+    if not ENABLED:
+        return
+    for hook in _async_scrape_hooks:
+        try:
+            await asyncio.wait_for(hook(), timeout)
+        except Exception as e:
+            logger.debug(f"指标抓取回调执行失败: {e!r}")
+
+
+# ===============================================instrumentation====================================================
+
+
+def instrument_db_pool(engine: Engine) -> None:
+    """通过连接池事件维护连接数指标(异步引擎传入 engine.sync_engine)
+
+    checked_out 随 checkout/checkin 增减,open 随物理连接的建立/关闭增减,
+    两者均为进程内精确值,多进程下按存活进程求和。
+    """
+    if not ENABLED or getattr(engine, "_metrics_instrumented", False):
+        return
+    engine._metrics_instrumented = True  # type: ignore[attr-defined]
+
+    pool = engine.pool
+    # NullPool/StaticPool 等没有容量限制
+    if hasattr(pool, "size") and hasattr(pool, "_max_overflow"):
+        DB_POOL_SIZE.labels("pool_size").set(pool.size())
+        DB_POOL_SIZE.labels("max_overflow").set(max(pool._max_overflow, 0))
+
+    open_connections = DB_POOL_CONNECTIONS.labels("open")
+    checked_out = DB_POOL_CONNECTIONS.labels("checked_out")
+
+    event.listen(engine, "connect", lambda *_: open_connections.inc())
+    event.listen(engine, "close", lambda *_: open_connections.dec())
+    event.listen(engine, "close_detached", lambda *_: open_connections.dec())
+    event.listen(engine, "checkout", lambda *_: checked_out.inc())
+    event.listen(engine, "checkin", lambda *_: checked_out.dec())
+
+
+def _timed_dao_method(method):
+    name = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            DAO_METHOD_DURATION.labels(type(self).__name__, name).observe(
+                time.perf_counter() - start
+            )
+
+    wrapper.__dao_timed__ = True
+    return wrapper
+
+
+def instrument_dao_class(cls: type) -> None:
+    """为 DAO 类上定义的公开协程方法记录耗时,继承的方法以实际 DAO 类名为标签"""
+    if not ENABLED:
+        return
+    for name, value in list(vars(cls).items()):
+        if (
+            not name.startswith("_")
+            and inspect.iscoroutinefunction(value)
+            and not getattr(value, "__dao_timed__", False)
+        ):
+            setattr(cls, name, _timed_dao_method(value))
+
+
+# ===============================================exposition====================================================
+
+
+def is_multiprocess() -> bool:
+    return bool(os.environ.get(MULTIPROC_DIR_ENV))
+
+
+def prepare_multiprocess_dir(path: str) -> None:
+    """多 worker 启动前调用: 创建并清空指标目录,并通过环境变量传递给 worker 进程"""
+    path = os.path.abspath(path)
+    os.makedirs(path, exist_ok=True)
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+    os.environ[MULTIPROC_DIR_ENV] = path
+
+
+def mark_process_dead() -> None:
+    """worker 退出时清理本进程的 live 类 Gauge 数据"""
+    if ENABLED and is_multiprocess():
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render_latest() -> tuple[bytes, str]:
+    """生成 Prometheus 文本格式的指标,多进程模式下汇总所有 worker"""
+    if not ENABLED:
+        return b"", CONTENT_TYPE_LATEST
+    _run_scrape_hooks()
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,154 @@
+"""
+采样分析器
+
+在独立线程中以固定频率读取 sys._current_frames(),按调用栈计数,输出 flamegraph.pl /
+speedscope 可直接使用的折叠栈(collapsed stacks)文本:
+
+- wall: 记录所有线程的采样,包括等待 IO 与锁的时间
+- cpu: 仅记录两次采样之间消耗了 CPU 的线程(基于线程 CPU 时钟)
+
+事件循环线程的采样以当前正在执行的 asyncio Task 名称作为根节点,空闲时落在 selector 上。
+分析过程不修改解释器的 profile/trace 钩子,开销仅为采样线程本身,同一进程同时只允许一个分析任务。
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+MODE_WALL = "wall"
+MODE_CPU = "cpu"
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ProfilerBusyError(RuntimeError):
+    """已有分析任务在运行"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(_PROJECT_ROOT):
+        filename = os.path.relpath(filename, _PROJECT_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    # 折叠栈以 ; 分隔帧,计数位于最后一个空格之后
+    return f"{code.co_name} ({filename}:{frame.f_lineno})".replace(";", ":")
+
+
+def _thread_cpu_clock(thread_id: int) -> int | None:
+    try:
+        return time.pthread_getcpuclockid(thread_id)
+    except (AttributeError, OSError):
+        return None
+
+
+class SamplingProfiler:
+    """基于 sys._current_frames() 的采样分析器"""
+
+    def __init__(self, max_depth: int = 128):
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """记录事件循环及其线程,用于给采样标注当前 Task(需在事件循环线程中调用)"""
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+
+    def profile(self, seconds: float, mode: str = MODE_WALL, hz: int = 100) -> str:
+        """阻塞当前线程采样 seconds 秒,返回折叠栈文本
+
+        Raises:
+            ProfilerBusyError: 已有分析任务在运行
+            ValueError: 不支持的模式
+        """
+        if mode not in (MODE_WALL, MODE_CPU):
+            raise ValueError(f"不支持的分析模式: {mode}")
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("已有分析任务在运行")
+        try:
+            stacks = self._sample(seconds, mode, 1.0 / hz)
+        finally:
+            self._lock.release()
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+    def _sample(self, seconds: float, mode: str, interval: float) -> Counter:
+        stacks: Counter[str] = Counter()
+        own_thread_id = threading.get_ident()
+        thread_names = {}
+        cpu_clocks: dict[int, int | None] = {}
+        cpu_times: dict[int, float] = {}
+        # cpu 模式下,两次采样之间线程 CPU 时间增长超过采样间隔的 10% 视为在 CPU 上运行
+        min_cpu_delta = interval * 0.1
+
+        deadline = time.monotonic() + seconds
+        next_sample = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if now < next_sample:
+                time.sleep(next_sample - now)
+            next_sample += interval
+
+            frames = sys._current_frames()
+            if len(thread_names) != len(frames):
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in frames.items():
+                if thread_id == own_thread_id:
+                    continue
+                if mode == MODE_CPU and not self._on_cpu(
+                    thread_id, cpu_clocks, cpu_times, min_cpu_delta
+                ):
+                    continue
+                stacks[self._collapse(thread_id, frame, thread_names)] += 1
+            del frames
+        return stacks
+
+    @staticmethod
+    def _on_cpu(thread_id, cpu_clocks, cpu_times, min_cpu_delta) -> bool:
+        if thread_id not in cpu_clocks:
+            cpu_clocks[thread_id] = _thread_cpu_clock(thread_id)
+        clock = cpu_clocks[thread_id]
+        if clock is None:
+            return True
+        try:
+            cpu_time = time.clock_gettime(clock)
+        except OSError:
+            # 线程已退出
+            return False
+        previous = cpu_times.get(thread_id)
+        cpu_times[thread_id] = cpu_time
+        return previous is not None and cpu_time - previous >= min_cpu_delta
+
+    def _collapse(self, thread_id: int, frame, thread_names: dict) -> str:
+        labels = []
+        depth = 0
+        while frame is not None and depth < self.max_depth:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+            depth += 1
+
+        root = [f"thread:{thread_names.get(thread_id, thread_id)}".replace(";", ":")]
+        if thread_id == self._loop_thread_id and self._loop is not None:
+            task = getattr(asyncio.tasks, "_current_tasks", {}).get(self._loop)
+            root.append(
+                f"task:{task.get_name()}".replace(";", ":")
+                if task is not None
+                else "task:<idle>"
+            )
+        labels.reverse()
+        return ";".join(root + labels)
+
+
+# 全局采样分析器,由 app_provider 在应用启动时绑定事件循环
+profiler = SamplingProfiler()
@@ -0,0 +1,15 @@
+"""
+请求上下文
+
+基于 contextvars 保存当前请求的 request_id,供日志等模块在不传参的情况下读取。
+由 RequestLoggerMiddleware 在请求开始时设置、结束时还原。
+"""
+
+from contextvars import ContextVar
+
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+
+def get_request_id() -> str | None:
+    """获取当前请求的 request_id,不在请求上下文中时返回 None"""
+    return request_id_var.get()
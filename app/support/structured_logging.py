@@ -0,0 +1,182 @@
+"""
+结构化日志
+
+- json_formatter: loguru 格式化函数,输出固定字段的单行 JSON,便于 ELK 直接解析
+- LogSampler: 请求日志采样器,按路由、方法、级别配置采样率;
+  错误与慢请求始终记录。采样规则可由 Nacos 在运行时调整
+"""
+
+import json
+import random
+import traceback
+from fnmatch import fnmatchcase
+from typing import Any, NamedTuple
+
+from app.support.request_context import get_request_id
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 为 fastapi ORJSONResponse 的依赖
+    orjson = None
+
+# 请求日志绑定到 record["extra"] 中、需要提升为顶层字段的键
+REQUEST_FIELDS = (
+    "method",
+    "route",
+    "path",
+    "status",
+    "duration_ms",
+    "client",
+    "db_queries",
+    "trace_id",
+    "timings",
+)
+
+_ALWAYS_LOG_LEVELS = frozenset({"ERROR", "CRITICAL"})
+
+
+def _dumps(payload: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str).decode()
+    return json.dumps(payload, default=str, ensure_ascii=False, separators=(",", ":"))
+
+
+def json_formatter(record: dict) -> str:
+    """将 loguru record 格式化为单行 JSON
+
+    固定字段: ts, level, logger, func, line, pid, request_id, msg;
+    请求日志额外包含 REQUEST_FIELDS,其余 bind 的字段放入 extra,异常堆栈放入 exc。
+    """
+    payload: dict[str, Any] = {
+        "ts": record["time"].isoformat(timespec="milliseconds"),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "func": record["function"],
+        "line": record["line"],
+        "pid": record["process"].id,
+        "request_id": get_request_id(),
+        "msg": record["message"],
+    }
+
+    extra = {}
+    for key, value in record["extra"].items():
+        if key.startswith("_"):
+            continue
+        if key in REQUEST_FIELDS:
+            payload[key] = value
+        else:
+            extra[key] = value
+    if extra:
+        payload["extra"] = extra
+
+    if record["exception"] is not None:
+        exc_type, exc_value, exc_tb = record["exception"]
+        payload["exc"] = "".join(traceback.format_exception(exc_type, exc_value, exc_tb))
+
+    # 多个 sink 共享同一个 record,序列化结果放在下划线开头的键中避免被重复收集
+    record["extra"]["_json"] = _dumps(payload)
+    return "{extra[_json]}\n"
+
+
+class SamplingRule(NamedTuple):
+    """采样规则, route/method/level 支持 * 通配"""
+
+    route: str
+    method: str
+    level: str
+    rate: float
+
+
+class LogSampler:
+    """请求日志采样器"""
+
+    def __init__(self):
+        self._rules: list[SamplingRule] = []
+        self._default_rate = 1.0
+        self._slow_threshold_ms = 1000.0
+        self._cache: dict[tuple[str, str, str], float] = {}
+
+    def configure(
+        self,
+        rules: list[dict] | None = None,
+        default_rate: float = 1.0,
+        slow_threshold_ms: float = 1000.0,
+    ) -> None:
+        """更新采样配置
+
+        Args:
+            rules: 采样规则列表,按顺序匹配第一条,例如
+                [{"route": "/health/*", "method": "GET", "level": "INFO", "rate": 0.01}]
+            default_rate: 未匹配任何规则时的采样率
+            slow_threshold_ms: 超过该耗时的请求始终记录
+        """
+        self._rules = [
+            SamplingRule(
+                route=rule.get("route", "*"),
+                method=rule.get("method", "*").upper(),
+                level=rule.get("level", "*").upper(),
+                rate=float(rule.get("rate", 1.0)),
+            )
+            for rule in rules or []
+        ]
+        self._default_rate = default_rate
+        self._slow_threshold_ms = slow_threshold_ms
+        self._cache = {}
+
+    def configure_from_settings(self, settings) -> None:
+        """根据应用配置初始化采样规则"""
+        self.configure(
+            rules=settings.LOG_SAMPLING_RULES,
+            default_rate=settings.LOG_SAMPLING_DEFAULT_RATE,
+            slow_threshold_ms=settings.LOG_SAMPLING_SLOW_MS,
+        )
+
+    def rate_for(self, method: str, route: str, level: str) -> float:
+        """获取指定请求的采样率"""
+        for rule in self._rules:
+            if (
+                (rule.method == "*" or rule.method == method)
+                and (rule.level == "*" or rule.level == level)
+                and fnmatchcase(route, rule.route)
+            ):
+                return rule.rate
+        return self._default_rate
+
+    def should_log(
+        self,
+        method: str,
+        route: str,
+        level: str,
+        duration_ms: float,
+        cacheable: bool = True,
+    ) -> bool:
+        """判断本次请求日志是否需要记录
+
+        Args:
+            cacheable: route 为路由模板时可缓存匹配结果;未匹配路由的原始路径
+                取值无界,不进入缓存
+        """
+        if level in _ALWAYS_LOG_LEVELS or duration_ms >= self._slow_threshold_ms:
+            return True
+
+        if cacheable:
+            key = (method, route, level)
+            rate = self._cache.get(key)
+            if rate is None:
+                rate = self._cache[key] = self.rate_for(method, route, level)
+        else:
+            rate = self.rate_for(method, route, level)
+
+        return rate >= 1.0 or random.random() < rate
+
+    def snapshot(self) -> dict:
+        """当前采样配置"""
+        return {
+            "default_rate": self._default_rate,
+            "slow_threshold_ms": self._slow_threshold_ms,
+            "rules": [rule._asdict() for rule in self._rules],
+        }
+
+
+# 全局请求日志采样器
+log_sampler = LogSampler()
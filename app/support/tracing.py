@@ -0,0 +1,368 @@
+"""
+请求级链路追踪
+
+基于 contextvars 的轻量 span API。RequestLoggerMiddleware 为每个请求开启一个 Trace,
+各处埋点通过 span() / start_span() 记录耗时,不在 Trace 中时埋点为空操作。
+
+内置埋点:
+- 会话首次获取数据库连接 (db.checkout),见 TracedSession
+- SQLAlchemy 语句执行 (db.query),见 instrument_sqlalchemy
+- Redis 命令 (redis),见 TracedRedis / TracedStrictRedis
+- LangChain 模型调用 (llm),见 app.services.llms_manage.callbacks
+
+请求结束时按 span 名称汇总为 Server-Timing 响应头与日志字段,
+并可按 OpenTelemetry OTLP/JSON 格式导出到本地文件。
+"""
+
+import json
+import os
+import random
+import secrets
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any
+
+from redis import StrictRedis
+from redis.asyncio import Redis
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.support.log_writer import BackgroundLogWriter
+from app.support.metrics import observe_redis_command
+
+# OTLP span kind
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+
+class Span:
+    """单个耗时片段"""
+
+    __slots__ = (
+        "name",
+        "span_id",
+        "parent_id",
+        "kind",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        parent_id: str | None,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: dict[str, Any] | None = None,
+    ):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes = attributes or {}
+        self.error: str | None = None
+
+    def end(self, error: BaseException | None = None) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1_000_000
+
+
+class Trace:
+    """一次请求内收集到的全部 span"""
+
+    __slots__ = ("trace_id", "spans", "max_spans", "dropped")
+
+    def __init__(self, trace_id: str | None = None, max_spans: int = 500):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.spans: list[Span] = []
+        self.max_spans = max_spans
+        self.dropped = 0
+
+    def add(self, span: Span) -> None:
+        if len(self.spans) < self.max_spans:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """按 span 名称汇总耗时与次数(不含根 span)"""
+        result: dict[str, dict[str, float]] = {}
+        for span in self.spans:
+            if span.kind == SPAN_KIND_SERVER:
+                continue
+            item = result.setdefault(span.name, {"dur": 0.0, "count": 0})
+            item["dur"] += span.duration_ms
+            item["count"] += 1
+        return result
+
+    def server_timing(self) -> str:
+        """生成 Server-Timing 响应头的值"""
+        return ", ".join(
+            f'{name};dur={item["dur"]:.2f};desc="{item["count"]}"'
+            for name, item in self.summary().items()
+        )
+
+    def timings(self) -> dict[str, float]:
+        """用于结构化日志的耗时字段 {span 名称: 毫秒}"""
+        return {name: round(item["dur"], 3) for name, item in self.summary().items()}
+
+
+_trace_var: ContextVar[Trace | None] = ContextVar("trace", default=None)
+_span_var: ContextVar[Span | None] = ContextVar("span", default=None)
+
+
+def start_trace(trace_id: str | None = None, max_spans: int = 500) -> tuple[Trace, Token]:
+    """在当前上下文开启 Trace,返回 Trace 与用于 end_trace 的 token"""
+    trace = Trace(trace_id, max_spans)
+    return trace, _trace_var.set(trace)
+
+
+def end_trace(token: Token) -> None:
+    """结束 start_trace 开启的 Trace"""
+    _trace_var.reset(token)
+
+
+def current_trace() -> Trace | None:
+    return _trace_var.get()
+
+
+def start_span(
+    name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any
+) -> Span | None:
+    """开始一个 span,不改变当前 span,适用于事件回调式埋点,需手动调用 span.end()
+
+    不在 Trace 中时返回 None。
+    """
+    trace = _trace_var.get()
+    if trace is None:
+        return None
+    parent = _span_var.get()
+    span_obj = Span(name, parent.span_id if parent else None, kind, attributes)
+    trace.add(span_obj)
+    return span_obj
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any) -> Iterator[Span | None]:
+    """以上下文管理器记录一个 span,内部开启的 span 以其为父节点"""
+    span_obj = start_span(name, kind, **attributes)
+    if span_obj is None:
+        yield None
+        return
+    token = _span_var.set(span_obj)
+    try:
+        yield span_obj
+    except BaseException as e:
+        span_obj.end(e)
+        raise
+    finally:
+        span_obj.end()
+        _span_var.reset(token)
+
+
+def parse_traceparent(value: str | None) -> str | None:
+    """从 W3C traceparent 头中解析 trace_id"""
+    if not value:
+        return None
+    parts = value.split("-")
+    if len(parts) == 4 and len(parts[1]) == 32:
+        return parts[1]
+    return None
+
+
+# ===============================================instrumentation====================================================
+
+
+def instrument_sqlalchemy(engine: Engine) -> None:
+    """为同步引擎(异步引擎传入 engine.sync_engine)注册语句执行埋点
+
+    SQLAlchemy 的 asyncio greenlet 继承调用方的 contextvars,事件回调中可以读取当前 Trace。
+    """
+    if getattr(engine, "_tracing_instrumented", False):
+        return
+    engine._tracing_instrumented = True  # type: ignore[attr-defined]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        span_obj = start_span(
+            "db.query", SPAN_KIND_CLIENT, statement=statement[:200], executemany=executemany
+        )
+        if span_obj is not None:
+            conn.info.setdefault("_tracing_spans", []).append(span_obj)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("_tracing_spans")
+        if spans:
+            spans.pop().end()
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("_tracing_spans") if conn is not None else None
+        if spans:
+            spans.pop().end(exception_context.original_exception)
+
+
+class TracedSession(Session):
+    """首次获取数据库连接时记录连接池 checkout 耗时(db.checkout)的会话,作为 async_sessionmaker 的 sync_session_class
+
+    会话在语句执行或 flush 真正需要连接时才从连接池获取,不执行 SQL 的请求不占用连接也不开启事务。
+    """
+
+
+def _start_checkout(session: Session) -> None:
+    if session.info.get("_tracing_connected") or "_tracing_checkout" in session.info:
+        return
+    span_obj = start_span("db.checkout", SPAN_KIND_CLIENT)
+    if span_obj is not None:
+        session.info["_tracing_checkout"] = span_obj
+
+
+def _end_checkout(session: Session) -> None:
+    span_obj = session.info.pop("_tracing_checkout", None)
+    if span_obj is not None:
+        span_obj.end()
+
+
+@event.listens_for(TracedSession, "do_orm_execute")
+def _do_orm_execute(orm_execute_state):
+    _start_checkout(orm_execute_state.session)
+
+
+@event.listens_for(TracedSession, "before_flush")
+def _before_flush(session, flush_context, instances):
+    _start_checkout(session)
+
+
+@event.listens_for(TracedSession, "after_begin")
+def _after_begin(session, transaction, connection):
+    session.info["_tracing_connected"] = True
+    _end_checkout(session)
+
+
+@event.listens_for(TracedSession, "after_transaction_end")
+def _after_transaction_end(session, transaction):
+    if transaction.parent is None:
+        # 根事务结束后连接归还连接池,之后再执行 SQL 会重新 checkout
+        session.info.pop("_tracing_connected", None)
+        _end_checkout(session)
+
+
+class TracedRedis(Redis):
+    """带命令耗时埋点(span 与 Prometheus 指标)的异步 Redis 客户端"""
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            if _trace_var.get() is None:
+                return await super().execute_command(*args, **options)
+            with span("redis", SPAN_KIND_CLIENT, command=str(args[0])):
+                return await super().execute_command(*args, **options)
+        finally:
+            observe_redis_command("async", args[0], time.perf_counter() - start)
+
+
+class TracedStrictRedis(StrictRedis):
+    """带命令耗时埋点(span 与 Prometheus 指标)的同步 Redis 客户端"""
+
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            if _trace_var.get() is None:
+                return super().execute_command(*args, **options)
+            with span("redis", SPAN_KIND_CLIENT, command=str(args[0])):
+                return super().execute_command(*args, **options)
+        finally:
+            observe_redis_command("sync", args[0], time.perf_counter() - start)
+
+
+# ===============================================export====================================================
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class TraceFileExporter:
+    """以 OTLP/JSON 格式(每行一个 ExportTraceServiceRequest)导出 Trace 到本地文件
+
+    写文件在 BackgroundLogWriter 的后台线程中完成。
+    """
+
+    def __init__(self, path: str, service_name: str, sample_rate: float = 1.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.service_name = service_name
+        self.sample_rate = sample_rate
+        self._file = open(path, "a", encoding="utf-8")  # noqa: SIM115
+        self._writer = BackgroundLogWriter(
+            name="trace-export", write=self._file.write, flush=self._file.flush
+        )
+
+    def export(self, trace: Trace) -> None:
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self._writer(json.dumps(self.to_otlp(trace), separators=(",", ":")) + "\n")
+
+    def to_otlp(self, trace: Trace) -> dict:
+        spans = []
+        for span_obj in trace.spans:
+            item = {
+                "traceId": trace.trace_id,
+                "spanId": span_obj.span_id,
+                "name": span_obj.name,
+                "kind": span_obj.kind,
+                "startTimeUnixNano": str(span_obj.start_ns),
+                "endTimeUnixNano": str(span_obj.end_ns or time.time_ns()),
+                "attributes": [
+                    {"key": key, "value": _otlp_value(value)}
+                    for key, value in span_obj.attributes.items()
+                ],
+                "status": (
+                    {"code": 2, "message": span_obj.error} if span_obj.error else {"code": 0}
+                ),
+            }
+            if span_obj.parent_id:
+                item["parentSpanId"] = span_obj.parent_id
+            spans.append(item)
+
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": self.service_name}},
+                            {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+                        ]
+                    },
+                    "scopeSpans": [{"scope": {"name": "app.support.tracing"}, "spans": spans}],
+                }
+            ]
+        }
+
+    def close(self) -> None:
+        self._writer.close()
+        self._file.close()
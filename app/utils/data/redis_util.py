@@ -11,22 +11,24 @@
 2022/10/25 10:17   zengxinmin@nowcoder.com   1.0         None
 """
 
-import json
-
 import redis
 from loguru import logger
 
+from app.support.codec import Codec, get_codec
+
 
 class RedisUtil:
-    def __init__(self, host="localhost", port=6379, db=0, password=None):
+    def __init__(self, host="localhost", port=6379, db=0, password=None, codec: Codec | None = None):
         """
         初始化Redis连接
         :param host: Redis地址,默认为localhost
         :param port: Redis端口,默认为6379
         :param db: Redis数据库编号,默认为0
         :param password: Redis密码,默认为None
+        :param codec: 值编解码器,默认按 REDIS_CODEC_* 配置创建;读取时兼容旧版 json.dumps 写入的值
         """
         self.__redis = redis.Redis(host=host, port=port, db=db, password=password)
+        self.__codec = codec or get_codec()
 
     def set(self, key, value, ex=None):
         """
@@ -37,9 +39,9 @@ class RedisUtil:
         :return: 返回True表示存储成功,否则返回False
         """
         try:
-            value = json.dumps(value)
+            value = self.__codec.encode(value)
             if ex:
-                self.__redis.setex(key, value, ex)
+                self.__redis.setex(key, ex, value)
             else:
                 self.__redis.set(key, value)
             return True
@@ -56,7 +58,7 @@ class RedisUtil:
         try:
             value = self.__redis.get(key)
             if value:
-                value = json.loads(value)
+                value = self.__codec.decode(value)
             return value
         except Exception as e:
             logger.error("获取键值对失败: ", e)
@@ -82,12 +84,97 @@ class RedisUtil:
         :return: 修改成功返回True,失败返回False
         """
         try:
-            self.__redis.set(key, json.dumps(value))
+            self.__redis.set(key, self.__codec.encode(value))
             return True
         except Exception as e:
             logger.error(f"修改键值对失败:{e}")
             return False
 
+    def mget(self, keys, batch_size=500):
+        """
+        批量获取多个键的值,键数量超过batch_size时分块通过同一管道发送MGET
+        :param keys: 待获取的键列表
+        :param batch_size: 每条MGET命令包含的键数量
+        :return: 与keys顺序一致的值列表,不存在的键为None,失败时返回空列表
+        """
+        if not keys:
+            return []
+        try:
+            pipe = self.__redis.pipeline(transaction=False)
+            for start in range(0, len(keys), batch_size):
+                pipe.mget(keys[start:start + batch_size])
+            return [
+                self.__codec.decode(value) if value else value
+                for values in pipe.execute()
+                for value in values
+            ]
+        except Exception as e:
+            logger.error(f"批量获取键值对失败:{e}")
+            return []
+
+    def mset(self, mapping, ex=None, batch_size=500):
+        """
+        批量存储键值对,通过管道分块发送SET,支持为每个键设置不同的过期时间
+        :param mapping: 待存储的键值对字典
+        :param ex: 过期时间(单位:秒),可以是统一的整数,或 键->过期时间 的字典(未列出的键不过期),默认为None,即不过期
+        :param batch_size: 每次管道发送的键数量
+        :return: 返回True表示存储成功,否则返回False
+        """
+        if not mapping:
+            return True
+        try:
+            items = list(mapping.items())
+            pipe = self.__redis.pipeline(transaction=False)
+            for start in range(0, len(items), batch_size):
+                for key, value in items[start:start + batch_size]:
+                    key_ex = ex.get(key) if isinstance(ex, dict) else ex
+                    pipe.set(key, self.__codec.encode(value), ex=key_ex or None)
+                pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"批量设置键值对失败:{e}")
+            return False
+
+    def hgetall_many(self, names, batch_size=500):
+        """
+        批量获取多个哈希表的所有字段和值
+        :param names: 哈希表名列表
+        :param batch_size: 每次管道发送的哈希表数量
+        :return: 与names顺序一致的字典列表(字段和值为bytes),不存在的哈希表为空字典,失败时返回空列表
+        """
+        try:
+            results = []
+            pipe = self.__redis.pipeline(transaction=False)
+            for start in range(0, len(names), batch_size):
+                for name in names[start:start + batch_size]:
+                    pipe.hgetall(name)
+                results.extend(pipe.execute())
+            return results
+        except Exception as e:
+            logger.error(f"批量获取哈希表失败:{e}")
+            return []
+
+    def delete_pattern(self, pattern, batch_size=500):
+        """
+        按模式批量删除键,使用SCAN增量遍历并分块UNLINK,避免KEYS/DEL阻塞Redis
+        :param pattern: 键匹配模式,如 "agent:cache:*"
+        :param batch_size: 每次SCAN的COUNT提示及每次UNLINK的键数量
+        :return: 被删除的键数量
+        """
+        deleted = 0
+        try:
+            batch = []
+            for key in self.__redis.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += self.__redis.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += self.__redis.unlink(*batch)
+        except Exception as e:
+            logger.error(f"按模式删除键失败:{e}")
+        return deleted
+
     def publish_message(self, channel, message):
         """
         将消息发布到指定频道
@@ -96,7 +183,7 @@ class RedisUtil:
         :return: 成功发布的消息数量
         """
         try:
-            return self.__redis.publish(channel, json.dumps(message))
+            return self.__redis.publish(channel, self.__codec.encode(message))
         except Exception as e:
             logger.error("消息发布失败: ", e)
             return 0
@@ -111,17 +198,26 @@ class RedisUtil:
         pubsub.subscribe(channel)
         return pubsub
 
-    def listen_for_messages(self, pubsub):
+    def listen_for_messages(self, pubsub, handler=None):
         """
-        持续监听订阅的频道,并处理接收到的消息
+        阻塞监听订阅的频道,并处理接收到的消息(没有消息时不占用CPU)
+        异步服务中请使用 app.services.redis_pubsub.redis_subscriber
         :param pubsub: PubSub对象
-        """
-        while True:
-            message = pubsub.get_message()
-            if message and message["type"] == "message":
-                logger.error("Received message:", message["data"])
-                # 处理消息后确认消息已接收
-                # ...
+        :param handler: 消息处理函数 handler(channel, data),默认仅记录日志
+        """
+        for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            channel = message["channel"].decode()
+            try:
+                data = self.__codec.decode(message["data"])
+            except Exception as e:
+                logger.error(f"消息解码失败:{e}")
+                continue
+            if handler is None:
+                logger.info(f"Received message: {channel} {data}")
+            else:
+                handler(channel, data)
 
 
 if __name__ == "__main__":
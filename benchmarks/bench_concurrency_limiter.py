@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+自适应并发限制基准测试
+
+模拟一个最多同时处理 --capacity 个请求的模型服务: 超出时立即返回 429,
+处理中的请求越多单次耗时越长。--callers 个并发调用方各发起 --calls 次调用,对比:
+
+- unlimited: 不限制并发,流量尖峰全部打到服务上
+- aimd: AdaptiveConcurrencyLimiter,上限按 429 与耗时膨胀自动收敛
+
+输出成功数、429 数、成功调用的平均/p95 耗时(含排队)与最终的并发上限。
+
+用法:
+    python benchmarks/bench_concurrency_limiter.py --callers 200 --calls 10 --capacity 10
+"""
+
+import argparse
+import asyncio
+import contextlib
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.concurrency_limiter import AdaptiveConcurrencyLimiter
+
+
+class Throttled(Exception):
+    status_code = 429
+
+
+class FakeProvider:
+    """超过容量返回 429,耗时随并发线性增长的模拟服务"""
+
+    def __init__(self, capacity: int, base_latency: float):
+        self.capacity = capacity
+        self.base_latency = base_latency
+        self.active = 0
+
+    async def call(self) -> None:
+        self.active += 1
+        try:
+            if self.active > self.capacity:
+                await asyncio.sleep(self.base_latency / 10)
+                raise Throttled()
+            await asyncio.sleep(self.base_latency * (1 + self.active / self.capacity))
+        finally:
+            self.active -= 1
+
+
+async def run(provider: FakeProvider, limit, callers: int, calls: int) -> tuple[list[float], int]:
+    """返回 (成功调用的耗时, 429 次数)"""
+    durations, throttled = [], 0
+
+    async def caller():
+        nonlocal throttled
+        for _ in range(calls):
+            started = time.perf_counter()
+            try:
+                async with limit():
+                    await provider.call()
+            except Throttled:
+                throttled += 1
+            else:
+                durations.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(caller() for _ in range(callers)))
+    return durations, throttled
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="自适应并发限制基准测试")
+    parser.add_argument("--callers", type=int, default=200, help="并发调用方数量")
+    parser.add_argument("--calls", type=int, default=10, help="每个调用方的调用次数")
+    parser.add_argument("--capacity", type=int, default=10, help="模拟服务的并发容量")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟服务空载时的耗时(秒)")
+    args = parser.parse_args()
+
+    limiter = AdaptiveConcurrencyLimiter("bench")
+    modes = {
+        "unlimited": contextlib.nullcontext,
+        "aimd": lambda: limiter.limit("provider:bench"),
+    }
+    print(f"callers: {args.callers} x {args.calls} calls, provider capacity: {args.capacity}")
+    print(f"  {'mode':<12}{'ok':>8}{'429':>8}{'mean':>12}{'p95':>12}")
+    for name, limit in modes.items():
+        provider = FakeProvider(args.capacity, args.latency)
+        durations, throttled = await run(provider, limit, args.callers, args.calls)
+        durations = sorted(d * 1000 for d in durations) or [0.0]
+        p95 = durations[max(0, int(len(durations) * 0.95) - 1)]
+        print(
+            f"  {name:<12}{len(durations):>8}{throttled:>8}"
+            f"{statistics.mean(durations):>10.1f}ms{p95:>10.1f}ms"
+        )
+    print(f"  final aimd limit: {limiter.stats()['provider:bench']['limit']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
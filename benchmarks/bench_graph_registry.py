@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+编译图注册表基准测试
+
+对比旧实现(每次运行 GraphBuilder().build_graph_async() 新建 StateGraph、重新编译并新建 InMemorySaver)
+与 GraphRegistry.get()(进程内只编译一次,共用checkpointer)从开始运行到收到第一个事件的耗时。
+两种方式都使用 InMemorySaver,只比较编译开销;LLM 调用被替换为直接返回的桩,
+不访问网络,也不连接 Redis(配置版本为空)和数据库。
+
+用法:
+    python benchmarks/bench_graph_registry.py --runs 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from langchain_core.messages import AIMessage
+from langchain_openai import ChatOpenAI
+
+from app.models.LLM import LLM
+from app.services.llms_manage.client_registry import llm_client_registry
+from app.services.llms_manage.router import llm_router
+from app.services.now_find_agents.graph_builder import GraphBuilder
+from app.services.now_find_agents.graph_registry import (DEFAULT_GRAPH,
+                                                         GraphRegistry,
+                                                         create_checkpointer)
+from app.services.workflow.base import create_workflow_config
+
+_bench_llm = LLM(id=1, provider="bench", model_name="gpt-4o", api_key="sk-bench", api_url="http://127.0.0.1/v1", status=1)
+
+
+# 不查询 agent 表与 llm 表
+async def _stub_resolve_agent_model(agent_name: str) -> str:
+    return _bench_llm.model_name
+
+
+async def _stub_active_llms() -> list[LLM]:
+    return [_bench_llm]
+
+
+async def _stub_ainvoke(self, messages, *args, **kwargs):
+    return AIMessage(content="ok")
+
+
+async def time_to_first_event(get_graph, run: int) -> tuple[float, float]:
+    """返回 (到第一个事件的耗时, 整次运行耗时)"""
+    started = time.perf_counter()
+    graph = await get_graph()
+    task_id = f"bench-{run}"
+    state = {"messages": [{"role": "user", "content": "帮我找3年以上经验的Python后端工程师"}], "hr_id": 1}
+    first = None
+    async for _ in graph.astream(
+        state,
+        config=create_workflow_config(task_id=task_id),
+        stream_mode=["values", "updates", "messages"],
+    ):
+        if first is None:
+            first = time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[max(0, int(len(values) * q) - 1)]
+
+
+def report(name: str, samples: list[tuple[float, float]]) -> None:
+    first = [s[0] * 1000 for s in samples]
+    total = [s[1] * 1000 for s in samples]
+    print(
+        f"  {name:<10}{statistics.mean(first):>12.2f}{percentile(first, 0.5):>10.2f}"
+        f"{percentile(first, 0.95):>10.2f}{statistics.mean(total):>12.2f}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="编译图注册表基准测试")
+    parser.add_argument("--runs", type=int, default=200, help="每种方式的运行次数")
+    args = parser.parse_args()
+
+    ChatOpenAI.ainvoke = _stub_ainvoke
+    llm_router.resolve_agent_model = _stub_resolve_agent_model
+    llm_client_registry.active_llms = _stub_active_llms
+    registry = GraphRegistry(create_checkpointer("memory"))
+    registry.register(DEFAULT_GRAPH, lambda checkpointer: GraphBuilder(checkpointer).build_graph_async())
+
+    async def cold():
+        return await GraphBuilder().build_graph_async()
+
+    # 预热导入与首次编译,不计入结果
+    await time_to_first_event(cold, -1)
+    await time_to_first_event(registry.get, -2)
+
+    results = {}
+    for name, get_graph in (("cold", cold), ("warm", registry.get)):
+        results[name] = [await time_to_first_event(get_graph, run) for run in range(args.runs)]
+
+    print(f"runs per mode: {args.runs}")
+    print(f"  {'mode':<10}{'ttfe mean':>12}{'p50':>10}{'p95':>10}{'run mean':>12}  (ms)")
+    for name, samples in results.items():
+        report(name, samples)
+    print(f"  compiles by registry: {registry.compiles}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
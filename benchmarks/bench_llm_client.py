@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+LLM 客户端基准测试
+
+对本地模拟的 OpenAI 兼容服务依次发起 N 次 ainvoke,对比:
+
+- per_call: 旧实现,每次调用新建 ChatOpenAI(使用 langchain 默认的 httpx 客户端)
+- fresh_pool: 每次调用新建 ChatOpenAI 与独立连接池,即每次调用都重新建连
+- registry: LLMClientRegistry.client(),按 llm 表行复用客户端与共享的长连接池
+
+输出每种方式的平均/p95 耗时与服务端收到的 TCP 连接数。本地服务不使用 TLS,
+线上经由 HTTPS 访问时重新建连的开销(TCP + TLS 握手,通常为数十毫秒)远大于本地结果。
+
+用法:
+    python benchmarks/bench_llm_client.py --runs 200
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from app.models.LLM import LLM
+from app.services.llms_manage.client_registry import LLMClientRegistry
+
+_RESPONSE = json.dumps({
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode()
+
+
+class FakeOpenAIServer:
+    """只返回固定响应的 HTTP/1.1 服务,统计收到的连接数"""
+
+    def __init__(self):
+        self.connections = 0
+        self._server = None
+        self._handlers: dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self._handlers[writer] = asyncio.current_task()
+        try:
+            while request_line := await reader.readline():
+                length = 0
+                while (header := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = header.partition(b":")
+                    if name.lower() == b"content-length":
+                        length = int(value)
+                if length:
+                    await reader.readexactly(length)
+                body = b"" if request_line.startswith(b"HEAD") else _RESPONSE
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n" % len(_RESPONSE) + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._handlers.pop(writer, None)
+            writer.close()
+
+    async def stop(self) -> None:
+        self._server.close()
+        # 客户端保持的长连接不会主动断开
+        handlers = list(self._handlers.values())
+        for writer in list(self._handlers):
+            writer.close()
+        if handlers:
+            await asyncio.wait(handlers)
+
+
+async def run(get_llm, runs: int) -> list[float]:
+    messages = [{"role": "user", "content": "帮我找3年以上经验的Python后端工程师"}]
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        llm, pool = get_llm()
+        await llm.ainvoke(messages)
+        if pool is not None:
+            await pool.aclose()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="LLM 客户端基准测试")
+    parser.add_argument("--runs", type=int, default=200, help="每种方式的调用次数")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer()
+    api_url = await server.start()
+    row = LLM(id=1, provider="bench", model_name="gpt-4o", api_key="sk-bench", api_url=api_url, status=1)
+    registry = LLMClientRegistry()
+
+    def per_call():
+        return ChatOpenAI(api_key=row.api_key, base_url=api_url, model=row.model_name), None
+
+    def fresh_pool():
+        pool = httpx.AsyncClient()
+        return ChatOpenAI(api_key=row.api_key, base_url=api_url, model=row.model_name, http_async_client=pool), pool
+
+    def registry_client():
+        return registry.client(row), None
+
+    print(f"runs: {args.runs}")
+    print(f"  {'client':<12}{'mean':>10}{'p95':>10}{'connections':>14}")
+    for name, get_llm in (("per_call", per_call), ("fresh_pool", fresh_pool), ("registry", registry_client)):
+        await run(get_llm, 5)  # 预热,不计入结果
+        before = server.connections
+        durations = sorted(d * 1000 for d in await run(get_llm, args.runs))
+        p95 = durations[max(0, int(len(durations) * 0.95) - 1)]
+        print(
+            f"  {name:<12}{statistics.mean(durations):>8.2f}ms{p95:>8.2f}ms"
+            f"{server.connections - before:>14}"
+        )
+
+    await registry.aclose()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
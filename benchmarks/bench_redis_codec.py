@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Redis 值编解码基准测试
+
+对比旧实现(标准库 json.dumps/json.loads)与 app.support.codec 各序列化格式/压缩算法组合
+在不同大小的工作流状态负载下的编码耗时、解码耗时与编码后大小。不连接 Redis,
+未安装的格式(msgpack/zstandard/lz4)会被跳过。
+
+用法:
+    python benchmarks/bench_redis_codec.py --iterations 200
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.support.codec import Codec, CodecError, decode
+
+CODECS = [
+    ("json", "none"),
+    ("json", "zstd"),
+    ("json", "lz4"),
+    ("msgpack", "none"),
+    ("msgpack", "zstd"),
+    ("msgpack", "lz4"),
+]
+
+
+def build_state(messages: int) -> dict:
+    """构造与 LangGraph 工作流状态结构相近的负载"""
+    return {
+        "thread_id": "bench-thread",
+        "next": ["supervisor"],
+        "messages": [
+            {
+                "type": "ai" if i % 2 else "human",
+                "id": f"run-{i:08d}",
+                "content": f"第{i}轮对话: 请根据岗位要求整理候选人简历中的项目经历与技能栈。" * 3,
+                "additional_kwargs": {"tool_calls": [{"name": "search", "args": {"q": f"query {i}"}}]},
+                "response_metadata": {"token_usage": {"prompt_tokens": 120 + i, "completion_tokens": 48}},
+            }
+            for i in range(messages)
+        ],
+    }
+
+
+def measure(fn, iterations: int) -> float:
+    for _ in range(min(iterations, 10)):
+        fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Redis 值编解码基准测试")
+    parser.add_argument("--iterations", type=int, default=200, help="每组重复次数")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1, 10, 100, 1000], help="负载中的消息条数"
+    )
+    args = parser.parse_args()
+
+    print(f"iterations per group: {args.iterations}")
+    for size in args.sizes:
+        state = build_state(size)
+        legacy = json.dumps(state)
+        legacy_bytes = len(legacy.encode())
+        encode_us = measure(lambda: json.dumps(state), args.iterations) * 1e6
+        decode_us = measure(lambda: json.loads(legacy), args.iterations) * 1e6
+
+        print(f"\nmessages={size} (legacy json {legacy_bytes} bytes)")
+        print(f"  {'codec':<16}{'bytes':>10}{'ratio':>8}{'encode us':>12}{'decode us':>12}")
+        print(f"  {'legacy json':<16}{legacy_bytes:>10}{1.0:>8.2f}{encode_us:>12.1f}{decode_us:>12.1f}")
+        for serializer, compression in CODECS:
+            try:
+                codec = Codec(serializer, compression)
+            except CodecError:
+                print(f"  {serializer + '/' + compression:<16}{'skipped (not installed)':>42}")
+                continue
+            encoded = codec.encode(state)
+            encode_us = measure(lambda: codec.encode(state), args.iterations) * 1e6
+            decode_us = measure(lambda: decode(encoded), args.iterations) * 1e6
+            print(
+                f"  {serializer + '/' + compression:<16}{len(encoded):>10}"
+                f"{len(encoded) / legacy_bytes:>8.2f}{encode_us:>12.1f}{decode_us:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
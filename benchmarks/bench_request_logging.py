@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+请求日志中间件开销基准测试
+
+对比旧实现(BaseHTTPMiddleware + logging_provider 中的 http 中间件,
+每个 POST 都读取并 json.loads 请求体)与新的纯 ASGI RequestLoggerMiddleware
+的单请求开销。直接调用 ASGI 接口,不经过网络与 HTTP 客户端。
+
+用法:
+    python benchmarks/bench_request_logging.py --requests 5000
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from fastapi import FastAPI, Request
+from loguru import logger
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.http.middleware.request_logger import RequestLoggerMiddleware
+
+PAYLOAD = json.dumps({"name": "agent", "description": "x" * 512}).encode()
+
+
+class LegacyRequestLoggerMiddleware(BaseHTTPMiddleware):
+    """旧版 BaseHTTPMiddleware 实现(简化复刻)"""
+
+    async def dispatch(self, request: Request, call_next):
+        request_id = str(uuid.uuid4())
+        start_time = time.time()
+        logger.info(f"Request started | ID: {request_id} | Path: {request.url.path}")
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        logger.info(f"Request completed | ID: {request_id} | Duration: {process_time:.4f}s")
+        response.headers["X-Request-ID"] = request_id
+        response.headers["X-Process-Time"] = str(process_time)
+        return response
+
+
+def build_app(mode: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    if mode == "legacy":
+
+        @app.middleware("http")
+        async def log_requests(request: Request, call_next):
+            body = await request.body()
+            request_body = json.loads(body.decode("utf-8"))
+            headers = dict(request.headers)
+            logger.info(
+                f"🚀 请求开始 [{request.method}] {request.url.path}\n"
+                f"   📤 请求头: {headers}\n"
+                f"   📦 请求体: {request_body}"
+            )
+            response = await call_next(request)
+            logger.info(f"✅ 请求完成 [{request.method}] {request.url.path}")
+            return response
+
+        app.add_middleware(LegacyRequestLoggerMiddleware)
+    elif mode == "asgi":
+        app.add_middleware(RequestLoggerMiddleware)
+    return app
+
+
+async def call(app, scope: dict) -> None:
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if body_sent:
+            return {"type": "http.disconnect"}
+        body_sent = True
+        return {"type": "http.request", "body": PAYLOAD, "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def run(app, requests: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/echo",
+        "raw_path": b"/echo",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"bench"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(PAYLOAD)).encode()),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+        "app": app,
+    }
+    # 预热
+    for _ in range(100):
+        await call(app, dict(scope))
+    start = time.perf_counter()
+    for _ in range(requests):
+        await call(app, dict(scope))
+    return (time.perf_counter() - start) / requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="请求日志中间件开销基准测试")
+    parser.add_argument("--requests", type=int, default=5000, help="每组请求数")
+    args = parser.parse_args()
+
+    # 使用丢弃型 sink,保留格式化开销但排除磁盘写入
+    logger.remove()
+    logger.add(lambda _: None, level="INFO", format="{time} | {level} | {message}")
+
+    baseline = asyncio.run(run(build_app("none"), args.requests))
+    legacy = asyncio.run(run(build_app("legacy"), args.requests))
+    current = asyncio.run(run(build_app("asgi"), args.requests))
+
+    print(f"requests per group: {args.requests}")
+    print(f"no logging middleware: {baseline * 1e6:8.1f} us/request")
+    print(f"legacy two layers    : {legacy * 1e6:8.1f} us/request "
+          f"(overhead {(legacy - baseline) * 1e6:.1f} us)")
+    print(f"pure ASGI middleware : {current * 1e6:8.1f} us/request "
+          f"(overhead {(current - baseline) * 1e6:.1f} us)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+工作流checkpointer基准测试
+
+依次运行 N 个会话(每个会话一个新的 thread_id),对比进程内checkpointer(BoundedMemorySaver,
+会话数不超过 CHECKPOINT_MEMORY_MAX_THREADS 时不淘汰)、SQLCheckpointSaver(每步写库)
+与 WriteBehindSaver 包装的 SQLCheckpointSaver(async 模式,运行结束时落库)
+每次运行的耗时、进程内存增长(tracemalloc)与数据库中保留的行数。
+LLM 调用被替换为直接返回的桩;SQLCheckpointSaver 使用临时目录中的 SQLite 数据库。
+
+用法:
+    python benchmarks/bench_sql_checkpointer.py --runs 500
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from langchain_core.messages import AIMessage
+from langchain_openai import ChatOpenAI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.models.LLM import LLM
+from app.services.llms_manage.client_registry import llm_client_registry
+from app.services.llms_manage.router import llm_router
+from app.services.now_find_agents.graph_builder import GraphBuilder
+from app.services.now_find_agents.graph_registry import create_checkpointer
+from app.services.now_find_agents.sql_checkpointer import SQLCheckpointSaver
+from app.services.now_find_agents.write_behind_checkpointer import WriteBehindSaver
+from app.services.workflow.base import create_workflow_config
+
+_bench_llm = LLM(id=1, provider="bench", model_name="gpt-4o", api_key="sk-bench", api_url="http://127.0.0.1/v1", status=1)
+
+
+# 不查询 agent 表与 llm 表
+async def _stub_resolve_agent_model(agent_name: str) -> str:
+    return _bench_llm.model_name
+
+
+async def _stub_active_llms() -> list[LLM]:
+    return [_bench_llm]
+
+
+async def _stub_ainvoke(self, messages, *args, **kwargs):
+    return AIMessage(content="已为您找到以下候选人:" + "Python后端工程师," * 200)
+
+
+async def run_conversations(name: str, checkpointer, runs: int) -> tuple[list[float], int]:
+    """返回 (每次运行耗时, 运行后的内存增长字节数),每次运行包含运行结束时的落库"""
+    graph = await GraphBuilder(checkpointer).build_graph_async()
+    state = {"messages": [{"role": "user", "content": "帮我找3年以上经验的Python后端工程师"}], "hr_id": 1}
+    # 预热,不计入结果
+    await graph.ainvoke(state, config=create_workflow_config(task_id=f"{name}-warmup"))
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    durations = []
+    for run in range(runs):
+        started = time.perf_counter()
+        task_id = f"{name}-{run}"
+        await graph.ainvoke(state, config=create_workflow_config(task_id=task_id))
+        if isinstance(checkpointer, WriteBehindSaver):
+            await checkpointer.aflush(task_id)
+        durations.append(time.perf_counter() - started)
+    growth = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return durations, growth
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="工作流checkpointer基准测试")
+    parser.add_argument("--runs", type=int, default=500, help="每种checkpointer运行的会话数")
+    parser.add_argument("--keep-last", type=int, default=10, help="每个会话保留的checkpoint数")
+    args = parser.parse_args()
+
+    ChatOpenAI.ainvoke = _stub_ainvoke
+    llm_router.resolve_agent_model = _stub_resolve_agent_model
+    llm_client_registry.active_llms = _stub_active_llms
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp}/checkpoints.db")
+        savers = {
+            "memory": create_checkpointer("memory"),
+            "sql": SQLCheckpointSaver(engine, keep_last=args.keep_last, ttl=0),
+            "write_behind": WriteBehindSaver(
+                SQLCheckpointSaver(engine, keep_last=args.keep_last, ttl=0), durability="async"
+            ),
+        }
+        print(f"runs per checkpointer: {args.runs}")
+        print(f"  {'saver':<14}{'run mean':>12}{'p95':>10}{'mem growth':>14}")
+        for name, saver in savers.items():
+            durations, growth = await run_conversations(name, saver, args.runs)
+            durations = sorted(d * 1000 for d in durations)
+            p95 = durations[max(0, int(len(durations) * 0.95) - 1)]
+            print(
+                f"  {name:<14}{statistics.mean(durations):>10.2f}ms{p95:>8.2f}ms"
+                f"{growth / 1024:>11.1f}KiB"
+            )
+
+        async with engine.connect() as conn:
+            for table in ("langgraph_checkpoint", "langgraph_checkpoint_blob", "langgraph_checkpoint_write"):
+                count = (await conn.execute(text(f"SELECT COUNT(*) FROM {table}"))).scalar()
+                print(f"  {table}: {count} rows")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
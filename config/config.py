@@ -54,6 +54,27 @@ class BaseAppSettings(BaseSettings):
     REDIS_PORT: int = Field(default=6379, description="Redis端口")
     REDIS_DB: int = Field(default=0, description="Redis数据库编号")
     REDIS_PASSWORD: Optional[str] = Field(default=None, description="Redis密码")
+    REDIS_EXPIRE: int = Field(default=60, description="Redis键默认过期时间(秒)")
+    REDIS_MAX_CONNECTIONS: int = Field(default=50, description="Redis连接池最大连接数(每个进程)")
+    REDIS_SOCKET_TIMEOUT: Optional[float] = Field(default=5.0, description="Redis命令读写超时(秒)")
+    REDIS_SOCKET_CONNECT_TIMEOUT: Optional[float] = Field(default=5.0, description="Redis建立连接超时(秒)")
+    REDIS_HEALTH_CHECK_INTERVAL: int = Field(default=30, description="空闲连接复用前的健康检查间隔(秒),0为不检查")
+    REDIS_CODEC_SERIALIZER: str = Field(default="json", description="Redis对象值序列化格式: json/msgpack")
+    REDIS_CODEC_COMPRESSION: str = Field(
+        default="none", description="Redis对象值压缩算法: none/zstd/lz4,所有读取方升级到支持头字节的版本后再开启"
+    )
+    REDIS_CODEC_COMPRESS_MIN_BYTES: int = Field(default=1024, description="Redis对象值达到该大小(字节)时才压缩")
+    REDIS_PUBSUB_QUEUE_SIZE: int = Field(default=1000, description="Redis订阅每个处理函数的默认队列容量")
+    REDIS_PUBSUB_PING_INTERVAL: float = Field(
+        default=30, description="Redis订阅连接空闲超过该时间(秒)时发送PING,再经过同样时间仍无响应则重连"
+    )
+    REDIS_NEAR_CACHE_PREFIXES: list[str] = Field(
+        default=[],
+        description="本地近缓存的键前缀(RESP3 广播模式客户端追踪),如 feature_flag:,为空时不启用,不建立追踪连接",
+    )
+    REDIS_NEAR_CACHE_TTL: float = Field(default=60, description="本地近缓存条目的兜底过期时间(秒),失效通知丢失时最多读到该时长的旧值")
+    REDIS_NEAR_CACHE_MAX_ENTRIES: int = Field(default=10000, description="本地近缓存最大条目数,超出时淘汰最久未使用的条目")
+    REDIS_CACHE_TAG_TTL: int = Field(default=86400, description="缓存标签集合与版本的保留时间(秒),redis_cached 的缓存时间不能超过该值")
 
     # 前端配置
     FRONTEND_URL: str = Field(default="http://localhost:3000", description="前端应用地址")
@@ -65,6 +86,136 @@ class BaseAppSettings(BaseSettings):
     LOG_PATH_ERROR: str = Field(default="config/settings/storage/logs/error/fastapi-{{time:YYYY-MM-DD}}.log", description="错误日志文件路径")
     LOG_ROTATION: str = Field(default="00:00", description="日志轮转时间")
     LOG_RETENTION: str = Field(default="7 days", description="日志保留时间")
+
+    LOG_PER_WORKER_FILE: bool = Field(default=True, description="多worker部署时每个进程写入独立的日志文件,文件名带稳定的worker编号")
+
+    # 结构化日志与采样配置
+    LOG_FORMAT_TYPE: str = Field(default="text", description="日志输出格式: text/json")
+    LOG_SAMPLING_DEFAULT_RATE: float = Field(default=1.0, description="请求日志默认采样率(0-1)")
+    LOG_SAMPLING_SLOW_MS: float = Field(default=1000.0, description="慢请求阈值(毫秒),超过阈值的请求日志始终记录")
+    LOG_SAMPLING_RULES: list[dict] = Field(
+        default_factory=list,
+        description='请求日志采样规则,如 [{"route": "/health/*", "method": "GET", "level": "INFO", "rate": 0.01}]',
+    )
+
+    # 链路追踪配置
+    TRACING_ENABLED: bool = Field(default=True, description="是否开启请求级链路追踪")
+    TRACING_SERVER_TIMING: bool = Field(default=True, description="是否输出Server-Timing响应头")
+    TRACING_MAX_SPANS: int = Field(default=500, description="单个请求最多记录的span数量")
+    TRACING_EXPORT_PATH: Optional[str] = Field(default=None, description="OTLP/JSON格式的Trace导出文件路径,为空则不导出")
+    TRACING_EXPORT_SAMPLE_RATE: float = Field(default=1.0, description="Trace导出采样率(0-1)")
+
+    # SQL监控配置
+    SQL_STATS_ENABLED: bool = Field(default=True, description="是否按语句指纹统计SQL执行耗时")
+    SQL_SLOW_QUERY_MS: float = Field(default=500.0, description="慢查询阈值(毫秒)")
+    SQL_SLOW_QUERY_EXPLAIN: bool = Field(default=False, description="慢查询日志是否附带EXPLAIN执行计划")
+    SQL_SLOW_LOG_PATH: Optional[str] = Field(
+        default="config/settings/storage/logs/slow-sql/slow-sql-{{time:YYYY-MM-DD}}.log",
+        description="慢查询日志文件路径,为空则只写入普通日志",
+    )
+    SQL_N_PLUS_ONE_THRESHOLD: int = Field(default=10, description="单个请求内同一查询执行次数达到该值时记录疑似N+1")
+
+    # 事件循环监控配置
+    LOOP_MONITOR_ENABLED: bool = Field(default=False, description="是否开启事件循环延迟监控与阻塞调用检测")
+    LOOP_MONITOR_INTERVAL_MS: float = Field(default=100.0, description="事件循环心跳间隔(毫秒)")
+    LOOP_BLOCK_THRESHOLD_MS: float = Field(default=100.0, description="事件循环阻塞超过该时长(毫秒)时抓取调用栈")
+
+    # 调试接口配置
+    DEBUG_TOKEN: Optional[str] = Field(default=None, description="/debug 调试接口访问令牌,为空则关闭调试接口")
+    PROFILER_MAX_SECONDS: int = Field(default=60, description="/debug/profile 单次采样最长时间(秒)")
+    PROFILER_SAMPLE_HZ: int = Field(default=100, description="/debug/profile 默认采样频率(次/秒)")
+
+    # 监控指标配置
+    METRICS_ENABLED: bool = Field(default=True, description="是否开启Prometheus指标与/metrics接口")
+    METRICS_MULTIPROC_DIR: str = Field(
+        default="config/settings/storage/prometheus",
+        description="多worker部署时Prometheus指标的共享目录",
+    )
+
+    # 限流配置
+    RATE_LIMIT_FAIL_OPEN: bool = Field(default=True, description="Redis不可用时限流器是否放行请求")
+    LLM_RATE_LIMITS: dict[str, dict] = Field(
+        default_factory=dict,
+        description='LLM调用令牌桶规则,如 {"provider:openai": {"rate": 10, "capacity": 20}, "model:gpt-4o": {"rate": 5}}',
+    )
+    LLM_RATE_LIMIT_PREFETCH: int = Field(default=1, description="LLM限流每次从Redis预取的令牌数,1为不预取")
+    LLM_RATE_LIMIT_TIMEOUT: float = Field(default=30.0, description="LLM调用等待令牌的最长时间(秒)")
+
+    # LLM并发控制配置
+    LLM_CONCURRENCY_ENABLED: bool = Field(default=True, description="是否按提供商与模型自适应限制每个进程的LLM并发调用数")
+    LLM_CONCURRENCY_INITIAL: int = Field(default=8, description="每个提供商/模型的初始并发上限")
+    LLM_CONCURRENCY_MIN: int = Field(default=1, description="并发上限下调的最小值")
+    LLM_CONCURRENCY_MAX: int = Field(default=64, description="并发上限增长的最大值")
+    LLM_CONCURRENCY_BACKOFF: float = Field(default=0.7, description="遇到429/5xx/超时或耗时膨胀时并发上限乘以该系数")
+    LLM_CONCURRENCY_LATENCY_TOLERANCE: float = Field(default=2.0, description="近期耗时超过长期耗时的该倍数时视为耗时膨胀")
+    LLM_CONCURRENCY_QUEUE_TIMEOUT: float = Field(default=60.0, description="LLM调用等待并发名额的最长时间(秒)")
+    LLM_CONCURRENCY_LIMITS: dict[str, dict] = Field(
+        default_factory=dict,
+        description='按键覆盖并发上限,如 {"provider:openai": {"initial": 16, "max": 128}, "model:gpt-4o": {"max": 32}}',
+    )
+
+    # LLM客户端配置
+    LLM_DEFAULT_MODEL: str = Field(default="gpt-4o", description="Agent 不存在或未关联模型时使用的模型名称,对应 llm 表的 model_name")
+    LLM_HTTP_MAX_CONNECTIONS: int = Field(default=100, description="每个模型服务地址的HTTP连接池最大连接数")
+    LLM_HTTP_MAX_KEEPALIVE: int = Field(default=20, description="每个模型服务地址保持的空闲长连接数")
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = Field(default=60.0, description="空闲长连接的保持时间(秒)")
+    LLM_HTTP_CONNECT_TIMEOUT: float = Field(default=10.0, description="连接模型服务的超时时间(秒)")
+    LLM_REQUEST_TIMEOUT: float = Field(default=120.0, description="单次模型调用的超时时间(秒)")
+    LLM_MAX_RETRIES: int = Field(default=2, description="模型调用失败时的重试次数")
+    LLM_CLIENT_CHECK_INTERVAL: float = Field(default=5.0, description="检查 llm 表配置版本的间隔(秒)")
+    LLM_CLIENT_RELOAD_INTERVAL: float = Field(default=300.0, description="无法读取配置版本时重新加载 llm 表的间隔(秒)")
+    LLM_CLIENT_WARMUP: bool = Field(default=True, description="启动时是否预先建立到各模型服务地址的连接")
+
+    # LLM路由配置
+    LLM_ROUTER_EWMA_ALPHA: float = Field(default=0.3, description="模型服务地址耗时与错误率的指数加权平均系数,越大越看重最近的调用")
+    LLM_EJECT_CONSECUTIVE_ERRORS: int = Field(default=3, description="模型服务地址连续失败该次数后暂时摘除")
+    LLM_EJECT_ERROR_RATE: float = Field(default=0.5, description="模型服务地址加权错误率达到该值后暂时摘除")
+    LLM_EJECT_MIN_REQUESTS: int = Field(default=10, description="按错误率摘除前至少需要的调用次数")
+    LLM_EJECT_BASE_SECONDS: float = Field(default=30.0, description="首次摘除的时长(秒),连续摘除时倍增")
+    LLM_EJECT_MAX_SECONDS: float = Field(default=300.0, description="摘除时长上限(秒)")
+
+    # 工作流图配置
+    GRAPH_VERSION_CHECK_INTERVAL: float = Field(default=5.0, description="编译图检查Agent/Tool/LLM配置版本的间隔(秒)")
+    CHECKPOINTER_BACKEND: str = Field(default="sql", description="工作流checkpointer: sql(数据库持久化)/memory(有界的进程内存,用于开发与单节点部署)")
+    CHECKPOINT_KEEP_LAST: int = Field(default=10, description="每个会话保留的最近checkpoint数,0为不限制")
+    CHECKPOINT_TTL: int = Field(default=7 * 24 * 3600, description="会话超过该时长(秒)未更新时删除其checkpoint,0为不清理")
+    CHECKPOINT_PRUNE_INTERVAL: float = Field(default=600.0, description="过期checkpoint后台清理间隔(秒)")
+    CHECKPOINT_COMPRESS_MIN_BYTES: int = Field(default=1024, description="checkpoint序列化结果达到该大小(字节)时压缩")
+    CHECKPOINT_DURABILITY: str = Field(default="async", description="数据库checkpoint落库时机: sync(每步写库)/async(写后缓冲,后台批量落库)/exit(运行结束时落库)")
+    CHECKPOINT_FLUSH_INTERVAL: float = Field(default=0.2, description="async 模式下后台落库间隔(秒)")
+    CHECKPOINT_FLUSH_BATCH_SIZE: int = Field(default=100, description="写后缓冲每批落库的会话数,积压达到该值时立即落库")
+    CHECKPOINT_MAX_PENDING: int = Field(default=1000, description="写后缓冲积压的会话数上限,超过时写入等待落库")
+    CHECKPOINT_MEMORY_MAX_THREADS: int = Field(default=1000, description="进程内checkpointer最多保存的会话数,0为不限制")
+    CHECKPOINT_MEMORY_MAX_BYTES: int = Field(default=256 * 1024 * 1024, description="进程内checkpointer的近似总字节数上限,0为不限制")
+    CHECKPOINT_MEMORY_TTL: float = Field(default=3600.0, description="进程内checkpointer淘汰超过该时长(秒)未访问的会话,0为不淘汰")
+    CHECKPOINT_MEMORY_SPILL_PATH: Optional[str] = Field(default=None, description="进程内checkpointer淘汰会话时转存的SQLite文件路径,为空则直接丢弃")
+
+    # 工作流任务队列配置
+    WORKFLOW_STREAM_KEY: str = Field(default="workflow:jobs", description="工作流任务队列的Redis Stream键")
+    WORKFLOW_CONSUMER_GROUP: str = Field(default="workflow-workers", description="工作流worker消费者组")
+    WORKFLOW_STREAM_MAXLEN: int = Field(default=100000, description="任务流最大长度(近似裁剪)")
+    WORKFLOW_STATUS_TTL: int = Field(default=7 * 24 * 3600, description="任务状态保留时间(秒)")
+    WORKFLOW_WORKER_CONCURRENCY: int = Field(default=4, description="每个worker进程同时运行的任务数")
+    WORKFLOW_JOB_TIMEOUT: float = Field(default=1800.0, description="单个工作流任务超时时间(秒),0为不限制")
+    WORKFLOW_CLAIM_IDLE_MS: int = Field(default=60000, description="未确认任务空闲超过该时间(毫秒)后由其他worker接管")
+    WORKFLOW_MAX_DELIVERIES: int = Field(default=3, description="任务最多投递次数,超过后转入死信流")
+    WORKFLOW_SHUTDOWN_TIMEOUT: float = Field(default=30.0, description="worker停止时等待执行中任务的最长时间(秒)")
+    WORKFLOW_DEDUP_PENDING_TTL_MS: int = Field(default=600000, description="相同任务去重锁在排队期间的租约(毫秒),超过后重复提交会新建任务")
+    WORKFLOW_LOCK_TTL_MS: int = Field(default=30000, description="任务执行期间去重锁的租约(毫秒),由看门狗续期")
+    WORKFLOW_EVENTS_MAXLEN: int = Field(default=10000, description="单个任务事件流最大长度(近似裁剪)")
+    WORKFLOW_EVENTS_TTL: int = Field(default=3600, description="任务事件流保留时间(秒)")
+
+    # 异步日志写入配置
+    LOG_ASYNC_ENABLED: bool = Field(default=True, description="是否启用后台线程批量写日志")
+    LOG_ASYNC_QUEUE_SIZE: int = Field(default=10000, description="异步日志队列容量")
+    LOG_ASYNC_BATCH_SIZE: int = Field(default=256, description="单批次最多写入的日志条数")
+    LOG_ASYNC_FLUSH_INTERVAL: float = Field(default=0.5, description="异步日志最长刷新间隔(秒)")
+    LOG_ASYNC_OVERFLOW_POLICY: str = Field(default="drop", description="队列满时的处理策略: drop/block")
+
+    # 请求日志配置
+    REQUEST_LOG_BODY: bool = Field(default=False, description="是否记录请求体(按比例采样)")
+    REQUEST_LOG_BODY_SAMPLE_RATE: float = Field(default=0.01, description="请求体记录采样率(0-1)")
+    REQUEST_LOG_BODY_MAX_BYTES: int = Field(default=2048, description="单个请求体最多记录的字节数")
     
     # JWT配置
     SECRET_KEY: str = Field(default="your-secret-key-change-in-production", description="JWT密钥")
@@ -210,6 +361,18 @@ class BaseAppSettings(BaseSettings):
                 self.LOG_PATH = logging_config["path"]
             if "error_path" in logging_config:
                 self.LOG_PATH_ERROR = logging_config["error_path"]
+            if "sampling" in logging_config:
+                sampling_config = logging_config["sampling"]
+                if "default_rate" in sampling_config:
+                    self.LOG_SAMPLING_DEFAULT_RATE = sampling_config["default_rate"]
+                if "slow_threshold_ms" in sampling_config:
+                    self.LOG_SAMPLING_SLOW_MS = sampling_config["slow_threshold_ms"]
+                if "rules" in sampling_config:
+                    self.LOG_SAMPLING_RULES = sampling_config["rules"]
+                # 采样规则支持运行时调整,配置变更后立即生效
+                from app.support.structured_logging import log_sampler
+                log_sampler.configure_from_settings(self)
+                logger.info("Applied log sampling configuration from Nacos")
         
         # 存储第三方服务配置
         if "third_party" in self._nacos_config:
@@ -127,7 +127,7 @@ class NacosConfigMapper:
         """映射日志配置"""
         try:
             # Spring Boot的日志配置与Python不同，这里提供默认配置
-            return {
+            logging_config = {
                 "level": "DEBUG",
                 "path": "config/settings/storage/logs/fastapi-{{time:YYYY-MM-DD}}.log",
                 "error_path": "config/settings/storage/logs/error/fastapi-{{time:YYYY-MM-DD}}.log",
@@ -135,6 +135,19 @@ class NacosConfigMapper:
                 "retention": "7 days"
             }
             
+            # 请求日志采样配置: logging.sampling.{default-rate, slow-threshold-ms, rules}
+            sampling = spring_config.get("logging", {}).get("sampling", {})
+            if sampling:
+                logging_config["sampling"] = {}
+                if "default-rate" in sampling:
+                    logging_config["sampling"]["default_rate"] = float(sampling["default-rate"])
+                if "slow-threshold-ms" in sampling:
+                    logging_config["sampling"]["slow_threshold_ms"] = float(sampling["slow-threshold-ms"])
+                if "rules" in sampling:
+                    logging_config["sampling"]["rules"] = list(sampling["rules"])
+            
+            return logging_config
+            
         except Exception as e:
             logger.error(f"Error mapping logging config: {e}")
             return {}
@@ -47,18 +47,24 @@ settings = get_settings()
 app = create_app()
 
 # 添加基础API路由
-from app.api import health_router, example_router
+from app.api import health_router, example_router, metrics_router, debug_router
 from app.api.agents import router as agents_router
 from app.api.llms import router as llms_router
 from app.api.tools import router as tools_router
+from app.api.workflows import router as workflows_router
 
 app.include_router(health_router)
 app.include_router(example_router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router)
+# 调试接口(需配置 DEBUG_TOKEN 并通过 X-Debug-Token 请求头访问)
+app.include_router(debug_router)
 
 # 添加业务API路由
 app.include_router(agents_router, prefix="/api/v1")
 app.include_router(llms_router, prefix="/api/v1")
 app.include_router(tools_router, prefix="/api/v1")
+app.include_router(workflows_router, prefix="/api/v1")
 
 # 添加根路径路由
 @app.get("/")
@@ -72,6 +78,11 @@ async def root():
 
 
 if __name__ == "__main__":
+    # 多worker时各进程的指标写入共享目录,由 /metrics 汇总
+    if settings.WORKERS > 1 and settings.METRICS_ENABLED:
+        from app.support.metrics import prepare_multiprocess_dir
+        prepare_multiprocess_dir(settings.METRICS_MULTIPROC_DIR)
+
     run(
         "main:app",
         host=settings.SERVER_HOST,
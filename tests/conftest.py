@@ -0,0 +1,32 @@
+"""
+测试公共 fixture
+"""
+
+import fakeredis
+import pytest
+
+from app.services.redis import AsyncRedisService
+from app.services.workflow.job_queue import WorkflowJobQueue
+
+
+@pytest.fixture
+async def redis_client():
+    """开启 decode_responses 的内存 Redis 客户端"""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield client
+    await client.aclose()
+
+
+@pytest.fixture
+def bound_redis(redis_client, monkeypatch):
+    """绑定为 AsyncRedisService 共享客户端的内存 Redis"""
+    monkeypatch.setattr(AsyncRedisService, "_client", redis_client)
+    return redis_client
+
+
+@pytest.fixture
+async def queue(redis_client):
+    """使用内存 Redis 的工作流任务队列"""
+    queue = WorkflowJobQueue(redis_client, stream="test:workflow", group="test-workers")
+    await queue.ensure_group()
+    return queue
@@ -0,0 +1,69 @@
+"""
+BoundedMemorySaver 测试
+"""
+
+import operator
+from typing import Annotated, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.services.now_find_agents.bounded_checkpointer import \
+    BoundedMemorySaver
+from app.services.now_find_agents.sql_checkpointer import SQLCheckpointSaver
+
+
+class State(TypedDict, total=False):
+    a: str
+    log: Annotated[list[int], operator.add]
+
+
+def _step(state: State) -> State:
+    return {"log": [len(state.get("log", []))]}
+
+
+def _graph(checkpointer):
+    builder = StateGraph(State)
+    builder.add_node("step", _step)
+    builder.add_edge(START, "step")
+    builder.add_edge("step", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def _config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+async def test_spilled_thread_keeps_unchanged_channels(tmp_path):
+    """被淘汰到 spill 的会话继续运行后,未变化的通道仍保留在会话状态中"""
+    spill = SQLCheckpointSaver(create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'spill.db'}"), keep_last=1)
+    await spill.setup()
+    saver = BoundedMemorySaver(max_threads=1, max_bytes=0, ttl=0, spill=spill)
+    graph = _graph(saver)
+
+    await graph.ainvoke({"a": "keep-me"}, _config("t1"))
+    # 写入 t2 时 t1 被淘汰并转存到 spill
+    await graph.ainvoke({"a": "other"}, _config("t2"))
+    assert "t1" not in saver.storage
+
+    result = await graph.ainvoke({}, _config("t1"))
+    assert result == {"a": "keep-me", "log": [0, 1]}
+    assert saver.spill_hits >= 1
+
+    state = await graph.aget_state(_config("t1"))
+    assert state.values == {"a": "keep-me", "log": [0, 1]}
+
+
+async def test_spill_restore_accounts_bytes(tmp_path):
+    """从 spill 放回内存的会话计入字节统计"""
+    spill = SQLCheckpointSaver(create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'spill.db'}"), keep_last=1)
+    await spill.setup()
+    saver = BoundedMemorySaver(max_threads=1, max_bytes=0, ttl=0, spill=spill)
+    graph = _graph(saver)
+
+    await graph.ainvoke({"a": "keep-me"}, _config("t1"))
+    await graph.ainvoke({"a": "other"}, _config("t2"))
+    await graph.aget_state(_config("t1"))
+
+    assert list(saver.storage) == ["t1"]
+    assert saver.total_bytes == sum(saver._thread_bytes.values()) > 0
@@ -0,0 +1,95 @@
+"""
+Redis 值编解码测试
+"""
+
+import json
+from datetime import datetime
+
+import pytest
+
+from app.support import codec as codec_module
+from app.support.codec import Codec, CodecError, decode
+
+VALUE = {"name": "测试", "items": list(range(500)), "nested": {"ok": True, "ratio": 0.5, "none": None}}
+
+FORMATS = [
+    ("json", "none"),
+    ("json", "zstd"),
+    ("json", "lz4"),
+    ("msgpack", "none"),
+    ("msgpack", "zstd"),
+    ("msgpack", "lz4"),
+]
+
+
+def _skip_unavailable(serializer: str, compression: str) -> None:
+    missing = codec_module._available(serializer, compression)
+    if missing:
+        pytest.skip(f"未安装 {missing}")
+
+
+@pytest.mark.parametrize("serializer,compression", FORMATS)
+def test_round_trip(serializer, compression):
+    _skip_unavailable(serializer, compression)
+    codec = Codec(serializer=serializer, compression=compression, compress_min_bytes=16)
+    encoded = codec.encode(VALUE)
+    assert decode(encoded) == VALUE
+    assert codec.decode(encoded) == VALUE
+
+
+@pytest.mark.parametrize("serializer,compression", FORMATS)
+def test_small_values_are_not_compressed(serializer, compression):
+    _skip_unavailable(serializer, compression)
+    codec = Codec(serializer=serializer, compression=compression, compress_min_bytes=1024)
+    encoded = codec.encode({"a": 1})
+    assert decode(encoded) == {"a": 1}
+    if serializer == "json":
+        assert json.loads(encoded) == {"a": 1}
+
+
+def test_default_codec_output_is_plain_json():
+    """json/none 的输出与旧版 json.dumps 一致,未升级的读取方可以直接解析"""
+    encoded = Codec().encode(VALUE)
+    assert json.loads(encoded) == VALUE
+    assert json.loads(encoded.decode("utf-8")) == VALUE
+
+
+def test_default_settings_do_not_compress():
+    from config.config import get_settings
+
+    assert get_settings().REDIS_CODEC_COMPRESSION == "none"
+
+
+@pytest.mark.parametrize(
+    "legacy",
+    [
+        json.dumps(VALUE),
+        json.dumps(VALUE).encode(),
+        json.dumps(VALUE, ensure_ascii=False).encode("utf-8"),
+    ],
+)
+def test_decode_legacy_json(legacy):
+    """旧版 json.dumps 写入的 str/bytes 值按 JSON 解析"""
+    assert decode(legacy) == VALUE
+
+
+@pytest.mark.parametrize("data", [None, b"", ""])
+def test_decode_empty(data):
+    assert decode(data) is None
+
+
+def test_encode_extra_types():
+    value = {"at": datetime(2024, 1, 2, 3, 4, 5), "tags": {"x"}}
+    assert decode(Codec().encode(value)) == {"at": "2024-01-02T03:04:05", "tags": ["x"]}
+
+
+def test_decode_unknown_header():
+    with pytest.raises(CodecError):
+        decode(bytes((0xFF,)) + b"payload")
+
+
+def test_unsupported_format():
+    with pytest.raises(CodecError):
+        Codec(serializer="pickle")
+    with pytest.raises(CodecError):
+        Codec(compression="gzip")
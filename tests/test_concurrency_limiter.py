@@ -0,0 +1,113 @@
+"""
+自适应并发限制测试
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.concurrency_limiter import (OUTCOME_OVERLOAD,
+                                              OUTCOME_SUCCESS,
+                                              AdaptiveConcurrencyLimiter,
+                                              ConcurrencyLimitExceeded)
+
+
+def _limiter(initial: int = 4, **kwargs) -> AdaptiveConcurrencyLimiter:
+    return AdaptiveConcurrencyLimiter("test", initial=initial, min_limit=1, max_limit=16, **kwargs)
+
+
+async def test_limit_grows_only_under_load():
+    """进行中的调用数不到上限一半时成功不增长,接近上限时每个成功调用增长 1/上限"""
+    limiter = _limiter(initial=4)
+    for _ in range(10):
+        async with limiter.limit("k"):
+            pass
+    assert limiter._states["k"].limit == 4
+
+    for _ in range(2):
+        await limiter.acquire("k")
+    started = time.monotonic()
+    limiter.release("k", started, 0.01, OUTCOME_SUCCESS)
+    assert limiter._states["k"].limit == pytest.approx(4.25)
+    # 释放时只剩一个进行中的调用,不再增长
+    limiter.release("k", started, 0.01, OUTCOME_SUCCESS)
+    assert limiter._states["k"].limit == pytest.approx(4.25)
+    assert limiter._states["k"].inflight == 0
+
+
+async def test_one_decrease_per_batch():
+    """同一批并发调用的过载只下调一次,下调之后开始的调用再次过载时继续下调"""
+    limiter = _limiter(initial=10, backoff=0.5)
+    started = time.monotonic()
+    for _ in range(4):
+        await limiter.acquire("k")
+    for _ in range(4):
+        limiter.release("k", started, 0.01, OUTCOME_OVERLOAD)
+    state = limiter._states["k"]
+    assert state.limit == 5
+    assert state.inflight == 0
+
+    with pytest.raises(TimeoutError):
+        async with limiter.limit("k"):
+            raise TimeoutError
+    assert state.limit == 2.5
+    assert state.capacity == 2
+
+
+async def test_timeout_raises_and_restores_inflight():
+    """等待超时抛出 ConcurrencyLimitExceeded,不占用名额也不留在等待队列中"""
+    limiter = _limiter(initial=1)
+    await limiter.acquire("k")
+    with pytest.raises(ConcurrencyLimitExceeded) as exc_info:
+        await limiter.acquire("k", timeout=0.01)
+    assert exc_info.value.key == "k" and exc_info.value.limit == 1
+    state = limiter._states["k"]
+    assert state.inflight == 1
+    assert not state.waiters
+
+    limiter.release("k", time.monotonic(), 0.01, OUTCOME_SUCCESS)
+    assert state.inflight == 0
+    await limiter.acquire("k", timeout=0.01)
+    assert state.inflight == 1
+
+
+async def test_cancel_during_grant_passes_slot_on():
+    """名额已分配给等待者但其在恢复前被取消时,名额转给下一个等待者"""
+    limiter = _limiter(initial=1)
+    await limiter.acquire("k")
+    first = asyncio.create_task(limiter.acquire("k"))
+    second = asyncio.create_task(limiter.acquire("k"))
+    await asyncio.sleep(0)
+    state = limiter._states["k"]
+    assert len(state.waiters) == 2
+
+    limiter.release("k", time.monotonic(), 0.01, OUTCOME_SUCCESS)
+    # 名额已分配给 first,first 尚未恢复执行时被取消
+    assert first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    await asyncio.wait_for(second, timeout=1)
+    assert state.inflight == 1
+    assert not state.waiters
+
+
+async def test_partial_acquire_rolls_back():
+    """多个键中后面的键获取失败时,已获取的键的名额全部归还"""
+    limiter = _limiter(initial=1)
+    await limiter.acquire("provider")
+    with pytest.raises(ConcurrencyLimitExceeded):
+        async with limiter.limit("model", "provider", timeout=0.01):
+            pytest.fail("不应获得名额")
+    assert limiter._states["model"].inflight == 0
+    assert limiter._states["provider"].inflight == 1
+
+    # 取消同样归还已获取的名额
+    task = asyncio.create_task(limiter.limit("model", "provider").__aenter__())
+    await asyncio.sleep(0)
+    assert limiter._states["model"].inflight == 1
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert limiter._states["model"].inflight == 0
+    assert not limiter._states["provider"].waiters
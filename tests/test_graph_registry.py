@@ -0,0 +1,110 @@
+"""
+编译图注册表测试
+"""
+
+import asyncio
+
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.services.now_find_agents import graph_registry as graph_registry_module
+from app.services.now_find_agents.graph_registry import GraphRegistry
+from app.services.redis_cache import invalidate_tags
+
+pytestmark = pytest.mark.usefixtures("bound_redis")
+
+
+class StubFactory:
+    """记录编译次数的图工厂,编译结果为 (图名称, 第几次编译)"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, checkpointer):
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(self.delay)
+        return ("graph", call)
+
+
+def _registry(factory: StubFactory) -> GraphRegistry:
+    registry = GraphRegistry(checkpointer=InMemorySaver(), check_interval=0)
+    registry.register("test", factory)
+    return registry
+
+
+async def test_concurrent_first_get_compiles_once():
+    """并发的首次获取只编译一次,所有调用方得到同一个图"""
+    factory = StubFactory(delay=0.05)
+    registry = _registry(factory)
+    graphs = await asyncio.gather(*(registry.get("test") for _ in range(10)))
+    assert factory.calls == 1
+    assert registry.compiles == 1
+    assert all(graph is graphs[0] for graph in graphs)
+
+    assert await registry.get("test") is graphs[0]
+    assert factory.calls == 1
+
+
+async def test_tag_version_bump_recompiles():
+    """agent/tool/llm 任一标签版本递增后重新编译,版本不变时复用"""
+    factory = StubFactory()
+    registry = _registry(factory)
+    first = await registry.get("test")
+
+    await invalidate_tags("tool")
+    second = await registry.get("test")
+    assert second == ("graph", 2)
+    assert registry.stats()["graphs"]["test"]["version"] == [0, 1, 0]
+
+    assert await registry.get("test") is second
+    await invalidate_tags("agent", "llm")
+    assert await registry.get("test") == ("graph", 3)
+    assert first != second
+
+
+async def test_check_interval_caches_version():
+    """检查间隔内不读取版本,标签递增后沿用已编译的图"""
+    factory = StubFactory()
+    registry = GraphRegistry(checkpointer=InMemorySaver(), check_interval=60)
+    registry.register("test", factory)
+    graph = await registry.get("test")
+    await invalidate_tags("agent")
+    assert await registry.get("test") is graph
+
+    registry._version_checked_at = float("-inf")
+    assert await registry.get("test") == ("graph", 2)
+
+
+async def test_redis_error_keeps_previous_version(monkeypatch):
+    """读取版本失败时沿用上次的版本,不重新编译"""
+    factory = StubFactory()
+    registry = _registry(factory)
+    await invalidate_tags("agent")
+    graph = await registry.get("test")
+    version = registry._version
+    assert version == (1, 0, 0)
+
+    async def failing_tag_versions(*tags):
+        raise RedisConnectionError("redis down")
+
+    monkeypatch.setattr(graph_registry_module, "tag_versions", failing_tag_versions)
+    assert await registry.get("test") is graph
+    assert registry._version == version
+    assert factory.calls == 1
+
+
+async def test_register_and_unknown_graph():
+    """重复注册后重新编译,未注册的图抛出 KeyError"""
+    factory = StubFactory()
+    registry = _registry(factory)
+    await registry.get("test")
+    other = StubFactory()
+    registry.register("test", other)
+    assert await registry.get("test") == ("graph", 1)
+    assert other.calls == 1
+
+    with pytest.raises(KeyError):
+        await registry.get("missing")
@@ -0,0 +1,52 @@
+"""
+工作流任务队列测试
+"""
+
+
+async def test_reclaim_resumes_from_cursor(queue):
+    """每次接管从上次的游标继续扫描,不会反复停在待确认列表开头"""
+    task_ids = [await queue.enqueue(f"input {i}", 1) for i in range(3)]
+    await queue.read("crashed", count=3, block_ms=0)
+
+    claimed = []
+    for _ in range(3):
+        jobs = await queue.reclaim("rescuer", min_idle_ms=0, count=1)
+        claimed += [job.task_id for job, _ in jobs]
+    assert claimed == task_ids
+    # 遍历完一轮后游标回到开头
+    assert queue._reclaim_cursor == "0-0"
+
+
+async def test_touch_skips_jobs_claimed_by_others(queue):
+    """已被其他 worker 接管的任务不会被原消费者的 touch 抢回"""
+    await queue.enqueue("stalled", 1)
+    await queue.enqueue("healthy", 1)
+    (stalled, healthy) = await queue.read("slow", count=2, block_ms=0)
+    await queue.client.xclaim(queue.stream, queue.group, "rescuer", 0, [stalled.message_id], justid=True)
+
+    owned = await queue.touch("slow", [stalled.message_id, healthy.message_id])
+
+    assert owned == {healthy.message_id}
+    pending = await queue.client.xpending_range(queue.stream, queue.group, min="-", max="+", count=10)
+    assert {item["message_id"]: item["consumer"] for item in pending} == {
+        stalled.message_id: "rescuer",
+        healthy.message_id: "slow",
+    }
+
+
+async def test_touch_without_jobs(queue):
+    assert await queue.touch("idle", []) == set()
+
+
+async def test_dead_letter_releases_dedup_lock(queue):
+    """转入死信流的任务释放去重锁,相同输入可以重新提交"""
+    task_id, reused = await queue.submit("find agents", 1)
+    assert not reused
+    assert await queue.submit("find agents", 1) == (task_id, True)
+
+    (job,) = await queue.read("w1", count=1, block_ms=0)
+    await queue.dead_letter(job, "too many deliveries")
+
+    new_task_id, reused = await queue.submit("find agents", 1)
+    assert not reused and new_task_id != task_id
+    assert await queue.client.xlen(queue.dead_letter_stream) == 1
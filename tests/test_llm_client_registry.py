@@ -0,0 +1,115 @@
+"""
+LLM 客户端注册表测试
+"""
+
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+import app.providers.database as database
+from app.models.LLM import LLM
+from app.services.llms_manage import client_registry as client_registry_module
+from app.services.llms_manage.client_registry import LLMClientRegistry, client_key
+from app.services.redis_cache import invalidate_tags
+
+pytestmark = pytest.mark.usefixtures("bound_redis")
+
+UPDATED_AT = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def _llm(llm_id: int, model_name: str = "test-model", api_url: str = "http://endpoint-1/v1", **kwargs) -> LLM:
+    values = {
+        "provider": "test-provider", "model_type": "1", "api_key": "sk-test",
+        "status": 1, "updated_at": UPDATED_AT, **kwargs,
+    }
+    return LLM(id=llm_id, model_name=model_name, api_url=api_url, **values)
+
+
+class StubLLMService:
+    """从内存中的行返回激活模型,替代读取数据库"""
+
+    rows: list[LLM] = []
+    loads = 0
+    error: Exception | None = None
+
+    def __init__(self, session):
+        pass
+
+    async def get_active_llms(self) -> list[LLM]:
+        StubLLMService.loads += 1
+        if StubLLMService.error is not None:
+            raise StubLLMService.error
+        return list(StubLLMService.rows)
+
+
+@pytest.fixture
+async def registry(monkeypatch):
+    @asynccontextmanager
+    async def session():
+        yield None
+
+    monkeypatch.setattr(database, "get_engine", lambda: (None, session))
+    monkeypatch.setattr(client_registry_module, "LLMService", StubLLMService)
+    StubLLMService.rows, StubLLMService.loads, StubLLMService.error = [], 0, None
+    registry = LLMClientRegistry(check_interval=0, reload_interval=3600)
+    yield registry
+    await registry.aclose()
+
+
+async def test_client_reused_per_endpoint(registry):
+    """同一 (provider, api_url, model_name) 复用客户端,同一地址的客户端共用连接池"""
+    client = registry.client(_llm(1))
+    assert registry.client(_llm(1)) is client
+    # 不同行但 provider/api_url/model_name 相同时同样复用
+    assert registry.client(_llm(2)) is client
+    assert registry.builds == 1
+
+    other_model = registry.client(_llm(3, model_name="test-model-mini"))
+    other_url = registry.client(_llm(4, api_url="http://endpoint-2/v1"))
+    assert other_model is not client and other_url is not client
+    assert registry.builds == 3
+    assert set(registry._pools) == {"http://endpoint-1/v1", "http://endpoint-2/v1"}
+    assert other_model.http_async_client is client.http_async_client
+
+
+async def test_client_rebuilt_on_updated_at(registry):
+    """行的 updated_at 变化(如更换了 api_key)时重建客户端"""
+    client = registry.client(_llm(1))
+    rebuilt = registry.client(_llm(1, api_key="sk-new", updated_at=UPDATED_AT + timedelta(minutes=1)))
+    assert rebuilt is not client
+    assert rebuilt.openai_api_key.get_secret_value() == "sk-new"
+    assert registry.builds == 2
+    assert registry.client(_llm(1, updated_at=UPDATED_AT + timedelta(minutes=1))) is rebuilt
+
+
+async def test_deactivated_rows_dropped(registry):
+    """llm 标签版本变化后重新加载,停用的行不再保留客户端"""
+    kept, deactivated = _llm(1), _llm(2, model_name="test-model-mini")
+    StubLLMService.rows = [kept, deactivated]
+    assert await registry.active_llms() == [kept, deactivated]
+    for llm in await registry.active_llms():
+        registry.client(llm)
+    assert StubLLMService.loads == 1
+    assert set(registry._clients) == {client_key(kept), client_key(deactivated)}
+
+    StubLLMService.rows = [kept]
+    await invalidate_tags("llm")
+    assert await registry.active_llms() == [kept]
+    assert StubLLMService.loads == 2
+    assert set(registry._clients) == {client_key(kept)}
+    assert registry.builds == 2
+
+
+async def test_reload_failure_keeps_loaded_rows(registry):
+    """已加载过时重新加载失败沿用上次的结果,首次加载失败时抛出"""
+    StubLLMService.error = RuntimeError("db down")
+    with pytest.raises(RuntimeError):
+        await registry.active_llms()
+
+    StubLLMService.error = None
+    StubLLMService.rows = [_llm(1)]
+    await registry.active_llms()
+    StubLLMService.error = RuntimeError("db down")
+    await invalidate_tags("llm")
+    assert [llm.id for llm in await registry.active_llms()] == [1]
@@ -0,0 +1,196 @@
+"""
+LLM 路由测试
+"""
+
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.models.LLM import LLM
+from app.services.llms_manage import router as router_module
+from app.services.llms_manage.router import LLMRouter
+
+
+class StubRegistry:
+    """内存中的模型客户端注册表,客户端用字符串代替"""
+
+    def __init__(self, *llms: LLM):
+        self.llms = list(llms)
+
+    async def active_llms(self) -> list[LLM]:
+        return list(self.llms)
+
+    def client(self, llm: LLM) -> str:
+        return f"client-{llm.id}"
+
+
+class Clock:
+    """替换 router 模块的 time,手动推进时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+def _llm(llm_id: int, model_name: str = "m") -> LLM:
+    return LLM(
+        id=llm_id, provider="p", model_name=model_name, model_type="1",
+        api_key="sk-test", api_url=f"http://endpoint-{llm_id}", status=1,
+    )
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(router_module, "time", clock)
+    return clock
+
+
+async def _call(router: LLMRouter, exc: BaseException | None = None, duration: float = 0.0, clock: Clock | None = None) -> str:
+    async with router.route("m") as client:
+        if clock is not None:
+            clock.now += duration
+        if exc is not None:
+            raise exc
+        return client
+
+
+async def _fail(router: LLMRouter) -> None:
+    with pytest.raises(RuntimeError):
+        await _call(router, RuntimeError("endpoint down"))
+
+
+def _bad_request() -> openai.BadRequestError:
+    request = httpx.Request("POST", "http://endpoint-1/chat/completions")
+    return openai.BadRequestError("bad request", response=httpx.Response(400, request=request), body=None)
+
+
+async def test_p2c_picks_lower_score(clock):
+    """P2C 在两个地址中选择 耗时 × (进行中 + 1) / (1 - 错误率) 较低的一个"""
+    router = LLMRouter(registry=StubRegistry(_llm(1), _llm(2), _llm(3, model_name="other")))
+    endpoints = await router.endpoints("m")
+    assert {llm.id for llm in endpoints} == {1, 2}
+
+    def picks() -> set[int]:
+        return {router._pick(endpoints).id for _ in range(20)}
+
+    # 都没有耗时数据时得分相同,两者都会被选中
+    assert picks() == {1, 2}
+
+    router._health[1].latency, router._health[2].latency = 0.1, 1.0
+    assert picks() == {1}
+
+    # 进行中的调用数拉高快地址的得分
+    router._health[1].inflight = 20
+    assert picks() == {2}
+
+    # 尚无耗时数据的地址按已知耗时的最小值计算
+    router._health[1].inflight = 0
+    router._health[1].error_rate = 0.5
+    router._health[2].latency = None
+    assert picks() == {2}
+
+
+async def test_ejected_endpoint_is_skipped(clock):
+    """摘除期间的地址不参与选择,全部被摘除时选择最早到期的地址"""
+    router = LLMRouter(registry=StubRegistry(_llm(1), _llm(2)))
+    await router.endpoints("m")
+    router._pick(router.registry.llms)
+    router._health[1].ejected_until = clock.now + 30
+    assert {await _call(router) for _ in range(20)} == {"client-2"}
+
+    router._health[2].ejected_until = clock.now + 10
+    assert await _call(router) == "client-2"
+
+
+async def test_ejection_backoff_and_probation(clock):
+    """连续失败后摘除,重新接入后处于观察期,观察期内失败摘除时长倍增,成功后恢复"""
+    router = LLMRouter(registry=StubRegistry(_llm(1)))
+    for _ in range(2):
+        await _fail(router)
+    health = router._health[1]
+    assert health.ejected_until == 0.0 and health.consecutive_errors == 2
+
+    await _fail(router)
+    assert health.ejections == 1
+    assert health.ejected_until == clock.now + 30
+
+    # 摘除期间的失败不重复摘除
+    await _fail(router)
+    assert health.ejections == 1
+
+    clock.now += 30
+    assert await _call(router) == "client-1"
+    assert health.probation is False and health.ejections == 0
+
+    for _ in range(3):
+        await _fail(router)
+    clock.now += 30
+    await _fail(router)
+    assert health.ejections == 2
+    assert health.ejected_until == clock.now + 60
+
+    clock.now += 60
+    await _fail(router)
+    assert health.ejected_until == clock.now + 120
+
+    # 摘除时长不超过 LLM_EJECT_MAX_SECONDS
+    health.ejections = 10
+    health.ejected_until = 0.0
+    health.probation = True
+    await _fail(router)
+    assert health.ejected_until == clock.now + 300
+
+
+async def test_probation_success_readmits(clock):
+    """观察期内成功后恢复正常,下次摘除重新从 LLM_EJECT_BASE_SECONDS 开始"""
+    router = LLMRouter(registry=StubRegistry(_llm(1)))
+    for _ in range(3):
+        await _fail(router)
+    health = router._health[1]
+    clock.now += 30
+
+    async with router.route("m"):
+        assert health.probation is True and health.ejected_until == 0.0
+    assert health.probation is False and health.ejections == 0
+
+    for _ in range(3):
+        await _fail(router)
+    assert health.ejected_until == clock.now + 30
+
+
+async def test_cancel_and_client_error_not_recorded(clock):
+    """取消与参数错误不计入地址统计,其他异常计入"""
+    router = LLMRouter(registry=StubRegistry(_llm(1)))
+    with pytest.raises(asyncio.CancelledError):
+        await _call(router, asyncio.CancelledError())
+    with pytest.raises(openai.BadRequestError):
+        await _call(router, _bad_request())
+    health = router._health[1]
+    assert health.requests == 0 and health.inflight == 0
+    assert health.latency is None and health.error_rate == 0.0
+
+    await _fail(router)
+    assert health.requests == 1 and health.consecutive_errors == 1 and health.inflight == 0
+
+    await _call(router, duration=0.5, clock=clock)
+    assert health.requests == 2 and health.consecutive_errors == 0
+    assert health.latency == 0.5
+
+
+async def test_deactivated_endpoint_dropped(clock):
+    """停用的地址在没有进行中的调用后不再保留统计"""
+    registry = StubRegistry(_llm(1), _llm(2))
+    router = LLMRouter(registry=registry)
+    await _call(router)
+    router._pick(registry.llms)
+    registry.llms = [_llm(2)]
+    assert [llm.id for llm in await router.endpoints("m")] == [2]
+    assert set(router._health) == {2}
@@ -0,0 +1,39 @@
+"""
+后台批量日志写入器测试
+"""
+
+import threading
+
+from app.support.log_writer import OVERFLOW_DROP, BackgroundLogWriter
+
+
+def test_dropped_counted_across_threads():
+    """多个线程同时写满队列时,写入与丢弃的条数之和等于调用次数"""
+    release = threading.Event()
+    lines: list[str] = []
+
+    def write(text: str) -> None:
+        release.wait()
+        lines.extend(text.splitlines())
+
+    writer = BackgroundLogWriter(
+        "test-dropped", write=write, queue_size=4, batch_size=1, overflow_policy=OVERFLOW_DROP
+    )
+    threads_count, per_thread = 8, 2000
+
+    def emit() -> None:
+        for _ in range(per_thread):
+            writer("line\n")
+
+    threads = [threading.Thread(target=emit) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release.set()
+    writer.close()
+
+    assert writer.dropped > 0
+    assert writer.dropped + writer.written == threads_count * per_thread
+    assert len(lines) == writer.written
+    assert writer.stats()["dropped"] == writer.dropped
@@ -0,0 +1,40 @@
+"""
+日志配置测试
+"""
+
+import pytest
+
+from app.providers import logging_provider
+
+fcntl = pytest.importorskip("fcntl")
+
+
+class _Settings:
+    WORKERS = 2
+    LOG_PER_WORKER_FILE = True
+
+
+@pytest.fixture(autouse=True)
+def reset_slot(monkeypatch):
+    monkeypatch.setattr(logging_provider, "_WORKER_SLOT", None)
+
+
+def test_worker_log_path_uses_stable_slot(tmp_path):
+    path = str(tmp_path / "fastapi-{time:YYYY-MM-DD}.log")
+    assert logging_provider._worker_log_path(path, _Settings) == str(tmp_path / "fastapi-{time:YYYY-MM-DD}.0.log")
+    # 同一进程的所有日志文件使用同一编号
+    assert logging_provider._worker_log_path(str(tmp_path / "error.log"), _Settings) == str(tmp_path / "error.0.log")
+
+
+def test_worker_slot_skips_slots_held_by_other_workers(tmp_path):
+    with open(tmp_path / ".worker.0.lock", "a") as held:
+        fcntl.flock(held, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert logging_provider._worker_slot(str(tmp_path), 2) == 1
+
+
+def test_single_worker_keeps_path(tmp_path):
+    class Single(_Settings):
+        WORKERS = 1
+
+    path = str(tmp_path / "fastapi.log")
+    assert logging_provider._worker_log_path(path, Single) == path
@@ -0,0 +1,49 @@
+"""
+内存诊断测试
+"""
+
+import tracemalloc
+
+import pytest
+
+from app.support.memory_debug import MemoryDebugger
+
+
+@pytest.fixture
+def debugger():
+    debugger = MemoryDebugger(max_snapshots=2)
+    was_tracing = tracemalloc.is_tracing()
+    debugger.start()
+    yield debugger
+    if was_tracing:
+        debugger._snapshots.clear()
+    else:
+        debugger.stop()
+
+
+def test_status_reuses_snapshot_totals(debugger, monkeypatch):
+    """快照大小与块数在保存时统计,status 不再对每个快照重新统计"""
+    described = debugger.take_snapshot("base")
+    assert described["size"] > 0 and described["count"] > 0
+
+    def fail(*args, **kwargs):
+        raise AssertionError("status 不应重新统计快照")
+
+    monkeypatch.setattr(tracemalloc.Snapshot, "statistics", fail)
+    status = debugger.status()
+    assert status["snapshots"] == [described]
+
+
+def test_snapshots_evicted_and_diffed(debugger):
+    """超过 max_snapshots 时淘汰最早的快照,diff 按名称比较"""
+    debugger.take_snapshot("first")
+    debugger.take_snapshot("second")
+    data = [bytearray(1024) for _ in range(100)]
+    debugger.take_snapshot("third")
+    assert [item["name"] for item in debugger.status()["snapshots"]] == ["second", "third"]
+
+    result = debugger.diff("second", "third", top=5)
+    assert result["size_diff"] > 0
+    with pytest.raises(KeyError):
+        debugger.diff("first")
+    assert len(data) == 100
@@ -0,0 +1,44 @@
+"""
+Redis 限流器测试
+"""
+
+import pytest
+
+from app.services.rate_limiter import (RateLimitExceeded, SlidingWindowLimiter,
+                                       TokenBucketLimiter, _BaseLimiter)
+
+
+pytestmark = pytest.mark.usefixtures("bound_redis")
+
+
+def test_base_limiter_is_abstract():
+    with pytest.raises(TypeError):
+        _BaseLimiter("base")
+
+    class Incomplete(_BaseLimiter):
+        def _rule(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete")
+
+
+async def test_token_bucket():
+    limiter = TokenBucketLimiter("test-bucket", rules={"model:a": {"rate": 0.01, "capacity": 2}})
+    assert (await limiter.try_acquire("model:a"))[0]
+    assert (await limiter.try_acquire("model:a"))[0]
+    granted, wait = await limiter.try_acquire("model:a")
+    assert not granted and wait > 0
+    with pytest.raises(RateLimitExceeded):
+        await limiter.acquire("model:a", timeout=0)
+    # 没有规则的键不限流
+    assert await limiter.try_acquire("model:b") == (True, 0.0)
+
+
+async def test_sliding_window():
+    limiter = SlidingWindowLimiter("test-window", rules={"hr:1": {"limit": 2, "window": 60}})
+    async with limiter.limit("hr:1"):
+        pass
+    assert (await limiter.try_acquire("hr:1"))[0]
+    granted, wait = await limiter.try_acquire("hr:1")
+    assert not granted and wait > 0
@@ -0,0 +1,98 @@
+"""
+Redis 批量操作测试
+"""
+
+import fakeredis
+import pytest
+
+from app.services import redis as redis_module
+from app.services.redis import AsyncRedisService, RedisService
+from app.utils.data.redis_util import RedisUtil
+from config.config import get_settings
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    """分块大小设为 2,少量键即可覆盖跨块的情况"""
+    monkeypatch.setattr(redis_module, "BATCH_SIZE", 2)
+
+
+@pytest.fixture
+def sync_redis(monkeypatch):
+    client = fakeredis.FakeStrictRedis(decode_responses=True)
+    monkeypatch.setattr(RedisService, "_client", client)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def redis_util():
+    util = RedisUtil()
+    util._RedisUtil__redis = fakeredis.FakeRedis()
+    yield util
+    util._RedisUtil__redis.close()
+
+
+async def test_async_get_and_set_values(bound_redis):
+    """批量写入支持逐键过期时间,批量读取按输入顺序返回"""
+    await AsyncRedisService.set_values(
+        {"k:1": "a", "k:2": "b", "k:3": "c", "k:4": "d", "k:5": "e"},
+        expire_seconds={"k:1": 10, "k:2": 20},
+    )
+    assert await bound_redis.ttl("k:1") == 10
+    assert await bound_redis.ttl("k:2") == 20
+    assert await bound_redis.ttl("k:5") == get_settings().REDIS_EXPIRE
+
+    keys = ["k:5", "missing", "k:1", "k:3", "k:2"]
+    assert await AsyncRedisService.get_values(keys) == ["e", None, "a", "c", "b"]
+    assert await AsyncRedisService.get_values([]) == []
+
+    await AsyncRedisService.set_values({"k:6": "f"}, expire_seconds=30)
+    assert await bound_redis.ttl("k:6") == 30
+
+
+async def test_async_hash_get_all_many(bound_redis):
+    for index in range(3):
+        await bound_redis.hset(f"h:{index}", mapping={"index": str(index)})
+    names = ["h:2", "h:missing", "h:0", "h:1"]
+    assert await AsyncRedisService.hash_get_all_many(names) == [
+        {"index": "2"}, {}, {"index": "0"}, {"index": "1"},
+    ]
+
+
+async def test_async_delete_pattern(bound_redis):
+    """按模式分块删除,不匹配的键保留"""
+    for index in range(5):
+        await bound_redis.set(f"agent:cache:{index}", index)
+    await bound_redis.set("agent:other", 1)
+    assert await AsyncRedisService.delete_pattern("agent:cache:*", batch_size=2) == 5
+    assert await bound_redis.keys("*") == ["agent:other"]
+    assert await AsyncRedisService.delete_pattern("agent:cache:*") == 0
+
+
+def test_sync_batch_operations(sync_redis):
+    RedisService.set_values({"k:1": "a", "k:2": "b", "k:3": "c"}, expire_seconds={"k:2": 20})
+    assert sync_redis.ttl("k:2") == 20
+    assert RedisService.get_values(["k:3", "missing", "k:1", "k:2"]) == ["c", None, "a", "b"]
+
+    sync_redis.hset("h:1", mapping={"a": "1"})
+    assert RedisService.hash_get_all_many(["h:missing", "h:1", "h:1"]) == [{}, {"a": "1"}, {"a": "1"}]
+
+    assert RedisService.delete_pattern("k:*", batch_size=2) == 3
+    assert RedisService.get_values(["k:1", "k:2", "k:3"]) == [None, None, None]
+
+
+def test_redis_util_batch_operations(redis_util):
+    """RedisUtil 批量读写经编解码器,未列出过期时间的键不过期"""
+    values = {"u:1": {"a": 1}, "u:2": [1, 2], "u:3": "text"}
+    assert redis_util.mset(values, ex={"u:1": 10}, batch_size=2)
+    client = redis_util._RedisUtil__redis
+    assert client.ttl("u:1") == 10
+    assert client.ttl("u:2") == -1
+    assert redis_util.mget(["u:3", "missing", "u:1", "u:2"], batch_size=2) == ["text", None, {"a": 1}, [1, 2]]
+
+    client.hset("h:1", mapping={"a": "1"})
+    assert redis_util.hgetall_many(["h:1", "h:missing"], batch_size=1) == [{b"a": b"1"}, {}]
+
+    assert redis_util.delete_pattern("u:*", batch_size=2) == 3
+    assert redis_util.mget(["u:1"]) == [None]
@@ -0,0 +1,54 @@
+"""
+Redis 缓存测试
+"""
+
+import pytest
+
+from app.services.redis_cache import (invalidate_tags, redis_cached,
+                                      tag_versions)
+
+
+pytestmark = pytest.mark.usefixtures("bound_redis")
+
+
+def _counter():
+    calls = []
+
+    @redis_cached(ttl=60, namespace="test.agent", tags=["agent"], beta=0)
+    async def get_agent(name: str) -> dict:
+        calls.append(name)
+        return {"name": name, "version": len(calls)}
+
+    return get_agent, calls
+
+
+async def test_invalidate_tags_deletes_cached_values(bound_redis):
+    get_agent, calls = _counter()
+    assert await get_agent("supervisor") == {"name": "supervisor", "version": 1}
+    assert await get_agent("supervisor") == {"name": "supervisor", "version": 1}
+
+    assert await invalidate_tags("agent", "llm") == 1
+    assert await tag_versions("agent", "llm") == (1, 1)
+    assert not await bound_redis.exists("cache:tag:agent")
+    assert await get_agent("supervisor") == {"name": "supervisor", "version": 2}
+    assert calls == ["supervisor", "supervisor"]
+
+
+async def test_write_started_before_invalidation_is_rejected(bound_redis, monkeypatch):
+    """回源期间标签失效,计算结果不写入,也不会在标签集合中留下孤立的键"""
+    get_agent, _ = _counter()
+
+    async def slow_func(name):
+        await invalidate_tags("agent")
+        return {"name": name, "version": 0}
+
+    monkeypatch.setattr(get_agent, "func", slow_func)
+    await get_agent("supervisor")
+
+    assert not await bound_redis.exists(get_agent.cache_key("supervisor"))
+    assert not await bound_redis.exists("cache:tag:agent")
+
+
+async def test_invalidate_without_cached_values():
+    assert await invalidate_tags("nothing") == 0
+    assert await tag_versions("nothing") == (1,)
@@ -0,0 +1,60 @@
+"""
+Redis 租约锁测试
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.redis_lock import LeaseLock, LockLostError
+
+
+async def _steal(redis_client, lock: LeaseLock) -> None:
+    """模拟租约过期后锁被其他持有者获得"""
+    await redis_client.set(lock.key, f"{lock.token + 1}:other")
+
+
+async def test_fence_tokens_increase(redis_client):
+    first = LeaseLock("job", client=redis_client)
+    assert await first.acquire() == 1
+    assert await LeaseLock("job", client=redis_client).acquire() is None
+    await first.release()
+    assert await LeaseLock("job", client=redis_client).acquire() == 2
+
+
+async def test_watch_cancels_holder_when_lost(redis_client):
+    lock = LeaseLock("job", ttl_ms=150, client=redis_client)
+    await lock.acquire()
+    with pytest.raises(LockLostError):
+        async with lock.watch(cancel_on_lost=True):
+            await _steal(redis_client, lock)
+            await asyncio.sleep(5)
+    assert lock.lost
+    # 不会删除新持有者的锁
+    assert await redis_client.get(lock.key) == "2:other"
+
+
+async def test_watch_keeps_running_without_cancel_on_lost(redis_client):
+    lock = LeaseLock("job", ttl_ms=150, client=redis_client)
+    await lock.acquire()
+    async with lock.watch():
+        await _steal(redis_client, lock)
+        await asyncio.sleep(0.2)
+        assert lock.lost
+
+
+async def test_external_cancel_is_not_reported_as_lost(redis_client):
+    lock = LeaseLock("job", ttl_ms=150, client=redis_client)
+    await lock.acquire()
+
+    async def hold():
+        async with lock.watch(cancel_on_lost=True):
+            await asyncio.sleep(5)
+
+    task = asyncio.create_task(hold())
+    await asyncio.sleep(0.1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert not lock.lost
+    assert await redis_client.get(lock.key) is None
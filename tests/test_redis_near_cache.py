@@ -0,0 +1,168 @@
+"""
+Redis 本地近缓存测试
+"""
+
+import pytest
+
+from app.services import redis_near_cache as near_cache_module
+from app.services.redis_near_cache import RedisNearCache
+from app.support.codec import get_codec
+
+
+class Clock:
+    """替换 redis_near_cache 模块的 time,手动推进时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class HookedClient:
+    """执行命令前先运行 hook,模拟读取进行中收到失效通知或被清空"""
+
+    def __init__(self, client, hook):
+        self.client = client
+        self.hook = hook
+
+    async def execute_command(self, *args, **options):
+        await self.hook()
+        return await self.client.execute_command(*args, **options)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(near_cache_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(redis_client, clock):
+    """追踪连接视为已建立的近缓存,不启动追踪任务"""
+    cache = RedisNearCache(prefixes=["ff:"], ttl=60, max_entries=2)
+    cache._client = redis_client
+    cache._tracking = True
+    return cache
+
+
+async def test_disabled_by_default(redis_client):
+    """默认不配置前缀,不建立追踪连接,读取透传到 Redis"""
+    cache = RedisNearCache()
+    await cache.start(redis_client)
+    try:
+        assert not cache.enabled
+        assert cache._tracker is None
+        await redis_client.set("feature_flag:hr:1", "on")
+        assert await cache.get("feature_flag:hr:1") == "on"
+        assert await cache.get_many(["feature_flag:hr:1", "missing"]) == ["on", None]
+        assert cache.stats()["entries"] == 0
+    finally:
+        await cache.stop()
+
+
+async def test_get_before_start():
+    with pytest.raises(RuntimeError):
+        await RedisNearCache(prefixes=[]).get("feature_flag:hr:1")
+
+
+async def test_caches_prefixed_keys(cache, redis_client):
+    """匹配前缀的键(包括不存在的键)缓存在本地,其余键透传"""
+    await redis_client.set("ff:a", "1")
+    await redis_client.set("other", "1")
+    assert await cache.get_many(["ff:a", "ff:missing", "other"]) == ["1", None, "1"]
+
+    await redis_client.set("ff:a", "2")
+    await redis_client.set("ff:missing", "2")
+    await redis_client.set("other", "2")
+    assert await cache.get_many(["ff:a", "ff:missing", "other"]) == ["1", None, "2"]
+    assert (cache.hits, cache.misses, cache.bypassed) == (2, 2, 2)
+
+    # 追踪连接断开期间全部透传且不写入
+    cache._set_tracking(False)
+    assert await cache.get("ff:a") == "2"
+    assert cache.stats()["entries"] == 0
+
+
+async def test_on_invalidate(cache, redis_client):
+    """invalidate 推送删除对应条目,键列表为 null 时清空全部条目"""
+    await redis_client.set("ff:a", "1")
+    await redis_client.set("ff:b", "1")
+    await cache.get_many(["ff:a", "ff:b"])
+    await redis_client.set("ff:a", "2")
+    await redis_client.set("ff:b", "2")
+
+    assert await cache._on_invalidate([b"invalidate", [b"ff:a"]]) is True
+    assert await cache.get_many(["ff:a", "ff:b"]) == ["2", "1"]
+
+    generation = cache._generation
+    await cache._on_invalidate([b"invalidate", None])
+    assert cache._generation == generation + 1
+    assert cache.stats()["entries"] == 0
+    assert await cache.get("ff:b") == "2"
+    assert cache.invalidations == 2
+
+
+async def test_invalidate_during_fetch_not_stored(cache, redis_client):
+    """读取进行中收到失效通知的键不写入缓存,读取结束后不再视为 dirty"""
+    await redis_client.set("ff:a", "1")
+
+    async def invalidate():
+        await cache._on_invalidate([b"invalidate", [b"ff:a"]])
+
+    cache._client = HookedClient(redis_client, invalidate)
+    assert await cache.get("ff:a") == "1"
+    assert "ff:a" not in cache._entries
+    assert not cache._dirty and not cache._inflight
+
+    cache._client = redis_client
+    await cache.get("ff:a")
+    assert "ff:a" in cache._entries
+
+
+async def test_clear_during_fetch_not_stored(cache, redis_client):
+    """读取进行中清空全部条目(generation 递增)时,读取结果不写入缓存"""
+    await redis_client.set("ff:a", "1")
+    await redis_client.set("ff:b", "1")
+
+    async def clear():
+        cache.clear()
+
+    cache._client = HookedClient(redis_client, clear)
+    assert await cache.get_many(["ff:a", "ff:b"]) == ["1", "1"]
+    assert cache.stats()["entries"] == 0
+    assert not cache._inflight
+
+
+async def test_ttl_expiry(cache, redis_client, clock):
+    """条目超过兜底过期时间后重新读取"""
+    await redis_client.set("ff:a", "1")
+    await cache.get("ff:a")
+    await redis_client.set("ff:a", "2")
+
+    clock.now += 59
+    assert await cache.get("ff:a") == "1"
+    clock.now += 1
+    assert await cache.get("ff:a") == "2"
+    assert cache.misses == 2
+
+
+async def test_lru_eviction(cache, redis_client):
+    """超过 max_entries 时淘汰最久未读取的条目"""
+    for key in ("ff:a", "ff:b", "ff:c"):
+        await redis_client.set(key, "1")
+    await cache.get("ff:a")
+    await cache.get("ff:b")
+    # 读取 ff:a 后 ff:b 成为最久未读取的条目
+    await cache.get("ff:a")
+    await cache.get("ff:c")
+    assert list(cache._entries) == ["ff:a", "ff:c"]
+
+
+async def test_get_object_decodes_once(cache, redis_client):
+    """命中时返回同一个已解码的对象"""
+    await redis_client.set("ff:obj", get_codec().encode({"enabled": True}))
+    first = await cache.get_object("ff:obj")
+    assert first == {"enabled": True}
+    assert await cache.get_object("ff:obj") is first
@@ -0,0 +1,93 @@
+"""
+Redis 订阅服务测试
+"""
+
+import asyncio
+
+import fakeredis
+import pytest
+from redis.asyncio.client import PubSub
+
+from app.services import redis_pubsub
+from app.services.redis_pubsub import RedisSubscriber
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    monkeypatch.setattr(redis_pubsub, "READ_TIMEOUT", 0.05)
+    client = fakeredis.FakeAsyncRedis()
+    yield client
+    await client.aclose()
+
+
+async def _wait_for(predicate, timeout: float = 5.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+
+async def _publish_until(client, channel: str, data: bytes, predicate) -> None:
+    """订阅建立前发布的消息会丢失,重复发布直到处理函数收到"""
+    async with asyncio.timeout(5.0):
+        while not predicate():
+            await client.publish(channel, data)
+            await asyncio.sleep(0.05)
+
+
+async def test_reader_survives_unexpected_errors(client, monkeypatch):
+    """分发时出现非连接类异常,读取协程记录后重连,之后的消息仍能收到"""
+    received = []
+    subscriber = RedisSubscriber(max_backoff=0.1)
+    subscriber.subscribe("events", lambda channel, data: received.append(data), decoder=None)
+
+    dispatch = subscriber._dispatch
+    failures = []
+
+    async def flaky_dispatch(message):
+        if not failures:
+            failures.append(message)
+            raise ValueError("bad message")
+        await dispatch(message)
+
+    monkeypatch.setattr(subscriber, "_dispatch", flaky_dispatch)
+    await subscriber.start(client)
+    try:
+        await _publish_until(client, "events", b"hello", lambda: received)
+        assert failures
+        assert subscriber.reconnects >= 1
+        assert subscriber.running
+    finally:
+        await subscriber.stop()
+
+
+async def test_idle_connection_is_pinged(client):
+    """空闲连接定期 PING,收到 PONG 时不重连"""
+    subscriber = RedisSubscriber(ping_interval=0.1)
+    subscriber.subscribe("events", lambda channel, data: None)
+    await subscriber.start(client)
+    try:
+        await _wait_for(lambda: subscriber._pubsub is not None)
+        await asyncio.sleep(0.5)
+        assert subscriber.reconnects == 0
+        assert subscriber.running
+    finally:
+        await subscriber.stop()
+
+
+async def test_unanswered_ping_reconnects(client, monkeypatch):
+    """PING 后仍收不到任何数据时视为半开连接并重连"""
+    received = []
+    subscriber = RedisSubscriber(max_backoff=0.1, ping_interval=0.1)
+    subscriber.subscribe("events", lambda channel, data: received.append(data), decoder=None)
+
+    async def lost_ping(self, message=None):
+        return None
+
+    monkeypatch.setattr(PubSub, "ping", lost_ping)
+    await subscriber.start(client)
+    try:
+        await _wait_for(lambda: subscriber.reconnects >= 1)
+        assert subscriber.running
+        await _publish_until(client, "events", b"after", lambda: received)
+    finally:
+        await subscriber.stop()
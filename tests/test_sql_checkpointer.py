@@ -0,0 +1,202 @@
+"""
+SQLCheckpointSaver 测试
+"""
+
+import operator
+from datetime import timedelta
+from typing import Annotated, TypedDict
+
+import pytest
+from langgraph.graph import END, START, StateGraph
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.services.now_find_agents import sql_checkpointer
+from app.services.now_find_agents.sql_checkpointer import (BLOBS, CHECKPOINTS,
+                                                           WRITES,
+                                                           SQLCheckpointSaver,
+                                                           _utcnow)
+
+
+class State(TypedDict, total=False):
+    a: str
+    log: Annotated[list[int], operator.add]
+
+
+def _first(state: State) -> State:
+    return {"log": [len(state.get("log", []))]}
+
+
+def _second(state: State) -> State:
+    return {"log": [len(state["log"])]}
+
+
+def _graph(checkpointer):
+    builder = StateGraph(State)
+    builder.add_node("first", _first)
+    builder.add_node("second", _second)
+    builder.add_edge(START, "first")
+    builder.add_edge("first", "second")
+    builder.add_edge("second", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def _config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'checkpoints.db'}")
+    yield engine
+    await engine.dispose()
+
+
+async def _saver(engine, **kwargs) -> SQLCheckpointSaver:
+    saver = SQLCheckpointSaver(engine, **{"keep_last": 0, "ttl": 0, **kwargs})
+    await saver.setup()
+    return saver
+
+
+async def _count(engine, table, thread_id: str) -> int:
+    async with engine.connect() as conn:
+        return (await conn.execute(
+            select(func.count()).select_from(table).where(table.c.thread_id == thread_id)
+        )).scalar_one()
+
+
+async def test_round_trip_restores_channel_values(engine):
+    saver = await _saver(engine)
+    graph = _graph(saver)
+
+    assert await graph.ainvoke({"a": "keep-me"}, _config("t1")) == {"a": "keep-me", "log": [0, 1]}
+    assert await graph.ainvoke({}, _config("t1")) == {"a": "keep-me", "log": [0, 1, 2, 3]}
+
+    checkpoint_tuple = await saver.aget_tuple(_config("t1"))
+    assert checkpoint_tuple.checkpoint["channel_values"]["a"] == "keep-me"
+    assert checkpoint_tuple.checkpoint["channel_values"]["log"] == [0, 1, 2, 3]
+    assert checkpoint_tuple.parent_config is not None
+    state = await graph.aget_state(_config("t1"))
+    assert state.values == {"a": "keep-me", "log": [0, 1, 2, 3]}
+    assert await saver.aget_tuple(_config("missing")) is None
+
+
+async def test_pending_writes_round_trip(engine):
+    saver = await _saver(engine)
+    await _graph(saver).ainvoke({"a": "x"}, _config("t1"))
+    config = (await saver.aget_tuple(_config("t1"))).config
+
+    await saver.aput_writes(config, [("a", "first"), ("log", [9])], "task-1")
+    # 普通写入重复时保留第一次
+    await saver.aput_writes(config, [("a", "second")], "task-1")
+
+    checkpoint_tuple = await saver.aget_tuple(config)
+    assert checkpoint_tuple.pending_writes == [("task-1", "a", "first"), ("task-1", "log", [9])]
+
+
+async def test_compressed_values_round_trip(engine):
+    saver = await _saver(engine, compress_min_bytes=64)
+    value = "招聘" * 2000
+    await _graph(saver).ainvoke({"a": value}, _config("t1"))
+
+    async with engine.connect() as conn:
+        types = (await conn.execute(
+            select(BLOBS.c.type).where(BLOBS.c.thread_id == "t1", BLOBS.c.channel == "a")
+        )).scalars().all()
+    assert any(type_.endswith(f"+{sql_checkpointer.COMPRESSION}") for type_ in types)
+    state = await saver.aget_tuple(_config("t1"))
+    assert state.checkpoint["channel_values"]["a"] == value
+
+
+@pytest.mark.parametrize("keep_last", [1, 2, 3])
+async def test_keep_last_retains_loadable_checkpoints(engine, keep_last):
+    saver = await _saver(engine, keep_last=keep_last)
+    graph = _graph(saver)
+    await graph.ainvoke({"a": "keep-me"}, _config("t1"))
+    for _ in range(3):
+        await graph.ainvoke({}, _config("t1"))
+    # 其他会话不受影响
+    await graph.ainvoke({"a": "other"}, _config("t2"))
+
+    assert await _count(engine, CHECKPOINTS, "t1") == keep_last
+    assert await _count(engine, CHECKPOINTS, "t2") == keep_last
+
+    survivors = [item async for item in saver.alist(_config("t1"))]
+    assert len(survivors) == keep_last
+    for item in survivors:
+        values = item.checkpoint["channel_values"]
+        # 保留的 checkpoint 引用的通道值都未被删除
+        for channel in item.checkpoint["channel_versions"]:
+            if channel in ("a", "log"):
+                assert channel in values
+        assert values["a"] == "keep-me"
+    assert survivors[0].checkpoint["channel_values"]["log"] == list(range(8))
+    state = await graph.aget_state(_config("t1"))
+    assert state.values == {"a": "keep-me", "log": list(range(8))}
+
+
+async def test_keep_last_drops_unreferenced_blobs_and_writes(engine):
+    unbounded = await _saver(engine)
+    await _graph(unbounded).ainvoke({"a": "x"}, _config("full"))
+    bounded = await _saver(engine, keep_last=1)
+    await _graph(bounded).ainvoke({"a": "x"}, _config("t1"))
+
+    assert await _count(engine, BLOBS, "t1") < await _count(engine, BLOBS, "full")
+    async with engine.connect() as conn:
+        write_ids = set((await conn.execute(
+            select(WRITES.c.checkpoint_id).where(WRITES.c.thread_id == "t1")
+        )).scalars().all())
+    kept = (await bounded.aget_tuple(_config("t1"))).config["configurable"]["checkpoint_id"]
+    # 任务写入只属于保留的 checkpoint
+    assert write_ids <= {kept}
+
+
+async def test_alist_filter_before_and_limit(engine):
+    saver = await _saver(engine)
+    graph = _graph(saver)
+    await graph.ainvoke({"a": "x"}, _config("t1"))
+    await graph.ainvoke({"a": "y"}, _config("t2"))
+
+    history = [item async for item in saver.alist(_config("t1"))]
+    assert len(history) == 4
+    ids = [item.config["configurable"]["checkpoint_id"] for item in history]
+    assert ids == sorted(ids, reverse=True)
+
+    inputs = [item async for item in saver.alist(_config("t1"), filter={"source": "input"})]
+    assert len(inputs) == 1 and inputs[0].metadata["source"] == "input"
+    assert len([item async for item in saver.alist(_config("t1"), filter={"source": "loop"}, limit=1)]) == 1
+    assert len([item async for item in saver.alist(_config("t1"), limit=2)]) == 2
+
+    older = [item async for item in saver.alist(_config("t1"), before=history[1].config)]
+    assert [item.config["configurable"]["checkpoint_id"] for item in older] == ids[2:]
+    assert len([item async for item in saver.alist(None)]) == 8
+
+
+async def test_prune_expired_removes_only_expired_threads(engine, monkeypatch):
+    monkeypatch.setattr(sql_checkpointer, "PRUNE_BATCH_SIZE", 2)
+    saver = await _saver(engine)
+    graph = _graph(saver)
+    for thread_id in ("old-1", "old-2", "old-3", "fresh"):
+        await graph.ainvoke({"a": thread_id}, _config(thread_id))
+    async with engine.begin() as conn:
+        await conn.execute(
+            update(CHECKPOINTS)
+            .where(CHECKPOINTS.c.thread_id.like("old-%"))
+            .values(created_at=_utcnow() - timedelta(hours=2))
+        )
+
+    assert await saver.prune_expired(ttl=3600) == 3
+    for thread_id in ("old-1", "old-2", "old-3"):
+        for table in (CHECKPOINTS, BLOBS, WRITES):
+            assert await _count(engine, table, thread_id) == 0
+    assert (await graph.aget_state(_config("fresh"))).values == {"a": "fresh", "log": [0, 1]}
+    assert await saver.prune_expired(ttl=3600) == 0
+    assert await saver.prune_expired(ttl=0) == 0
+
+
+async def test_delete_thread(engine):
+    saver = await _saver(engine)
+    await _graph(saver).ainvoke({"a": "x"}, _config("t1"))
+    await saver.adelete_thread("t1")
+    for table in (CHECKPOINTS, BLOBS, WRITES):
+        assert await _count(engine, table, "t1") == 0
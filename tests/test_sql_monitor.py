@@ -0,0 +1,89 @@
+"""
+SQL 执行监控测试
+"""
+
+import pytest
+
+from app.orm.tools.SQLMonitor import fingerprint
+
+# 每组语句应得到同一个指纹,不同组的指纹互不相同
+FINGERPRINT_GROUPS = [
+    pytest.param(
+        "SELECT * FROM llm WHERE id = ?",
+        [
+            "SELECT * FROM llm WHERE id = 1",
+            "SELECT * FROM llm WHERE id = 42",
+            "SELECT * FROM llm WHERE id = %s",
+            "SELECT * FROM llm WHERE id = %(id_1)s",
+            "SELECT * FROM llm WHERE id = $1",
+            "SELECT * FROM llm WHERE id = :id_1",
+            "SELECT * FROM llm WHERE id = ?",
+        ],
+        id="number-and-placeholders",
+    ),
+    pytest.param(
+        "SELECT * FROM agent WHERE name = ? AND score > ?",
+        [
+            "SELECT * FROM agent WHERE name = 'supervisor' AND score > 0.5",
+            "SELECT * FROM agent WHERE name = 'it''s' AND score > 10",
+            "SELECT * FROM agent WHERE name = '' AND score > %s",
+        ],
+        id="string-literals",
+    ),
+    pytest.param(
+        "SELECT * FROM tool WHERE id IN (...)",
+        [
+            "SELECT * FROM tool WHERE id IN (1)",
+            "SELECT * FROM tool WHERE id IN (1, 2, 3)",
+            "SELECT * FROM tool WHERE id IN (%s,%s)",
+            "SELECT * FROM tool WHERE id IN ( $1 , $2 , $3 )",
+            "SELECT * FROM tool WHERE id IN ('a', 'b')",
+        ],
+        id="in-list",
+    ),
+    pytest.param(
+        "INSERT INTO llm (provider, model_name) VALUES (?, ?), ...",
+        [
+            "INSERT INTO llm (provider, model_name) VALUES ('a', 'b'), ('c', 'd')",
+            "INSERT INTO llm (provider,model_name) VALUES (%s,%s),(%s,%s),(%s,%s)",
+            "INSERT INTO llm (provider, model_name)\nVALUES\n  (?, ?),\n  (?, ?)",
+        ],
+        id="multi-row-values",
+    ),
+    pytest.param(
+        "SELECT a, b FROM llm WHERE status = ? ORDER BY id LIMIT ?",
+        [
+            "SELECT a, b FROM llm WHERE status = 1 ORDER BY id LIMIT 10",
+            "SELECT a,b\nFROM llm\n\tWHERE status = 1\n  ORDER BY id LIMIT 20",
+            "  SELECT  a ,  b  FROM llm WHERE status = ? ORDER BY id LIMIT ?  ",
+        ],
+        id="whitespace",
+    ),
+]
+
+
+@pytest.mark.parametrize("expected, statements", FINGERPRINT_GROUPS)
+def test_fingerprint_collapses_variants(expected, statements):
+    """字面量、占位符、IN 列表长度与空白不同的语句得到同一个指纹"""
+    assert {fingerprint(statement) for statement in statements} == {expected}
+
+
+def test_fingerprint_groups_distinct():
+    fingerprints = [group.values[0] for group in FINGERPRINT_GROUPS]
+    assert len(set(fingerprints)) == len(fingerprints)
+
+
+@pytest.mark.parametrize(
+    "statement, expected",
+    [
+        # 单行 VALUES 不折叠
+        ("INSERT INTO t (a, b) VALUES (1, 2)", "INSERT INTO t (a, b) VALUES (?, ?)"),
+        # 子查询与函数参数不是 IN 列表
+        ("SELECT * FROM t WHERE a IN (SELECT b FROM u)", "SELECT * FROM t WHERE a IN (SELECT b FROM u)"),
+        ("SELECT coalesce(a, 0) FROM t", "SELECT coalesce(a, ?) FROM t"),
+        # 标识符中的数字与类型转换不替换
+        ("SELECT t1.id::text FROM t1", "SELECT t1.id::text FROM t1"),
+    ],
+)
+def test_fingerprint_keeps_structure(statement, expected):
+    assert fingerprint(statement) == expected
@@ -0,0 +1,68 @@
+"""
+请求日志采样测试
+"""
+
+import pytest
+
+from app.support import structured_logging
+from app.support.structured_logging import LogSampler
+
+RULES = [
+    {"route": "/health", "method": "get", "rate": 0},
+    {"route": "/api/v1/llms/*", "method": "GET", "level": "INFO", "rate": 0.1},
+    {"route": "/api/v1/*", "rate": 0.5},
+]
+
+
+@pytest.fixture
+def sampler():
+    sampler = LogSampler()
+    sampler.configure(rules=RULES, default_rate=1.0, slow_threshold_ms=500)
+    return sampler
+
+
+@pytest.mark.parametrize(
+    "method, route, level, rate",
+    [
+        ("GET", "/health", "INFO", 0.0),
+        # 规则中的 method/level 统一为大写
+        ("GET", "/health", "WARNING", 0.0),
+        ("POST", "/health", "INFO", 1.0),
+        ("GET", "/api/v1/llms/{llm_id}", "INFO", 0.1),
+        # 按顺序匹配第一条规则,level 不符时落到下一条
+        ("GET", "/api/v1/llms/{llm_id}", "WARNING", 0.5),
+        ("POST", "/api/v1/llms/{llm_id}", "INFO", 0.5),
+        ("GET", "/api/v1/agents", "INFO", 0.5),
+        ("GET", "/api/v2/agents", "INFO", 1.0),
+    ],
+)
+def test_rate_for_first_matching_rule(sampler, method, route, level, rate):
+    assert sampler.rate_for(method, route, level) == rate
+
+
+def test_errors_and_slow_requests_always_logged(sampler):
+    """ERROR/CRITICAL 与慢请求不受采样率影响"""
+    assert sampler.should_log("GET", "/health", "ERROR", 1.0)
+    assert sampler.should_log("GET", "/health", "CRITICAL", 1.0)
+    assert sampler.should_log("GET", "/health", "INFO", 500.0)
+    assert not sampler.should_log("GET", "/health", "INFO", 499.0)
+
+
+def test_should_log_samples_by_rate(sampler, monkeypatch):
+    """采样率在 0 与 1 之间时按随机数判断"""
+    monkeypatch.setattr(structured_logging.random, "random", lambda: 0.3)
+    assert sampler.should_log("GET", "/api/v1/agents", "INFO", 1.0)
+    assert not sampler.should_log("GET", "/api/v1/llms/{llm_id}", "INFO", 1.0)
+    assert sampler.should_log("GET", "/api/v2/agents", "INFO", 1.0)
+
+
+def test_cache_only_for_route_templates(sampler):
+    """路由模板缓存匹配结果,未匹配路由的原始路径不进入缓存;重新配置后清空缓存"""
+    sampler.should_log("GET", "/api/v1/agents", "INFO", 1.0)
+    sampler.should_log("GET", "/unknown/12345", "INFO", 1.0, cacheable=False)
+    assert sampler._cache == {("GET", "/api/v1/agents", "INFO"): 0.5}
+
+    sampler.configure(rules=[], default_rate=0.0)
+    assert sampler._cache == {}
+    assert not sampler.should_log("GET", "/api/v1/agents", "INFO", 1.0)
+    assert sampler.snapshot() == {"default_rate": 0.0, "slow_threshold_ms": 1000.0, "rules": []}
@@ -0,0 +1,81 @@
+"""
+请求级链路追踪测试
+"""
+
+import pytest
+from sqlalchemy import Column, Integer, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+
+from app.support.tracing import (TracedSession, end_trace, instrument_sqlalchemy,
+                                 start_trace)
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "item"
+
+    id = Column(Integer, primary_key=True)
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'trace.db'}")
+    instrument_sqlalchemy(engine.sync_engine)
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY)"))
+    yield engine
+    await engine.dispose()
+
+
+def _names(trace) -> list[str]:
+    return [span.name for span in trace.spans]
+
+
+async def test_checkout_is_lazy(engine):
+    """会话不执行 SQL 时不获取连接,首次执行时记录一次 db.checkout,事务结束后重新 checkout"""
+    async_session = async_sessionmaker(engine, sync_session_class=TracedSession)
+    trace, token = start_trace()
+    try:
+        async with async_session() as session:
+            assert engine.sync_engine.pool.checkedout() == 0
+            assert trace.spans == []
+
+            await session.execute(text("SELECT 1"))
+            await session.execute(text("SELECT 2"))
+            assert _names(trace) == ["db.checkout", "db.query", "db.query"]
+            checkout = trace.spans[0]
+            assert checkout.end_ns is not None
+            assert checkout.end_ns <= trace.spans[1].start_ns
+
+            await session.commit()
+            await session.execute(text("SELECT 3"))
+            assert _names(trace)[3:] == ["db.checkout", "db.query"]
+    finally:
+        end_trace(token)
+    assert engine.sync_engine.pool.checkedout() == 0
+
+
+async def test_checkout_on_flush(engine):
+    """只有写操作的会话在 flush 时记录 db.checkout"""
+    async_session = async_sessionmaker(engine, sync_session_class=TracedSession)
+    trace, token = start_trace()
+    try:
+        async with async_session() as session:
+            session.add(Item(id=1))
+            assert trace.spans == []
+            await session.commit()
+    finally:
+        end_trace(token)
+    assert _names(trace)[0] == "db.checkout"
+    assert _names(trace).count("db.checkout") == 1
+    assert all(span.end_ns is not None for span in trace.spans)
+
+
+async def test_no_trace_no_span(engine):
+    """不在 Trace 中时不记录"""
+    async_session = async_sessionmaker(engine, sync_session_class=TracedSession)
+    async with async_session() as session:
+        await session.execute(text("SELECT 1"))
+        assert "_tracing_checkout" not in session.info
@@ -0,0 +1,84 @@
+"""
+工作流 worker 测试
+"""
+
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from app.services.redis_lock import LeaseLock
+from app.services.workflow import worker as worker_module
+from app.services.workflow.worker import WorkflowWorker
+
+
+@pytest.fixture
+def hanging_workflow(monkeypatch):
+    started = asyncio.Event()
+
+    async def run_agent_workflow(*args, **kwargs):
+        started.set()
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(worker_module, "run_agent_workflow", run_agent_workflow)
+    return started
+
+
+async def test_job_taken_over_is_cancelled_without_releasing_lock(queue, hanging_workflow):
+    """任务被其他 worker 接管后,原 worker 停止执行且不释放接管方持有的去重锁"""
+    task_id, _ = await queue.submit("find agents", 1)
+    worker = WorkflowWorker(queue, consumer="slow")
+    (job,) = await queue.read("slow", count=1, block_ms=0)
+    worker._start(job)
+    await hanging_workflow.wait()
+    (task,) = worker._in_flight
+
+    await queue.client.xclaim(queue.stream, queue.group, "rescuer", 0, [job.message_id], justid=True)
+    await worker._touch()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert task.cancelled()
+    assert not worker._in_flight and not worker._locks
+    holder = await LeaseLock(job.lock_name, client=queue.client).holder()
+    assert holder is not None and holder.owner == task_id
+    pending = await queue.client.xpending_range(queue.stream, queue.group, min="-", max="+", count=10)
+    assert [item["consumer"] for item in pending] == ["rescuer"]
+
+
+async def test_start_failure_leaves_job_pending(queue, hanging_workflow, monkeypatch):
+    """开始执行时 Redis 出错,任务不确认,留给其他 worker 接管"""
+    await queue.enqueue("find agents", 1)
+    worker = WorkflowWorker(queue, consumer="w1")
+    (job,) = await queue.read("w1", count=1, block_ms=0)
+
+    async def set_status(*args, **kwargs):
+        raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(queue, "set_status", set_status)
+    worker._start(job)
+    (task,) = worker._in_flight
+    await task
+
+    assert not hanging_workflow.is_set()
+    assert not worker._in_flight
+    assert (await queue.client.xpending(queue.stream, queue.group))["pending"] == 1
+
+
+async def test_lost_lock_stops_job(queue, hanging_workflow, monkeypatch):
+    """去重锁丢失时停止执行,任务标记失败并确认"""
+    monkeypatch.setattr(worker_module.get_settings(), "WORKFLOW_LOCK_TTL_MS", 150)
+    task_id, _ = await queue.submit("find agents", 1)
+    worker = WorkflowWorker(queue, consumer="w1")
+    (job,) = await queue.read("w1", count=1, block_ms=0)
+    worker._start(job)
+    await hanging_workflow.wait()
+    (task,) = worker._in_flight
+
+    await queue.client.set(f"lock:{job.lock_name}", f"{job.fence + 1}:other")
+    await asyncio.wait_for(task, 5)
+
+    status = await queue.get_status(task_id)
+    assert status["status"] == "FAILED"
+    assert "LockLostError" in status["error"]
+    assert (await queue.client.xpending(queue.stream, queue.group))["pending"] == 0
+    assert await queue.client.get(f"lock:{job.lock_name}") == f"{job.fence + 1}:other"
@@ -0,0 +1,144 @@
+"""
+WriteBehindSaver 测试
+"""
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+from langgraph.checkpoint.memory import InMemorySaver
+
+from app.services.now_find_agents.write_behind_checkpointer import \
+    WriteBehindSaver
+
+
+class FlakySaver(InMemorySaver):
+    """记录每次落库的 checkpoint,fail 大于 0 时落库失败"""
+
+    def __init__(self):
+        super().__init__()
+        self.fail = 0
+        self.puts: list[tuple[str, str, dict]] = []
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("database unavailable")
+        self.puts.append((config["configurable"]["thread_id"], checkpoint["id"], dict(new_versions)))
+        return await super().aput(config, checkpoint, metadata, new_versions)
+
+
+def _config(thread_id: str, checkpoint_id: str | None = None) -> dict:
+    configurable = {"thread_id": thread_id, "checkpoint_ns": ""}
+    if checkpoint_id:
+        configurable["checkpoint_id"] = checkpoint_id
+    return {"configurable": configurable}
+
+
+class Thread:
+    """按步生成 checkpoint 的会话,每步只有传入的通道变化"""
+
+    def __init__(self, thread_id: str):
+        self.thread_id = thread_id
+        self.values: dict = {}
+        self.versions: dict = {}
+        self.checkpoint_id: str | None = None
+
+    async def step(self, saver: WriteBehindSaver, **changes) -> str:
+        new_versions = {}
+        for channel, value in changes.items():
+            self.values[channel] = value
+            self.versions[channel] = new_versions[channel] = saver.get_next_version(self.versions.get(channel), None)
+        checkpoint = empty_checkpoint()
+        checkpoint.update(id=str(uuid6()), channel_values=dict(self.values), channel_versions=dict(self.versions))
+        await saver.aput(_config(self.thread_id, self.checkpoint_id), checkpoint, {"step": len(self.versions)}, new_versions)
+        self.checkpoint_id = checkpoint["id"]
+        return checkpoint["id"]
+
+
+@pytest.fixture
+def inner():
+    return FlakySaver()
+
+
+@pytest.fixture
+def saver(inner):
+    return WriteBehindSaver(inner, durability="exit", batch_size=100, max_pending=0)
+
+
+async def test_coalesced_puts_persist_all_changed_channels(inner, saver):
+    """同一会话两次未落库的 checkpoint 合并为最新一个,之前变化的通道一并写入"""
+    thread = Thread("t1")
+    await thread.step(saver, a="keep-me", log=[0])
+    latest = await thread.step(saver, log=[0, 1])
+    assert inner.puts == []
+
+    assert await saver.aflush() == 1
+    assert [(thread_id, checkpoint_id) for thread_id, checkpoint_id, _ in inner.puts] == [("t1", latest)]
+    assert set(inner.puts[0][2]) == {"a", "log"}
+    stored = await inner.aget_tuple(_config("t1"))
+    assert stored.checkpoint["channel_values"] == {"a": "keep-me", "log": [0, 1]}
+    assert saver.coalesced == 1
+
+
+async def test_channels_changed_before_last_flush_are_not_rewritten(inner, saver):
+    thread = Thread("t1")
+    await thread.step(saver, a="keep-me")
+    await saver.aflush()
+    await thread.step(saver, log=[0])
+    await thread.step(saver, log=[0, 1])
+    await saver.aflush()
+
+    assert set(inner.puts[-1][2]) == {"log"}
+    stored = await inner.aget_tuple(_config("t1"))
+    assert stored.checkpoint["channel_values"] == {"a": "keep-me", "log": [0, 1]}
+
+
+async def test_failed_flush_requeues_in_order_and_merges_newer(inner, saver):
+    """落库失败的数据按原顺序放回缓冲,期间的新写入合并在其后"""
+    first, second = Thread("t1"), Thread("t2")
+    await first.step(saver, a="first")
+    await second.step(saver, a="second")
+
+    inner.fail = 1
+    with pytest.raises(ConnectionError):
+        await saver.aflush()
+    assert list(saver._pending) == [("t1", ""), ("t2", "")]
+    assert saver.flush_errors == 1
+
+    latest = await first.step(saver, log=[0])
+    task_config = _config("t1", latest)
+    await saver.aput_writes(task_config, [("log", [1])], "task-1")
+    assert list(saver._pending) == [("t1", ""), ("t2", "")]
+
+    assert await saver.aflush() == 2
+    assert [(thread_id, checkpoint_id) for thread_id, checkpoint_id, _ in inner.puts] == [
+        ("t1", latest),
+        ("t2", second.checkpoint_id),
+    ]
+    assert set(inner.puts[0][2]) == {"a", "log"}
+    stored = await inner.aget_tuple(_config("t1"))
+    assert stored.checkpoint["channel_values"] == {"a": "first", "log": [0]}
+    assert stored.pending_writes == [("task-1", "log", [1])]
+
+
+async def test_get_tuple_flushes_that_thread_first(inner, saver):
+    """读取会话前先写入该会话的缓冲,其他会话仍留在缓冲中"""
+    first, second = Thread("t1"), Thread("t2")
+    await first.step(saver, a="first")
+    await second.step(saver, a="second")
+
+    stored = await saver.aget_tuple(_config("t1"))
+    assert stored.checkpoint["channel_values"] == {"a": "first"}
+    assert list(saver._pending) == [("t2", "")]
+    assert [thread_id for thread_id, _, _ in inner.puts] == ["t1"]
+
+    listed = [item async for item in saver.alist(_config("t2"))]
+    assert listed[0].checkpoint["channel_values"] == {"a": "second"}
+    assert not saver._pending
+
+
+async def test_sync_durability_writes_through(inner):
+    saver = WriteBehindSaver(inner, durability="sync")
+    await Thread("t1").step(saver, a="x")
+    assert not saver._pending
+    assert [thread_id for thread_id, _, _ in inner.puts] == ["t1"]